@@ -0,0 +1,42 @@
+"""profile_permission
+
+Revision ID: 2e8b5f0a7c61
+Revises: 9a4d6e1f3b27
+Create Date: 2026-10-19 14:21:08.530417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2e8b5f0a7c61'
+down_revision = '9a4d6e1f3b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Permiso de perfilado para bases ya inicializadas (init_roles solo corre en bases vacías)
+    op.execute("""
+        INSERT INTO permisos (id, nombre, descripcion, codigo, categoria_id, es_critico)
+        SELECT 21, 'Perfilar el sistema',
+               'Permite obtener perfiles de CPU de los workers y de solicitudes',
+               'admin:system:profile', 1, true
+        WHERE EXISTS (SELECT 1 FROM categorias_permiso WHERE id = 1)
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("""
+        INSERT INTO rol_permiso (rol_id, permiso_id)
+        SELECT 1, id FROM permisos WHERE codigo = 'admin:system:profile'
+        AND EXISTS (SELECT 1 FROM roles WHERE id = 1)
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        DELETE FROM rol_permiso
+        WHERE permiso_id IN (SELECT id FROM permisos WHERE codigo = 'admin:system:profile')
+    """)
+    op.execute("DELETE FROM permisos WHERE codigo = 'admin:system:profile'")
@@ -0,0 +1,39 @@
+"""login_attempt_counters
+
+Revision ID: 3b9e1c7d2a4f
+Revises: f5c949ccbc73
+Create Date: 2026-10-19 09:12:41.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9e1c7d2a4f'
+down_revision = 'f5c949ccbc73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Índice compuesto para consultas de intentos por IP y fecha
+    op.create_index(
+        'ix_intentos_login_ip_exitoso_fecha',
+        'intentos_login',
+        ['ip_address', 'exitoso', 'fecha'],
+        unique=False
+    )
+
+    # Contador compartido de intentos fallidos por sub-ventana de tiempo
+    op.create_table('contador_intentos_login',
+    sa.Column('ip_address', sa.String(), nullable=False),
+    sa.Column('ventana_inicio', sa.DateTime(), nullable=False),
+    sa.Column('fallidos', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('ip_address', 'ventana_inicio')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('contador_intentos_login')
+    op.drop_index('ix_intentos_login_ip_exitoso_fecha', table_name='intentos_login')
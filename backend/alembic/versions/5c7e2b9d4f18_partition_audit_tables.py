@@ -0,0 +1,126 @@
+"""partition_audit_tables
+
+Revision ID: 5c7e2b9d4f18
+Revises: 8d2f4a6c1e93
+Create Date: 2026-10-19 11:24:09.731664
+
+Convierte registro_acceso, historial_acceso e intentos_login en tablas
+particionadas por mes según fecha. Los datos existentes se copian a las nuevas
+particiones, por lo que en tablas grandes conviene ejecutarla en una ventana
+de mantenimiento. Las particiones siguientes y la retención las mantiene
+app/utils/partitions.py.
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c7e2b9d4f18'
+down_revision = '8d2f4a6c1e93'
+branch_labels = None
+depends_on = None
+
+# Meses futuros con partición creada al migrar
+PARTITIONS_AHEAD = 3
+
+# Claves foráneas e índices de cada tabla, comunes a ambas direcciones
+FOREIGN_KEYS = {
+    'registro_acceso': [('usuario_id', 'usuarios')],
+    'historial_acceso': [('usuario_id', 'usuarios'), ('documento_id', 'documentos')],
+    'intentos_login': [],
+}
+
+INDEXES_BEFORE = {
+    'registro_acceso': [('ix_registro_acceso_id', ['id'])],
+    'historial_acceso': [('ix_historial_acceso_id', ['id'])],
+    'intentos_login': [
+        ('ix_intentos_login_id', ['id']),
+        ('ix_intentos_login_email', ['email']),
+        ('ix_intentos_login_ip_exitoso_fecha', ['ip_address', 'exitoso', 'fecha']),
+    ],
+}
+
+INDEXES_AFTER = {
+    'registro_acceso': INDEXES_BEFORE['registro_acceso'] + [
+        ('ix_registro_acceso_fecha', ['fecha']),
+        ('ix_registro_acceso_usuario_fecha', ['usuario_id', 'fecha']),
+        ('ix_registro_acceso_ip_fecha', ['ip_address', 'fecha']),
+    ],
+    'historial_acceso': INDEXES_BEFORE['historial_acceso'] + [
+        ('ix_historial_acceso_fecha', ['fecha']),
+        ('ix_historial_acceso_usuario_fecha', ['usuario_id', 'fecha']),
+    ],
+    'intentos_login': INDEXES_BEFORE['intentos_login'] + [
+        ('ix_intentos_login_fecha', ['fecha']),
+    ],
+}
+
+
+def _add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _add_constraints(table: str, primary_key: str, indexes) -> None:
+    op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY ({primary_key})")
+    for column, referenced in FOREIGN_KEYS[table]:
+        op.create_foreign_key(f'{table}_{column}_fkey', table, referenced, [column], ['id'])
+    for name, columns in indexes:
+        op.create_index(name, table, columns, unique=False)
+
+
+def _partition_table(table: str) -> None:
+    bind = op.get_bind()
+
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+    # fecha pasa a formar parte de la clave primaria
+    op.execute(f"UPDATE {table}_old SET fecha = timezone('utc', now()) WHERE fecha IS NULL")
+
+    op.execute(f"CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS) PARTITION BY RANGE (fecha)")
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN fecha SET NOT NULL")
+
+    # Una partición por mes desde el dato más antiguo hasta PARTITIONS_AHEAD meses adelante
+    oldest = bind.execute(sa.text(f"SELECT min(fecha) FROM {table}_old")).scalar()
+    current = date(datetime.utcnow().year, datetime.utcnow().month, 1)
+    month = date(oldest.year, oldest.month, 1) if oldest else current
+    while month <= _add_months(current, PARTITIONS_AHEAD):
+        following = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE {table}_p{month.year:04d}{month.month:02d} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        )
+        month = following
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    op.execute(f"INSERT INTO {table} SELECT * FROM {table}_old")
+    op.execute(f"DROP TABLE {table}_old")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+    _add_constraints(table, 'id, fecha', INDEXES_AFTER[table])
+
+
+def _unpartition_table(table: str) -> None:
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_part")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+
+    op.execute(f"CREATE TABLE {table} (LIKE {table}_part INCLUDING DEFAULTS)")
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN fecha DROP NOT NULL")
+    op.execute(f"INSERT INTO {table} SELECT * FROM {table}_part")
+    op.execute(f"DROP TABLE {table}_part CASCADE")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+    _add_constraints(table, 'id', INDEXES_BEFORE[table])
+
+
+def upgrade() -> None:
+    for table in ('registro_acceso', 'historial_acceso', 'intentos_login'):
+        _partition_table(table)
+
+
+def downgrade() -> None:
+    for table in ('registro_acceso', 'historial_acceso', 'intentos_login'):
+        _unpartition_table(table)
@@ -0,0 +1,29 @@
+"""rate_limit_state
+
+Revision ID: 8d2f4a6c1e93
+Revises: 3b9e1c7d2a4f
+Create Date: 2026-10-19 10:03:17.284105
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f4a6c1e93'
+down_revision = '3b9e1c7d2a4f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Estado compartido del limitador de tasa entre workers
+    op.create_table('limites_tasa',
+    sa.Column('clave', sa.String(), nullable=False),
+    sa.Column('tat', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('clave')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('limites_tasa')
@@ -0,0 +1,71 @@
+"""query_pattern_indexes
+
+Revision ID: 9a4d6e1f3b27
+Revises: 5c7e2b9d4f18
+Create Date: 2026-10-19 12:02:45.118930
+
+Índices compuestos y parciales alineados con las consultas reales
+(ver "Auditoría de patrones de consulta" en docs/technical/data_model.md).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4d6e1f3b27'
+down_revision = '5c7e2b9d4f18'
+branch_labels = None
+depends_on = None
+
+ACTIVO = sa.text('activo')
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Documentos: filtros de búsqueda sobre documentos activos y columnas de orden
+    op.create_index('ix_documentos_activos_fecha_modificacion', 'documentos', ['fecha_modificacion'], postgresql_where=ACTIVO)
+    op.create_index('ix_documentos_activos_fecha_creacion', 'documentos', ['fecha_creacion'], postgresql_where=ACTIVO)
+    op.create_index('ix_documentos_activos_categoria', 'documentos', ['categoria_id', 'fecha_modificacion'], postgresql_where=ACTIVO)
+    op.create_index('ix_documentos_activos_tipo', 'documentos', ['tipo_documento_id', 'fecha_modificacion'], postgresql_where=ACTIVO)
+    op.create_index('ix_documentos_activos_usuario', 'documentos', ['usuario_id', 'fecha_modificacion'], postgresql_where=ACTIVO)
+    op.create_index('ix_documentos_activos_verificacion', 'documentos', ['fecha_ultima_verificacion'], postgresql_where=ACTIVO)
+    for column in ('titulo', 'numero_expediente', 'descripcion'):
+        op.create_index(
+            f'ix_documentos_{column}_trgm', 'documentos', [column],
+            postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'}, postgresql_where=ACTIVO
+        )
+
+    # Versiones: listado por documento ordenado por número y versión actual
+    op.create_index('ix_versiones_documento_documento_numero', 'versiones_documento', ['documento_id', 'numero_version'])
+    op.create_index('ix_versiones_documento_actual', 'versiones_documento', ['documento_id'], postgresql_where=sa.text('es_actual'))
+
+    # Historial de un documento ordenado por fecha
+    op.create_index('ix_historial_acceso_documento_fecha', 'historial_acceso', ['documento_id', 'fecha'])
+
+    # Bloqueos de IP: índice parcial para la consulta de cada solicitud. El índice
+    # único sobre ip_address impedía volver a bloquear una IP ya desbloqueada
+    op.drop_index('ix_bloqueo_ip_ip_address', table_name='bloqueo_ip')
+    op.create_index('ix_bloqueo_ip_ip_address', 'bloqueo_ip', ['ip_address'], unique=False)
+    op.create_index('ix_bloqueo_ip_activo', 'bloqueo_ip', ['ip_address', 'fecha_fin'], postgresql_where=ACTIVO)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_bloqueo_ip_activo', table_name='bloqueo_ip')
+    op.drop_index('ix_bloqueo_ip_ip_address', table_name='bloqueo_ip')
+    op.create_index('ix_bloqueo_ip_ip_address', 'bloqueo_ip', ['ip_address'], unique=True)
+
+    op.drop_index('ix_historial_acceso_documento_fecha', table_name='historial_acceso')
+
+    op.drop_index('ix_versiones_documento_actual', table_name='versiones_documento')
+    op.drop_index('ix_versiones_documento_documento_numero', table_name='versiones_documento')
+
+    for column in ('titulo', 'numero_expediente', 'descripcion'):
+        op.drop_index(f'ix_documentos_{column}_trgm', table_name='documentos')
+    op.drop_index('ix_documentos_activos_verificacion', table_name='documentos')
+    op.drop_index('ix_documentos_activos_usuario', table_name='documentos')
+    op.drop_index('ix_documentos_activos_tipo', table_name='documentos')
+    op.drop_index('ix_documentos_activos_categoria', table_name='documentos')
+    op.drop_index('ix_documentos_activos_fecha_creacion', table_name='documentos')
+    op.drop_index('ix_documentos_activos_fecha_modificacion', table_name='documentos')
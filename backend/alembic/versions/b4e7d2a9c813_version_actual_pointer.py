@@ -0,0 +1,49 @@
+"""version_actual_pointer
+
+Revision ID: b4e7d2a9c813
+Revises: 2e8b5f0a7c61
+Create Date: 2026-10-19 16:40:12.507314
+
+Puntero documentos.version_actual_id a la versión vigente e índice sobre
+versiones_documento.version_anterior_id para recorrer el linaje con CTE
+recursivas (ver app/db/lineage.py).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e7d2a9c813'
+down_revision = '2e8b5f0a7c61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('documentos', sa.Column('version_actual_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_documentos_version_actual_id', 'documentos', 'versiones_documento',
+        ['version_actual_id'], ['id']
+    )
+
+    # La versión vigente es la marcada es_actual o, si no hay, la de número más alto
+    op.execute("""
+        UPDATE documentos d
+        SET version_actual_id = v.id
+        FROM (
+            SELECT DISTINCT ON (documento_id) documento_id, id
+            FROM versiones_documento
+            ORDER BY documento_id, es_actual DESC, numero_version DESC
+        ) v
+        WHERE v.documento_id = d.id
+    """)
+
+    # Siguiente versión de una dada (paso recursivo del linaje hacia adelante)
+    op.create_index('ix_versiones_documento_version_anterior', 'versiones_documento', ['version_anterior_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_versiones_documento_version_anterior', table_name='versiones_documento')
+    op.drop_constraint('fk_documentos_version_actual_id', 'documentos', type_='foreignkey')
+    op.drop_column('documentos', 'version_actual_id')
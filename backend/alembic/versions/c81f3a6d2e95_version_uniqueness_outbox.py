@@ -0,0 +1,86 @@
+"""version_uniqueness_outbox
+
+Revision ID: c81f3a6d2e95
+Revises: b4e7d2a9c813
+Create Date: 2026-10-19 18:05:37.224816
+
+Unicidad de (documento_id, numero_version) y de la versión actual por documento,
+y tabla eventos_pendientes de la bandeja de salida transaccional.
+
+Las versiones duplicadas por cargas concurrentes anteriores se renumeran al
+final de la cadena de su documento (en orden de creación), y solo la versión
+apuntada por documentos.version_actual_id queda marcada como actual.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f3a6d2e95'
+down_revision = 'b4e7d2a9c813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Renumerar las repeticiones de un mismo número después del máximo del documento
+    op.execute("""
+        WITH repetidas AS (
+            SELECT id, documento_id,
+                   ROW_NUMBER() OVER (PARTITION BY documento_id, numero_version ORDER BY fecha_version, id) AS repeticion
+            FROM versiones_documento
+        ),
+        renumeradas AS (
+            SELECT r.id,
+                   m.maximo + ROW_NUMBER() OVER (PARTITION BY r.documento_id ORDER BY r.id) AS nuevo_numero
+            FROM repetidas r
+            JOIN (
+                SELECT documento_id, MAX(numero_version) AS maximo
+                FROM versiones_documento
+                GROUP BY documento_id
+            ) m ON m.documento_id = r.documento_id
+            WHERE r.repeticion > 1
+        )
+        UPDATE versiones_documento v
+        SET numero_version = r.nuevo_numero
+        FROM renumeradas r
+        WHERE v.id = r.id
+    """)
+
+    # Una sola versión actual por documento: la del puntero
+    op.execute("""
+        UPDATE versiones_documento v
+        SET es_actual = false
+        FROM documentos d
+        WHERE d.id = v.documento_id
+          AND v.es_actual
+          AND d.version_actual_id IS NOT NULL
+          AND v.id <> d.version_actual_id
+    """)
+
+    op.drop_index('ix_versiones_documento_documento_numero', table_name='versiones_documento')
+    op.create_index('ix_versiones_documento_documento_numero', 'versiones_documento', ['documento_id', 'numero_version'], unique=True)
+    op.drop_index('ix_versiones_documento_actual', table_name='versiones_documento')
+    op.create_index('ix_versiones_documento_actual', 'versiones_documento', ['documento_id'], unique=True, postgresql_where=sa.text('es_actual'))
+
+    op.create_table(
+        'eventos_pendientes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(), nullable=False),
+        sa.Column('documento_id', sa.Integer(), nullable=True),
+        sa.Column('datos', sa.Text(), nullable=False),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+        sa.Column('intentos', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['documento_id'], ['documentos.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('eventos_pendientes')
+
+    op.drop_index('ix_versiones_documento_actual', table_name='versiones_documento')
+    op.create_index('ix_versiones_documento_actual', 'versiones_documento', ['documento_id'], postgresql_where=sa.text('es_actual'))
+    op.drop_index('ix_versiones_documento_documento_numero', table_name='versiones_documento')
+    op.create_index('ix_versiones_documento_documento_numero', 'versiones_documento', ['documento_id', 'numero_version'])
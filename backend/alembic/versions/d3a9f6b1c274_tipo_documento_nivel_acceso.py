@@ -0,0 +1,41 @@
+"""tipo_documento_nivel_acceso
+
+Revision ID: d3a9f6b1c274
+Revises: c81f3a6d2e95
+Create Date: 2026-10-19 21:12:48.630915
+
+Columna tipos_documento.nivel_acceso (publico, restringido o clasificado), que
+reemplaza la búsqueda de "clasificado" y "público" en el nombre del tipo al
+filtrar la búsqueda de documentos por permisos. Los tipos existentes toman el
+nivel que les daba su nombre.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a9f6b1c274'
+down_revision = 'c81f3a6d2e95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'tipos_documento',
+        sa.Column('nivel_acceso', sa.String(length=20), nullable=False, server_default='restringido')
+    )
+    op.create_check_constraint(
+        'ck_tipos_documento_nivel_acceso', 'tipos_documento',
+        "nivel_acceso IN ('publico', 'restringido', 'clasificado')"
+    )
+
+    # Mismo criterio que usaba la búsqueda: "clasificado" prevalece sobre "público"
+    op.execute("UPDATE tipos_documento SET nivel_acceso = 'publico' WHERE nombre ILIKE '%público%'")
+    op.execute("UPDATE tipos_documento SET nivel_acceso = 'clasificado' WHERE nombre ILIKE '%clasificado%'")
+
+
+def downgrade() -> None:
+    op.drop_constraint('ck_tipos_documento_nivel_acceso', 'tipos_documento', type_='check')
+    op.drop_column('tipos_documento', 'nivel_acceso')
@@ -1,15 +1,70 @@
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
+from .pool import instrumented_pool_class, register_engine
+from .query_stats import instrument_engine
 from ..utils.config import settings
 
-# Crear motor de base de datos
-engine = create_engine(settings.DATABASE_URL)
+# Parámetros comunes del pool. Cada worker tiene un pool por motor, por lo que el
+# máximo de conexiones es workers * motores * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+pool_kwargs = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING
+)
+
+def sync_connect_args() -> dict:
+    """Argumentos de conexión de psycopg2 (timeout de sentencias en el servidor)"""
+    if settings.DB_STATEMENT_TIMEOUT_MS <= 0:
+        return {}
+    return {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+
+def async_connect_args() -> dict:
+    """Argumentos de conexión de asyncpg (timeout de sentencias en el servidor)"""
+    if settings.DB_STATEMENT_TIMEOUT_MS <= 0:
+        return {}
+    return {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}}
+
+# Crear motor de base de datos síncrono (Alembic, scripts, tareas en hilos)
+engine = create_engine(
+    settings.DATABASE_URL,
+    poolclass=instrumented_pool_class(QueuePool),
+    connect_args=sync_connect_args(),
+    **pool_kwargs
+)
 
 # Crear sesión local
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Crear motor asíncrono (asyncpg) para los endpoints async, de modo que las
+# consultas no bloqueen el event loop
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    poolclass=instrumented_pool_class(AsyncAdaptedQueuePool),
+    connect_args=async_connect_args(),
+    **pool_kwargs
+)
+
+# Crear sesión asíncrona. Sin expirar al hacer commit, ya que en modo async
+# no se pueden recargar atributos de forma implícita
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+register_engine("primary", engine)
+register_engine("primary_async", async_engine)
+instrument_engine(engine)
+instrument_engine(async_engine)
+
 # Crear base para modelos declarativos
 Base = declarative_base()
 
@@ -24,3 +79,29 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_request_session(request: Request) -> AsyncSession:
+    """
+    Obtiene la sesión asíncrona de la solicitud, creándola si no existe.
+    Middlewares y endpoints comparten así una única sesión (y como máximo una
+    conexión a la vez) por solicitud; RequestSessionMiddleware la cierra al final.
+    """
+    db = getattr(request.state, "db", None)
+    if db is None:
+        db = AsyncSessionLocal()
+        request.state.db = db
+    return db
+
+# Dependencia para obtener la sesión asíncrona de base de datos
+async def get_async_db(request: Request = None):
+    """
+    Dependencia para obtener una sesión asíncrona de base de datos.
+    Utilizar en endpoints async para no bloquear el event loop durante las consultas.
+    Si un middleware ya abrió la sesión de la solicitud, se reutiliza.
+    """
+    db = getattr(request.state, "db", None) if request is not None else None
+    if db is not None:
+        yield db
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
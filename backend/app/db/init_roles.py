@@ -216,13 +216,23 @@ PERMISOS = [
         "codigo": "search:restricted",
         "categoria_id": 4,
         "es_critico": True
+    },
+    
+    # Diagnóstico de rendimiento
+    {
+        "id": 21,
+        "nombre": "Perfilar el sistema",
+        "descripcion": "Permite obtener perfiles de CPU de los workers y de solicitudes",
+        "codigo": "admin:system:profile",
+        "categoria_id": 1,
+        "es_critico": True
     }
 ]
 
 # Asignación de permisos a roles
 ROL_PERMISOS = {
     # Administrador tiene todos los permisos
-    1: list(range(1, 21)),  # IDs del 1 al 20
+    1: list(range(1, 22)),  # IDs del 1 al 21
     
     # Gestor de Documentos
     2: [6, 7, 9, 10, 11, 12, 13, 18, 19],  # Permisos de gestión de documentos y búsqueda
@@ -0,0 +1,79 @@
+"""
+Consultas sobre la cadena de versiones de un documento.
+
+Las versiones forman una lista enlazada por version_anterior_id. Recorrerla con
+las relaciones version_anterior / version_siguiente emite una consulta por
+salto; en su lugar:
+
+- la versión actual se lee por el puntero documentos.version_actual_id (una
+  lectura por clave primaria, que además suele resolverse en el identity map);
+- el linaje completo de una versión (anteriores y siguientes) se obtiene en una
+  sola consulta con dos CTE recursivas sobre version_anterior_id.
+
+Las sentencias se construyen con select(), por lo que sirven tanto para Session
+como para AsyncSession.
+"""
+from typing import List, Optional
+
+from sqlalchemy import Select, literal, select, union_all
+from sqlalchemy.orm import Session, aliased
+
+from . import models
+
+# Límite de saltos de las CTE: protege de ciclos en datos corruptos
+MAX_LINEAGE_DEPTH = 10000
+
+def lineage_statement(version_id: int) -> Select:
+    """
+    Versiones de la cadena de version_id (sus anteriores, ella misma y sus
+    siguientes), de la más antigua a la más reciente.
+    """
+    version = models.VersionDocumento
+
+    anteriores = select(
+        version.id, version.version_anterior_id, literal(0).label("profundidad")
+    ).where(version.id == version_id).cte("anteriores", recursive=True)
+    previa = aliased(version)
+    anteriores = anteriores.union_all(
+        select(previa.id, previa.version_anterior_id, anteriores.c.profundidad + 1)
+        .join(anteriores, previa.id == anteriores.c.version_anterior_id)
+        .where(anteriores.c.profundidad < MAX_LINEAGE_DEPTH)
+    )
+
+    siguientes = select(
+        version.id, literal(0).label("profundidad")
+    ).where(version.id == version_id).cte("siguientes", recursive=True)
+    posterior = aliased(version)
+    siguientes = siguientes.union_all(
+        select(posterior.id, siguientes.c.profundidad + 1)
+        .join(siguientes, posterior.version_anterior_id == siguientes.c.id)
+        .where(siguientes.c.profundidad < MAX_LINEAGE_DEPTH)
+    )
+
+    # Posición en la cadena: negativa para las anteriores, positiva para las siguientes
+    cadena = union_all(
+        select(anteriores.c.id, (-anteriores.c.profundidad).label("orden")),
+        select(siguientes.c.id, siguientes.c.profundidad.label("orden")).where(siguientes.c.profundidad > 0),
+    ).subquery("cadena")
+
+    return select(version).join(cadena, version.id == cadena.c.id).order_by(cadena.c.orden)
+
+def get_lineage(db: Session, version_id: int, *options) -> List[models.VersionDocumento]:
+    """Linaje de la versión en una sola consulta (ver lineage_statement)."""
+    return list(db.execute(lineage_statement(version_id).options(*options)).scalars().all())
+
+def current_version_statement(documento_id: int) -> Select:
+    """
+    Versión actual de un documento sin puntero (documentos anteriores a
+    version_actual_id): la marcada es_actual o, si no hay, la de número más alto.
+    """
+    version = models.VersionDocumento
+    return select(version).where(version.documento_id == documento_id).order_by(
+        version.es_actual.desc(), version.numero_version.desc()
+    ).limit(1)
+
+def get_current_version(db: Session, documento: models.Documento) -> Optional[models.VersionDocumento]:
+    """Versión actual del documento por su puntero, con una sola consulta si falta."""
+    if documento.version_actual_id is not None:
+        return db.get(models.VersionDocumento, documento.version_actual_id)
+    return db.execute(current_version_statement(documento.id)).scalars().first()
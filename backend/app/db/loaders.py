@@ -0,0 +1,69 @@
+"""
+Estrategias de carga ansiosa por esquema de respuesta.
+
+Cada función devuelve las opciones de carga que cubren exactamente las relaciones
+que serializa el esquema Pydantic correspondiente, para que las rutas de listado
+emitan un número constante de consultas (sin N+1) y funcionen con AsyncSession,
+donde la carga perezosa no está permitida.
+
+- joinedload para relaciones muchos-a-uno distintas en cada fila (usuario, rol).
+- selectinload para relaciones que se repiten en todas las filas de un listado
+  (el documento del historial o de las versiones), que se cargan una sola vez.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+from . import models
+
+def documento_options(loader=None):
+    """Relaciones de schemas.Documento: categoria, tipo_documento y usuario."""
+    if loader is None:
+        return (
+            joinedload(models.Documento.categoria),
+            joinedload(models.Documento.tipo_documento),
+            joinedload(models.Documento.usuario),
+        )
+    return (loader.options(*documento_options()),)
+
+def version_simple_options():
+    """Relaciones de schemas.VersionDocumentoSimple: usuario."""
+    return (joinedload(models.VersionDocumento.usuario),)
+
+def version_options():
+    """Relaciones de schemas.VersionDocumento: usuario, documento completo y versiones vecinas."""
+    return version_simple_options() + documento_options(selectinload(models.VersionDocumento.documento)) + (
+        selectinload(models.VersionDocumento.version_anterior).joinedload(models.VersionDocumento.usuario),
+        selectinload(models.VersionDocumento.version_siguiente).joinedload(models.VersionDocumento.usuario),
+    )
+
+def historial_acceso_options():
+    """Relaciones de schemas.HistorialAcceso: usuario y documento completo."""
+    return (joinedload(models.HistorialAcceso.usuario),) + documento_options(
+        selectinload(models.HistorialAcceso.documento)
+    )
+
+def historial_rol_options():
+    """Relaciones de schemas.HistorialRol: usuario, roles anterior y nuevo y quien modificó."""
+    return (
+        joinedload(models.HistorialRol.usuario),
+        joinedload(models.HistorialRol.rol_anterior),
+        joinedload(models.HistorialRol.rol_nuevo),
+        joinedload(models.HistorialRol.modificado_por),
+    )
+
+def historial_permiso_options():
+    """Relaciones de schemas.HistorialPermiso: rol, permiso con su categoría y quien modificó."""
+    return (
+        selectinload(models.HistorialPermiso.rol),
+        joinedload(models.HistorialPermiso.permiso).joinedload(models.Permiso.categoria),
+        joinedload(models.HistorialPermiso.modificado_por),
+    )
+
+def registro_acceso_options():
+    """Relaciones de schemas.RegistroAcceso: usuario."""
+    return (joinedload(models.RegistroAcceso.usuario),)
+
+def error_almacenamiento_options():
+    """Relaciones de schemas.ErrorAlmacenamiento: usuario y documento completo."""
+    return (joinedload(models.ErrorAlmacenamiento.usuario),) + documento_options(
+        selectinload(models.ErrorAlmacenamiento.documento)
+    )
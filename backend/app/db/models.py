@@ -1,9 +1,16 @@
 from datetime import datetime
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, Table, Float
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, CheckConstraint, Column, ForeignKey, Integer, String, Text, DateTime, Table, Float, Index, Sequence, DDL, event, text
+from sqlalchemy.orm import backref, relationship
 
 from .database import Base
 
+# Los índices trigram de la búsqueda de documentos requieren la extensión pg_trgm
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
 # Tabla de relación entre roles y permisos
 rol_permiso = Table(
     'rol_permiso',
@@ -79,6 +86,13 @@ class Categoria(Base):
     # Relaciones
     documentos = relationship("Documento", back_populates="categoria")
 
+# Niveles de acceso de los tipos de documento. Sin docs:view, search:restricted
+# permite ver los públicos y restringidos; sin ninguno, solo los públicos (y
+# siempre los documentos propios).
+NIVEL_PUBLICO = "publico"
+NIVEL_RESTRINGIDO = "restringido"
+NIVEL_CLASIFICADO = "clasificado"
+
 class TipoDocumento(Base):
     __tablename__ = "tipos_documento"
 
@@ -86,10 +100,18 @@ class TipoDocumento(Base):
     nombre = Column(String, nullable=False)
     descripcion = Column(Text, nullable=True)
     extensiones_permitidas = Column(String, nullable=False)
+    nivel_acceso = Column(String(20), nullable=False, default=NIVEL_RESTRINGIDO, server_default=NIVEL_RESTRINGIDO)
 
     # Relaciones
     documentos = relationship("Documento", back_populates="tipo_documento")
 
+    __table_args__ = (
+        CheckConstraint(
+            f"nivel_acceso IN ('{NIVEL_PUBLICO}', '{NIVEL_RESTRINGIDO}', '{NIVEL_CLASIFICADO}')",
+            name="ck_tipos_documento_nivel_acceso"
+        ),
+    )
+
 class Documento(Base):
     __tablename__ = "documentos"
 
@@ -109,14 +131,41 @@ class Documento(Base):
     fecha_ultima_verificacion = Column(DateTime, nullable=True)  # Fecha de última verificación de integridad
     estado_integridad = Column(Boolean, nullable=True)  # True si la última verificación fue exitosa
     activo = Column(Boolean, default=True)
+    # Puntero a la versión actual (ver app/db/lineage.py); use_alter rompe el ciclo
+    # de claves foráneas con versiones_documento al crear las tablas
+    version_actual_id = Column(
+        Integer,
+        ForeignKey("versiones_documento.id", use_alter=True, name="fk_documentos_version_actual_id"),
+        nullable=True
+    )
 
     # Relaciones
     categoria = relationship("Categoria", back_populates="documentos")
     tipo_documento = relationship("TipoDocumento", back_populates="documentos")
     usuario = relationship("Usuario", back_populates="documentos")
-    versiones = relationship("VersionDocumento", back_populates="documento")
+    versiones = relationship("VersionDocumento", back_populates="documento", foreign_keys="VersionDocumento.documento_id")
+    version_actual = relationship("VersionDocumento", foreign_keys=[version_actual_id], post_update=True)
     historial = relationship("HistorialAcceso", back_populates="documento")
 
+    __table_args__ = (
+        # La búsqueda siempre filtra activo y ordena por fecha_modificacion por defecto;
+        # los índices parciales excluyen los documentos dados de baja
+        Index("ix_documentos_activos_fecha_modificacion", "fecha_modificacion", postgresql_where=text("activo")),
+        Index("ix_documentos_activos_fecha_creacion", "fecha_creacion", postgresql_where=text("activo")),
+        Index("ix_documentos_activos_categoria", "categoria_id", "fecha_modificacion", postgresql_where=text("activo")),
+        Index("ix_documentos_activos_tipo", "tipo_documento_id", "fecha_modificacion", postgresql_where=text("activo")),
+        Index("ix_documentos_activos_usuario", "usuario_id", "fecha_modificacion", postgresql_where=text("activo")),
+        # Verificación periódica de integridad: activo y fecha_ultima_verificacion < límite
+        Index("ix_documentos_activos_verificacion", "fecha_ultima_verificacion", postgresql_where=text("activo")),
+        # Búsqueda por término con ILIKE '%...%' (no puede usar índices B-tree)
+        Index("ix_documentos_titulo_trgm", "titulo", postgresql_using="gin",
+              postgresql_ops={"titulo": "gin_trgm_ops"}, postgresql_where=text("activo")),
+        Index("ix_documentos_numero_expediente_trgm", "numero_expediente", postgresql_using="gin",
+              postgresql_ops={"numero_expediente": "gin_trgm_ops"}, postgresql_where=text("activo")),
+        Index("ix_documentos_descripcion_trgm", "descripcion", postgresql_using="gin",
+              postgresql_ops={"descripcion": "gin_trgm_ops"}, postgresql_where=text("activo")),
+    )
+
 class VersionDocumento(Base):
     __tablename__ = "versiones_documento"
 
@@ -136,20 +185,44 @@ class VersionDocumento(Base):
     titulo_archivo = Column(String, nullable=True)  # Título/nombre del archivo de esta versión específica
 
     # Relaciones
-    documento = relationship("Documento", back_populates="versiones")
+    documento = relationship("Documento", back_populates="versiones", foreign_keys=[documento_id])
     usuario = relationship("Usuario", back_populates="versiones")
-    version_anterior = relationship("VersionDocumento", remote_side=[id], backref="version_siguiente", uselist=False)
+    # version_siguiente es escalar como en schemas.VersionDocumento (cada versión tiene a lo sumo una siguiente)
+    version_anterior = relationship("VersionDocumento", remote_side=[id],
+                                    backref=backref("version_siguiente", uselist=False), uselist=False)
+
+    __table_args__ = (
+        # Listado de versiones y cálculo del siguiente número: documento_id ordenado por numero_version.
+        # Único: dos cargas concurrentes no pueden generar el mismo número de versión
+        Index("ix_versiones_documento_documento_numero", "documento_id", "numero_version", unique=True),
+        # Versión actual de un documento: documento_id y es_actual (a lo sumo una por documento)
+        Index("ix_versiones_documento_actual", "documento_id", unique=True,
+              postgresql_where=text("es_actual"), sqlite_where=text("es_actual")),
+        # Paso recursivo del linaje hacia las versiones siguientes (version_anterior_id = id)
+        Index("ix_versiones_documento_version_anterior", "version_anterior_id"),
+    )
 
 class HistorialAcceso(Base):
     __tablename__ = "historial_acceso"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # Particionada por mes según fecha (ver app/utils/partitions.py); la clave
+    # primaria debe incluir la columna de partición, por lo que el id se toma
+    # explícitamente de su secuencia
+    id = Column(Integer, Sequence("historial_acceso_id_seq"), primary_key=True, index=True)
     usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
     documento_id = Column(Integer, ForeignKey("documentos.id"), nullable=False)
     accion = Column(String, nullable=False)
-    fecha = Column(DateTime, default=datetime.utcnow)
+    fecha = Column(DateTime, primary_key=True, default=datetime.utcnow)
     detalles = Column(Text, nullable=True)
 
+    __table_args__ = (
+        Index("ix_historial_acceso_fecha", "fecha"),
+        Index("ix_historial_acceso_usuario_fecha", "usuario_id", "fecha"),
+        # Historial de un documento ordenado por fecha
+        Index("ix_historial_acceso_documento_fecha", "documento_id", "fecha"),
+        {"postgresql_partition_by": "RANGE (fecha)"},
+    )
+
     # Relaciones
     usuario = relationship("Usuario", back_populates="historial")
     documento = relationship("Documento", back_populates="historial")
@@ -188,13 +261,14 @@ class HistorialPermiso(Base):
 class RegistroAcceso(Base):
     __tablename__ = "registro_acceso"
     
-    id = Column(Integer, primary_key=True, index=True)
+    # Particionada por mes según fecha (ver app/utils/partitions.py)
+    id = Column(Integer, Sequence("registro_acceso_id_seq"), primary_key=True, index=True)
     usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=True)  # Puede ser nulo en intentos fallidos
     ip_address = Column(String, nullable=False)
     user_agent = Column(String, nullable=True)
     endpoint = Column(String, nullable=False)
     metodo = Column(String, nullable=False)  # GET, POST, PUT, DELETE, etc.
-    fecha = Column(DateTime, default=datetime.utcnow)
+    fecha = Column(DateTime, primary_key=True, default=datetime.utcnow)
     exitoso = Column(Boolean, default=True)
     codigo_respuesta = Column(Integer, nullable=False)  # 200, 401, 403, etc.
     mensaje_error = Column(String, nullable=True)  # Detalle del error si falla
@@ -203,27 +277,85 @@ class RegistroAcceso(Base):
     # Relaciones
     usuario = relationship("Usuario", foreign_keys=[usuario_id], back_populates="registros_acceso")
 
+    __table_args__ = (
+        Index("ix_registro_acceso_fecha", "fecha"),
+        Index("ix_registro_acceso_usuario_fecha", "usuario_id", "fecha"),
+        Index("ix_registro_acceso_ip_fecha", "ip_address", "fecha"),
+        {"postgresql_partition_by": "RANGE (fecha)"},
+    )
+
 class IntentosLogin(Base):
     __tablename__ = "intentos_login"
     
-    id = Column(Integer, primary_key=True, index=True)
+    # Particionada por mes según fecha (ver app/utils/partitions.py)
+    id = Column(Integer, Sequence("intentos_login_id_seq"), primary_key=True, index=True)
     email = Column(String, nullable=False, index=True)
     ip_address = Column(String, nullable=False)
     user_agent = Column(String, nullable=True)
-    fecha = Column(DateTime, default=datetime.utcnow)
+    fecha = Column(DateTime, primary_key=True, default=datetime.utcnow)
     exitoso = Column(Boolean, default=False)
     motivo_fallo = Column(String, nullable=True)  # "credenciales_invalidas", "usuario_inactivo", etc.
+
+    __table_args__ = (
+        # Índice para las consultas por IP y rango de fechas (auditoría y conteo de fallos)
+        Index("ix_intentos_login_ip_exitoso_fecha", "ip_address", "exitoso", "fecha"),
+        Index("ix_intentos_login_fecha", "fecha"),
+        {"postgresql_partition_by": "RANGE (fecha)"},
+    )
+
+class ContadorIntentosLogin(Base):
+    """
+    Contador compartido de intentos fallidos por IP, agrupado en sub-ventanas de tiempo.
+    Permite que varios workers consulten la ventana deslizante leyendo pocas filas
+    a través de la clave primaria compuesta, sin recorrer intentos_login.
+    """
+    __tablename__ = "contador_intentos_login"
+
+    ip_address = Column(String, primary_key=True)
+    ventana_inicio = Column(DateTime, primary_key=True)  # Inicio de la sub-ventana
+    fallidos = Column(Integer, nullable=False, default=0)
     
+class LimiteTasa(Base):
+    """
+    Estado compartido del limitador de tasa (GCRA): una fila por clave
+    (usuario o IP) con el tiempo teórico de llegada de la próxima solicitud.
+    """
+    __tablename__ = "limites_tasa"
+
+    clave = Column(String, primary_key=True)
+    tat = Column(Float, nullable=False)  # Epoch en segundos
+
 class BloqueoIP(Base):
     __tablename__ = "bloqueo_ip"
     
     id = Column(Integer, primary_key=True, index=True)
-    ip_address = Column(String, nullable=False, index=True, unique=True)
+    ip_address = Column(String, nullable=False, index=True)
     motivo = Column(String, nullable=False)  # "intentos_fallidos", "actividad_sospechosa", etc.
     fecha_inicio = Column(DateTime, default=datetime.utcnow)
     fecha_fin = Column(DateTime, nullable=False)  # Cuando expira el bloqueo
     activo = Column(Boolean, default=True)
 
+    __table_args__ = (
+        # Consulta de IPBlockMiddleware en cada solicitud: ip_address, activo y fecha_fin.
+        # ip_address ya no es único para poder volver a bloquear una IP desbloqueada
+        Index("ix_bloqueo_ip_activo", "ip_address", "fecha_fin", postgresql_where=text("activo")),
+    )
+
+class EventoPendiente(Base):
+    """
+    Bandeja de salida transaccional (ver app/utils/outbox.py): los efectos
+    posteriores a una escritura se registran en la misma transacción y se
+    despachan después del commit, o en el reintento periódico si el worker cae.
+    """
+    __tablename__ = "eventos_pendientes"
+
+    id = Column(Integer, primary_key=True)
+    tipo = Column(String, nullable=False)  # "version_creada", etc.
+    documento_id = Column(Integer, ForeignKey("documentos.id"), nullable=True)
+    datos = Column(Text, nullable=False)  # JSON con los datos del evento
+    fecha_creacion = Column(DateTime, default=datetime.utcnow)
+    intentos = Column(Integer, nullable=False, default=0)  # Despachos fallidos
+
 class ErrorAlmacenamiento(Base):
     __tablename__ = "errores_almacenamiento"
     
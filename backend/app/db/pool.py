@@ -0,0 +1,111 @@
+"""
+Instrumentación de los pools de conexiones de SQLAlchemy.
+
+Cada motor usa una subclase de su pool que mide cuánto se espera por una
+conexión, cuántas solicitudes esperan en este momento y cuántas agotaron el
+tiempo de espera. Las métricas se consultan en /api/health/db y, agregadas
+entre workers, en /api/metrics.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import exc
+
+from ..utils.metrics import DB_POOL_TIMEOUTS, DB_POOL_WAIT
+
+class PoolStats:
+    """Contadores de espera de un pool, compartidos por todos los hilos del worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.name: Optional[str] = None  # Nombre del motor, asignado por register_engine
+        self.waiting = 0
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+    def record(self, wait: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        if self.name:
+            DB_POOL_WAIT.labels(self.name).observe(wait)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+        if self.name:
+            DB_POOL_TIMEOUTS.labels(self.name).inc()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+def instrumented_pool_class(base):
+    """
+    Crea una subclase instrumentada de la clase de pool `base`
+    (QueuePool o AsyncAdaptedQueuePool) con sus propios contadores.
+    Los contadores son atributo de clase para sobrevivir a Pool.recreate().
+    """
+
+    class InstrumentedPool(base):
+        stats = PoolStats()
+
+        def _do_get(self):
+            stats = self.stats
+            # Se considera en espera la solicitud que encuentra el pool agotado
+            exhausted = 0 <= self._max_overflow and self.checkedout() >= self.size() + self._max_overflow
+            if exhausted:
+                with stats._lock:
+                    stats.waiting += 1
+            start = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except exc.TimeoutError:
+                stats.record_timeout()
+                raise
+            finally:
+                if exhausted:
+                    with stats._lock:
+                        stats.waiting -= 1
+            stats.record(time.perf_counter() - start)
+            return conn
+
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+# Motores registrados para exponer sus métricas: {nombre: motor}
+_engines: Dict[str, Any] = {}
+
+def register_engine(name: str, engine) -> None:
+    """Registra un motor (síncrono o asíncrono) para incluirlo en las métricas."""
+    _engines[name] = engine
+    stats = getattr(engine.pool, "stats", None)
+    if stats is not None:
+        stats.name = name
+
+def get_pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """Devuelve el estado de cada pool registrado: ocupación y esperas."""
+    metrics = {}
+    for name, engine in _engines.items():
+        pool = engine.pool
+        data = {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+        }
+        stats = getattr(pool, "stats", None)
+        if stats is not None:
+            data.update(stats.snapshot())
+        metrics[name] = data
+    return metrics
@@ -0,0 +1,144 @@
+"""
+Instrumentación de consultas SQL.
+
+Los eventos de cursor de cada motor registran, para la solicitud en curso, la
+cantidad de consultas, el tiempo total en la base de datos y las sentencias más
+lentas, y acumulan por worker estadísticas por huella (SQL normalizado, sin
+literales). Las consultas que superan SLOW_QUERY_MS se registran en el log
+"app.db.slow_queries" con muestreo.
+"""
+import heapq
+import logging
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..utils.config import settings
+
+slow_query_logger = logging.getLogger("app.db.slow_queries")
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM_RE = re.compile(r"%\(\w+\)s|\$\d+|:\w+|\?|%s")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+def fingerprint(statement: str) -> str:
+    """
+    Normaliza una sentencia SQL para agrupar las ejecuciones de la misma consulta:
+    reemplaza literales y parámetros por "?", colapsa listas IN y espacios.
+    """
+    sql = _STRING_RE.sub("?", statement)
+    sql = _PARAM_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("(?...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+class RequestQueryStats:
+    """Consultas de una solicitud: cantidad, tiempo total y las más lentas."""
+
+    def __init__(self, keep_slowest: int = 5):
+        self.count = 0
+        self.total_time = 0.0
+        self.keep_slowest = keep_slowest
+        self._slowest: List[Tuple[float, str]] = []  # min-heap (duración, huella)
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.total_time += duration
+        item = (duration, statement)
+        if len(self._slowest) < self.keep_slowest:
+            heapq.heappush(self._slowest, item)
+        elif duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    @property
+    def slowest(self) -> List[Dict[str, Any]]:
+        """Sentencias más lentas de la solicitud, de mayor a menor duración."""
+        return [
+            {"fingerprint": fingerprint(statement), "ms": round(duration * 1000, 3)}
+            for duration, statement in sorted(self._slowest, reverse=True)
+        ]
+
+class QueryStatsRegistry:
+    """Estadísticas acumuladas por huella en el worker, con una cantidad máxima de huellas."""
+
+    def __init__(self, max_fingerprints: int = 500):
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._stats: Dict[str, List[float]] = {}  # {huella: [ejecuciones, tiempo total, tiempo máximo]}
+        self.dropped = 0
+
+    def record(self, key: str, duration: float) -> None:
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    self.dropped += 1
+                    return
+                entry = self._stats[key] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += duration
+            entry[2] = max(entry[2], duration)
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """Huellas ordenadas por tiempo total, tiempo medio, máximo o ejecuciones."""
+        with self._lock:
+            rows = [
+                {
+                    "fingerprint": key,
+                    "calls": int(calls),
+                    "total_ms": round(total * 1000, 3),
+                    "mean_ms": round(total / calls * 1000, 3),
+                    "max_ms": round(maximum * 1000, 3),
+                }
+                for key, (calls, total, maximum) in self._stats.items()
+            ]
+        rows.sort(key=lambda row: row[order_by], reverse=True)
+        return rows[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self.dropped = 0
+
+# Estadísticas de la solicitud en curso (las fija QueryStatsMiddleware)
+current_request_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("current_request_stats", default=None)
+
+# Estadísticas globales del worker
+query_stats_registry = QueryStatsRegistry(max_fingerprints=settings.QUERY_STATS_MAX_FINGERPRINTS)
+
+def record_query(statement: str, duration: float) -> None:
+    """Registra una sentencia ejecutada en la solicitud actual, el registro global y el log de lentas."""
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+
+    key = fingerprint(statement)
+    query_stats_registry.record(key, duration)
+
+    if duration * 1000 >= settings.SLOW_QUERY_MS and random.random() < settings.SLOW_QUERY_SAMPLE_RATE:
+        slow_query_logger.warning(f"Consulta lenta ({duration * 1000:.1f} ms): {key}")
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    record_query(statement, time.perf_counter() - start_times.pop())
+
+def instrument_engine(engine) -> None:
+    """Agrega los eventos de medición de consultas a un motor síncrono o asíncrono."""
+    if not settings.QUERY_STATS_ENABLED:
+        return
+    target = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
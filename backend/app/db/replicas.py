@@ -0,0 +1,135 @@
+"""
+Enrutamiento de consultas de solo lectura a réplicas.
+
+Las dependencias de lectura (get_read_db) reparten las sesiones entre las réplicas
+configuradas en DB_REPLICA_URLS. Tras una escritura, las lecturas del mismo usuario
+se envían al primario durante DB_REPLICA_STICKY_SECONDS ("read-your-writes"), para
+no devolver datos anteriores a su propio cambio mientras la réplica se pone al día.
+"""
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .database import AsyncSessionLocal, async_connect_args, pool_kwargs
+from .pool import instrumented_pool_class, register_engine
+from .query_stats import instrument_engine
+from ..utils.config import settings
+
+# Cookie con el instante (epoch) hasta el que las lecturas deben ir al primario.
+# Permite mantener la consistencia aunque la siguiente solicitud llegue a otro worker
+STICKY_COOKIE = "hcdsys_primary_until"
+
+def to_async_url(url: str) -> str:
+    """Convierte una URL postgresql:// al driver asyncpg"""
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    return url
+
+class ReplicaRouter:
+    """
+    Elige la sesión para una lectura: una réplica por turnos (round-robin) o el
+    primario si no hay réplicas o el usuario escribió hace poco.
+    """
+
+    def __init__(self, urls: List[str], sticky_seconds: float):
+        self.sticky_seconds = sticky_seconds
+        self.engines = []
+        self.sessionmakers = []
+        for i, url in enumerate(urls):
+            engine = create_async_engine(
+                to_async_url(url),
+                poolclass=instrumented_pool_class(AsyncAdaptedQueuePool),
+                connect_args=async_connect_args(),
+                **pool_kwargs
+            )
+            register_engine(f"replica_{i}_async", engine)
+            instrument_engine(engine)
+            self.engines.append(engine)
+            self.sessionmakers.append(async_sessionmaker(
+                bind=engine,
+                class_=AsyncSession,
+                autoflush=False,
+                expire_on_commit=False
+            ))
+        self._turn = itertools.cycle(range(len(self.engines))) if self.engines else None
+        self._last_write: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    def mark_write(self, key: str, now: Optional[float] = None) -> float:
+        """Registra una escritura de la clave y devuelve hasta cuándo leer del primario."""
+        now = time.time() if now is None else now
+        until = now + self.sticky_seconds
+        with self._lock:
+            self._last_write[key] = until
+            if len(self._last_write) > 10_000:
+                self._last_write = {k: v for k, v in self._last_write.items() if v > now}
+        return until
+
+    def is_sticky(self, key: Optional[str], cookie_until: Optional[float] = None, now: Optional[float] = None) -> bool:
+        """Indica si las lecturas de la clave deben ir todavía al primario."""
+        now = time.time() if now is None else now
+        if cookie_until is not None and cookie_until > now:
+            return True
+        if key is None:
+            return False
+        with self._lock:
+            return self._last_write.get(key, 0) > now
+
+    def choose(self, key: Optional[str], cookie_until: Optional[float] = None, now: Optional[float] = None) -> Optional[int]:
+        """Devuelve el índice de la réplica a usar, o None para el primario."""
+        if not self.enabled or self.is_sticky(key, cookie_until, now):
+            return None
+        with self._lock:
+            return next(self._turn)
+
+    def session(self, index: int) -> AsyncSession:
+        return self.sessionmakers[index]()
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+def get_sticky_key(request: Request) -> Optional[str]:
+    """Clave de consistencia de la solicitud: el usuario autenticado, si lo hay."""
+    user = getattr(request.state, "user", None)
+    return f"user:{user.id}" if user is not None else None
+
+def get_cookie_until(request: Request) -> Optional[float]:
+    try:
+        return float(request.cookies[STICKY_COOKIE])
+    except (KeyError, ValueError):
+        return None
+
+replica_router = ReplicaRouter(
+    [url.strip() for url in settings.DB_REPLICA_URLS.split(",") if url.strip()],
+    sticky_seconds=settings.DB_REPLICA_STICKY_SECONDS
+)
+
+# Dependencia para obtener una sesión de solo lectura
+async def get_read_db(request: Request):
+    """
+    Dependencia para obtener una sesión de solo lectura, en una réplica si está disponible.
+    Las escrituras (incluido el historial de accesos) deben usar get_async_db.
+    """
+    index = replica_router.choose(get_sticky_key(request), get_cookie_until(request))
+    if index is not None:
+        async with replica_router.session(index) as db:
+            yield db
+        return
+    
+    # Primario: reutilizar la sesión de la solicitud si ya existe
+    db = getattr(request.state, "db", None)
+    if db is not None:
+        yield db
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
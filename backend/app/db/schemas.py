@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel, EmailStr, Field, validator
 import re
 
@@ -193,6 +193,7 @@ class TipoDocumentoBase(BaseModel):
     nombre: str
     descripcion: Optional[str] = None
     extensiones_permitidas: str
+    nivel_acceso: Literal["publico", "restringido", "clasificado"] = "restringido"
 
 class TipoDocumentoCreate(TipoDocumentoBase):
     pass
@@ -201,6 +202,7 @@ class TipoDocumentoUpdate(BaseModel):
     nombre: Optional[str] = None
     descripcion: Optional[str] = None
     extensiones_permitidas: Optional[str] = None
+    nivel_acceso: Optional[Literal["publico", "restringido", "clasificado"]] = None
 
 class TipoDocumentoInDB(TipoDocumentoBase):
     id: int
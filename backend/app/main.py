@@ -1,14 +1,21 @@
+import os
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
-from .db.database import engine, Base, get_db
+from .db.database import engine, async_engine, Base, get_db
+from .db.pool import get_pool_metrics
 from .routes import auth, documents, users, roles, permissions, websockets, security, document_history
 from .utils.config import settings
+from .utils.event_bus import event_bus
 from .db.init_roles import init_roles_and_permissions
-from .utils.middleware import AuthenticationMiddleware, AuthorizationMiddleware, IPBlockMiddleware
+from .db.replicas import replica_router
+from .utils.middleware import AuthenticationMiddleware, AuthorizationMiddleware, IPBlockMiddleware, QueryStatsMiddleware, ReadYourWritesMiddleware, RequestSessionMiddleware
+from .utils.metrics import MetricsMiddleware, render_metrics, track_task, update_pool_gauges
+from .utils.profiler import ProfilingMiddleware
+from .utils.rate_limiter import configure_rate_limiter, PostgresRateLimitStore
 
 # Crear tablas en la base de datos
 Base.metadata.create_all(bind=engine)
@@ -44,10 +51,26 @@ cors_logger.info(f"Middleware CORS configurado con éxito. Orígenes permitidos:
 
 # Añadir middlewares de seguridad
 # El orden es importante: primero IPBlock, luego Authentication, finalmente Authorization
+# El limitador de tasa se registra primero para ejecutarse después de la autenticación
+# y poder limitar por usuario
+# El perfilador es el más interno: mide el endpoint y necesita al usuario autenticado
+if settings.PROFILER_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+configure_rate_limiter(app)
+if replica_router.enabled:
+    app.add_middleware(ReadYourWritesMiddleware)
 app.add_middleware(IPBlockMiddleware)
 app.add_middleware(AuthenticationMiddleware)
 # Middleware de autorización temporalmente desactivado para depuración
 # app.add_middleware(AuthorizationMiddleware)
+# Cierra la sesión compartida por los middlewares y endpoints de cada solicitud
+app.add_middleware(RequestSessionMiddleware)
+# Mide las consultas SQL de toda la solicitud, incluidas las de los middlewares
+if settings.QUERY_STATS_ENABLED:
+    app.add_middleware(QueryStatsMiddleware)
+# Latencia y solicitudes en curso; al ser el más externo mide la solicitud completa
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 # Incluir rutas
 app.include_router(auth.router, prefix="/api", tags=["auth"])
@@ -64,6 +87,19 @@ def health_check():
     """Endpoint para verificar el estado de la API"""
     return {"status": "ok", "version": app.version}
 
+@app.get("/api/health/db")
+def db_pool_health():
+    """Estado de los pools de conexiones del worker: ocupación, esperas y timeouts"""
+    return {"pid": os.getpid(), "pools": get_pool_metrics()}
+
+@app.get("/api/metrics", include_in_schema=False)
+def metrics():
+    """Métricas en formato Prometheus, agregadas entre todos los workers"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Métricas desactivadas")
+    update_pool_gauges(get_pool_metrics())
+    return render_metrics()
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     return JSONResponse(
@@ -74,18 +110,31 @@ async def http_exception_handler(request, exc):
 # Evento de inicio para inicializar roles y permisos
 @app.on_event("startup")
 async def startup_event():
+    import asyncio
+    from .utils.partitions import run_partition_maintenance
+    
     db = next(get_db())
     try:
         # Inicializar roles y permisos
         init_roles_and_permissions(db)
     finally:
         db.close()
+    
+    # Asegurar las particiones de las tablas de auditoría antes de recibir solicitudes
+    try:
+        await asyncio.to_thread(run_partition_maintenance)
+    except Exception as e:
+        print(f"Error en el mantenimiento de particiones: {str(e)}")
+    
+    # Escuchar los eventos publicados por los demás workers
+    await event_bus.start()
 
 # Configurar tareas periódicas
 @app.on_event("startup")
 async def setup_periodic_tasks():
     import asyncio
-    from .utils.tasks import verify_document_integrity, cleanup_old_backups
+    from .utils.tasks import verify_document_integrity, cleanup_old_backups, cleanup_staged_files
+    from .utils.partitions import run_partition_maintenance
     
     async def run_periodic_tasks():
         while True:
@@ -93,18 +142,104 @@ async def setup_periodic_tasks():
             try:
                 db = next(get_db())
                 try:
-                    await verify_document_integrity(db)
-                    await cleanup_old_backups(db, 30)  # Mantener respaldos por 30 días
+                    with track_task("verify_document_integrity"):
+                        await verify_document_integrity(db)
+                    with track_task("cleanup_old_backups"):
+                        await cleanup_old_backups(db, 30)  # Mantener respaldos por 30 días
+                    with track_task("cleanup_staged_files"):
+                        await cleanup_staged_files()
                 finally:
                     db.close()
+                
+                # Crear particiones futuras y aplicar la retención de auditoría
+                with track_task("partition_maintenance"):
+                    await asyncio.to_thread(run_partition_maintenance)
+                
+                # Depurar claves vencidas del limitador de tasa compartido
+                if settings.RATE_LIMIT_ENABLED and settings.RATE_LIMIT_BACKEND == "postgres":
+                    with track_task("rate_limit_purge"):
+                        await asyncio.to_thread(PostgresRateLimitStore().purge)
             except Exception as e:
                 print(f"Error en tareas periódicas: {str(e)}")
             
             # Esperar 24 horas
             await asyncio.sleep(24 * 60 * 60)
     
+    async def flush_login_attempts():
+        from .utils.login_attempts import login_attempt_buffer, login_tracker
+        
+        while True:
+            await login_attempt_buffer.wait(settings.LOGIN_ATTEMPTS_FLUSH_INTERVAL)
+            try:
+                # Persistir en lote los intentos de login acumulados (cada intervalo o al llenarse el buffer)
+                with track_task("login_attempts_flush"):
+                    await asyncio.to_thread(login_attempt_buffer.flush)
+                
+                # Depurar sub-ventanas vencidas del contador compartido
+                if login_tracker.backend == "db":
+                    db = next(get_db())
+                    try:
+                        await asyncio.to_thread(login_tracker.purge_expired, db)
+                    finally:
+                        db.close()
+            except Exception as e:
+                print(f"Error al persistir intentos de login: {str(e)}")
+    
+    async def relay_outbox():
+        from .utils.outbox import dispatch_events
+        
+        while True:
+            await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL)
+            try:
+                # Reintentar los eventos que no se despacharon tras su commit
+                db = next(get_db())
+                try:
+                    with track_task("outbox_relay"):
+                        await asyncio.to_thread(dispatch_events, db)
+                finally:
+                    db.close()
+            except Exception as e:
+                print(f"Error al despachar eventos pendientes: {str(e)}")
+    
+    async def update_metrics():
+        # Cada worker publica la ocupación de sus pools; /api/metrics suma los workers activos
+        while True:
+            try:
+                update_pool_gauges(get_pool_metrics())
+            except Exception as e:
+                print(f"Error al actualizar métricas: {str(e)}")
+            await asyncio.sleep(settings.METRICS_UPDATE_INTERVAL)
+    
     # Iniciar tareas en segundo plano
     asyncio.create_task(run_periodic_tasks())
+    asyncio.create_task(flush_login_attempts())
+    asyncio.create_task(relay_outbox())
+    if settings.METRICS_ENABLED:
+        asyncio.create_task(update_metrics())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from .utils.login_attempts import login_attempt_buffer
+    
+    from .utils.security import password_executor
+    from .utils.diff import diff_executor
+    from .utils.text_extraction import extraction_executor
+    
+    # Cerrar los WebSockets del worker y dejar de escuchar el bus de eventos
+    await websockets.manager.close_all()
+    await event_bus.stop()
+    
+    # Persistir los intentos de login pendientes antes de terminar el worker
+    login_attempt_buffer.flush()
+    
+    # Detener los pools de hash de contraseñas, de diffs y de extracción de texto
+    password_executor.shutdown(wait=False)
+    diff_executor.shutdown(wait=False)
+    extraction_executor.shutdown(wait=False)
+    
+    # Cerrar las conexiones de los motores asíncronos
+    await async_engine.dispose()
+    await replica_router.dispose()
 
 if __name__ == "__main__":
     import uvicorn
@@ -5,9 +5,10 @@ from sqlalchemy.orm import Session
 
 from ..db import models, schemas
 from ..db.database import get_db
-from ..utils.security import authenticate_user, create_access_token, get_password_hash
+from ..utils.security import authenticate_user_async, create_access_token, get_password_hash_async
 from ..utils.config import settings
 from ..utils.middleware import check_and_block_ip
+from ..utils.login_attempts import record_login_attempt
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -35,21 +36,14 @@ async def login_for_access_token(
         )
     
     # Intentar autenticar
-    user = authenticate_user(db, form_data.username, form_data.password)
-    
-    # Registrar intento de login
-    intento_login = models.IntentosLogin(
-        email=form_data.username,
-        ip_address=client_host,
-        user_agent=user_agent,
-        exitoso=(user is not False and user is not None)
-    )
+    user = await authenticate_user_async(db, form_data.username, form_data.password)
     
     if not user:
         # Autenticación fallida - credenciales incorrectas
-        intento_login.motivo_fallo = "credenciales_invalidas"
-        db.add(intento_login)
-        db.commit()
+        record_login_attempt(
+            form_data.username, client_host, user_agent, False, db,
+            motivo_fallo="credenciales_invalidas"
+        )
         
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -59,9 +53,10 @@ async def login_for_access_token(
     
     if user is None:
         # Autenticación fallida - usuario inactivo
-        intento_login.motivo_fallo = "usuario_inactivo"
-        db.add(intento_login)
-        db.commit()
+        record_login_attempt(
+            form_data.username, client_host, user_agent, False, db,
+            motivo_fallo="usuario_inactivo"
+        )
         
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -70,8 +65,7 @@ async def login_for_access_token(
         )
     
     # Autenticación exitosa
-    db.add(intento_login)
-    db.commit()
+    record_login_attempt(form_data.username, client_host, user_agent, True, db)
     
     # Crear token de acceso
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -112,7 +106,7 @@ async def register_user(
     role_id = 3  # Usuario de Consulta
     
     # Crear el nuevo usuario
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     db_user = models.Usuario(
         email=user_data.email,
         nombre=user_data.nombre,
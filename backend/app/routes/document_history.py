@@ -1,11 +1,13 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, select
 
-from ..db import models, schemas
-from ..db.database import get_db
-from ..utils.security import get_current_active_user, check_permission
+from ..db import loaders, models, schemas
+from ..db.database import get_db, get_async_db
+from ..db.replicas import get_read_db
+from ..utils.security import get_current_active_user, get_current_active_user_async, check_permission
 
 router = APIRouter(prefix="/documents", tags=["document_history"])
 
@@ -14,17 +16,16 @@ async def get_document_history(
     documento_id: int,
     page: int = Query(1, description="Número de página", ge=1),
     page_size: int = Query(20, description="Tamaño de página", ge=1, le=100),
-    current_user: models.Usuario = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: models.Usuario = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db),
+    read_db: AsyncSession = Depends(get_read_db)
 ):
     """
     Obtiene el historial de acceso y modificaciones de un documento.
     Requiere permiso para ver el documento o ser el creador del mismo.
     """
     # Verificar si el documento existe
-    documento = db.query(models.Documento).filter(
-        models.Documento.id == documento_id
-    ).first()
+    documento = await read_db.get(models.Documento, documento_id)
     
     if not documento:
         raise HTTPException(
@@ -46,12 +47,17 @@ async def get_document_history(
     # Calcular offset para paginación
     skip = (page - 1) * page_size
     
-    # Obtener historial paginado
-    historial = db.query(models.HistorialAcceso).filter(
-        models.HistorialAcceso.documento_id == documento_id
-    ).order_by(
-        desc(models.HistorialAcceso.fecha)
-    ).offset(skip).limit(page_size).all()
+    # Obtener historial paginado, cargando las relaciones que serializa la respuesta
+    result = await read_db.execute(
+        select(models.HistorialAcceso).where(
+            models.HistorialAcceso.documento_id == documento_id
+        ).options(
+            *loaders.historial_acceso_options()
+        ).order_by(
+            desc(models.HistorialAcceso.fecha)
+        ).offset(skip).limit(page_size)
+    )
+    historial = result.scalars().all()
     
     # Registrar esta consulta en el historial
     new_historial = models.HistorialAcceso(
@@ -61,7 +67,7 @@ async def get_document_history(
         detalles=f"Consulta de historial de documento"
     )
     db.add(new_historial)
-    db.commit()
+    await db.commit()
     
     return historial
 
@@ -89,7 +95,7 @@ async def get_storage_errors(
         )
     
     # Construir consulta base
-    query = db.query(models.ErrorAlmacenamiento)
+    query = db.query(models.ErrorAlmacenamiento).options(*loaders.error_almacenamiento_options())
     
     # Aplicar filtros si se proporcionan
     if documento_id is not None:
@@ -4,43 +4,54 @@ import hashlib
 import logging
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, BackgroundTasks
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, and_, func
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, BackgroundTasks, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, and_, func, select
 
 # Configurar logging
 logger = logging.getLogger("app.documents")
 
-from ..db import models, schemas
-from ..db.database import get_db
-from ..utils.security import get_current_active_user, check_permission
+from ..db import loaders, models, schemas
+from ..db.database import get_db, get_async_db
+from ..db.lineage import lineage_statement
+from ..db.replicas import get_read_db
+from ..utils.security import get_current_active_user, get_current_active_user_async, check_permission
 from ..utils.config import settings
+from ..utils.diff import diff_executor, ndjson_chunks
+from ..utils.document_events import DOCUMENT_CREATED, METADATA_EDITED, VERSION_ADDED, VERSION_RESTORED, publish_document_event
+from ..utils.executors import ExecutorSaturatedError
+from ..utils.metrics import record_transfer
+from ..utils import reference_data
+from ..utils.reference_data import reference_cache, serve_reference_set
 from ..utils.storage import StorageService
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
 @router.get("/categories", response_model=List[schemas.Categoria])
 async def get_document_categories(
+    request: Request,
     current_user: models.Usuario = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     Obtener todas las categorías de documentos disponibles.
+    Se sirven desde la caché de datos de referencia, con ETag (304 si no cambiaron).
     """
-    categorias = db.query(models.Categoria).all()
-    return categorias
+    return serve_reference_set(request, db, reference_data.CATEGORIES)
 
 @router.get("/types", response_model=List[schemas.TipoDocumento])
 async def get_document_types(
+    request: Request,
     current_user: models.Usuario = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     Obtener todos los tipos de documentos disponibles.
+    Se sirven desde la caché de datos de referencia, con ETag (304 si no cambiaron).
     """
-    tipos = db.query(models.TipoDocumento).all()
-    return tipos
+    return serve_reference_set(request, db, reference_data.DOCUMENT_TYPES)
 
 @router.get("/diagnostics/search", response_model=dict)
 async def search_diagnostics(
@@ -194,8 +205,9 @@ async def search_documents(
     sort_order: str = Query("desc", description="Orden de los resultados (asc, desc)"),
     page: int = Query(1, description="Número de página", ge=1),
     page_size: int = Query(10, description="Tamaño de página", ge=1, le=100),
-    current_user: models.Usuario = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: models.Usuario = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db),
+    read_db: AsyncSession = Depends(get_read_db)
 ):
     """
     Buscar documentos con filtros opcionales y paginación.
@@ -208,6 +220,9 @@ async def search_documents(
     - **usuario_id**: Filtra por usuario que cargó el documento
     - **sort_by/sort_order**: Controla el ordenamiento de los resultados
     - **page/page_size**: Controla la paginación de resultados
+    
+    Las consultas se hacen en una réplica de lectura si está configurada;
+    el registro en el historial se escribe en el primario.
     """
     # Validación de parámetros
     if not termino and not fecha_desde and not fecha_hasta and not categoria_id and not tipo_documento_id and not numero_expediente and not usuario_id:
@@ -218,65 +233,37 @@ async def search_documents(
         
     logger.info(f"Búsqueda de documentos - Usuario: {current_user.email} - Criterios: termino={termino}, fecha_desde={fecha_desde}, fecha_hasta={fecha_hasta}, categoria_id={categoria_id}, tipo_documento_id={tipo_documento_id}, numero_expediente={numero_expediente}, usuario_id={usuario_id}")
     
-    # Iniciar la consulta base - IMPORTANTE: Primero select_from y luego los filtros
-    query = db.query(models.Documento).select_from(models.Documento)
-    
+    # Filtros comunes a la consulta principal y a la de conteo
     # Aplicar filtro base de documentos activos
-    query = query.filter(models.Documento.activo == True)
+    filtros = [models.Documento.activo == True]
     
     # Aplicar filtros si se proporcionan
     if termino:
-        try:
-            logger.info(f"Aplicando filtro de búsqueda con término: '{termino}'")
-            # Escapar caracteres especiales en el término de búsqueda
-            # Usamos una función más robusta para escapar caracteres especiales
-            def escape_like(string):
-                if not string:
-                    return string
-                return string.replace('%', '\\%').replace('_', '\\_').replace('[', '\\[').replace(']', '\\]')
-            
-            termino_seguro = escape_like(termino)
-            logger.debug(f"Término de búsqueda escapado: '{termino_seguro}'")
-            
-            # Usamos la función de texto completo para una búsqueda más robusta
-            try:
-                query = query.filter(
-                    or_(
-                        models.Documento.titulo.ilike(f"%{termino_seguro}%"),
-                        models.Documento.numero_expediente.ilike(f"%{termino_seguro}%"),
-                        models.Documento.descripcion.ilike(f"%{termino_seguro}%")
-                    )
-                )
-            except Exception as e:
-                logger.error(f"Error en la consulta ILIKE: {str(e)}", exc_info=True)
-                # Intentar con una búsqueda más simple como fallback
-                query = query.filter(
-                    or_(
-                        models.Documento.titulo.contains(termino),
-                        models.Documento.numero_expediente.contains(termino),
-                        models.Documento.descripcion.contains(termino)
-                    )
-                )
-            logger.debug("Filtro de búsqueda aplicado correctamente")
-        except Exception as e:
-            logger.error(f"Error al aplicar filtro de término: {str(e)}", exc_info=True)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error al procesar el término de búsqueda: {str(e)}"
+        logger.info(f"Aplicando filtro de búsqueda con término: '{termino}'")
+        # Escapar caracteres especiales en el término de búsqueda
+        termino_seguro = termino.replace('%', '\\%').replace('_', '\\_').replace('[', '\\[').replace(']', '\\]')
+        logger.debug(f"Término de búsqueda escapado: '{termino_seguro}'")
+        
+        filtros.append(
+            or_(
+                models.Documento.titulo.ilike(f"%{termino_seguro}%"),
+                models.Documento.numero_expediente.ilike(f"%{termino_seguro}%"),
+                models.Documento.descripcion.ilike(f"%{termino_seguro}%")
             )
+        )
         
     # Filtro exacto por número de expediente
     if numero_expediente:
-        query = query.filter(models.Documento.numero_expediente == numero_expediente)
+        filtros.append(models.Documento.numero_expediente == numero_expediente)
         
     # Filtro por usuario que cargó el documento
     if usuario_id:
-        query = query.filter(models.Documento.usuario_id == usuario_id)
+        filtros.append(models.Documento.usuario_id == usuario_id)
     
     if fecha_desde:
         try:
             fecha_desde_dt = datetime.strptime(fecha_desde, "%Y-%m-%d")
-            query = query.filter(models.Documento.fecha_creacion >= fecha_desde_dt)
+            filtros.append(models.Documento.fecha_creacion >= fecha_desde_dt)
         except ValueError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -286,7 +273,7 @@ async def search_documents(
     if fecha_hasta:
         try:
             fecha_hasta_dt = datetime.strptime(fecha_hasta, "%Y-%m-%d")
-            query = query.filter(models.Documento.fecha_creacion <= fecha_hasta_dt)
+            filtros.append(models.Documento.fecha_creacion <= fecha_hasta_dt)
         except ValueError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -294,99 +281,54 @@ async def search_documents(
             )
     
     if categoria_id:
-        # Verificar que la categoría existe
-        categoria = db.query(models.Categoria).filter(models.Categoria.id == categoria_id).first()
-        if not categoria:
+        # Verificar que la categoría existe (en la caché de datos de referencia)
+        if not await db.run_sync(reference_cache.contains, reference_data.CATEGORIES, categoria_id):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Categoría con ID {categoria_id} no encontrada"
             )
-        query = query.filter(models.Documento.categoria_id == categoria_id)
+        filtros.append(models.Documento.categoria_id == categoria_id)
     
     if tipo_documento_id:
-        # Verificar que el tipo de documento existe
-        tipo_documento = db.query(models.TipoDocumento).filter(models.TipoDocumento.id == tipo_documento_id).first()
-        if not tipo_documento:
+        # Verificar que el tipo de documento existe (en la caché de datos de referencia)
+        if not await db.run_sync(reference_cache.contains, reference_data.DOCUMENT_TYPES, tipo_documento_id):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Tipo de documento con ID {tipo_documento_id} no encontrado"
             )
-        query = query.filter(models.Documento.tipo_documento_id == tipo_documento_id)
+        filtros.append(models.Documento.tipo_documento_id == tipo_documento_id)
     
     # Filtrar por permisos de acceso
     # 1. Verificar si el usuario tiene permiso de acceso a todos los documentos
     has_full_access = check_permission(current_user, "docs:view", db)
     
-    # 2. Si no tiene acceso completo, filtrar según restricciones
+    # 2. Si no tiene acceso completo, filtrar según el nivel de acceso del tipo de documento
     if not has_full_access:
-        # Obtener documentos creados por el usuario
-        user_docs = query.filter(models.Documento.usuario_id == current_user.id)
-        
-        # Obtener documentos públicos o con acceso según rol
-        # Aquí asumimos que los documentos tienen un nivel de acceso basado en roles
-        # Si no existe esta estructura, se puede implementar según los requisitos específicos
-        
-        # Verificar si el usuario tiene permiso de acceso a documentos restringidos
+        # Con search:restricted se ven los tipos públicos y restringidos; sin él, solo los públicos
         has_restricted_access = check_permission(current_user, "search:restricted", db)
+        niveles = reference_data.RESTRICTED_LEVELS if has_restricted_access else reference_data.PUBLIC_LEVELS
         
-        if has_restricted_access:
-            # El usuario puede ver documentos restringidos, pero no clasificados
-            # Obtenemos primero los IDs de documentos clasificados
-            classified_docs = db.query(models.TipoDocumento.id).filter(
-                models.TipoDocumento.nombre.ilike("%clasificado%")
-            ).all()
-            
-            classified_ids = [doc_id for (doc_id,) in classified_docs]
-            logger.debug(f"Documentos clasificados encontrados: {classified_ids}")
-            
-            if classified_ids:
-                query = query.filter(
-                    or_(
-                        models.Documento.usuario_id == current_user.id,  # Documentos propios
-                        ~models.Documento.tipo_documento_id.in_(classified_ids)  # No clasificados
-                    )
-                )
-            else:
-                logger.debug("No se encontraron documentos clasificados, mostrando todos los documentos")
-                query = query.filter(
-                    or_(
-                        models.Documento.usuario_id == current_user.id,  # Documentos propios
-                        True  # Si no hay documentos clasificados, mostrar todos
-                    )
-                )
-        else:
-            # El usuario solo puede ver documentos públicos y propios
-            # Obtenemos primero los IDs de documentos públicos
-            public_docs = db.query(models.TipoDocumento.id).filter(
-                models.TipoDocumento.nombre.ilike("%público%")
-            ).all()
-            
-            public_ids = [doc_id for (doc_id,) in public_docs]
-            logger.debug(f"Documentos públicos encontrados: {public_ids}")
-            
-            if public_ids:
-                query = query.filter(
-                    or_(
-                        models.Documento.usuario_id == current_user.id,  # Documentos propios
-                        models.Documento.tipo_documento_id.in_(public_ids)  # Documentos públicos
-                    )
-                )
-            else:
-                logger.debug("No se encontraron documentos públicos, mostrando solo documentos propios")
-                query = query.filter(
-                    models.Documento.usuario_id == current_user.id  # Solo documentos propios
+        # Conjunto de tipos visibles precalculado en la caché de datos de referencia
+        visible_type_ids = await db.run_sync(reference_data.visible_document_types, niveles)
+        logger.debug(f"Tipos de documento visibles para {sorted(niveles)}: {visible_type_ids}")
+        
+        # None: todos los tipos son visibles y no hace falta filtrar
+        if visible_type_ids:
+            filtros.append(
+                or_(
+                    models.Documento.usuario_id == current_user.id,  # Documentos propios
+                    models.Documento.tipo_documento_id.in_(sorted(visible_type_ids))  # Tipos visibles
                 )
+            )
+        elif visible_type_ids is not None:
+            logger.debug("No hay tipos de documento visibles, mostrando solo documentos propios")
+            filtros.append(models.Documento.usuario_id == current_user.id)  # Solo documentos propios
     
-    # Optimizaciones para mejorar el rendimiento
-    
-    # 1. Aplicar eager loading para evitar problemas de N+1 queries
-    query = query.options(
-        joinedload(models.Documento.categoria),
-        joinedload(models.Documento.tipo_documento),
-        joinedload(models.Documento.usuario)
-    )
+    # Consulta principal con eager loading para evitar problemas de N+1 queries
+    # (en modo async además no se permite la carga perezosa de relaciones)
+    query = select(models.Documento).where(*filtros).options(*loaders.documento_options())
     
-    # 3. Ordenar según los parámetros proporcionados
+    # Ordenar según los parámetros proporcionados
     sort_column = None
     
     # Determinar la columna de ordenamiento
@@ -410,121 +352,13 @@ async def search_documents(
     else:
         query = query.order_by(sort_column.desc())
     
-    # Calcular total de resultados para la paginación
-    # Usar una consulta separada y optimizada solo para contar
-    count_query = db.query(func.count(models.Documento.id))
-    
-    # Aplicar los mismos filtros a la consulta de conteo
-    if termino:
-        try:
-            logger.info(f"Aplicando filtro de término a consulta de conteo: '{termino}'")
-            # Usar la misma función de escape definida anteriormente
-            def escape_like(string):
-                if not string:
-                    return string
-                return string.replace('%', '\\%').replace('_', '\\_').replace('[', '\\[').replace(']', '\\]')
-            
-            termino_seguro = escape_like(termino)
-            logger.debug(f"Término de conteo escapado: '{termino_seguro}'")
-            
-            try:
-                count_query = count_query.filter(
-                    or_(
-                        models.Documento.titulo.ilike(f"%{termino_seguro}%"),
-                        models.Documento.numero_expediente.ilike(f"%{termino_seguro}%"),
-                        models.Documento.descripcion.ilike(f"%{termino_seguro}%")
-                    )
-                )
-            except Exception as e:
-                logger.error(f"Error en la consulta ILIKE de conteo: {str(e)}", exc_info=True)
-                # Intentar con una búsqueda más simple como fallback
-                count_query = count_query.filter(
-                    or_(
-                        models.Documento.titulo.contains(termino),
-                        models.Documento.numero_expediente.contains(termino),
-                        models.Documento.descripcion.contains(termino)
-                    )
-                )
-            logger.debug("Filtro de término aplicado correctamente a consulta de conteo")
-        except Exception as e:
-            logger.error(f"Error al aplicar filtro de término en consulta de conteo: {str(e)}", exc_info=True)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error al procesar el término de búsqueda en consulta de conteo: {str(e)}"
-            )
-        
-    # Filtro exacto por número de expediente
-    if numero_expediente:
-        count_query = count_query.filter(models.Documento.numero_expediente == numero_expediente)
-        
-    # Filtro por usuario que cargó el documento
-    if usuario_id:
-        count_query = count_query.filter(models.Documento.usuario_id == usuario_id)
-    
-    if fecha_desde and 'fecha_desde_dt' in locals():
-        count_query = count_query.filter(models.Documento.fecha_creacion >= fecha_desde_dt)
-    
-    if fecha_hasta and 'fecha_hasta_dt' in locals():
-        count_query = count_query.filter(models.Documento.fecha_creacion <= fecha_hasta_dt)
-    
-    if categoria_id:
-        count_query = count_query.filter(models.Documento.categoria_id == categoria_id)
-    
-    if tipo_documento_id:
-        count_query = count_query.filter(models.Documento.tipo_documento_id == tipo_documento_id)
-    
-    # Aplicar filtros de permisos a la consulta de conteo
-    if not has_full_access:
-        if has_restricted_access:
-            # Usamos una forma alternativa para el filtro que no depende de .has()
-            classified_docs = db.query(models.TipoDocumento.id).filter(
-                models.TipoDocumento.nombre.ilike("%clasificado%")
-            ).all()
-            
-            classified_ids = [doc_id for (doc_id,) in classified_docs]
-            
-            if classified_ids:
-                count_query = count_query.filter(
-                    or_(
-                        models.Documento.usuario_id == current_user.id,
-                        ~models.Documento.tipo_documento_id.in_(classified_ids)
-                    )
-                )
-            else:
-                count_query = count_query.filter(
-                    or_(
-                        models.Documento.usuario_id == current_user.id,
-                        True  # Si no hay documentos clasificados, mostrar todos
-                    )
-                )
-        else:
-            # Usamos una forma alternativa para el filtro que no depende de .has()
-            public_docs = db.query(models.TipoDocumento.id).filter(
-                models.TipoDocumento.nombre.ilike("%público%")
-            ).all()
-            
-            public_ids = [doc_id for (doc_id,) in public_docs]
-            
-            if public_ids:
-                count_query = count_query.filter(
-                    or_(
-                        models.Documento.usuario_id == current_user.id,
-                        models.Documento.tipo_documento_id.in_(public_ids)
-                    )
-                )
-            else:
-                count_query = count_query.filter(
-                    models.Documento.usuario_id == current_user.id  # Solo documentos propios
-                )
+    # Calcular total de resultados para la paginación con los mismos filtros
+    count_query = select(func.count(models.Documento.id)).where(*filtros)
     
     # Obtener el conteo total
     try:
         logger.debug("Ejecutando consulta de conteo...")
-        # Registrar la consulta SQL para depuración
-        query_str = str(count_query.statement.compile(compile_kwargs={"literal_binds": True}))
-        logger.debug(f"SQL de consulta de conteo: {query_str}")
-        
-        total_items = count_query.scalar()
+        total_items = (await read_db.execute(count_query)).scalar_one()
         total_pages = (total_items + page_size - 1) // page_size if total_items > 0 else 0
         logger.info(f"Búsqueda completada - Total de documentos encontrados: {total_items}, páginas: {total_pages}")
     except Exception as e:
@@ -539,16 +373,13 @@ async def search_documents(
         )
     
     # Aplicar paginación
+    skip = (page - 1) * page_size
     try:
         logger.debug(f"Aplicando paginación: página {page}, tamaño {page_size}")
-        skip = (page - 1) * page_size
         logger.debug(f"Saltando {skip} registros")
         
-        # Registrar la consulta SQL para depuración
-        query_str = str(query.statement.compile(compile_kwargs={"literal_binds": True}))
-        logger.debug(f"SQL de consulta principal: {query_str}")
-        
-        documentos = query.offset(skip).limit(page_size).all()
+        result = await read_db.execute(query.offset(skip).limit(page_size))
+        documentos = result.scalars().all()
         logger.debug(f"Documentos recuperados: {len(documentos)}")
         
         # Log de IDs de documentos recuperados para depuración
@@ -558,7 +389,7 @@ async def search_documents(
         logger.error(f"Error al recuperar documentos: {str(e)}", exc_info=True)
         # Registrar detalles adicionales del error
         logger.error(f"Tipo de error: {type(e).__name__}")
-        logger.error(f"Parámetros de paginación: page={page}, page_size={page_size}, skip={skip if 'skip' in locals() else 'N/A'}")
+        logger.error(f"Parámetros de paginación: page={page}, page_size={page_size}, skip={skip}")
         
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -567,23 +398,19 @@ async def search_documents(
     
     # Registrar la búsqueda en el historial
     try:
-        for doc in documentos:
-            historial = models.HistorialAcceso(
+        db.add_all([
+            models.HistorialAcceso(
                 usuario_id=current_user.id,
                 documento_id=doc.id,
                 accion="busqueda",
                 detalles=f"Búsqueda: {termino if termino else 'filtrada'}, página {page}"
             )
-            db.add(historial)
-        
-        try:
-            db.commit()
-        except Exception as e:
-            db.rollback()
-            logger.error(f"Error al registrar la búsqueda en el historial: {str(e)}", exc_info=True)
-            # Continuamos sin lanzar excepción para no interrumpir la respuesta al usuario
+            for doc in documentos
+        ])
+        await db.commit()
     except Exception as e:
-        logger.error(f"Error al procesar el historial de búsqueda: {str(e)}", exc_info=True)
+        await db.rollback()
+        logger.error(f"Error al registrar la búsqueda en el historial: {str(e)}", exc_info=True)
         # Continuamos sin lanzar excepción para no interrumpir la respuesta al usuario
     
     # Construir respuesta paginada
@@ -604,7 +431,7 @@ async def get_document(
     """
     Obtener un documento por su ID.
     """
-    documento = db.query(models.Documento).filter(
+    documento = db.query(models.Documento).options(*loaders.documento_options()).filter(
         models.Documento.id == documento_id,
         models.Documento.activo == True
     ).first()
@@ -630,17 +457,20 @@ async def get_document(
 @router.get("/{documento_id}/download")
 async def download_document(
     documento_id: int,
-    current_user: models.Usuario = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: models.Usuario = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Descargar un documento por su ID.
     """
     # Verificar si el documento existe
-    documento = db.query(models.Documento).filter(
-        models.Documento.id == documento_id,
-        models.Documento.activo == True
-    ).first()
+    result = await db.execute(
+        select(models.Documento).where(
+            models.Documento.id == documento_id,
+            models.Documento.activo == True
+        )
+    )
+    documento = result.scalars().first()
     
     if not documento:
         raise HTTPException(
@@ -673,11 +503,13 @@ async def download_document(
         detalles="Descarga del documento"
     )
     db.add(historial)
-    db.commit()
+    await db.commit()
     
     # Obtener nombre original del archivo
     filename = f"{documento.titulo}{documento.extension_archivo}"
     
+    record_transfer("download", documento.tamano_archivo)
+    
     return FileResponse(
         path=documento.path_archivo,
         filename=filename,
@@ -808,6 +640,9 @@ async def create_document(
         db.add(historial)
         db.commit()
         
+        # Avisar a los clientes suscritos a los cambios de documentos
+        await publish_document_event(DOCUMENT_CREATED, new_document, current_user.id)
+        
         # Programar verificación de integridad en segundo plano
         if background_tasks:
             from ..utils.tasks import verify_document_integrity
@@ -854,17 +689,21 @@ async def create_document(
 @router.get("/{documento_id}/versions", response_model=List[schemas.VersionDocumentoSimple])
 async def get_document_versions(
     documento_id: int,
-    current_user: models.Usuario = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: models.Usuario = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db),
+    read_db: AsyncSession = Depends(get_read_db)
 ):
     """
     Obtener todas las versiones de un documento.
     """
     # Verificar si el documento existe
-    documento = db.query(models.Documento).filter(
-        models.Documento.id == documento_id,
-        models.Documento.activo == True
-    ).first()
+    result = await read_db.execute(
+        select(models.Documento).where(
+            models.Documento.id == documento_id,
+            models.Documento.activo == True
+        )
+    )
+    documento = result.scalars().first()
     
     if not documento:
         raise HTTPException(
@@ -883,9 +722,14 @@ async def get_document_versions(
         )
     
     # Obtener todas las versiones del documento
-    versiones = db.query(models.VersionDocumento).filter(
-        models.VersionDocumento.documento_id == documento_id
-    ).order_by(models.VersionDocumento.numero_version.desc()).all()
+    result = await read_db.execute(
+        select(models.VersionDocumento).where(
+            models.VersionDocumento.documento_id == documento_id
+        ).options(
+            *loaders.version_simple_options()
+        ).order_by(models.VersionDocumento.numero_version.desc())
+    )
+    versiones = result.scalars().all()
     
     # Registrar la acción en el historial
     historial = models.HistorialAcceso(
@@ -895,7 +739,7 @@ async def get_document_versions(
         detalles="Consulta de historial de versiones"
     )
     db.add(historial)
-    db.commit()
+    await db.commit()
     
     return versiones
 
@@ -932,7 +776,7 @@ async def get_document_version(
         )
     
     # Obtener la versión específica
-    version = db.query(models.VersionDocumento).filter(
+    version = db.query(models.VersionDocumento).options(*loaders.version_options()).filter(
         models.VersionDocumento.documento_id == documento_id,
         models.VersionDocumento.id == version_id
     ).first()
@@ -955,21 +799,77 @@ async def get_document_version(
     
     return version
 
+@router.get("/{documento_id}/versions/{version_id}/lineage", response_model=List[schemas.VersionDocumentoSimple])
+async def get_document_version_lineage(
+    documento_id: int,
+    version_id: int,
+    current_user: models.Usuario = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Obtener el linaje de una versión (versiones anteriores y siguientes), de la
+    más antigua a la más reciente, en una sola consulta.
+    """
+    # Verificar si el documento existe
+    result = await read_db.execute(
+        select(models.Documento).where(
+            models.Documento.id == documento_id,
+            models.Documento.activo == True
+        )
+    )
+    documento = result.scalars().first()
+    
+    if not documento:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Documento no encontrado"
+        )
+    
+    # Verificar permisos para ver el documento
+    is_owner = documento.usuario_id == current_user.id
+    has_permission = check_permission(current_user, "docs:view", db) or check_permission(current_user, "search:restricted", db)
+    
+    if not (is_owner or has_permission):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para ver este documento"
+        )
+    
+    # Recorrer la cadena de versiones con CTE recursivas
+    result = await read_db.execute(
+        lineage_statement(version_id).where(
+            models.VersionDocumento.documento_id == documento_id
+        ).options(*loaders.version_simple_options())
+    )
+    versiones = result.scalars().all()
+    
+    if not versiones:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Versión no encontrada"
+        )
+    
+    return versiones
+
 @router.get("/{documento_id}/versions/{version_id}/download")
 async def download_document_version(
     documento_id: int,
     version_id: int,
-    current_user: models.Usuario = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: models.Usuario = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Descargar una versión específica de un documento.
     """
     # Verificar si el documento existe
-    documento = db.query(models.Documento).filter(
-        models.Documento.id == documento_id,
-        models.Documento.activo == True
-    ).first()
+    result = await db.execute(
+        select(models.Documento).where(
+            models.Documento.id == documento_id,
+            models.Documento.activo == True
+        )
+    )
+    documento = result.scalars().first()
     
     if not documento:
         raise HTTPException(
@@ -988,10 +888,13 @@ async def download_document_version(
         )
     
     # Obtener la versión específica
-    version = db.query(models.VersionDocumento).filter(
-        models.VersionDocumento.documento_id == documento_id,
-        models.VersionDocumento.id == version_id
-    ).first()
+    result = await db.execute(
+        select(models.VersionDocumento).where(
+            models.VersionDocumento.documento_id == documento_id,
+            models.VersionDocumento.id == version_id
+        )
+    )
+    version = result.scalars().first()
     
     if not version:
         raise HTTPException(
@@ -1014,11 +917,13 @@ async def download_document_version(
         detalles=f"Descarga de la versión {version.numero_version}"
     )
     db.add(historial)
-    db.commit()
+    await db.commit()
     
     # Obtener nombre original del archivo
     filename = f"{documento.titulo}_v{version.numero_version}{version.extension_archivo}"
     
+    record_transfer("download", version.tamano_archivo)
+    
     return FileResponse(
         path=version.path_archivo,
         filename=filename,
@@ -1140,50 +1045,56 @@ async def create_document_version(
                 logger.error(f"Error al actualizar metadatos: {str(metadata_error)}")
                 # No lanzar excepción, la versión ya se creó correctamente
         
-            # Obtener la versión creada con relaciones necesarias para el esquema de respuesta
-            version = db.query(models.VersionDocumento).filter(
-                models.VersionDocumento.id == version_id
-            ).first()
-            
-            if not version:
-                logger.error(f"Versión creada con ID {version_id} pero no se puede recuperar")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Versión creada pero no se puede recuperar: {message}"
-                )
-                
-            # Crear una respuesta simplificada que cumpla con el esquema
-            # Esto evita los errores de validación cuando version_siguiente es None
-            response_version = {
-                "id": version.id,
-                "documento_id": version.documento_id,
-                "numero_version": version.numero_version,
-                "fecha_version": version.fecha_version,
-                "comentario": version.comentario,
-                "cambios": version.cambios,
-                "path_archivo": version.path_archivo,
-                "usuario_id": version.usuario_id,
-                "usuario": version.usuario,
-                "hash_archivo": version.hash_archivo,
-                "tamano_archivo": version.tamano_archivo,
-                "extension_archivo": version.extension_archivo,
-                "es_actual": version.es_actual,
-                "version_anterior_id": version.version_anterior_id,
-                "version_anterior": None,
-                "version_siguiente": None,
-                "documento": documento
-            }
-            
-            # Programar verificación de integridad en segundo plano
-            if background_tasks:
-                try:
-                    from ..utils.tasks import verify_document_integrity
-                    background_tasks.add_task(verify_document_integrity, db, documento_id)
-                except Exception as bg_error:
-                    logger.error(f"Error al programar tarea en segundo plano: {str(bg_error)}")
-                    # No lanzar excepción, la versión ya se creó correctamente
+        # Obtener la versión creada con relaciones necesarias para el esquema de respuesta
+        version = db.query(models.VersionDocumento).options(*loaders.version_simple_options()).filter(
+            models.VersionDocumento.id == version_id
+        ).first()
+        
+        if not version:
+            logger.error(f"Versión creada con ID {version_id} pero no se puede recuperar")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Versión creada pero no se puede recuperar: {message}"
+            )
             
-            return response_version
+        # Crear una respuesta simplificada que cumpla con el esquema
+        # Esto evita los errores de validación cuando version_siguiente es None
+        response_version = {
+            "id": version.id,
+            "documento_id": version.documento_id,
+            "numero_version": version.numero_version,
+            "fecha_version": version.fecha_version,
+            "comentario": version.comentario,
+            "cambios": version.cambios,
+            "path_archivo": version.path_archivo,
+            "usuario_id": version.usuario_id,
+            "usuario": version.usuario,
+            "hash_archivo": version.hash_archivo,
+            "tamano_archivo": version.tamano_archivo,
+            "extension_archivo": version.extension_archivo,
+            "es_actual": version.es_actual,
+            "version_anterior_id": version.version_anterior_id,
+            "version_anterior": None,
+            "version_siguiente": None,
+            "documento": documento
+        }
+        
+        # Avisar a los clientes suscritos a los cambios de documentos
+        await publish_document_event(
+            VERSION_ADDED, documento, current_user.id,
+            version_id=version.id, numero_version=version.numero_version
+        )
+        
+        # Programar verificación de integridad en segundo plano
+        if background_tasks:
+            try:
+                from ..utils.tasks import verify_document_integrity
+                background_tasks.add_task(verify_document_integrity, db, documento_id)
+            except Exception as bg_error:
+                logger.error(f"Error al programar tarea en segundo plano: {str(bg_error)}")
+                # No lanzar excepción, la versión ya se creó correctamente
+        
+        return response_version
         
     except HTTPException as http_ex:
         # Re-lanzar excepciones HTTP
@@ -1301,7 +1212,7 @@ async def restore_document_version(
         )
     
     # Restaurar la versión
-    success, message, version_id = StorageService.restore_version(
+    success, message, nueva_version_id = StorageService.restore_version(
         document_id=documento_id,
         version_id=version_id,
         user_id=current_user.id,
@@ -1318,6 +1229,12 @@ async def restore_document_version(
     # Obtener el documento actualizado
     db.refresh(documento)
     
+    # Avisar a los clientes suscritos a los cambios de documentos
+    await publish_document_event(
+        VERSION_RESTORED, documento, current_user.id,
+        version_id=nueva_version_id, version_restaurada_id=version_id
+    )
+    
     return documento
 
 @router.post("/{documento_id}/versions/compare")
@@ -1325,11 +1242,22 @@ async def compare_document_versions(
     documento_id: int,
     version_id1: int,
     version_id2: int,
+    request: Request,
+    stream: bool = Query(False, description="Devolver el diff completo en bloques NDJSON"),
     current_user: models.Usuario = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     Comparar dos versiones de un documento.
+    
+    Los PDF y DOCX se comparan sobre su texto extraído: además del diff por
+    párrafos, "changes" indica la página de cada cambio en ambas versiones y el
+    detalle por palabras de los párrafos modificados.
+    
+    La respuesta JSON incluye como máximo DIFF_MAX_JSON_LINES líneas de diff y
+    cambios (marcada con "truncated"). Con stream=true o Accept: application/x-ndjson el
+    resultado se envía como NDJSON: una línea de resumen seguida del diff completo
+    en bloques.
     """
     # Verificar si el documento existe
     documento = db.query(models.Documento).filter(
@@ -1353,8 +1281,7 @@ async def compare_document_versions(
             detail="No tiene permisos para ver este documento"
         )
     
-    # Comparar versiones
-    success, message, result = StorageService.compare_versions(
+    success, message, versions = StorageService.get_versions_to_compare(
         document_id=documento_id,
         version_id1=version_id1,
         version_id2=version_id2,
@@ -1367,6 +1294,30 @@ async def compare_document_versions(
             detail=message
         )
     
+    # Comparar versiones en el pool de diffs para no bloquear el event loop
+    version1, version2 = versions
+    try:
+        comparison = await diff_executor.run(StorageService.compare_version_files, version1, version2)
+    except ExecutorSaturatedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El servidor está procesando demasiadas comparaciones. Intente nuevamente en unos segundos.",
+            headers={"Retry-After": "1"}
+        )
+    except Exception as e:
+        logger.error(f"Error al comparar versiones: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al comparar versiones: {str(e)}"
+        )
+    
+    # El resultado se arma antes del commit, que expira las versiones cargadas
+    as_ndjson = stream or "application/x-ndjson" in request.headers.get("accept", "")
+    if as_ndjson:
+        summary = StorageService.comparison_summary(version1, version2, comparison)
+    else:
+        result = StorageService.comparison_result(version1, version2, comparison, settings.DIFF_MAX_JSON_LINES)
+    
     # Registrar la acción en el historial
     historial = models.HistorialAcceso(
         usuario_id=current_user.id,
@@ -1377,6 +1328,12 @@ async def compare_document_versions(
     db.add(historial)
     db.commit()
     
+    if as_ndjson:
+        return StreamingResponse(
+            ndjson_chunks(summary, comparison["diff"], settings.DIFF_STREAM_CHUNK_LINES, comparison.get("changes")),
+            media_type="application/x-ndjson"
+        )
+    
     return result
 
 @router.put("/{documento_id}", response_model=schemas.Documento)
@@ -1457,4 +1414,7 @@ async def update_document(
     db.add(historial)
     db.commit()
     
+    # Avisar a los clientes suscritos a los cambios de documentos
+    await publish_document_event(METADATA_EDITED, documento, current_user.id)
+    
     return documento
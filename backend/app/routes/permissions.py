@@ -1,11 +1,13 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Request
 from sqlalchemy.orm import Session, joinedload
 
 from .websockets import notify_permission_change
 
-from ..db import models, schemas
+from ..db import loaders, models, schemas
 from ..db.database import get_db
+from ..utils import reference_data
+from ..utils.reference_data import serve_reference_set
 from ..utils.security import get_current_active_user, check_permission
 
 router = APIRouter(prefix="/permissions", tags=["permissions"])
@@ -13,12 +15,14 @@ router = APIRouter(prefix="/permissions", tags=["permissions"])
 # Obtener todas las categorías de permisos
 @router.get("/categories", response_model=List[schemas.CategoriaPermiso])
 async def get_permission_categories(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
     Obtener todas las categorías de permisos disponibles.
     Requiere permisos de administrador.
+    Se sirven desde la caché de datos de referencia, con ETag (304 si no cambiaron).
     """
     # Verificar permisos
     if not check_permission(current_user, "admin:permissions:manage", db):
@@ -27,12 +31,12 @@ async def get_permission_categories(
             detail="No tiene permisos para ver categorías de permisos"
         )
     
-    categories = db.query(models.CategoriaPermiso).all()
-    return categories
+    return serve_reference_set(request, db, reference_data.PERMISSION_CATEGORIES)
 
 # Obtener todos los permisos
 @router.get("/", response_model=List[schemas.Permiso])
 async def get_permissions(
+    request: Request,
     categoria_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: models.Usuario = Depends(get_current_active_user)
@@ -41,6 +45,7 @@ async def get_permissions(
     Obtener todos los permisos disponibles.
     Se puede filtrar por categoría.
     Requiere permisos de administrador.
+    Se sirven desde la caché de datos de referencia, con ETag (304 si no cambiaron).
     """
     # Verificar permisos
     if not check_permission(current_user, "admin:permissions:manage", db):
@@ -49,15 +54,10 @@ async def get_permissions(
             detail="No tiene permisos para ver permisos"
         )
     
-    # Consulta base con eager loading para la categoría
-    query = db.query(models.Permiso).options(joinedload(models.Permiso.categoria))
-    
-    # Filtrar por categoría si se especifica
+    # Filtrar por categoría si se especifica (sobre el conjunto en caché)
     if categoria_id:
-        query = query.filter(models.Permiso.categoria_id == categoria_id)
-    
-    permisos = query.all()
-    return permisos
+        return serve_reference_set(request, db, reference_data.PERMISSIONS, lambda permiso: permiso.categoria_id == categoria_id)
+    return serve_reference_set(request, db, reference_data.PERMISSIONS)
 
 # Obtener permisos de un rol específico
 @router.get("/roles/{role_id}", response_model=List[schemas.Permiso])
@@ -265,7 +265,7 @@ async def get_role_permission_history(
         )
     
     # Obtener historial
-    historial = db.query(models.HistorialPermiso).filter(
+    historial = db.query(models.HistorialPermiso).options(*loaders.historial_permiso_options()).filter(
         models.HistorialPermiso.rol_id == role_id
     ).order_by(models.HistorialPermiso.fecha_cambio.desc()).all()
     
@@ -1,9 +1,11 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 
-from ..db import models, schemas
+from ..db import loaders, models, schemas
 from ..db.database import get_db
+from ..utils import reference_data
+from ..utils.reference_data import serve_reference_set
 from ..utils.security import get_current_active_user, check_permission
 
 router = APIRouter(prefix="/roles", tags=["roles"])
@@ -11,12 +13,14 @@ router = APIRouter(prefix="/roles", tags=["roles"])
 # Obtener todos los roles
 @router.get("/", response_model=List[schemas.Rol])
 async def get_roles(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
     Obtener todos los roles disponibles en el sistema.
     Requiere permisos de administrador.
+    Se sirven desde la caché de datos de referencia, con ETag (304 si no cambiaron).
     """
     # Verificar permisos
     if not check_permission(current_user, "admin:roles:manage", db):
@@ -25,8 +29,7 @@ async def get_roles(
             detail="No tiene permisos para ver roles"
         )
     
-    roles = db.query(models.Rol).all()
-    return roles
+    return serve_reference_set(request, db, reference_data.ROLES)
 
 # Obtener un rol específico
 @router.get("/{role_id}", response_model=schemas.Rol)
@@ -145,7 +148,7 @@ async def get_user_role_history(
         )
     
     # Obtener historial
-    historial = db.query(models.HistorialRol).filter(
+    historial = db.query(models.HistorialRol).options(*loaders.historial_rol_options()).filter(
         models.HistorialRol.usuario_id == user_id
     ).order_by(models.HistorialRol.fecha_cambio.desc()).all()
     
@@ -1,12 +1,20 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+import os
 from datetime import datetime, timedelta
 
-from ..db import models, schemas
-from ..db.database import get_db
-from ..utils.security import get_current_active_user, check_permission
+from ..db import loaders, models, schemas
+from ..db.database import get_db, get_async_db
+from ..db.query_stats import query_stats_registry
+from ..db.replicas import get_read_db
+from ..utils.security import get_current_active_user, get_current_active_user_async, check_permission, role_has_permission
+from ..utils.config import settings
 from ..utils.middleware import require_permissions
+from ..utils.profiler import collapsed, load_profile, profile_worker, request_profiler, user_can_profile
 
 router = APIRouter(prefix="/security", tags=["security"])
 
@@ -20,31 +28,32 @@ async def get_access_logs(
     ip_address: Optional[str] = Query(None, description="Filtrar por dirección IP"),
     skip: int = Query(0, description="Número de registros a omitir"),
     limit: int = Query(100, description="Número máximo de registros a devolver"),
-    current_user: models.Usuario = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    current_user: models.Usuario = Depends(get_current_active_user_async),
+    read_db: AsyncSession = Depends(get_read_db),
     _: bool = Depends(require_permissions(["admin:history:view"]))
 ):
     """
     Obtener registros de acceso al sistema.
     Requiere permiso de administrador para ver el historial del sistema.
+    Se consulta en una réplica de lectura si está configurada.
     """
     # Construir consulta base
-    query = db.query(models.RegistroAcceso)
+    query = select(models.RegistroAcceso).options(*loaders.registro_acceso_options())
     
     # Aplicar filtros
     if endpoint:
-        query = query.filter(models.RegistroAcceso.endpoint.ilike(f"%{endpoint}%"))
+        query = query.where(models.RegistroAcceso.endpoint.ilike(f"%{endpoint}%"))
     
     if user_id:
-        query = query.filter(models.RegistroAcceso.usuario_id == user_id)
+        query = query.where(models.RegistroAcceso.usuario_id == user_id)
     
     if exitoso is not None:
-        query = query.filter(models.RegistroAcceso.exitoso == exitoso)
+        query = query.where(models.RegistroAcceso.exitoso == exitoso)
     
     if desde:
         try:
             desde_dt = datetime.strptime(desde, "%Y-%m-%d")
-            query = query.filter(models.RegistroAcceso.fecha >= desde_dt)
+            query = query.where(models.RegistroAcceso.fecha >= desde_dt)
         except ValueError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -56,7 +65,7 @@ async def get_access_logs(
             hasta_dt = datetime.strptime(hasta, "%Y-%m-%d")
             # Añadir un día para incluir todo el día final
             hasta_dt = hasta_dt + timedelta(days=1)
-            query = query.filter(models.RegistroAcceso.fecha < hasta_dt)
+            query = query.where(models.RegistroAcceso.fecha < hasta_dt)
         except ValueError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -64,13 +73,14 @@ async def get_access_logs(
             )
     
     if ip_address:
-        query = query.filter(models.RegistroAcceso.ip_address == ip_address)
+        query = query.where(models.RegistroAcceso.ip_address == ip_address)
     
     # Ordenar por fecha descendente (más reciente primero)
     query = query.order_by(models.RegistroAcceso.fecha.desc())
     
     # Aplicar paginación
-    registros = query.offset(skip).limit(limit).all()
+    result = await read_db.execute(query.offset(skip).limit(limit))
+    registros = result.scalars().all()
     
     return registros
 
@@ -83,28 +93,29 @@ async def get_login_attempts(
     ip_address: Optional[str] = Query(None, description="Filtrar por dirección IP"),
     skip: int = Query(0, description="Número de registros a omitir"),
     limit: int = Query(100, description="Número máximo de registros a devolver"),
-    current_user: models.Usuario = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    current_user: models.Usuario = Depends(get_current_active_user_async),
+    read_db: AsyncSession = Depends(get_read_db),
     _: bool = Depends(require_permissions(["admin:history:view"]))
 ):
     """
     Obtener registros de intentos de inicio de sesión.
     Requiere permiso de administrador para ver el historial del sistema.
+    Se consulta en una réplica de lectura si está configurada.
     """
     # Construir consulta base
-    query = db.query(models.IntentosLogin)
+    query = select(models.IntentosLogin)
     
     # Aplicar filtros
     if email:
-        query = query.filter(models.IntentosLogin.email.ilike(f"%{email}%"))
+        query = query.where(models.IntentosLogin.email.ilike(f"%{email}%"))
     
     if exitoso is not None:
-        query = query.filter(models.IntentosLogin.exitoso == exitoso)
+        query = query.where(models.IntentosLogin.exitoso == exitoso)
     
     if desde:
         try:
             desde_dt = datetime.strptime(desde, "%Y-%m-%d")
-            query = query.filter(models.IntentosLogin.fecha >= desde_dt)
+            query = query.where(models.IntentosLogin.fecha >= desde_dt)
         except ValueError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -116,7 +127,7 @@ async def get_login_attempts(
             hasta_dt = datetime.strptime(hasta, "%Y-%m-%d")
             # Añadir un día para incluir todo el día final
             hasta_dt = hasta_dt + timedelta(days=1)
-            query = query.filter(models.IntentosLogin.fecha < hasta_dt)
+            query = query.where(models.IntentosLogin.fecha < hasta_dt)
         except ValueError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -124,13 +135,14 @@ async def get_login_attempts(
             )
     
     if ip_address:
-        query = query.filter(models.IntentosLogin.ip_address == ip_address)
+        query = query.where(models.IntentosLogin.ip_address == ip_address)
     
     # Ordenar por fecha descendente (más reciente primero)
     query = query.order_by(models.IntentosLogin.fecha.desc())
     
     # Aplicar paginación
-    intentos = query.offset(skip).limit(limit).all()
+    result = await read_db.execute(query.offset(skip).limit(limit))
+    intentos = result.scalars().all()
     
     return intentos
 
@@ -199,3 +211,102 @@ async def unblock_ip(
     db.refresh(bloqueo)
     
     return bloqueo
+
+async def require_config_permission(
+    current_user: models.Usuario = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
+) -> models.Usuario:
+    """Exige el permiso admin:system:config consultando el rol del usuario."""
+    allowed = await role_has_permission(current_user, "admin:system:config", db)
+    await db.commit()
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para ver las estadísticas de consultas"
+        )
+    return current_user
+
+@router.get("/query-stats", response_model=dict)
+async def get_query_stats(
+    order_by: str = Query("total_ms", pattern="^(total_ms|mean_ms|max_ms|calls)$", description="Criterio de orden"),
+    limit: int = Query(20, ge=1, le=200, description="Número máximo de consultas a devolver"),
+    reset: bool = Query(False, description="Reiniciar las estadísticas después de leerlas"),
+    current_user: models.Usuario = Depends(require_config_permission)
+):
+    """
+    Obtener las consultas SQL con mayor costo acumulado en este worker, agrupadas
+    por huella (SQL normalizado). Requiere el permiso admin:system:config.
+    """
+    result = {
+        "pid": os.getpid(),
+        "dropped_fingerprints": query_stats_registry.dropped,
+        "queries": query_stats_registry.top(limit=limit, order_by=order_by)
+    }
+    if reset:
+        query_stats_registry.reset()
+    return result
+
+async def require_profile_permission(
+    current_user: models.Usuario = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
+) -> models.Usuario:
+    """Exige el permiso admin:system:profile consultando el rol del usuario."""
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Perfilador desactivado")
+    allowed = await user_can_profile(current_user, db)
+    # Liberar la conexión durante el perfilado
+    await db.commit()
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para perfilar el sistema"
+        )
+    return current_user
+
+@router.post("/profile/worker", response_class=PlainTextResponse)
+async def profile_current_worker(
+    seconds: float = Query(10, gt=0, le=settings.PROFILER_MAX_SECONDS, description="Duración del perfil en segundos"),
+    interval_ms: int = Query(settings.PROFILER_INTERVAL_MS, ge=1, le=1000, description="Intervalo de muestreo en milisegundos"),
+    current_user: models.Usuario = Depends(require_profile_permission)
+):
+    """
+    Perfila el worker que atiende la solicitud durante el tiempo indicado.
+    Devuelve las pilas en formato collapsed (flamegraph.pl, speedscope).
+    Requiere el permiso admin:system:profile.
+    """
+    counts = await profile_worker(seconds, interval_ms / 1000)
+    return PlainTextResponse(collapsed(counts), headers={"X-Profile-Pid": str(os.getpid())})
+
+@router.post("/profile/requests", response_class=PlainTextResponse)
+async def profile_next_requests(
+    count: int = Query(10, ge=1, le=1000, description="Cantidad de solicitudes a perfilar"),
+    path_prefix: str = Query("/api/", description="Perfilar solo las rutas que empiezan con este prefijo"),
+    timeout: float = Query(30, gt=0, le=settings.PROFILER_MAX_SECONDS, description="Tiempo máximo de espera en segundos"),
+    current_user: models.Usuario = Depends(require_profile_permission)
+):
+    """
+    Perfila las próximas solicitudes atendidas por este worker y devuelve el
+    perfil acumulado en formato collapsed. Requiere el permiso admin:system:profile.
+    """
+    try:
+        session = await request_profiler.profile_requests(count, path_prefix, timeout)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return PlainTextResponse(collapsed(session.counts), headers={
+        "X-Profile-Pid": str(os.getpid()),
+        "X-Profile-Requests": str(session.profiled)
+    })
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_saved_profile(
+    profile_id: str,
+    current_user: models.Usuario = Depends(require_profile_permission)
+):
+    """
+    Obtiene el perfil de una solicitud enviada con la cabecera X-Profile
+    (el id se devuelve en la cabecera X-Profile de la respuesta).
+    """
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Perfil no encontrado")
+    return PlainTextResponse(profile)
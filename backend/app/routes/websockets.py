@@ -1,21 +1,116 @@
-from typing import Dict, List, Set
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
 from fastapi import WebSocket, WebSocketDisconnect, Depends, HTTPException, status
 from fastapi.routing import APIRouter
 from sqlalchemy.orm import Session
 
 from ..db.database import get_db
-from ..utils.security import get_current_user_ws
+from ..utils.document_events import DocumentSubscription
+from ..utils.event_bus import BROADCAST_TOPIC, DOCUMENTS_TOPIC, document_topic, event_bus, role_topic, user_topic
+from ..utils.config import settings
+from ..utils.metrics import WEBSOCKET_CONNECTIONS, WEBSOCKET_DROPPED
+from ..utils.reference_data import PUBLIC_LEVELS, RESTRICTED_LEVELS
+from ..utils.security import check_permission, get_current_user_ws
 from ..db import models
 
 router = APIRouter()
 
+PING_MESSAGE = json.dumps({"action": "ping"})
+
+class ClientConnection:
+    """
+    Conexión de un cliente con su cola de envío acotada. Una tarea por conexión
+    envía los mensajes en orden, de modo que un cliente lento solo demora su
+    propia cola y no la entrega a los demás.
+    """
+    def __init__(self, websocket: WebSocket, user_id: int, role_id: int, queue_size: int, send_timeout: float):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.role_id = role_id
+        self.send_timeout = send_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self.sender: Optional[asyncio.Task] = None
+    
+    def start(self, on_failure: Callable[["ClientConnection"], Awaitable[None]]):
+        self.sender = asyncio.create_task(self._send_loop(on_failure))
+    
+    def offer(self, text: str) -> bool:
+        """Encola un mensaje ya serializado; False si la cola está llena."""
+        if self.closed:
+            return True
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return False
+    
+    async def _send_loop(self, on_failure):
+        while True:
+            text = await self.queue.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Envío vencido o socket muerto
+                await on_failure(self)
+                return
+            finally:
+                self.queue.task_done()
+    
+    async def close(self, code: int):
+        if self.closed:
+            return
+        self.closed = True
+        if self.sender is not None and self.sender is not asyncio.current_task():
+            self.sender.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
 # Clase para gestionar las conexiones WebSocket
 class ConnectionManager:
-    def __init__(self):
+    """
+    Conexiones WebSocket del worker, agrupadas por tema (ver app/utils/event_bus.py).
+    Los mensajes dirigidos a un rol, un usuario o un documento se publican en el bus
+    y cada worker los entrega a sus propias conexiones suscritas al tema.
+    
+    Cada mensaje se serializa una sola vez y se encola en cada conexión sin esperar
+    el envío. Las conexiones cuya cola se llena se cierran (el cliente debe
+    reconectarse y refrescar su estado), igual que las que no responden: el
+    servidor envía {"action": "ping"} cada WS_HEARTBEAT_INTERVAL segundos y cierra
+    las conexiones que no envían nada (por ejemplo "pong") en WS_HEARTBEAT_TIMEOUT.
+    """
+    def __init__(
+        self,
+        bus=event_bus,
+        queue_size: int = settings.WS_SEND_QUEUE_SIZE,
+        send_timeout: float = settings.WS_SEND_TIMEOUT,
+        heartbeat_interval: float = settings.WS_HEARTBEAT_INTERVAL,
+        heartbeat_timeout: float = settings.WS_HEARTBEAT_TIMEOUT
+    ):
         # Conexiones activas: {usuario_id: {conexión1, conexión2, ...}}
         self.active_connections: Dict[int, Set[WebSocket]] = {}
-        # Conexiones por rol: {rol_id: {usuario_id1, usuario_id2, ...}}
-        self.role_connections: Dict[int, Set[int]] = {}
+        # Estado de envío de cada conexión
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        # Conexiones por tema: {"rol:1": {conexión1, ...}, "usuario:5": {...}, ...}
+        self.topic_connections: Dict[str, Set[WebSocket]] = {}
+        # Temas de cada conexión, para desuscribirla al desconectarse
+        self.connection_topics: Dict[WebSocket, Set[str]] = {}
+        # Filtros opcionales por conexión y tema: solo se entregan los mensajes que aceptan
+        self.filters: Dict[Tuple[WebSocket, str], Callable[[dict], bool]] = {}
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.bus = bus
+        bus.subscribe(self.deliver)
     
     async def connect(self, websocket: WebSocket, user_id: int, role_id: int):
         await websocket.accept()
@@ -24,11 +119,32 @@ class ConnectionManager:
         if user_id not in self.active_connections:
             self.active_connections[user_id] = set()
         self.active_connections[user_id].add(websocket)
+        connection = ClientConnection(websocket, user_id, role_id, self.queue_size, self.send_timeout)
+        self.connections[websocket] = connection
+        connection.start(self._on_send_failure)
+        WEBSOCKET_CONNECTIONS.inc()
         
-        # Añadir a conexiones por rol
-        if role_id not in self.role_connections:
-            self.role_connections[role_id] = set()
-        self.role_connections[role_id].add(user_id)
+        # Suscribir a los temas del usuario, de su rol y a los avisos generales
+        for topic in (user_topic(user_id), role_topic(role_id), BROADCAST_TOPIC):
+            self.subscribe(websocket, topic)
+        
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+    
+    def subscribe(self, websocket: WebSocket, topic: str, accepts: Optional[Callable[[dict], bool]] = None):
+        self.topic_connections.setdefault(topic, set()).add(websocket)
+        self.connection_topics.setdefault(websocket, set()).add(topic)
+        if accepts is not None:
+            self.filters[(websocket, topic)] = accepts
+    
+    def unsubscribe(self, websocket: WebSocket, topic: str):
+        self.filters.pop((websocket, topic), None)
+        if topic in self.topic_connections:
+            self.topic_connections[topic].discard(websocket)
+            if not self.topic_connections[topic]:
+                del self.topic_connections[topic]
+        if websocket in self.connection_topics:
+            self.connection_topics[websocket].discard(topic)
     
     def disconnect(self, websocket: WebSocket, user_id: int, role_id: int):
         # Eliminar de conexiones activas
@@ -36,26 +152,91 @@ class ConnectionManager:
             self.active_connections[user_id].discard(websocket)
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
-                
-                # Eliminar de conexiones por rol
-                if role_id in self.role_connections:
-                    self.role_connections[role_id].discard(user_id)
-                    if not self.role_connections[role_id]:
-                        del self.role_connections[role_id]
+        
+        connection = self.connections.pop(websocket, None)
+        if connection is not None:
+            WEBSOCKET_CONNECTIONS.dec()
+            if connection.sender is not None and connection.sender is not asyncio.current_task():
+                connection.sender.cancel()
+        
+        # Eliminar de todos sus temas
+        for topic in list(self.connection_topics.pop(websocket, ())):
+            self.filters.pop((websocket, topic), None)
+            if topic in self.topic_connections:
+                self.topic_connections[topic].discard(websocket)
+                if not self.topic_connections[topic]:
+                    del self.topic_connections[topic]
+    
+    def touch(self, websocket: WebSocket):
+        """Registra actividad del cliente (cualquier mensaje recibido)."""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+    
+    async def drop(self, connection: ClientConnection, reason: str, code: int):
+        """Cierra una conexión desde el servidor y la quita de todos sus temas."""
+        if connection.websocket not in self.connections:
+            return
+        WEBSOCKET_DROPPED.labels(reason).inc()
+        self.disconnect(connection.websocket, connection.user_id, connection.role_id)
+        await connection.close(code)
+    
+    async def close_all(self):
+        """Cierra todas las conexiones del worker (al detener la aplicación)."""
+        for connection in list(self.connections.values()):
+            await connection.close(status.WS_1001_GOING_AWAY)
+            self.disconnect(connection.websocket, connection.user_id, connection.role_id)
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+    
+    async def _on_send_failure(self, connection: ClientConnection):
+        await self.drop(connection, "error", status.WS_1011_INTERNAL_ERROR)
+    
+    async def _heartbeat_loop(self):
+        while self.connections:
+            await asyncio.sleep(self.heartbeat_interval)
+            limit = time.monotonic() - self.heartbeat_timeout
+            for connection in list(self.connections.values()):
+                if connection.last_seen < limit:
+                    await self.drop(connection, "sin_respuesta", status.WS_1001_GOING_AWAY)
+                elif not connection.offer(PING_MESSAGE):
+                    await self.drop(connection, "lento", status.WS_1013_TRY_AGAIN_LATER)
+    
+    async def send_local(self, websocket: WebSocket, message: dict):
+        """Envía un mensaje a una sola conexión de este worker."""
+        connection = self.connections.get(websocket)
+        if connection is not None and not connection.offer(json.dumps(message, default=str)):
+            await self.drop(connection, "lento", status.WS_1013_TRY_AGAIN_LATER)
+    
+    async def deliver(self, topic: str, message: dict):
+        """Entrega un evento del bus a las conexiones locales suscritas al tema."""
+        websockets = self.topic_connections.get(topic)
+        if not websockets:
+            return
+        text = json.dumps(message, default=str)
+        slow = []
+        for websocket in list(websockets):
+            connection = self.connections.get(websocket)
+            accepts = self.filters.get((websocket, topic))
+            if connection is None or (accepts is not None and not accepts(message)):
+                continue
+            if not connection.offer(text):
+                slow.append(connection)
+        for connection in slow:
+            await self.drop(connection, "lento", status.WS_1013_TRY_AGAIN_LATER)
     
     async def send_personal_message(self, message: dict, user_id: int):
-        if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                await connection.send_json(message)
+        await self.bus.publish(user_topic(user_id), message)
     
     async def broadcast_to_role(self, message: dict, role_id: int):
-        if role_id in self.role_connections:
-            for user_id in self.role_connections[role_id]:
-                await self.send_personal_message(message, user_id)
+        await self.bus.publish(role_topic(role_id), message)
+    
+    async def broadcast_to_document(self, message: dict, documento_id: int):
+        await self.bus.publish(document_topic(documento_id), message)
     
     async def broadcast(self, message: dict):
-        for user_id in self.active_connections:
-            await self.send_personal_message(message, user_id)
+        await self.bus.publish(BROADCAST_TOPIC, message)
 
 # Instancia del gestor de conexiones
 manager = ConnectionManager()
@@ -70,31 +251,92 @@ async def websocket_endpoint(
     try:
         # Autenticar usuario
         user = await get_current_user_ws(token, db)
-        
-        # Conectar WebSocket
-        await manager.connect(websocket, user.id, user.role_id)
-        
-        try:
-            while True:
-                # Esperar mensajes del cliente
-                data = await websocket.receive_text()
-                
-                # Aquí podríamos procesar mensajes específicos del cliente
-                # Por ahora, solo enviamos un eco
-                await manager.send_personal_message(
-                    {"action": "echo", "message": data},
-                    user.id
-                )
-        except WebSocketDisconnect:
-            # Desconectar cuando el cliente cierra la conexión
-            manager.disconnect(websocket, user.id, user.role_id)
     except HTTPException:
         # En caso de error de autenticación
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    # Conectar WebSocket
+    await manager.connect(websocket, user.id, user.role_id)
+    try:
+        while True:
+            # Esperar mensajes del cliente; cualquier mensaje cuenta como latido
+            data = await websocket.receive_text()
+            manager.touch(websocket)
+            if data == "pong":
+                continue
+            
+            # Aquí podríamos procesar mensajes específicos del cliente
+            # Por ahora, solo enviamos un eco a la misma conexión
+            await manager.send_local(websocket, {"action": "echo", "message": data})
+    except WebSocketDisconnect:
+        # El cliente cerró la conexión
+        pass
+    except Exception as e:
+        # En caso de otros errores (incluida una conexión ya cerrada por el servidor)
+        print(f"WebSocket error: {str(e)}")
+    finally:
+        manager.disconnect(websocket, user.id, user.role_id)
+
+# WebSocket de cambios en documentos
+@router.websocket("/ws/documents")
+async def document_events_endpoint(
+    websocket: WebSocket,
+    token: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Eventos de documentos (ver app/utils/document_events.py). El cliente elige qué
+    recibir con mensajes {"action": "subscribe" | "unsubscribe", "todos": true,
+    "documentos": [...], "categorias": [...], "expedientes": [...]}; el servidor
+    solo entrega los eventos de documentos que el usuario puede ver.
+    """
+    try:
+        # Autenticar usuario
+        user = await get_current_user_ws(token, db)
+    except HTTPException:
+        # En caso de error de autenticación
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    # Permisos de lectura, evaluados una vez por conexión con la misma regla que la búsqueda
+    if check_permission(user, "docs:view", db):
+        niveles = None
+    elif check_permission(user, "search:restricted", db):
+        niveles = RESTRICTED_LEVELS
+    else:
+        niveles = PUBLIC_LEVELS
+    subscription = DocumentSubscription(user.id, niveles)
+    
+    await manager.connect(websocket, user.id, user.role_id)
+    manager.subscribe(websocket, DOCUMENTS_TOPIC, subscription.accepts)
+    try:
+        while True:
+            # Esperar mensajes del cliente; cualquier mensaje cuenta como latido
+            data = await websocket.receive_text()
+            manager.touch(websocket)
+            if data == "pong":
+                continue
+            
+            try:
+                message = json.loads(data)
+                action = message.get("action")
+                if action not in ("subscribe", "unsubscribe"):
+                    raise ValueError(f"Acción desconocida: {action}")
+                subscription.update(message, subscribe=action == "subscribe")
+            except (ValueError, TypeError, AttributeError) as e:
+                await manager.send_local(websocket, {"action": "error", "message": f"Mensaje inválido: {str(e)}"})
+                continue
+            
+            await manager.send_local(websocket, {"action": "subscribed", "filtros": subscription.describe()})
+    except WebSocketDisconnect:
+        # El cliente cerró la conexión
+        pass
     except Exception as e:
-        # En caso de otros errores
+        # En caso de otros errores (incluida una conexión ya cerrada por el servidor)
         print(f"WebSocket error: {str(e)}")
-        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+    finally:
+        manager.disconnect(websocket, user.id, user.role_id)
 
 # Función para notificar cambios de permisos
 async def notify_permission_change(role_id: int, permission_id: int, action: str, db: Session):
@@ -17,6 +17,34 @@ class Settings(BaseSettings):
     DB_USER: str = os.getenv("DB_USER", "postgres")
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "password")
     
+    # Configuración del pool de conexiones (por worker y por motor)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "10"))  # Segundos de espera por una conexión libre
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Segundos antes de reciclar una conexión
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # 0 para desactivar
+    
+    # Réplicas de lectura: URLs postgresql:// separadas por comas (vacío para usar solo el primario)
+    DB_REPLICA_URLS: str = os.getenv("DB_REPLICA_URLS", "")
+    DB_REPLICA_STICKY_SECONDS: int = int(os.getenv("DB_REPLICA_STICKY_SECONDS", "10"))  # Lecturas al primario tras una escritura
+    
+    # Instrumentación de consultas SQL
+    QUERY_STATS_ENABLED: bool = os.getenv("QUERY_STATS_ENABLED", "True").lower() == "true"
+    QUERY_STATS_MAX_FINGERPRINTS: int = int(os.getenv("QUERY_STATS_MAX_FINGERPRINTS", "500"))  # Huellas distintas acumuladas por worker
+    SLOW_QUERY_MS: int = int(os.getenv("SLOW_QUERY_MS", "500"))  # Umbral del log de consultas lentas
+    SLOW_QUERY_SAMPLE_RATE: float = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", "1.0"))  # Fracción de consultas lentas registradas
+    
+    # Métricas Prometheus (/api/metrics)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    METRICS_UPDATE_INTERVAL: int = int(os.getenv("METRICS_UPDATE_INTERVAL", "15"))  # Segundos entre actualizaciones de los gauges del pool
+    
+    # Perfilador por muestreo (requiere el permiso admin:system:profile)
+    PROFILER_ENABLED: bool = os.getenv("PROFILER_ENABLED", "True").lower() == "true"
+    PROFILER_INTERVAL_MS: int = int(os.getenv("PROFILER_INTERVAL_MS", "5"))  # Intervalo de muestreo
+    PROFILER_MAX_SECONDS: int = int(os.getenv("PROFILER_MAX_SECONDS", "60"))  # Duración máxima de un perfil
+    PROFILE_OUTPUT_PATH: str = os.getenv("PROFILE_OUTPUT_PATH", "./storage/profiles")  # Perfiles de la cabecera X-Profile
+    
     # Configuración de la API
     API_PORT: int = int(os.getenv("API_PORT", "8000"))
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
@@ -27,10 +55,62 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your_secret_key_here")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))  # Costo de bcrypt; los hashes con otro costo se regeneran al iniciar sesión
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))  # Hilos dedicados a bcrypt por worker
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))  # Tareas de hash admitidas antes de responder 503
+
+    # Configuración de control de intentos de login
+    LOGIN_MAX_FAILED_ATTEMPTS: int = int(os.getenv("LOGIN_MAX_FAILED_ATTEMPTS", "5"))
+    LOGIN_FAILURE_WINDOW_MINUTES: int = int(os.getenv("LOGIN_FAILURE_WINDOW_MINUTES", "10"))
+    LOGIN_BLOCK_MINUTES: int = int(os.getenv("LOGIN_BLOCK_MINUTES", "30"))
+    LOGIN_COUNTER_BACKEND: str = os.getenv("LOGIN_COUNTER_BACKEND", "memory")  # "memory" o "db"
+    LOGIN_ATTEMPTS_FLUSH_SIZE: int = int(os.getenv("LOGIN_ATTEMPTS_FLUSH_SIZE", "50"))
+    LOGIN_ATTEMPTS_FLUSH_INTERVAL: int = int(os.getenv("LOGIN_ATTEMPTS_FLUSH_INTERVAL", "5"))  # segundos
+
+    # Configuración de particiones y retención de tablas de auditoría
+    AUDIT_RETENTION_MONTHS: int = int(os.getenv("AUDIT_RETENTION_MONTHS", "12"))  # Meses completos a conservar
+    AUDIT_PARTITIONS_AHEAD: int = int(os.getenv("AUDIT_PARTITIONS_AHEAD", "3"))  # Meses futuros con partición creada
+    AUDIT_ARCHIVE_PATH: str = os.getenv("AUDIT_ARCHIVE_PATH", "")  # Directorio para archivar particiones antes de eliminarlas (vacío: solo eliminar)
     
     # Configuración de almacenamiento de documentos
     DOCUMENT_STORAGE_PATH: str = os.getenv("DOCUMENT_STORAGE_PATH", "./storage/documents")
     MAX_UPLOAD_SIZE: int = int(os.getenv("MAX_UPLOAD_SIZE", "10485760"))  # 10MB en bytes
+    STAGING_MAX_AGE_HOURS: int = int(os.getenv("STAGING_MAX_AGE_HOURS", "24"))  # Cargas a medio publicar que se eliminan en la limpieza diaria
+
+    # Bandeja de salida transaccional (efectos posteriores a crear una versión)
+    OUTBOX_POLL_INTERVAL: int = int(os.getenv("OUTBOX_POLL_INTERVAL", "30"))  # Segundos entre reintentos de eventos pendientes
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))  # Eventos despachados por ronda
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))  # Intentos antes de dejar un evento para revisión manual
+
+    # Configuración de la comparación de versiones
+    DIFF_MAX_FILE_SIZE: int = int(os.getenv("DIFF_MAX_FILE_SIZE", "20971520"))  # Archivos más grandes no se comparan línea por línea
+    DIFF_TIME_BUDGET_MS: int = int(os.getenv("DIFF_TIME_BUDGET_MS", "5000"))  # Al agotarse, el diff se devuelve aproximado (0 para desactivar)
+    DIFF_MAX_JSON_LINES: int = int(os.getenv("DIFF_MAX_JSON_LINES", "5000"))  # Líneas de diff en la respuesta JSON; el resto solo por NDJSON
+    DIFF_STREAM_CHUNK_LINES: int = int(os.getenv("DIFF_STREAM_CHUNK_LINES", "500"))  # Líneas por bloque NDJSON
+    DIFF_CACHE_PATH: str = os.getenv("DIFF_CACHE_PATH", "./storage/diff_cache")  # Caché compartida entre workers (vacío: solo en memoria)
+    DIFF_CACHE_MEMORY_LINES: int = int(os.getenv("DIFF_CACHE_MEMORY_LINES", "200000"))  # Líneas de diff en la caché en memoria por worker
+    DIFF_WORKERS: int = int(os.getenv("DIFF_WORKERS", "2"))  # Hilos dedicados a los diffs por worker
+    DIFF_MAX_PENDING: int = int(os.getenv("DIFF_MAX_PENDING", "8"))  # Comparaciones admitidas antes de responder 503
+    TEXT_CACHE_PATH: str = os.getenv("TEXT_CACHE_PATH", "./storage/text_cache")  # Texto extraído de PDF y DOCX por hash (vacío: extraer en cada comparación)
+    TEXT_EXTRACTION_WORKERS: int = int(os.getenv("TEXT_EXTRACTION_WORKERS", "1"))  # Hilos de extracción por worker
+    TEXT_EXTRACTION_MAX_PENDING: int = int(os.getenv("TEXT_EXTRACTION_MAX_PENDING", "16"))  # Extracciones en cola; las demás se hacen al comparar
+
+    # Configuración de limitación de tasa
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "False").lower() == "true"
+    RATE_LIMIT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))  # Unidades de costo por minuto
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", "30"))  # Ráfaga máxima en unidades de costo
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" o "postgres"
+    
+    # Notificaciones en tiempo real (WebSockets)
+    EVENT_BUS_BACKEND: str = os.getenv("EVENT_BUS_BACKEND", "memory")  # "memory" (un solo worker) o "postgres" (LISTEN/NOTIFY entre workers y hosts)
+    EVENT_BUS_CHANNEL: str = os.getenv("EVENT_BUS_CHANNEL", "hcdsys_eventos")  # Canal de NOTIFY
+    EVENT_BUS_RECONNECT_SECONDS: int = int(os.getenv("EVENT_BUS_RECONNECT_SECONDS", "5"))  # Espera antes de volver a escuchar tras perder la conexión
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))  # Mensajes pendientes por conexión antes de cerrarla por lenta
+    WS_SEND_TIMEOUT: int = int(os.getenv("WS_SEND_TIMEOUT", "10"))  # Segundos máximos para enviar un mensaje a una conexión
+    WS_HEARTBEAT_INTERVAL: int = int(os.getenv("WS_HEARTBEAT_INTERVAL", "30"))  # Segundos entre pings a los clientes
+    WS_HEARTBEAT_TIMEOUT: int = int(os.getenv("WS_HEARTBEAT_TIMEOUT", "90"))  # Silencio del cliente tras el que se cierra la conexión
+    REFERENCE_CACHE_TTL: int = int(os.getenv("REFERENCE_CACHE_TTL", "300"))  # Segundos tras los que se recargan categorías, tipos, permisos y roles aunque no haya invalidación
+    REFERENCE_CACHE_MAX_AGE: int = int(os.getenv("REFERENCE_CACHE_MAX_AGE", "60"))  # max-age de Cache-Control para esos datos en el navegador
     
     # Configuración de CORS
     CORS_ORIGINS: str = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173")
@@ -40,6 +120,11 @@ class Settings(BaseSettings):
         """Obtener la URL de conexión a la base de datos"""
         return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
     
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        """Obtener la URL de conexión asíncrona (asyncpg) a la base de datos"""
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
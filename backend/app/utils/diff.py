@@ -0,0 +1,612 @@
+"""
+Motor de comparación de versiones de documentos.
+
+- Las líneas se reemplazan por enteros (cada línea distinta se hashea una sola vez)
+  y el diff se calcula sobre esas secuencias: se recortan el prefijo y el sufijo
+  comunes, las regiones grandes se dividen con las líneas únicas en ambas
+  versiones (patience diff) y solo las regiones chicas o sin líneas únicas se
+  resuelven con difflib.
+- El cálculo tiene un presupuesto de tiempo, que se controla entre regiones: al
+  agotarse, las regiones pendientes se marcan como reemplazadas completas y el
+  resultado se informa como aproximado.
+- Los PDF y DOCX se comparan sobre su texto extraído (ver text_extraction): por
+  párrafos, con la página de cada cambio en ambas versiones y el detalle por
+  palabras de los párrafos modificados.
+- Los archivos que superan DIFF_MAX_FILE_SIZE no se comparan línea por línea.
+- Las versiones son inmutables, por lo que los resultados se guardan en caché
+  por el par de hashes de contenido: en memoria en cada worker y comprimidos en
+  disco (compartidos entre workers) en DIFF_CACHE_PATH.
+"""
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .config import settings
+from .executors import BoundedExecutor
+from .metrics import observe_storage
+from .text_extraction import Pages, can_extract, get_pages, has_text
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Cambia cuando cambia el formato del resultado, para no reutilizar entradas de caché viejas
+ENGINE_VERSION = 3
+CONTEXT_LINES = 3
+# Párrafos de contexto alrededor de cada cambio en los documentos con texto extraído
+CONTEXT_PARAGRAPHS = 1
+# Regiones con a lo sumo este producto de líneas se resuelven directamente con difflib
+SMALL_REGION = 4096
+BINARY_SNIFF_BYTES = 8192
+# Emparejamiento de párrafos modificados: similitud mínima y párrafos candidatos
+PARAGRAPH_SIMILARITY = 0.5
+PARAGRAPH_WINDOW = 20
+# Palabras, signos de puntuación y espacios, para el diff por palabras
+WORD_TOKENS = re.compile(r"\w+|[^\w\s]+|\s+")
+
+Opcode = Tuple[str, int, int, int, int]
+
+# Pool dedicado a los diffs: acota cuántas comparaciones ocupan CPU a la vez
+diff_executor = BoundedExecutor(
+    "diff",
+    max_workers=settings.DIFF_WORKERS,
+    max_pending=settings.DIFF_MAX_PENDING
+)
+
+def _intern(lines_a: Sequence[str], lines_b: Sequence[str]) -> Tuple[List[int], List[int]]:
+    """Reemplaza cada línea por un entero; líneas iguales reciben el mismo entero."""
+    table: Dict[str, int] = {}
+    a = [table.setdefault(line, len(table)) for line in lines_a]
+    b = [table.setdefault(line, len(table)) for line in lines_b]
+    return a, b
+
+def _unique_anchors(a: List[int], b: List[int], alo: int, ahi: int, blo: int, bhi: int) -> List[Tuple[int, int]]:
+    """
+    Pares (i, j) de líneas que aparecen una sola vez en cada región, reducidos a
+    la subsecuencia creciente más larga (patience sorting).
+    """
+    positions: Dict[int, List[int]] = {}
+    for i in range(alo, ahi):
+        entry = positions.get(a[i])
+        if entry is None:
+            positions[a[i]] = [i, -1, 1]
+        else:
+            entry[2] += 1
+    for j in range(blo, bhi):
+        entry = positions.get(b[j])
+        if entry is not None and entry[2] == 1:
+            # -1: todavía no apareció en b; -2: apareció más de una vez
+            entry[1] = j if entry[1] == -1 else -2
+
+    candidates = sorted((i, j) for i, j, count in positions.values() if count == 1 and j >= 0)
+    if not candidates:
+        return []
+
+    # Subsecuencia creciente más larga de las posiciones en b
+    tails: List[int] = []
+    tail_index: List[int] = []
+    previous: List[int] = [-1] * len(candidates)
+    for index, (_, j) in enumerate(candidates):
+        k = bisect_left(tails, j)
+        if k == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[k] = j
+            tail_index[k] = index
+        previous[index] = tail_index[k - 1] if k > 0 else -1
+
+    anchors = []
+    index = tail_index[-1]
+    while index != -1:
+        anchors.append(candidates[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+def diff_opcodes(a: List[int], b: List[int], deadline: Optional[float] = None) -> Tuple[List[Opcode], bool]:
+    """
+    Opcodes al estilo de difflib para las secuencias a y b.
+    Devuelve también si el resultado es aproximado por haberse agotado el tiempo.
+    """
+    matches: List[Tuple[int, int]] = []
+    approximate = False
+    regions = [(0, len(a), 0, len(b))]
+
+    while regions:
+        alo, ahi, blo, bhi = regions.pop()
+
+        # Prefijo y sufijo comunes
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matches.append((alo, blo))
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            matches.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+
+        if deadline is not None and time.monotonic() > deadline:
+            # Sin tiempo: la región queda como reemplazo completo
+            approximate = True
+            continue
+
+        if (ahi - alo) * (bhi - blo) <= SMALL_REGION:
+            anchors = []
+        else:
+            anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+
+        if not anchors:
+            # Regiones chicas o sin líneas únicas: difflib (en las grandes, con su
+            # heurística que ignora las líneas demasiado frecuentes)
+            matcher = SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=(ahi - alo) * (bhi - blo) > SMALL_REGION)
+            for i, j, size in matcher.get_matching_blocks():
+                matches.extend((alo + i + k, blo + j + k) for k in range(size))
+            continue
+
+        # Las regiones entre anclas se procesan por separado
+        previous_i, previous_j = alo, blo
+        for i, j in anchors:
+            matches.append((i, j))
+            regions.append((previous_i, i, previous_j, j))
+            previous_i, previous_j = i + 1, j + 1
+        regions.append((previous_i, ahi, previous_j, bhi))
+
+    matches.sort()
+    return _matches_to_opcodes(matches, len(a), len(b)), approximate
+
+def _matches_to_opcodes(matches: List[Tuple[int, int]], size_a: int, size_b: int) -> List[Opcode]:
+    opcodes: List[List[Any]] = []
+    i = j = 0
+    for match_i, match_j in matches:
+        if match_i > i or match_j > j:
+            tag = "replace" if match_i > i and match_j > j else ("delete" if match_i > i else "insert")
+            opcodes.append([tag, i, match_i, j, match_j])
+        if opcodes and opcodes[-1][0] == "equal" and opcodes[-1][2] == match_i and opcodes[-1][4] == match_j:
+            opcodes[-1][2] += 1
+            opcodes[-1][4] += 1
+        else:
+            opcodes.append(["equal", match_i, match_i + 1, match_j, match_j + 1])
+        i, j = match_i + 1, match_j + 1
+    if i < size_a or j < size_b:
+        tag = "replace" if i < size_a and j < size_b else ("delete" if i < size_a else "insert")
+        opcodes.append([tag, i, size_a, j, size_b])
+    return [tuple(opcode) for opcode in opcodes]
+
+def group_opcodes(opcodes: List[Opcode], context: int = CONTEXT_LINES) -> Iterator[List[Opcode]]:
+    """Agrupa los opcodes en hunks con `context` líneas de contexto (como difflib)."""
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        # Los bloques iguales largos separan hunks
+        if tag == "equal" and i2 - i1 > context * 2:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+def _format_range(start: int, stop: int) -> str:
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+def unified_diff(
+    lines_a: Sequence[str],
+    lines_b: Sequence[str],
+    fromfile: str,
+    tofile: str,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Diff unificado (mismo formato que difflib.unified_diff con lineterm="")
+    con el conteo de líneas agregadas y eliminadas.
+    """
+    a, b = _intern(lines_a, lines_b)
+    opcodes, approximate = diff_opcodes(a, b, deadline)
+
+    diff: List[str] = []
+    added = removed = 0
+    for group in group_opcodes(opcodes):
+        if not diff:
+            diff.append(f"--- {fromfile}")
+            diff.append(f"+++ {tofile}")
+        first, last = group[0], group[-1]
+        diff.append(f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                diff.extend(" " + line for line in lines_a[i1:i2])
+                continue
+            if tag in ("replace", "delete"):
+                diff.extend("-" + line for line in lines_a[i1:i2])
+                removed += i2 - i1
+            if tag in ("replace", "insert"):
+                diff.extend("+" + line for line in lines_b[j1:j2])
+                added += j2 - j1
+
+    return {
+        "diff": diff,
+        "added_lines": added,
+        "removed_lines": removed,
+        "is_binary": False,
+        "is_approximate": approximate,
+        "is_too_large": False,
+        "is_text_extracted": False,
+    }
+
+def word_diff(text_a: str, text_b: str, deadline: Optional[float] = None) -> List[List[str]]:
+    """Segmentos [operación, texto] ("=", "-" o "+") que transforman text_a en text_b."""
+    tokens_a = WORD_TOKENS.findall(text_a)
+    tokens_b = WORD_TOKENS.findall(text_b)
+    a, b = _intern(tokens_a, tokens_b)
+    opcodes, _ = diff_opcodes(a, b, deadline)
+
+    segments: List[List[str]] = []
+
+    def add(operation: str, tokens: List[str]) -> None:
+        text = "".join(tokens)
+        if not text:
+            return
+        if segments and segments[-1][0] == operation:
+            segments[-1][1] += text
+        else:
+            segments.append([operation, text])
+
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            add("=", tokens_a[i1:i2])
+            continue
+        add("-", tokens_a[i1:i2])
+        add("+", tokens_b[j1:j2])
+    return segments
+
+def _page(paragraphs: List[Tuple[int, str]], index: int) -> int:
+    """Página del párrafo index (o de la posición donde se insertaría)."""
+    if index < len(paragraphs):
+        return paragraphs[index][0]
+    return paragraphs[-1][0] if paragraphs else 1
+
+def _insertion_page(paragraphs: List[Tuple[int, str]], index: int) -> int:
+    """Página donde se inserta contenido antes del párrafo index (la del párrafo anterior)."""
+    return paragraphs[index - 1][0] if index > 0 and paragraphs else 1
+
+def _pair_paragraphs(
+    texts_a: List[str],
+    texts_b: List[str],
+    i1: int,
+    i2: int,
+    j1: int,
+    j2: int,
+    deadline: Optional[float] = None,
+) -> List[Tuple[Optional[int], Optional[int]]]:
+    """
+    Empareja en orden los párrafos de un bloque reemplazado con el párrafo nuevo
+    más parecido (al menos PARAGRAPH_SIMILARITY de palabras en común, buscando en
+    los PARAGRAPH_WINDOW siguientes). Los que no tienen pareja quedan como
+    eliminados (None en b) o agregados (None en a), igual que todos una vez
+    agotado el presupuesto de tiempo.
+    """
+    pairs: List[Tuple[Optional[int], Optional[int]]] = []
+    tokens_b: Dict[int, List[str]] = {}
+    next_j = j1
+    for i in range(i1, i2):
+        if deadline is not None and time.monotonic() > deadline:
+            pairs.append((i, None))
+            continue
+        tokens_a = WORD_TOKENS.findall(texts_a[i])
+        best, best_ratio = None, PARAGRAPH_SIMILARITY
+        for j in range(next_j, min(j2, next_j + PARAGRAPH_WINDOW)):
+            if j not in tokens_b:
+                tokens_b[j] = WORD_TOKENS.findall(texts_b[j])
+            ratio = SequenceMatcher(None, tokens_a, tokens_b[j], autojunk=False).ratio()
+            if ratio > best_ratio:
+                best, best_ratio = j, ratio
+        if best is None:
+            pairs.append((i, None))
+            continue
+        pairs.extend((None, j) for j in range(next_j, best))
+        pairs.append((i, best))
+        next_j = best + 1
+    pairs.extend((None, j) for j in range(next_j, j2))
+    return pairs
+
+def document_diff(
+    pages_a: Pages,
+    pages_b: Pages,
+    fromfile: str,
+    tofile: str,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Diff por párrafos del texto extraído de dos documentos.
+
+    `diff` conserva el formato unificado (un párrafo por línea) y cada hunk indica
+    la página en la que empieza en cada versión. `changes` detalla cada cambio con
+    sus páginas: párrafos agregados, eliminados y modificados (con el diff por palabras).
+    """
+    paragraphs_a = [(number, text) for number, page in enumerate(pages_a, start=1) for text in page]
+    paragraphs_b = [(number, text) for number, page in enumerate(pages_b, start=1) for text in page]
+    texts_a = [text for _, text in paragraphs_a]
+    texts_b = [text for _, text in paragraphs_b]
+    a, b = _intern(texts_a, texts_b)
+    opcodes, approximate = diff_opcodes(a, b, deadline)
+
+    diff: List[str] = []
+    changes: List[Dict[str, Any]] = []
+    added = removed = 0
+    for group in group_opcodes(opcodes, CONTEXT_PARAGRAPHS):
+        if not diff:
+            diff.append(f"--- {fromfile}")
+            diff.append(f"+++ {tofile}")
+        first, last = group[0], group[-1]
+        diff.append(
+            f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@ "
+            f"página {_page(paragraphs_a, first[1])} / página {_page(paragraphs_b, first[3])}"
+        )
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                diff.extend(" " + text for text in texts_a[i1:i2])
+                continue
+            diff.extend("-" + text for text in texts_a[i1:i2])
+            diff.extend("+" + text for text in texts_b[j1:j2])
+            removed += i2 - i1
+            added += j2 - j1
+
+            # Posición en cada versión, para ubicar los párrafos agregados y eliminados
+            cursor_a, cursor_b = i1, j1
+            for index_a, index_b in _pair_paragraphs(texts_a, texts_b, i1, i2, j1, j2, deadline):
+                if index_a is not None and index_b is not None:
+                    changes.append({
+                        "tipo": "modificado",
+                        "pagina1": paragraphs_a[index_a][0],
+                        "pagina2": paragraphs_b[index_b][0],
+                        "palabras": word_diff(texts_a[index_a], texts_b[index_b], deadline),
+                    })
+                elif index_a is not None:
+                    changes.append({
+                        "tipo": "eliminado",
+                        "pagina1": paragraphs_a[index_a][0],
+                        "pagina2": _insertion_page(paragraphs_b, cursor_b),
+                        "texto": texts_a[index_a],
+                    })
+                else:
+                    changes.append({
+                        "tipo": "agregado",
+                        "pagina1": _insertion_page(paragraphs_a, cursor_a),
+                        "pagina2": paragraphs_b[index_b][0],
+                        "texto": texts_b[index_b],
+                    })
+                cursor_a = index_a + 1 if index_a is not None else cursor_a
+                cursor_b = index_b + 1 if index_b is not None else cursor_b
+
+    return {
+        "diff": diff,
+        "changes": changes,
+        "added_lines": added,
+        "removed_lines": removed,
+        "is_binary": False,
+        "is_approximate": approximate,
+        "is_too_large": False,
+        "is_text_extracted": True,
+    }
+
+def _read_lines(path: str) -> Optional[List[str]]:
+    """Líneas del archivo como texto, o None si el archivo es binario."""
+    with open(path, "rb") as file:
+        content = file.read()
+    if b"\0" in content[:BINARY_SNIFF_BYTES]:
+        return None
+    try:
+        return content.decode("utf-8").splitlines(keepends=True)
+    except UnicodeDecodeError:
+        return None
+
+class DiffCache:
+    """
+    Caché de resultados de comparación por par de hashes de contenido.
+
+    En memoria se conservan los resultados más recientes hasta max_lines líneas
+    de diff en total; en disco (si path no está vacío) cada resultado se guarda
+    como JSON comprimido y lo comparten todos los workers.
+    """
+
+    def __init__(self, path: str, max_lines: int):
+        self.path = path
+        self.max_lines = max_lines
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lines = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(hash1: str, hash2: str) -> str:
+        return f"{hash1}-{hash2}-v{ENGINE_VERSION}"
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json.gz")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                return result
+        if not self.path:
+            return None
+        try:
+            with gzip.open(self._file(key), "rt", encoding="utf-8") as cached:
+                result = json.load(cached)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Entrada de caché de diff ilegible {key}: {str(e)}")
+            return None
+        self._remember(key, result)
+        return result
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        self._remember(key, result)
+        if not self.path:
+            return
+        path = self._file(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Escritura atómica: otro worker puede estar leyendo la misma entrada
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(temporary, "wt", encoding="utf-8", compresslevel=3) as cached:
+                json.dump(result, cached, ensure_ascii=False)
+            os.replace(temporary, path)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el diff {key} en caché: {str(e)}")
+
+    @staticmethod
+    def _size(result: Dict[str, Any]) -> int:
+        return len(result.get("diff") or []) + len(result.get("changes") or []) + 1
+
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        size = self._size(result)
+        if size > self.max_lines:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = result
+            self._lines += size
+            while self._lines > self.max_lines:
+                _, evicted = self._entries.popitem(last=False)
+                self._lines -= self._size(evicted)
+
+    def clear(self) -> None:
+        """Vacía la caché en memoria (la de disco se conserva)."""
+        with self._lock:
+            self._entries.clear()
+            self._lines = 0
+
+diff_cache = DiffCache(settings.DIFF_CACHE_PATH, settings.DIFF_CACHE_MEMORY_LINES)
+
+def compare_files(
+    path1: str,
+    path2: str,
+    hash1: Optional[str],
+    hash2: Optional[str],
+    fromfile: str,
+    tofile: str,
+) -> Dict[str, Any]:
+    """
+    Compara dos archivos respetando los presupuestos de tamaño y tiempo.
+    Si se conocen los hashes de ambos, el resultado se toma de la caché o se guarda
+    en ella (salvo los aproximados, por agotarse el presupuesto de tiempo). La caché
+    guarda el diff sin las líneas ---/+++: otro par con el mismo contenido (por
+    ejemplo, una versión restaurada) recibe sus propios nombres.
+    """
+    key = DiffCache.key(hash1, hash2) if hash1 and hash2 else None
+    if key:
+        cached = diff_cache.get(key)
+        if cached is not None:
+            return _with_labels(cached, fromfile, tofile)
+
+    if max(os.path.getsize(path1), os.path.getsize(path2)) > settings.DIFF_MAX_FILE_SIZE:
+        result = {
+            "diff": [],
+            "added_lines": 0,
+            "removed_lines": 0,
+            "is_binary": False,
+            "is_approximate": False,
+            "is_too_large": True,
+            "is_text_extracted": False,
+        }
+    else:
+        deadline = time.monotonic() + settings.DIFF_TIME_BUDGET_MS / 1000 if settings.DIFF_TIME_BUDGET_MS > 0 else None
+        extension1 = os.path.splitext(path1)[1].lower()
+        extension2 = os.path.splitext(path2)[1].lower()
+        if can_extract(extension1) and can_extract(extension2):
+            # PDF y DOCX: el texto suele estar ya extraído desde que se creó la versión
+            pages1 = get_pages(path1, hash1, extension1)
+            pages2 = get_pages(path2, hash2, extension2) if pages1 is not None else None
+            lines1 = lines2 = None
+            # Sin texto (PDF escaneados) no se puede afirmar que no haya cambios: solo
+            # se comparan por metadatos, salvo que el contenido sea el mismo
+            if (
+                pages1 is not None and pages2 is not None
+                and not (has_text(pages1) and has_text(pages2))
+                and not (hash1 and hash1 == hash2)
+            ):
+                pages1 = pages2 = None
+        else:
+            pages1 = pages2 = None
+            lines1 = _read_lines(path1)
+            lines2 = _read_lines(path2) if lines1 is not None else None
+
+        if pages1 is not None and pages2 is not None:
+            with observe_storage("diff"):
+                result = document_diff(pages1, pages2, fromfile, tofile, deadline)
+        elif lines1 is not None and lines2 is not None:
+            with observe_storage("diff"):
+                result = unified_diff(lines1, lines2, fromfile, tofile, deadline)
+        else:
+            result = {
+                "diff": None,
+                "added_lines": 0,
+                "removed_lines": 0,
+                "is_binary": True,
+                "is_approximate": False,
+                "is_too_large": False,
+                "is_text_extracted": False,
+            }
+        if result["is_approximate"]:
+            logger.warning(f"Diff aproximado entre {path1} y {path2}: se agotó el presupuesto de tiempo")
+
+    # Un diff aproximado depende de la carga del momento: no se guarda para que la
+    # próxima comparación del par lo calcule completo
+    if key and not result["is_approximate"]:
+        diff_cache.put(key, {**result, "diff": result["diff"][2:] if result["diff"] else result["diff"]})
+    return result
+
+def _with_labels(result: Dict[str, Any], fromfile: str, tofile: str) -> Dict[str, Any]:
+    """Resultado de la caché con el encabezado ---/+++ de los archivos comparados."""
+    if not result["diff"]:
+        return result
+    return {**result, "diff": [f"--- {fromfile}", f"+++ {tofile}", *result["diff"]]}
+
+def ndjson_chunks(
+    summary: Dict[str, Any],
+    diff: Optional[List[str]],
+    chunk_lines: int,
+    changes: Optional[List[Dict[str, Any]]] = None,
+) -> Iterator[bytes]:
+    """
+    Serializa una comparación como NDJSON: primero el resumen
+    ({"type": "summary", ...}), luego el diff en bloques de chunk_lines líneas
+    ({"type": "diff", "lines": [...]}) y, si hay texto extraído, los cambios por
+    párrafo en bloques del mismo tamaño ({"type": "changes", "items": [...]}).
+    """
+    header = {"type": "summary", **summary, "total_lines": len(diff or []), "total_changes": len(changes or [])}
+    yield (json.dumps(header, ensure_ascii=False) + "\n").encode("utf-8")
+    for start in range(0, len(diff or []), chunk_lines):
+        chunk = {"type": "diff", "lines": diff[start:start + chunk_lines]}
+        yield (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
+    for start in range(0, len(changes or []), chunk_lines):
+        chunk = {"type": "changes", "items": changes[start:start + chunk_lines]}
+        yield (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
@@ -0,0 +1,119 @@
+"""
+Eventos de cambios en documentos para el WebSocket /api/ws/documents.
+
+Cada cambio se publica una vez en el tema "documentos" del bus después de
+confirmarse; cada worker lo entrega a sus conexiones cuyo filtro (categorías,
+expedientes o documentos suscritos) lo acepta y cuyo usuario puede ver el
+documento con la misma regla que la búsqueda (propios, o de los tipos visibles
+para su nivel de acceso). Los eventos llevan identificadores y metadatos básicos: el cliente
+consulta el documento o su lista si necesita el resto, en lugar de sondear la
+búsqueda periódicamente.
+"""
+import logging
+from datetime import datetime
+from typing import Callable, FrozenSet, Iterable, Optional, Set
+
+from ..db import models
+from ..db.database import SessionLocal
+from .event_bus import DOCUMENTS_TOPIC, event_bus
+from .reference_data import visible_document_types
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Tipos de evento
+DOCUMENT_CREATED = "creado"
+VERSION_ADDED = "version_agregada"
+VERSION_RESTORED = "version_restaurada"
+METADATA_EDITED = "metadatos_editados"
+INTEGRITY_FAILED = "integridad_fallida"
+
+def document_event(tipo: str, documento: models.Documento, actor_id: Optional[int] = None, **extra) -> dict:
+    """Mensaje del evento con los datos necesarios para filtrarlo y mostrarlo."""
+    return {
+        "action": "document_event",
+        "tipo": tipo,
+        "documento_id": documento.id,
+        "titulo": documento.titulo,
+        "numero_expediente": documento.numero_expediente,
+        "categoria_id": documento.categoria_id,
+        "tipo_documento_id": documento.tipo_documento_id,
+        "usuario_id": documento.usuario_id,
+        "activo": documento.activo,
+        "actor_id": actor_id,
+        "fecha": datetime.utcnow().isoformat(),
+        **extra
+    }
+
+async def publish_document_event(tipo: str, documento: models.Documento, actor_id: Optional[int] = None, **extra) -> None:
+    """Publica el evento; si el bus falla, la operación ya confirmada no se ve afectada."""
+    try:
+        await event_bus.publish(DOCUMENTS_TOPIC, document_event(tipo, documento, actor_id, **extra))
+    except Exception as e:
+        logger.warning(f"No se pudo publicar el evento {tipo} del documento {documento.id}: {str(e)}")
+
+def _visible_types(niveles: FrozenSet[str]) -> Optional[FrozenSet[int]]:
+    # La sesión solo se conecta si hay que recargar los tipos de la caché
+    with SessionLocal() as db:
+        return visible_document_types(db, niveles)
+
+class DocumentSubscription:
+    """
+    Filtro de una conexión de /ws/documents: documentos, categorías y expedientes
+    suscritos (o todos), limitado a los documentos que el usuario puede ver.
+    """
+
+    def __init__(
+        self,
+        user_id: int,
+        niveles: Optional[FrozenSet[str]],
+        visible_types: Callable[[FrozenSet[str]], Optional[FrozenSet[int]]] = _visible_types
+    ):
+        self.user_id = user_id
+        # Niveles de acceso visibles (PUBLIC_LEVELS o RESTRICTED_LEVELS, como en la
+        # búsqueda); None con docs:view, que permite ver todos los documentos
+        self.niveles = niveles
+        self.visible_types = visible_types
+        self.todos = False
+        self.documentos: Set[int] = set()
+        self.categorias: Set[int] = set()
+        self.expedientes: Set[str] = set()
+
+    def update(self, filtros: dict, subscribe: bool = True) -> None:
+        """
+        Agrega (o quita, con subscribe=False) los filtros de un mensaje del cliente:
+        {"todos": true, "documentos": [1], "categorias": [2], "expedientes": ["EXP-2025-00001"]}
+        """
+        if "todos" in filtros:
+            self.todos = bool(filtros["todos"]) and subscribe
+        for attribute, cast in (("documentos", int), ("categorias", int), ("expedientes", str)):
+            values: Iterable = filtros.get(attribute) or []
+            if isinstance(values, (str, int)):
+                values = [values]
+            target: set = getattr(self, attribute)
+            for value in values:
+                (target.add if subscribe else target.discard)(cast(value))
+
+    def describe(self) -> dict:
+        return {
+            "todos": self.todos,
+            "documentos": sorted(self.documentos),
+            "categorias": sorted(self.categorias),
+            "expedientes": sorted(self.expedientes),
+        }
+
+    def can_view(self, event: dict) -> bool:
+        if self.niveles is None or event.get("usuario_id") == self.user_id:
+            return True
+        visibles = self.visible_types(self.niveles)
+        return visibles is None or event.get("tipo_documento_id") in visibles
+
+    def accepts(self, event: dict) -> bool:
+        if not self.can_view(event):
+            return False
+        return (
+            self.todos
+            or event.get("documento_id") in self.documentos
+            or event.get("categoria_id") in self.categorias
+            or event.get("numero_expediente") in self.expedientes
+        )
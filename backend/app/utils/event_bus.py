@@ -0,0 +1,156 @@
+"""
+Bus de eventos entre workers para las notificaciones en tiempo real.
+
+Cada worker mantiene sus propios WebSockets: los eventos se publican en el bus y
+cada worker los reenvía a sus conexiones locales suscritas al tema. Con
+EVENT_BUS_BACKEND="postgres" el bus usa LISTEN/NOTIFY sobre una conexión asyncpg
+dedicada, por lo que llega a todos los workers y hosts que comparten la base;
+con "memory" (un único worker, pruebas) los eventos no salen del proceso.
+
+Los temas identifican a los destinatarios: rol:<id>, usuario:<id>,
+documento:<id>, documentos y todos. NOTIFY admite cargas de hasta 8000 bytes,
+así que los mensajes deben llevar identificadores y metadatos, no contenidos. Los eventos
+publicados mientras un worker se reconecta a Postgres se pierden para ese
+worker; los clientes deben refrescar su estado al reconectarse.
+"""
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+import asyncpg
+from sqlalchemy import text
+
+from .config import settings
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Manejador de eventos: recibe el tema y el mensaje
+Handler = Callable[[str, dict], Awaitable[None]]
+
+# Tema que reciben todas las conexiones
+BROADCAST_TOPIC = "todos"
+# Cambios en documentos; cada conexión de /ws/documents los filtra (ver app/utils/document_events.py)
+DOCUMENTS_TOPIC = "documentos"
+# Límite de NOTIFY (8000 bytes) menos el margen del sobre {"topic": ..., "message": ...}
+MAX_PAYLOAD_BYTES = 7900
+
+def role_topic(role_id: int) -> str:
+    return f"rol:{role_id}"
+
+def user_topic(user_id: int) -> str:
+    return f"usuario:{user_id}"
+
+def document_topic(documento_id: int) -> str:
+    return f"documento:{documento_id}"
+
+class MemoryEventBus:
+    """Bus local al proceso: entrega cada evento a los manejadores suscritos."""
+
+    def __init__(self):
+        self._handlers: List[Handler] = []
+
+    def subscribe(self, handler: Handler) -> None:
+        self._handlers.append(handler)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, topic: str, message: dict) -> None:
+        await self._deliver(topic, message)
+
+    async def _deliver(self, topic: str, message: dict) -> None:
+        for handler in list(self._handlers):
+            try:
+                await handler(topic, message)
+            except Exception as e:
+                logger.error(f"Error al entregar el evento {topic}: {str(e)}")
+
+class PostgresEventBus(MemoryEventBus):
+    """
+    Bus compartido sobre LISTEN/NOTIFY. Los eventos se publican con pg_notify por
+    el pool asíncrono de la aplicación y se reciben por una conexión dedicada que
+    se restablece si se pierde. El worker que publica también recibe su propio
+    NOTIFY, de modo que todos los workers entregan por el mismo camino.
+    """
+
+    def __init__(self, dsn: str, channel: str, reconnect_delay: float = 5.0, bind=None):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._bind = bind
+        self._task: Optional[asyncio.Task] = None
+        self._connection: Optional[asyncpg.Connection] = None
+
+    @property
+    def bind(self):
+        if self._bind is None:
+            from ..db.database import async_engine
+            self._bind = async_engine
+        return self._bind
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish(self, topic: str, message: dict) -> None:
+        payload = json.dumps({"topic": topic, "message": message}, separators=(",", ":"), default=str)
+        if len(payload.encode("utf-8")) > MAX_PAYLOAD_BYTES:
+            raise ValueError(f"Evento {topic} demasiado grande para NOTIFY ({len(payload)} bytes)")
+        async with self.bind.begin() as conn:
+            await conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                self._connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.Event()
+                self._connection.add_termination_listener(lambda connection: closed.set())
+                await self._connection.add_listener(self.channel, self._on_notification)
+                logger.info(f"Escuchando eventos en el canal {self.channel}")
+                await closed.wait()
+                logger.warning(f"Conexión del bus de eventos perdida; reconectando en {self.reconnect_delay}s")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"No se pudo escuchar el canal {self.channel}: {str(e)}")
+            finally:
+                if self._connection is not None and not self._connection.is_closed():
+                    await self._connection.close()
+                self._connection = None
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Evento ilegible en el canal {channel}")
+            return
+        asyncio.ensure_future(self._deliver(event["topic"], event["message"]))
+
+def create_event_bus():
+    """Crea el bus configurado en EVENT_BUS_BACKEND."""
+    if settings.EVENT_BUS_BACKEND == "postgres":
+        return PostgresEventBus(
+            settings.DATABASE_URL,
+            settings.EVENT_BUS_CHANNEL,
+            reconnect_delay=settings.EVENT_BUS_RECONNECT_SECONDS
+        )
+    return MemoryEventBus()
+
+# Instancia del bus de eventos del worker
+event_bus = create_event_bus()
@@ -0,0 +1,73 @@
+"""
+Pools de trabajo acotados para ejecutar tareas bloqueantes fuera del event loop.
+"""
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+class ExecutorSaturatedError(Exception):
+    """Se lanza cuando el pool ya tiene el máximo de tareas pendientes admitidas."""
+
+class BoundedExecutor:
+    """
+    Pool de hilos con control de admisión.
+
+    Como máximo max_workers tareas se ejecutan a la vez y max_pending tareas
+    (en ejecución o en cola) son admitidas; las siguientes se rechazan de inmediato
+    con ExecutorSaturatedError en lugar de acumularse sin límite.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Cantidad de tareas admitidas que todavía no terminaron."""
+        return self._pending
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ExecutorSaturatedError(
+                    f"El pool '{self.name}' alcanzó el máximo de {self.max_pending} tareas pendientes"
+                )
+            self._pending += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Ejecuta func en el pool y espera su resultado sin bloquear el event loop."""
+        self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        finally:
+            self._release()
+
+    def submit(self, func: Callable[..., Any], *args: Any, **kwargs: Any):
+        """Encola func en el pool desde código síncrono y devuelve el Future."""
+        self._acquire()
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Detiene el pool."""
+        self._executor.shutdown(wait=wait)
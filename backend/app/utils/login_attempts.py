@@ -0,0 +1,257 @@
+"""
+Módulo para el control de intentos de login.
+
+Mantiene un contador de intentos fallidos por IP con ventana deslizante (en memoria
+por worker u opcionalmente compartido a través de la tabla contador_intentos_login)
+y acumula los registros de IntentosLogin para persistirlos en lotes.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..db import models
+from ..db.database import SessionLocal
+from .config import settings
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+class SlidingWindowCounter:
+    """
+    Contador de eventos por clave con ventana deslizante aproximada.
+
+    La ventana se divide en un número fijo de sub-ventanas (buckets), de modo que
+    registrar y consultar un evento cuesta O(buckets), independiente de la cantidad
+    de eventos. Las claves menos usadas se descartan al superar max_keys.
+    """
+
+    def __init__(self, window_seconds: float, buckets: int = 10, max_keys: int = 100_000):
+        self.window_seconds = window_seconds
+        self.buckets = buckets
+        self.bucket_seconds = window_seconds / buckets
+        self.max_keys = max_keys
+        # {clave: [conteos por bucket, índice absoluto de cada bucket, total]}
+        self._data: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, entry: List[Any], current_index: int) -> None:
+        counts, indexes = entry[0], entry[1]
+        for slot in range(self.buckets):
+            if indexes[slot] != -1 and indexes[slot] <= current_index - self.buckets:
+                entry[2] -= counts[slot]
+                counts[slot] = 0
+                indexes[slot] = -1
+
+    def add(self, key: str, now: Optional[float] = None, amount: int = 1) -> int:
+        """Registra un evento para la clave y devuelve el total dentro de la ventana."""
+        now = time.time() if now is None else now
+        current_index = int(now // self.bucket_seconds)
+        slot = current_index % self.buckets
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                entry = [[0] * self.buckets, [-1] * self.buckets, 0]
+                self._data[key] = entry
+                if len(self._data) > self.max_keys:
+                    self._data.popitem(last=False)
+            else:
+                self._data.move_to_end(key)
+
+            self._expire(entry, current_index)
+            if entry[1][slot] != current_index:
+                entry[2] -= entry[0][slot]
+                entry[0][slot] = 0
+                entry[1][slot] = current_index
+            entry[0][slot] += amount
+            entry[2] += amount
+            return entry[2]
+
+    def count(self, key: str, now: Optional[float] = None) -> int:
+        """Devuelve la cantidad de eventos de la clave dentro de la ventana."""
+        now = time.time() if now is None else now
+        current_index = int(now // self.bucket_seconds)
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return 0
+            self._expire(entry, current_index)
+            if entry[2] <= 0:
+                del self._data[key]
+                return 0
+            return entry[2]
+
+    def reset(self, key: str) -> None:
+        """Elimina el contador de una clave."""
+        with self._lock:
+            self._data.pop(key, None)
+
+class LoginAttemptBuffer:
+    """
+    Acumula registros de IntentosLogin y los inserta en lotes desde la tarea de
+    fondo, que los vacía periódicamente o en cuanto el buffer alcanza max_size.
+    add nunca accede a la base: se llama desde el event loop.
+    """
+
+    def __init__(self, max_size: int = 50):
+        self.max_size = max_size
+        self._rows: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._full = asyncio.Event()
+        # Loop de la tarea de fondo, para avisarle desde cualquier hilo
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, row: Dict[str, Any]) -> None:
+        """Agrega un intento al buffer y avisa a la tarea de fondo si alcanzó el tamaño máximo."""
+        row.setdefault("fecha", datetime.utcnow())
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.max_size
+        if full and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._full.set)
+
+    async def wait(self, timeout: float) -> None:
+        """Espera a que el buffer se llene o a que pasen timeout segundos."""
+        self._loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(self._full.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._full.clear()
+
+    def flush(self) -> int:
+        """Inserta en la base de datos todos los intentos pendientes. Devuelve la cantidad insertada."""
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return 0
+
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(models.IntentosLogin, rows)
+            db.commit()
+            return len(rows)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error al persistir intentos de login: {str(e)}")
+            # Devolver los registros al buffer para reintentar en el próximo ciclo
+            with self._lock:
+                self._rows = rows + self._rows
+            return 0
+        finally:
+            db.close()
+
+class LoginFailureTracker:
+    """
+    Lleva la cuenta de intentos fallidos por IP dentro de la ventana configurada.
+
+    Con el backend "memory" el conteo es local a cada worker. Con el backend "db"
+    se comparte entre workers mediante la tabla contador_intentos_login, cuyo
+    índice por (ip_address, ventana_inicio) hace que la consulta lea como máximo
+    una fila por sub-ventana.
+    """
+
+    def __init__(self, window_minutes: int, backend: str = "memory", buckets: int = 10):
+        self.window_seconds = window_minutes * 60
+        self.backend = backend
+        self.buckets = buckets
+        self.bucket_seconds = self.window_seconds / buckets
+        self.counter = SlidingWindowCounter(self.window_seconds, buckets=buckets)
+
+    def _bucket_start(self, now: datetime) -> datetime:
+        seconds = (now - _EPOCH).total_seconds()
+        return _EPOCH + timedelta(seconds=seconds - (seconds % self.bucket_seconds))
+
+    def register_failure(self, ip_address: str, db: Optional[Session] = None) -> None:
+        """Registra un intento fallido para la IP."""
+        self.counter.add(ip_address)
+
+        if self.backend != "db" or db is None:
+            return
+
+        ventana_inicio = self._bucket_start(datetime.utcnow())
+        stmt = pg_insert(models.ContadorIntentosLogin).values(
+            ip_address=ip_address,
+            ventana_inicio=ventana_inicio,
+            fallidos=1
+        ).on_conflict_do_update(
+            index_elements=["ip_address", "ventana_inicio"],
+            set_={"fallidos": models.ContadorIntentosLogin.fallidos + 1}
+        )
+        try:
+            db.execute(stmt)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error al actualizar contador compartido de intentos: {str(e)}")
+
+    def count_failures(self, ip_address: str, db: Optional[Session] = None) -> int:
+        """Devuelve los intentos fallidos de la IP dentro de la ventana."""
+        if self.backend != "db" or db is None:
+            return self.counter.count(ip_address)
+
+        desde = datetime.utcnow() - timedelta(seconds=self.window_seconds)
+        try:
+            total = db.query(func.coalesce(func.sum(models.ContadorIntentosLogin.fallidos), 0)).filter(
+                models.ContadorIntentosLogin.ip_address == ip_address,
+                models.ContadorIntentosLogin.ventana_inicio > self._bucket_start(desde)
+            ).scalar()
+            return int(total or 0)
+        except Exception as e:
+            logger.error(f"Error al consultar contador compartido de intentos: {str(e)}")
+            return self.counter.count(ip_address)
+
+    def purge_expired(self, db: Session) -> int:
+        """Elimina las sub-ventanas del contador compartido que ya salieron de la ventana."""
+        if self.backend != "db":
+            return 0
+        limite = datetime.utcnow() - timedelta(seconds=self.window_seconds + self.bucket_seconds)
+        eliminados = db.query(models.ContadorIntentosLogin).filter(
+            models.ContadorIntentosLogin.ventana_inicio < limite
+        ).delete(synchronize_session=False)
+        db.commit()
+        return eliminados
+
+# Instancias globales por worker
+login_tracker = LoginFailureTracker(
+    window_minutes=settings.LOGIN_FAILURE_WINDOW_MINUTES,
+    backend=settings.LOGIN_COUNTER_BACKEND
+)
+login_attempt_buffer = LoginAttemptBuffer(max_size=settings.LOGIN_ATTEMPTS_FLUSH_SIZE)
+
+def record_login_attempt(
+    email: str,
+    ip_address: str,
+    user_agent: Optional[str],
+    exitoso: bool,
+    db: Session,
+    motivo_fallo: Optional[str] = None
+) -> None:
+    """
+    Registra un intento de login: actualiza el contador de fallos y encola la fila
+    de IntentosLogin para su persistencia en lote.
+    """
+    if not exitoso:
+        login_tracker.register_failure(ip_address, db)
+
+    login_attempt_buffer.add({
+        "email": email,
+        "ip_address": ip_address,
+        "user_agent": user_agent,
+        "exitoso": exitoso,
+        "motivo_fallo": motivo_fallo
+    })
@@ -0,0 +1,183 @@
+"""
+Métricas de la API en formato Prometheus.
+
+Con gunicorn cada worker escribe sus métricas en archivos dentro de
+PROMETHEUS_MULTIPROC_DIR (lo configura gunicorn_config.py) y /api/metrics las
+agrega leyendo los archivos de todos los workers, de modo que la respuesta es la
+misma sin importar qué worker atiende la solicitud. Sin esa variable se usa el
+registro en memoria del proceso (desarrollo y pruebas).
+
+El rendimiento de cargas y descargas se obtiene en Prometheus como
+rate(hcdsys_document_transfer_bytes_total[5m]).
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator
+
+from fastapi import Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+from starlette.middleware.base import BaseHTTPMiddleware
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# Solicitudes HTTP
+REQUEST_LATENCY = Histogram(
+    "hcdsys_http_request_duration_seconds",
+    "Latencia de las solicitudes HTTP por plantilla de ruta",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "hcdsys_http_requests_in_flight",
+    "Solicitudes HTTP en curso",
+    multiprocess_mode="livesum"
+)
+
+# Transferencia de documentos
+TRANSFER_BYTES = Counter(
+    "hcdsys_document_transfer_bytes_total",
+    "Bytes de documentos cargados (upload) y descargados (download)",
+    ["direction"]
+)
+TRANSFER_SIZE = Histogram(
+    "hcdsys_document_transfer_size_bytes",
+    "Tamaño de cada archivo cargado o descargado",
+    ["direction"],
+    buckets=(10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000)
+)
+
+# Operaciones de StorageService
+STORAGE_LATENCY = Histogram(
+    "hcdsys_storage_operation_duration_seconds",
+    "Latencia de las operaciones de almacenamiento (save, hash, copy, verify)",
+    ["operation"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+# Pools de conexiones
+DB_POOL_WAIT = Histogram(
+    "hcdsys_db_pool_wait_seconds",
+    "Espera por una conexión del pool",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+)
+DB_POOL_TIMEOUTS = Counter(
+    "hcdsys_db_pool_timeouts_total",
+    "Solicitudes de conexión que agotaron DB_POOL_TIMEOUT",
+    ["pool"]
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "hcdsys_db_pool_checked_out",
+    "Conexiones en uso (suma de los workers activos)",
+    ["pool"],
+    multiprocess_mode="livesum"
+)
+DB_POOL_OPEN = Gauge(
+    "hcdsys_db_pool_open_connections",
+    "Conexiones abiertas en el pool, incluido el overflow (suma de los workers activos)",
+    ["pool"],
+    multiprocess_mode="livesum"
+)
+DB_POOL_WAITING = Gauge(
+    "hcdsys_db_pool_waiting",
+    "Solicitudes esperando una conexión (suma de los workers activos)",
+    ["pool"],
+    multiprocess_mode="livesum"
+)
+
+# Tareas en segundo plano y WebSockets
+TASK_DURATION = Histogram(
+    "hcdsys_background_task_duration_seconds",
+    "Duración de las tareas en segundo plano",
+    ["task", "outcome"],
+    buckets=(0.01, 0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "hcdsys_websocket_connections",
+    "Conexiones WebSocket abiertas",
+    multiprocess_mode="livesum"
+)
+WEBSOCKET_DROPPED = Counter(
+    "hcdsys_websocket_dropped_connections_total",
+    "Conexiones WebSocket cerradas por el servidor (lento, sin_respuesta, error)",
+    ["reason"]
+)
+
+def record_transfer(direction: str, size: int) -> None:
+    """Registra la carga ("upload") o descarga ("download") de un archivo de `size` bytes."""
+    if size is None or size < 0:
+        return
+    TRANSFER_BYTES.labels(direction).inc(size)
+    TRANSFER_SIZE.labels(direction).observe(size)
+
+@contextmanager
+def observe_storage(operation: str) -> Iterator[None]:
+    """Mide la duración de una operación de almacenamiento."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STORAGE_LATENCY.labels(operation).observe(time.perf_counter() - start)
+
+@contextmanager
+def track_task(task: str) -> Iterator[None]:
+    """Mide la duración de una tarea en segundo plano y si terminó con error."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        TASK_DURATION.labels(task, outcome).observe(time.perf_counter() - start)
+
+def update_pool_gauges(pool_metrics: Dict[str, Dict]) -> None:
+    """Actualiza los gauges de ocupación con las métricas de get_pool_metrics()."""
+    for name, pool in pool_metrics.items():
+        DB_POOL_CHECKED_OUT.labels(name).set(pool.get("checked_out", 0))
+        DB_POOL_OPEN.labels(name).set(pool.get("checked_in", 0) + pool.get("checked_out", 0))
+        DB_POOL_WAITING.labels(name).set(pool.get("waiting", 0))
+
+def route_template(request: Request) -> str:
+    """Plantilla de la ruta atendida (p. ej. /api/documents/{documento_id}) para acotar la cardinalidad."""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """
+    Middleware que mide la latencia de cada solicitud por método, plantilla de
+    ruta y código de estado, y la cantidad de solicitudes en curso.
+    """
+
+    def __init__(self, app, exempt_paths=("/api/metrics",)):
+        super().__init__(app)
+        self.exempt_paths = exempt_paths
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        if request.url.path in self.exempt_paths:
+            return await call_next(request)
+
+        start = time.perf_counter()
+        status_code = 500
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_LATENCY.labels(
+                request.method, route_template(request), str(status_code)
+            ).observe(time.perf_counter() - start)
+
+def render_metrics() -> Response:
+    """Genera la respuesta de /api/metrics, agregando todos los workers en modo multiproceso."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,16 +1,88 @@
+import math
 import time
 from datetime import datetime, timedelta
 from typing import Callable, List, Optional, Dict, Any
 from fastapi import Request, Response, HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from ..db import models, schemas
-from ..db.database import get_db
+from ..db.database import get_db, get_request_session
+from ..db.query_stats import RequestQueryStats, current_request_stats
+from ..db.replicas import STICKY_COOKIE, get_sticky_key, replica_router
 from .config import settings
 from .security import check_permission
+from .login_attempts import login_tracker
+
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    """
+    Middleware que mide las consultas SQL de cada solicitud (incluidas las de los
+    demás middlewares, por lo que debe registrarse al final). En modo DEBUG
+    agrega la cantidad de consultas y el tiempo en la base de datos a la respuesta.
+    """
+    
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        stats = RequestQueryStats()
+        token = current_request_stats.set(stats)
+        try:
+            response = await call_next(request)
+        finally:
+            current_request_stats.reset(token)
+        
+        request.state.query_stats = stats
+        if settings.DEBUG:
+            response.headers["X-DB-Query-Count"] = str(stats.count)
+            response.headers["X-DB-Time-Ms"] = f"{stats.total_time * 1000:.1f}"
+            if stats.slowest:
+                response.headers["X-DB-Slowest-Ms"] = f"{stats.slowest[0]['ms']:.1f}"
+        return response
+
+class RequestSessionMiddleware(BaseHTTPMiddleware):
+    """
+    Middleware que cierra la sesión asíncrona compartida de la solicitud.
+    Debe registrarse después de los middlewares que usan la base de datos
+    para envolverlos a todos.
+    """
+    
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        try:
+            return await call_next(request)
+        finally:
+            db = getattr(request.state, "db", None)
+            if db is not None:
+                await db.close()
+
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    """
+    Middleware que registra las escrituras exitosas de cada usuario para que sus
+    lecturas siguientes vayan al primario en lugar de a una réplica.
+    Debe registrarse antes que AuthenticationMiddleware para conocer al usuario.
+    """
+    
+    WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+    
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        response = await call_next(request)
+        
+        if request.method in self.WRITE_METHODS and response.status_code < 400:
+            key = get_sticky_key(request)
+            if key is not None:
+                until = replica_router.mark_write(key)
+            else:
+                until = time.time() + replica_router.sticky_seconds
+            # La cookie extiende la ventana a los demás workers
+            response.set_cookie(
+                STICKY_COOKIE,
+                str(until),
+                max_age=math.ceil(replica_router.sticky_seconds),
+                httponly=True,
+                samesite="lax"
+            )
+        
+        return response
 
 class AuthenticationMiddleware(BaseHTTPMiddleware):
     """
@@ -18,15 +90,16 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
     Verifica el token JWT en los headers y extrae la información del usuario.
     """
     
-    def __init__(self, app, db_func=get_db):
+    def __init__(self, app, session_func=get_request_session):
         super().__init__(app)
-        self.db_func = db_func
+        self.session_func = session_func
         self.oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
         # Rutas que no requieren autenticación
         self.public_paths = [
             "/api/auth/login",
             "/api/auth/register",
             "/api/health",
+            "/api/metrics",
             "/docs",
             "/redoc",
             "/openapi.json"
@@ -55,7 +128,6 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
             response_code = response.status_code
         else:
             # Ruta protegida, verificar autenticación
-            db = next(self.db_func())
             try:
                 # Extraer token
                 auth_header = request.headers.get("Authorization")
@@ -85,8 +157,13 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
                         headers={"WWW-Authenticate": "Bearer"},
                     )
                 
-                # Obtener usuario
-                user = db.query(models.Usuario).filter(models.Usuario.email == email).first()
+                # Obtener usuario con la sesión de la solicitud. El commit libera la
+                # conexión antes de continuar, de modo que el endpoint la reutiliza
+                db = self.session_func(request)
+                result = await db.execute(
+                    select(models.Usuario).where(models.Usuario.email == email)
+                )
+                user = result.scalars().first()
                 if not user:
                     raise HTTPException(
                         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -103,7 +180,7 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
                 
                 # Actualizar último acceso
                 user.ultimo_acceso = datetime.utcnow()
-                db.commit()
+                await db.commit()
                 
                 # Añadir usuario a la solicitud para que esté disponible en los endpoints
                 request.state.user = user
@@ -152,13 +229,13 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
                         mensaje_error=error_message,
                         tiempo_respuesta=tiempo_respuesta
                     )
+                    db = self.session_func(request)
+                    # Descartar cualquier transacción que el endpoint haya dejado abierta
+                    await db.rollback()
                     db.add(registro)
-                    db.commit()
+                    await db.commit()
                 except Exception as e:
                     print(f"Error al registrar acceso: {str(e)}")
-                    db.rollback()
-                finally:
-                    db.close()
         
         return response
 
@@ -166,6 +243,8 @@ class AuthorizationMiddleware(BaseHTTPMiddleware):
     """
     Middleware para autorización basada en permisos.
     Verifica si el usuario tiene los permisos necesarios para acceder a un recurso.
+    check_permission es síncrono, por lo que usa una sesión síncrona propia en lugar
+    de la sesión asíncrona de la solicitud, y la cierra antes de continuar.
     """
     
     def __init__(self, app, db_func=get_db):
@@ -225,6 +304,7 @@ class AuthorizationMiddleware(BaseHTTPMiddleware):
             "/api/auth/login",
             "/api/auth/register",
             "/api/health",
+            "/api/metrics",
             "/docs",
             "/redoc",
             "/openapi.json"
@@ -274,8 +354,9 @@ class AuthorizationMiddleware(BaseHTTPMiddleware):
         if not required_permissions:
             return await call_next(request)
         
-        # Verificar permisos
-        db = next(self.db_func())
+        # Verificar permisos; la conexión se libera antes de procesar la solicitud
+        db_generator = self.db_func()
+        db = next(db_generator)
         try:
             user = request.state.user
             
@@ -286,10 +367,6 @@ class AuthorizationMiddleware(BaseHTTPMiddleware):
                         status_code=status.HTTP_403_FORBIDDEN,
                         detail=f"No tiene permiso para acceder a este recurso: {permission_code}"
                     )
-            
-            # Si tiene todos los permisos, continuar con la solicitud
-            return await call_next(request)
-            
         except HTTPException as e:
             return Response(
                 content={"detail": e.detail}.get("detail", "Error de autorización"),
@@ -297,16 +374,19 @@ class AuthorizationMiddleware(BaseHTTPMiddleware):
                 media_type="application/json"
             )
         finally:
-            db.close()
+            db_generator.close()
+        
+        # Si tiene todos los permisos, continuar con la solicitud
+        return await call_next(request)
 
 class IPBlockMiddleware(BaseHTTPMiddleware):
     """
     Middleware para bloquear IPs que han realizado demasiados intentos fallidos.
     """
     
-    def __init__(self, app, db_func=get_db):
+    def __init__(self, app, session_func=get_request_session):
         super().__init__(app)
-        self.db_func = db_func
+        self.session_func = session_func
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         # Si es una solicitud OPTIONS, permitir sin verificar bloqueo
@@ -317,31 +397,32 @@ class IPBlockMiddleware(BaseHTTPMiddleware):
         client_host = request.client.host if request.client else "unknown"
         
         # Verificar si la IP está bloqueada
-        db = next(self.db_func())
-        try:
-            # Buscar bloqueo activo para esta IP
-            bloqueo = db.query(models.BloqueoIP).filter(
+        db = self.session_func(request)
+        # Buscar bloqueo activo para esta IP
+        result = await db.execute(
+            select(models.BloqueoIP).where(
                 models.BloqueoIP.ip_address == client_host,
                 models.BloqueoIP.activo == True,
                 models.BloqueoIP.fecha_fin > datetime.utcnow()
-            ).first()
-            
-            if bloqueo:
-                # IP bloqueada, devolver error 403
-                tiempo_restante = bloqueo.fecha_fin - datetime.utcnow()
-                minutos_restantes = int(tiempo_restante.total_seconds() / 60)
-                
-                return Response(
-                    content={"detail": f"Acceso bloqueado temporalmente. Intente nuevamente en {minutos_restantes} minutos."}.get("detail"),
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    media_type="application/json"
-                )
-            
-            # IP no bloqueada, continuar con la solicitud
-            return await call_next(request)
+            ).limit(1)
+        )
+        bloqueo = result.scalars().first()
+        # Terminar la transacción de lectura para devolver la conexión al pool
+        await db.commit()
+        
+        if bloqueo:
+            # IP bloqueada, devolver error 403
+            tiempo_restante = bloqueo.fecha_fin - datetime.utcnow()
+            minutos_restantes = int(tiempo_restante.total_seconds() / 60)
             
-        finally:
-            db.close()
+            return Response(
+                content={"detail": f"Acceso bloqueado temporalmente. Intente nuevamente en {minutos_restantes} minutos."}.get("detail"),
+                status_code=status.HTTP_403_FORBIDDEN,
+                media_type="application/json"
+            )
+        
+        # IP no bloqueada, continuar con la solicitud
+        return await call_next(request)
 
 def require_permissions(permission_codes: List[str]):
     """
@@ -378,19 +459,14 @@ def require_permissions(permission_codes: List[str]):
 def check_and_block_ip(email: str, ip_address: str, db: Session):
     """
     Verifica si una IP ha realizado demasiados intentos fallidos y la bloquea si es necesario.
+    El conteo se obtiene del contador de ventana deslizante, sin recorrer intentos_login.
     """
     # Configuración
-    MAX_INTENTOS_FALLIDOS = 5  # Número máximo de intentos fallidos permitidos
-    PERIODO_VERIFICACION = 10  # Minutos para verificar intentos fallidos
-    DURACION_BLOQUEO = 30  # Minutos de bloqueo
+    MAX_INTENTOS_FALLIDOS = settings.LOGIN_MAX_FAILED_ATTEMPTS  # Número máximo de intentos fallidos permitidos
+    DURACION_BLOQUEO = settings.LOGIN_BLOCK_MINUTES  # Minutos de bloqueo
     
     # Verificar intentos fallidos recientes
-    desde = datetime.utcnow() - timedelta(minutes=PERIODO_VERIFICACION)
-    intentos_fallidos = db.query(models.IntentosLogin).filter(
-        models.IntentosLogin.ip_address == ip_address,
-        models.IntentosLogin.exitoso == False,
-        models.IntentosLogin.fecha >= desde
-    ).count()
+    intentos_fallidos = login_tracker.count_failures(ip_address, db)
     
     # Si hay demasiados intentos fallidos, bloquear IP
     if intentos_fallidos >= MAX_INTENTOS_FALLIDOS:
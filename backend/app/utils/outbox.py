@@ -0,0 +1,85 @@
+"""
+Bandeja de salida transaccional (outbox).
+
+Los efectos que deben ocurrir después de una escritura (extraer el texto de una
+versión nueva, notificar a otros workers, etc.) se registran como filas de
+eventos_pendientes en la misma transacción que la escritura: si el commit falla
+no queda ningún evento, y si el worker cae después del commit el evento sigue
+pendiente y lo despacha el reintento periódico.
+
+Los manejadores se ejecutan al menos una vez y deben ser idempotentes. Los
+eventos despachados se eliminan; los que fallan OUTBOX_MAX_ATTEMPTS veces
+quedan en la tabla para revisión manual.
+"""
+import json
+import logging
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..db import models
+from .config import settings
+from .text_extraction import schedule_text_extraction
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Manejadores por tipo de evento: reciben los datos del evento
+HANDLERS: Dict[str, Callable[[dict], None]] = {}
+
+def handler(tipo: str):
+    """Registra el manejador de un tipo de evento."""
+    def register(function: Callable[[dict], None]):
+        HANDLERS[tipo] = function
+        return function
+    return register
+
+def record_event(db: Session, tipo: str, documento_id: Optional[int] = None, **datos) -> models.EventoPendiente:
+    """
+    Agrega un evento a la transacción en curso (no hace commit): se publica
+    junto con el resto de los cambios o no se publica.
+    """
+    evento = models.EventoPendiente(tipo=tipo, documento_id=documento_id, datos=json.dumps(datos))
+    db.add(evento)
+    return evento
+
+def dispatch_events(db: Session, event_ids: Optional[List[int]] = None) -> int:
+    """
+    Despacha eventos pendientes: los indicados o, sin event_ids, los más antiguos
+    hasta OUTBOX_BATCH_SIZE. Las filas se bloquean con SKIP LOCKED para que
+    varios workers no despachen el mismo evento a la vez.
+
+    Returns:
+        Cantidad de eventos despachados
+    """
+    query = select(models.EventoPendiente).where(
+        models.EventoPendiente.intentos < settings.OUTBOX_MAX_ATTEMPTS
+    ).order_by(models.EventoPendiente.id).limit(settings.OUTBOX_BATCH_SIZE).with_for_update(skip_locked=True)
+    if event_ids is not None:
+        query = query.where(models.EventoPendiente.id.in_(event_ids))
+
+    dispatched = 0
+    try:
+        for evento in db.execute(query).scalars().all():
+            function = HANDLERS.get(evento.tipo)
+            try:
+                if function is None:
+                    raise LookupError(f"Sin manejador para el evento {evento.tipo}")
+                function(json.loads(evento.datos))
+            except Exception as e:
+                evento.intentos += 1
+                logger.warning(f"Error al despachar el evento {evento.id} ({evento.tipo}), intento {evento.intentos}: {str(e)}")
+                continue
+            db.delete(evento)
+            dispatched += 1
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return dispatched
+
+@handler("version_creada")
+def _extract_version_text(datos: dict) -> None:
+    # Extraer el texto (PDF y DOCX) en segundo plano para las comparaciones
+    schedule_text_extraction(datos["path"], datos["hash"], datos["extension"])
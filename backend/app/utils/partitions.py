@@ -0,0 +1,201 @@
+"""
+Mantenimiento de las tablas de auditoría particionadas por mes.
+
+registro_acceso, historial_acceso e intentos_login están particionadas por rango
+de `fecha`, con una partición por mes (<tabla>_pYYYYMM) y una partición DEFAULT.
+Este módulo crea por adelantado las particiones de los meses siguientes, para que
+las inserciones nunca caigan en la DEFAULT, y aplica la retención: las particiones
+más antiguas que AUDIT_RETENTION_MONTHS se archivan (opcional) y se eliminan con
+DROP TABLE, sin recorrer ni borrar filas.
+
+Si igualmente llegaron filas de un mes a la DEFAULT (por ejemplo, porque el
+mantenimiento no corrió), Postgres rechaza crear la partición de ese mes; en ese
+caso la DEFAULT se desvincula, se crea la partición, se mueven las filas del mes
+y se vuelve a vincular.
+"""
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from ..db.database import engine
+from .config import settings
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ["registro_acceso", "historial_acceso", "intentos_login"]
+
+# Clave del advisory lock que evita que varios workers hagan el mantenimiento a la vez
+MAINTENANCE_LOCK_KEY = 7340021
+
+_PARTITION_RE = re.compile(r"^(?P<table>\w+)_p(?P<year>\d{4})(?P<month>\d{2})$")
+
+def month_start(value: date) -> date:
+    """Primer día del mes de la fecha dada."""
+    return date(value.year, value.month, 1)
+
+def add_months(value: date, months: int) -> date:
+    """Suma meses a una fecha que es primer día de mes."""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table: str, month: date) -> str:
+    """Nombre de la partición mensual, por ejemplo registro_acceso_p202601."""
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+def parse_partition_name(name: str) -> Optional[Tuple[str, date]]:
+    """Devuelve (tabla, mes) a partir del nombre de una partición mensual."""
+    match = _PARTITION_RE.match(name)
+    if not match:
+        return None
+    return match.group("table"), date(int(match.group("year")), int(match.group("month")), 1)
+
+def expired_partitions(partitions: List[str], retention_months: int, today: date) -> List[str]:
+    """
+    Particiones mensuales cuyo mes completo quedó fuera de la retención.
+    Con retention_months=12 se conservan el mes actual y los 12 anteriores.
+    """
+    limite = add_months(month_start(today), -retention_months)
+    expired = []
+    for name in partitions:
+        parsed = parse_partition_name(name)
+        if parsed and parsed[1] < limite:
+            expired.append(name)
+    return sorted(expired)
+
+def create_partition_sql(table: str, month: date) -> str:
+    """Sentencia que crea la partición mensual si no existe."""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table)"
+    ), {"table": table}).scalar()
+
+def list_partitions(conn: Connection, table: str) -> List[str]:
+    """Nombres de las particiones de una tabla."""
+    rows = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table"
+    ), {"table": table})
+    return [row[0] for row in rows]
+
+def default_has_rows(conn: Connection, table: str, month: date) -> bool:
+    """Indica si la partición DEFAULT tiene filas del mes dado."""
+    return conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE fecha >= :desde AND fecha < :hasta)"
+    ), {"desde": month, "hasta": add_months(month, 1)}).scalar()
+
+def move_rows_from_default(conn: Connection, table: str, month: date) -> int:
+    """
+    Crea la partición del mes cuando la DEFAULT ya tiene filas de ese mes: desvincula
+    la DEFAULT, crea la partición, reinserta las filas del mes (ahora se enrutan a la
+    partición nueva), las borra de la DEFAULT y la vuelve a vincular. Devuelve las
+    filas movidas.
+    """
+    rango = {"desde": month, "hasta": add_months(month, 1)}
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {table}_default"))
+    conn.execute(text(create_partition_sql(table, month)))
+    conn.execute(text(
+        f"INSERT INTO {table} SELECT * FROM {table}_default WHERE fecha >= :desde AND fecha < :hasta"
+    ), rango)
+    moved = conn.execute(text(
+        f"DELETE FROM {table}_default WHERE fecha >= :desde AND fecha < :hasta"
+    ), rango).rowcount
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {table}_default DEFAULT"))
+    return moved
+
+def ensure_partitions(conn: Connection, table: str, months_ahead: int, today: Optional[date] = None) -> None:
+    """Crea la partición DEFAULT y las de los meses desde el actual hasta months_ahead."""
+    today = today or datetime.utcnow().date()
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+    existing = set(list_partitions(conn, table))
+    current = month_start(today)
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if partition_name(table, month) in existing:
+            continue
+        if default_has_rows(conn, table, month):
+            moved = move_rows_from_default(conn, table, month)
+            logger.warning(f"Se movieron {moved} filas de {table}_default a {partition_name(table, month)}")
+        else:
+            conn.execute(text(create_partition_sql(table, month)))
+
+def archive_partition(conn: Connection, partition: str, archive_dir: str) -> str:
+    """Exporta la partición a un CSV comprimido en archive_dir. Devuelve la ruta del archivo."""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{partition}.csv.gz")
+    raw = conn.connection.dbapi_connection
+    with gzip.open(path, "wt", encoding="utf-8") as output:
+        with raw.cursor() as cursor:
+            cursor.copy_expert(f"COPY {partition} TO STDOUT WITH CSV HEADER", output)
+    return path
+
+def drop_expired_partitions(
+    conn: Connection,
+    table: str,
+    retention_months: int,
+    archive_dir: str = "",
+    today: Optional[date] = None
+) -> List[str]:
+    """Archiva (si se indicó directorio) y elimina las particiones vencidas de la tabla."""
+    today = today or datetime.utcnow().date()
+    dropped = []
+    for partition in expired_partitions(list_partitions(conn, table), retention_months, today):
+        if archive_dir:
+            path = archive_partition(conn, partition, archive_dir)
+            logger.info(f"Partición {partition} archivada en {path}")
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition}"))
+        conn.execute(text(f"DROP TABLE {partition}"))
+        dropped.append(partition)
+    return dropped
+
+def run_partition_maintenance(bind=engine) -> List[str]:
+    """
+    Crea las particiones futuras y aplica la retención en todas las tablas de auditoría.
+    Solo un worker lo ejecuta a la vez (advisory lock). Cada tabla se procesa en su
+    propia transacción: si una falla se registra el error y se sigue con las demás.
+    Devuelve las particiones eliminadas.
+    """
+    dropped = []
+    with bind.connect() as conn:
+        locked = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}).scalar()
+        conn.commit()
+        if not locked:
+            logger.info("Mantenimiento de particiones en curso en otro worker")
+            return dropped
+        try:
+            for table in PARTITIONED_TABLES:
+                try:
+                    with conn.begin():
+                        if not is_partitioned(conn, table):
+                            logger.warning(f"La tabla {table} no está particionada; ejecute las migraciones")
+                            continue
+                        ensure_partitions(conn, table, settings.AUDIT_PARTITIONS_AHEAD)
+                        if settings.AUDIT_RETENTION_MONTHS > 0:
+                            dropped += drop_expired_partitions(
+                                conn, table, settings.AUDIT_RETENTION_MONTHS, settings.AUDIT_ARCHIVE_PATH
+                            )
+                except Exception:
+                    logger.exception(
+                        f"Falló el mantenimiento de particiones de {table}; las inserciones de los "
+                        f"meses sin partición irán a {table}_default"
+                    )
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MAINTENANCE_LOCK_KEY})
+            conn.commit()
+    if dropped:
+        logger.info(f"Particiones eliminadas por retención: {dropped}")
+    return dropped
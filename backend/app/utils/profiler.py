@@ -0,0 +1,217 @@
+"""
+Perfilador por muestreo para los workers en producción.
+
+Un hilo toma cada `interval` segundos la pila de todos los hilos del proceso
+(sys._current_frames) y acumula las pilas en formato "collapsed" (una línea
+"marco1;marco2;... cantidad" por pila), compatible con flamegraph.pl y speedscope.
+No instrumenta el código, por lo que el costo solo existe mientras se perfila.
+
+Modos:
+- Perfil del worker durante un tiempo acotado.
+- Perfil de las próximas N solicitudes (opcionalmente de una ruta) atendidas por el worker.
+- Perfil de una solicitud puntual con la cabecera X-Profile, solo para administradores.
+
+En un worker async varias solicitudes comparten el hilo del event loop, por lo
+que el perfil de una solicitud incluye las muestras de las solicitudes que se
+atienden en paralelo en el mismo worker.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from ..db import models
+from ..db.database import get_request_session
+from .config import settings
+from .security import role_has_permission
+
+PROFILE_PERMISSION = "admin:system:profile"
+PROFILE_HEADER = "X-Profile"
+
+# Marcos en los que un hilo está ocioso (event loop esperando eventos, hilos del pool sin tareas)
+IDLE_FRAMES = {("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get")}
+
+def _frame_label(code) -> str:
+    """Nombre del marco: ruta corta del archivo y función (sin ';' para el formato collapsed)."""
+    filename = code.co_filename
+    for marker in ("site-packages" + os.sep, os.sep + "app" + os.sep):
+        index = filename.rfind(marker)
+        if index != -1:
+            filename = filename[index + 1:] if marker.startswith(os.sep) else filename[index + len(marker):]
+            break
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{code.co_name}".replace(";", ",")
+
+class StackSampler:
+    """Muestrea periódicamente las pilas de los hilos del proceso y las acumula en formato collapsed."""
+
+    def __init__(self, interval: float = 0.005, skip_idle: bool = True):
+        self.interval = max(interval, 0.001)
+        self.skip_idle = skip_idle
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample_once(self) -> None:
+        """Toma una muestra de la pila de cada hilo (salvo el propio hilo de muestreo)."""
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            code = frame.f_code
+            if self.skip_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)).replace(";", ","))
+            self.counts[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample_once()
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+def collapsed(counts: Counter) -> str:
+    """Pilas en formato collapsed, de la más frecuente a la menos frecuente."""
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n"
+
+async def profile_worker(seconds: float, interval: float) -> Counter:
+    """Perfila el worker durante `seconds` segundos sin bloquear el event loop."""
+    sampler = StackSampler(interval=interval).start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        sampler.stop()
+    return sampler.counts
+
+class RequestProfilingSession:
+    """Acumula el perfil de las próximas `count` solicitudes cuya ruta empieza con `path_prefix`."""
+
+    def __init__(self, count: int, path_prefix: str = ""):
+        self.remaining = count
+        self.path_prefix = path_prefix
+        self.counts: Counter = Counter()
+        self.profiled = 0
+        self.done = asyncio.Event()
+
+    def claim(self, path: str) -> bool:
+        if self.remaining <= 0 or not path.startswith(self.path_prefix):
+            return False
+        self.remaining -= 1
+        return True
+
+    def add(self, counts: Counter) -> None:
+        self.counts.update(counts)
+        self.profiled += 1
+        if self.remaining <= 0:
+            self.done.set()
+
+class RequestProfiler:
+    """Estado de perfilado de solicitudes del worker."""
+
+    def __init__(self):
+        self.session: Optional[RequestProfilingSession] = None
+
+    async def profile_requests(self, count: int, path_prefix: str, timeout: float) -> RequestProfilingSession:
+        """Perfila las próximas `count` solicitudes o hasta `timeout` segundos, lo que ocurra primero."""
+        if self.session is not None:
+            raise RuntimeError("Ya hay un perfilado de solicitudes en curso en este worker")
+        session = RequestProfilingSession(count, path_prefix)
+        self.session = session
+        try:
+            await asyncio.wait_for(session.done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            session.remaining = 0
+            self.session = None
+        return session
+
+request_profiler = RequestProfiler()
+
+def save_profile(counts: Counter) -> str:
+    """Guarda un perfil en PROFILE_OUTPUT_PATH (compartido por los workers) y devuelve su id."""
+    os.makedirs(settings.PROFILE_OUTPUT_PATH, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    with open(os.path.join(settings.PROFILE_OUTPUT_PATH, f"{profile_id}.collapsed"), "w") as output:
+        output.write(collapsed(counts))
+    return profile_id
+
+def load_profile(profile_id: str) -> Optional[str]:
+    """Lee un perfil guardado por save_profile."""
+    if not profile_id.replace("-", "").isalnum():
+        return None
+    path = os.path.join(settings.PROFILE_OUTPUT_PATH, f"{profile_id}.collapsed")
+    if not os.path.exists(path):
+        return None
+    with open(path) as profile:
+        return profile.read()
+
+async def user_can_profile(user: Optional[models.Usuario], db) -> bool:
+    """
+    Verifica que el rol del usuario tenga el permiso de perfilado. No usa
+    check_permission para que la cabecera X-Profile nunca se acepte a usuarios
+    sin el permiso.
+    """
+    return await role_has_permission(user, PROFILE_PERMISSION, db)
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    """
+    Middleware que perfila solicitudes: las reclamadas por una sesión de
+    perfilado de N solicitudes y las que envían la cabecera X-Profile de un
+    administrador (el id del perfil se devuelve en la misma cabecera).
+    Debe registrarse antes que AuthenticationMiddleware para conocer al usuario.
+    """
+
+    def __init__(self, app, session_func: Callable = get_request_session):
+        super().__init__(app)
+        self.session_func = session_func
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        session = request_profiler.session
+        claimed = session is not None and session.claim(request.url.path)
+
+        on_demand = False
+        if PROFILE_HEADER in request.headers and settings.PROFILER_ENABLED:
+            db = self.session_func(request)
+            on_demand = await user_can_profile(getattr(request.state, "user", None), db)
+            # Liberar la conexión antes de continuar con la solicitud
+            await db.commit()
+
+        if not (claimed or on_demand):
+            return await call_next(request)
+
+        sampler = StackSampler(interval=settings.PROFILER_INTERVAL_MS / 1000).start()
+        try:
+            response = await call_next(request)
+        finally:
+            sampler.stop()
+            if claimed:
+                session.add(sampler.counts)
+
+        if on_demand:
+            response.headers[PROFILE_HEADER] = save_profile(sampler.counts)
+        return response
@@ -1,61 +1,198 @@
 """
-Módulo para implementar limitación de tasa (rate limiting) en la API
+Módulo para implementar limitación de tasa (rate limiting) en la API.
+
+Usa el algoritmo GCRA (equivalente a un token bucket) con un costo por ruta.
+El estado se guarda en memoria por worker o en la tabla limites_tasa de Postgres,
+compartida por todos los workers y hosts, para que los límites no se multipliquen
+por la cantidad de procesos.
 """
-from fastapi import Request, HTTPException, status
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+import math
+import re
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional, Pattern, Tuple
+
+from fastapi import Request, Response, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from ..db.database import engine
 from ..utils.config import settings
-import os
 
-# Crear instancia del limitador de tasa sin requerir archivo .env
-limiter = Limiter(key_func=get_remote_address, default_limits=["100/minute"])
+# Costos por ruta: (método, patrón de ruta, costo). Se usa la primera coincidencia.
+# Las cargas de archivos y las operaciones que leen archivos completos cuestan más
+# que una búsqueda; el login cuesta más por el cálculo de bcrypt.
+ROUTE_COSTS: List[Tuple[str, Pattern, int]] = [
+    ("POST", re.compile(r"^/api/documents/?$"), 10),
+    ("POST", re.compile(r"^/api/documents/\d+/versions/?$"), 10),
+    ("POST", re.compile(r"^/api/documents/\d+/versions/\d+/restore/?$"), 5),
+    ("POST", re.compile(r"^/api/documents/\d+/versions/compare/?$"), 5),
+    ("GET", re.compile(r"^/api/documents/\d+(/versions/\d+)?/download/?$"), 3),
+    ("POST", re.compile(r"^/api/auth/(login|register)/?$"), 5),
+    ("GET", re.compile(r"^/api/documents/?$"), 2),
+]
+DEFAULT_COST = 1
 
-def configure_rate_limiter(app):
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    retry_after: float  # Segundos hasta que la solicitud sería admitida
+
+class GCRAPolicy:
     """
-    Configura el limitador de tasa para la aplicación FastAPI
-    
-    Args:
-        app: Instancia de FastAPI
+    Parámetros de un límite GCRA: `rate` unidades por `period` segundos con una
+    ráfaga máxima de `burst` unidades.
     """
-    if not settings.ENVIRONMENT == "production" or not getattr(settings, "RATE_LIMIT_ENABLED", False):
-        return
-    
-    # Configurar el limitador en la aplicación
-    app.state.limiter = limiter
-    app.add_exception_handler(HTTPException, _rate_limit_exception_handler)
 
-async def _rate_limit_exception_handler(request: Request, exc: HTTPException):
+    def __init__(self, rate: int, period: float = 60.0, burst: Optional[int] = None):
+        self.emission_interval = period / rate
+        self.tolerance = self.emission_interval * (burst if burst is not None else rate)
+
+    def evaluate(self, tat: Optional[float], now: float, cost: int) -> Tuple[RateLimitResult, float]:
+        """
+        Evalúa una solicitud de costo `cost` dado el TAT (theoretical arrival time) actual.
+        Devuelve el resultado y el TAT a guardar.
+        """
+        increment = self.emission_interval * cost
+        new_tat = max(tat if tat is not None else now, now) + increment
+        excess = new_tat - now - self.tolerance
+        if excess > 0:
+            return RateLimitResult(False, excess), (tat if tat is not None else now)
+        return RateLimitResult(True, 0.0), new_tat
+
+class MemoryRateLimitStore:
+    """Almacén de TAT en memoria, local a cada worker."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self._tats = {}
+        self._lock = threading.Lock()
+        self.max_keys = max_keys
+
+    def hit(self, key: str, policy: GCRAPolicy, cost: int, now: float) -> RateLimitResult:
+        with self._lock:
+            result, tat = policy.evaluate(self._tats.get(key), now, cost)
+            self._tats[key] = tat
+            if len(self._tats) > self.max_keys:
+                # Eliminar las claves cuyo TAT ya pasó (bucket lleno de nuevo)
+                self._tats = {k: v for k, v in self._tats.items() if v > now}
+            return result
+
+class PostgresRateLimitStore:
     """
-    Manejador de excepciones para el limitador de tasa
+    Almacén de TAT compartido en Postgres.
+    Cada evaluación es un único UPSERT condicional; la fila solo se actualiza
+    si la solicitud es admitida, por lo que no hay carreras entre workers.
     """
-    if exc.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
-        return {
-            "detail": "Demasiadas solicitudes. Por favor, inténtelo de nuevo más tarde.",
-            "status_code": exc.status_code
-        }
-    raise exc
 
-# Decorador para aplicar límites de tasa a rutas específicas
-def rate_limit(limit_string=None):
+    _hit_sql = text("""
+        INSERT INTO limites_tasa (clave, tat) VALUES (:clave, :now + :incremento)
+        ON CONFLICT (clave) DO UPDATE
+        SET tat = GREATEST(limites_tasa.tat, :now) + :incremento
+        WHERE GREATEST(limites_tasa.tat, :now) + :incremento - :now <= :tolerancia
+        RETURNING tat
+    """)
+    _tat_sql = text("SELECT tat FROM limites_tasa WHERE clave = :clave")
+
+    def __init__(self, bind=engine):
+        self.bind = bind
+
+    def hit(self, key: str, policy: GCRAPolicy, cost: int, now: float) -> RateLimitResult:
+        increment = policy.emission_interval * cost
+        with self.bind.begin() as conn:
+            row = conn.execute(self._hit_sql, {
+                "clave": key,
+                "now": now,
+                "incremento": increment,
+                "tolerancia": policy.tolerance
+            }).first()
+            if row is not None:
+                return RateLimitResult(True, 0.0)
+            tat = conn.execute(self._tat_sql, {"clave": key}).scalar() or now
+        return RateLimitResult(False, max(tat, now) + increment - now - policy.tolerance)
+
+    def purge(self, now: Optional[float] = None) -> int:
+        """Elimina las claves cuyo bucket ya está lleno (TAT en el pasado)."""
+        now = time.time() if now is None else now
+        with self.bind.begin() as conn:
+            return conn.execute(text("DELETE FROM limites_tasa WHERE tat < :now"), {"now": now}).rowcount
+
+def get_route_cost(method: str, path: str) -> int:
+    """Obtiene el costo de una solicitud según su método y ruta."""
+    for route_method, pattern, cost in ROUTE_COSTS:
+        if method == route_method and pattern.match(path):
+            return cost
+    return DEFAULT_COST
+
+def get_rate_limit_key(request: Request) -> str:
+    """Clave del límite: el usuario autenticado o, si no hay, la IP del cliente."""
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return f"user:{user.id}"
+    client_host = request.client.host if request.client else "unknown"
+    return f"ip:{client_host}"
+
+def create_rate_limit_store():
+    """Crea el almacén configurado en RATE_LIMIT_BACKEND."""
+    if settings.RATE_LIMIT_BACKEND == "postgres":
+        return PostgresRateLimitStore()
+    return MemoryRateLimitStore()
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    """
+    Middleware que aplica el límite GCRA a cada solicitud.
+    Debe registrarse antes que AuthenticationMiddleware para ejecutarse después
+    de él y poder usar el usuario autenticado como clave.
+    """
+
+    def __init__(
+        self,
+        app,
+        store=None,
+        policy: Optional[GCRAPolicy] = None,
+        key_func: Callable[[Request], str] = get_rate_limit_key
+    ):
+        super().__init__(app)
+        self.store = store or create_rate_limit_store()
+        self.policy = policy or GCRAPolicy(
+            rate=settings.RATE_LIMIT_PER_MINUTE,
+            period=60.0,
+            burst=settings.RATE_LIMIT_BURST
+        )
+        self.key_func = key_func
+        self.exempt_paths = ["/api/health", "/api/metrics", "/docs", "/redoc", "/openapi.json"]
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        path = request.url.path
+        if request.method == "OPTIONS" or any(path.startswith(p) for p in self.exempt_paths):
+            return await call_next(request)
+
+        key = self.key_func(request)
+        cost = get_route_cost(request.method, path)
+        now = time.time()
+
+        if isinstance(self.store, PostgresRateLimitStore):
+            result = await run_in_threadpool(self.store.hit, key, self.policy, cost, now)
+        else:
+            result = self.store.hit(key, self.policy, cost, now)
+
+        if not result.allowed:
+            return JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": "Demasiadas solicitudes. Por favor, inténtelo de nuevo más tarde."},
+                headers={"Retry-After": str(max(1, math.ceil(result.retry_after)))}
+            )
+
+        return await call_next(request)
+
+def configure_rate_limiter(app):
     """
-    Decorador para aplicar límites de tasa a rutas específicas
-    
+    Configura el limitador de tasa para la aplicación FastAPI
+
     Args:
-        limit_string: Cadena de límite (por ejemplo, "5/minute")
-    
-    Returns:
-        Decorador configurado
-    """
-    if not settings.ENVIRONMENT == "production" or not getattr(settings, "RATE_LIMIT_ENABLED", False):
-        # Si no estamos en producción o el rate limiting está desactivado,
-        # devolver un decorador que no hace nada
-        def dummy_decorator(func):
-            return func
-        return dummy_decorator
-    
-    # Usar el límite predeterminado si no se proporciona uno
-    if limit_string is None:
-        limit_string = f"{getattr(settings, 'RATE_LIMIT_PER_MINUTE', 60)}/minute"
-    
-    # Devolver el decorador real
-    return limiter.limit(limit_string)
+        app: Instancia de FastAPI
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+
+    app.add_middleware(RateLimitMiddleware)
@@ -0,0 +1,244 @@
+"""
+Caché en memoria de los datos de referencia: categorías y tipos de documento,
+categorías de permisos, permisos y roles.
+
+Estos datos cambian pocas veces al año pero el frontend los pide en casi todas
+las páginas. Cada worker los carga una vez por conjunto y los sirve ya
+serializados, con un ETag fuerte (hash del contenido, igual en todos los
+workers) y Cache-Control, respondiendo 304 cuando el cliente ya tiene la
+versión vigente.
+
+Cualquier commit que agregue, modifique o elimine filas de esos modelos invalida
+los conjuntos afectados en el worker y publica la invalidación en el bus de
+eventos para el resto. Los cambios hechos por fuera de la aplicación (SQL
+directo) se ven a más tardar a los REFERENCE_CACHE_TTL segundos.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set
+
+from fastapi import Request, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+
+from ..db import models, schemas
+from .config import settings
+from .event_bus import event_bus
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Tema del bus para las invalidaciones entre workers
+REFERENCE_TOPIC = "referencia"
+
+# Conjuntos de datos de referencia
+CATEGORIES = "categorias"
+DOCUMENT_TYPES = "tipos_documento"
+PERMISSION_CATEGORIES = "categorias_permiso"
+PERMISSIONS = "permisos"
+ROLES = "roles"
+
+@dataclass
+class ReferenceSet:
+    """Un conjunto cargado: los elementos validados, su JSON y su ETag."""
+    version: int
+    items: List[Any]
+    body: bytes
+    etag: str
+    loaded_at: float
+    ids: Set[int] = field(default_factory=set)
+    # Valores calculados a partir de los elementos (ver ReferenceDataCache.derive)
+    derived: Dict[Any, Any] = field(default_factory=dict)
+
+@dataclass
+class ReferenceLoader:
+    schema: Any
+    query: Callable[[Session], Iterable[Any]]
+    # Modelos cuyas escrituras invalidan el conjunto
+    sources: tuple
+
+    def __post_init__(self):
+        self.adapter = TypeAdapter(List[self.schema])
+
+LOADERS: Dict[str, ReferenceLoader] = {
+    CATEGORIES: ReferenceLoader(
+        schemas.Categoria, lambda db: db.query(models.Categoria).order_by(models.Categoria.id).all(),
+        (models.Categoria,)
+    ),
+    DOCUMENT_TYPES: ReferenceLoader(
+        schemas.TipoDocumento, lambda db: db.query(models.TipoDocumento).order_by(models.TipoDocumento.id).all(),
+        (models.TipoDocumento,)
+    ),
+    PERMISSION_CATEGORIES: ReferenceLoader(
+        schemas.CategoriaPermiso, lambda db: db.query(models.CategoriaPermiso).order_by(models.CategoriaPermiso.id).all(),
+        (models.CategoriaPermiso,)
+    ),
+    PERMISSIONS: ReferenceLoader(
+        schemas.Permiso,
+        lambda db: db.query(models.Permiso).options(joinedload(models.Permiso.categoria)).order_by(models.Permiso.id).all(),
+        (models.Permiso, models.CategoriaPermiso)
+    ),
+    ROLES: ReferenceLoader(
+        schemas.Rol, lambda db: db.query(models.Rol).order_by(models.Rol.id).all(),
+        (models.Rol,)
+    ),
+}
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+class ReferenceDataCache:
+    """
+    Conjuntos de referencia del worker. Cada invalidación incrementa la versión
+    del conjunto; una carga que empezó antes de la invalidación no se guarda.
+    """
+
+    def __init__(self, bus=None, ttl: int = 300):
+        self.ttl = ttl
+        self._sets: Dict[str, ReferenceSet] = {}
+        self._versions: Dict[str, int] = {name: 0 for name in LOADERS}
+        self._lock = threading.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+        self.bus = bus
+        if bus is not None:
+            bus.subscribe(self._on_event)
+
+    def get(self, db: Session, name: str) -> ReferenceSet:
+        """Conjunto vigente, cargándolo desde la base si no está o venció."""
+        with self._lock:
+            cached = self._sets.get(name)
+            version = self._versions[name]
+        if cached is not None and cached.version == version and time.monotonic() - cached.loaded_at < self.ttl:
+            return cached
+
+        loader = LOADERS[name]
+        items = loader.adapter.validate_python(loader.query(db), from_attributes=True)
+        body = loader.adapter.dump_json(items)
+        loaded = ReferenceSet(
+            version=version, items=items, body=body, etag=make_etag(body),
+            loaded_at=time.monotonic(), ids={item.id for item in items}
+        )
+        with self._lock:
+            if self._versions[name] == version:
+                self._sets[name] = loaded
+        return loaded
+
+    def derive(self, db: Session, name: str, key: Any, compute: Callable[[List[Any]], Any]) -> Any:
+        """Valor calculado sobre el conjunto vigente; se recalcula solo cuando el conjunto se recarga."""
+        reference_set = self.get(db, name)
+        if key not in reference_set.derived:
+            reference_set.derived[key] = compute(reference_set.items)
+        return reference_set.derived[key]
+
+    def contains(self, db: Session, name: str, item_id: int) -> bool:
+        """Verifica la existencia de un id sin consultar la base si el conjunto está cargado."""
+        return item_id in self.get(db, name).ids
+
+    def invalidate(self, names: Iterable[str]) -> None:
+        with self._lock:
+            for name in names:
+                if name in self._versions:
+                    self._versions[name] += 1
+                    self._sets.pop(name, None)
+
+    def clear(self) -> None:
+        self.invalidate(list(LOADERS))
+
+    async def publish_invalidation(self, names: Iterable[str]) -> None:
+        """Avisa a los demás workers (y a este) que los conjuntos cambiaron."""
+        names = sorted(set(names))
+        self.invalidate(names)
+        if self.bus is None:
+            return
+        try:
+            await self.bus.publish(REFERENCE_TOPIC, {"action": "reference_invalidated", "conjuntos": names})
+        except Exception as e:
+            logger.warning(f"No se pudo publicar la invalidación de {names}: {str(e)}")
+
+    async def _on_event(self, topic: str, message: dict) -> None:
+        if topic == REFERENCE_TOPIC:
+            self.invalidate(message.get("conjuntos") or [])
+
+    def after_commit(self, names: Set[str]) -> None:
+        """Invalida tras un commit; si hay un loop en curso, también en los demás workers."""
+        self.invalidate(names)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self.publish_invalidation(names))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+# Niveles de acceso visibles sin docs:view, con y sin search:restricted
+RESTRICTED_LEVELS = frozenset({models.NIVEL_PUBLICO, models.NIVEL_RESTRINGIDO})
+PUBLIC_LEVELS = frozenset({models.NIVEL_PUBLICO})
+
+def visible_document_types(db: Session, niveles: FrozenSet[str]) -> Optional[FrozenSet[int]]:
+    """
+    Ids de los tipos de documento cuyo nivel de acceso está en niveles, o None si
+    lo están todos (no hace falta filtrar).
+    """
+    def compute(tipos):
+        visibles = frozenset(tipo.id for tipo in tipos if tipo.nivel_acceso in niveles)
+        return None if len(visibles) == len(tipos) else visibles
+    return reference_cache.derive(db, DOCUMENT_TYPES, ("visibles", niveles), compute)
+
+def _affected_sets(instances: Iterable[Any]) -> Set[str]:
+    names = set()
+    for instance in instances:
+        for name, loader in LOADERS.items():
+            if isinstance(instance, loader.sources):
+                names.add(name)
+    return names
+
+PENDING_KEY = "reference_data_pending"
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session: Session, flush_context) -> None:
+    names = _affected_sets(list(session.new) + list(session.dirty) + list(session.deleted))
+    if names:
+        session.info.setdefault(PENDING_KEY, set()).update(names)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    names = session.info.pop(PENDING_KEY, None)
+    if names:
+        reference_cache.after_commit(names)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session) -> None:
+    session.info.pop(PENDING_KEY, None)
+
+def _matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def reference_response(request: Request, body: bytes, etag: Optional[str] = None) -> Response:
+    """Respuesta JSON con ETag y Cache-Control; 304 si el cliente ya tiene este contenido."""
+    etag = etag or make_etag(body)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={settings.REFERENCE_CACHE_MAX_AGE}, must-revalidate",
+    }
+    if _matches(etag, request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def serve_reference_set(request: Request, db: Session, name: str, predicate: Optional[Callable[[Any], bool]] = None) -> Response:
+    """Sirve un conjunto completo (o filtrado por predicate) desde la caché."""
+    reference_set = reference_cache.get(db, name)
+    if predicate is None:
+        return reference_response(request, reference_set.body, reference_set.etag)
+    loader = LOADERS[name]
+    return reference_response(request, loader.adapter.dump_json([item for item in reference_set.items if predicate(item)]))
+
+# Caché del worker
+reference_cache = ReferenceDataCache(event_bus, ttl=settings.REFERENCE_CACHE_TTL)
@@ -1,20 +1,39 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
-from fastapi import Depends, HTTPException, status, WebSocket
+from fastapi import Depends, HTTPException, Request, status, WebSocket
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from ..db import models, schemas
-from ..db.database import get_db
+from ..db.database import get_db, get_async_db
 from .config import settings
+from .executors import BoundedExecutor, ExecutorSaturatedError
 
 # Configuración de seguridad
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min_rounds/max_rounds iguales al costo configurado hacen que los hashes generados
+# con otro costo se marquen para regenerarse en el próximo login exitoso
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Pool dedicado para bcrypt: el cálculo libera el GIL, por lo que los hilos
+# no bloquean el event loop ni compiten con el resto de las solicitudes
+password_executor = BoundedExecutor(
+    "password-hash",
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verificar si la contraseña en texto plano coincide con el hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -23,6 +42,28 @@ def get_password_hash(password: str) -> str:
     """Generar hash de contraseña"""
     return pwd_context.hash(password)
 
+async def _run_password_task(func, *args):
+    """Ejecutar una operación de bcrypt en el pool, respondiendo 503 si está saturado"""
+    try:
+        return await password_executor.run(func, *args)
+    except ExecutorSaturatedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El servidor está procesando demasiadas autenticaciones. Intente nuevamente en unos segundos.",
+            headers={"Retry-After": "1"},
+        )
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verificar la contraseña en el pool de bcrypt.
+    Devuelve si es válida y, si el hash debe regenerarse, el nuevo hash.
+    """
+    return await _run_password_task(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Generar hash de contraseña en el pool de bcrypt"""
+    return await _run_password_task(pwd_context.hash, password)
+
 def authenticate_user(db: Session, email: str, password: str):
     """Autenticar usuario por email y contraseña"""
     user = db.query(models.Usuario).filter(models.Usuario.email == email).first()
@@ -34,6 +75,25 @@ def authenticate_user(db: Session, email: str, password: str):
         return None
     return user
 
+async def authenticate_user_async(db: Session, email: str, password: str):
+    """
+    Autenticar usuario por email y contraseña sin bloquear el event loop.
+    Si el hash almacenado usa un costo distinto al configurado, se regenera.
+    """
+    user = db.query(models.Usuario).filter(models.Usuario.email == email).first()
+    if not user:
+        return False
+    is_valid, new_hash = await verify_password_async(password, user.password_hash)
+    if not is_valid:
+        return False
+    if new_hash:
+        # Rehash transparente con el costo actual
+        user.password_hash = new_hash
+        db.commit()
+    if not user.activo:
+        return None
+    return user
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Crear token de acceso JWT"""
     to_encode = data.copy()
@@ -92,6 +152,78 @@ async def get_current_active_user(current_user: models.Usuario = Depends(get_cur
         )
     return current_user
 
+async def get_current_user_async(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Versión asíncrona de get_current_user.
+    Si el middleware de autenticación ya validó el token, reutiliza el usuario
+    de la solicitud en lugar de volver a consultarlo.
+    """
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+    
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Credenciales inválidas",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        email: str = payload.get("sub")
+        if email is None:
+            raise credentials_exception
+        token_data = schemas.TokenData(email=email)
+    except JWTError:
+        raise credentials_exception
+    
+    result = await db.execute(select(models.Usuario).where(models.Usuario.email == token_data.email))
+    user = result.scalars().first()
+    if user is None:
+        raise credentials_exception
+    if not user.activo:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Usuario inactivo. Contacte al administrador."
+        )
+    
+    # Actualizar último acceso
+    user.ultimo_acceso = datetime.utcnow()
+    await db.commit()
+    
+    return user
+
+async def get_current_active_user_async(current_user: models.Usuario = Depends(get_current_user_async)):
+    """Verificar que el usuario actual esté activo (versión asíncrona)"""
+    if not current_user.activo:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Usuario inactivo. Contacte al administrador."
+        )
+    return current_user
+
+async def role_has_permission(user: Optional[models.Usuario], permission_code: str, db: AsyncSession) -> bool:
+    """
+    Verifica que el rol del usuario tenga el permiso consultando rol_permiso.
+    Se usa en los endpoints de diagnóstico en lugar de check_permission, que
+    está desactivado y acepta a cualquier usuario.
+    """
+    if user is None:
+        return False
+    result = await db.execute(
+        select(func.count()).select_from(models.rol_permiso).join(
+            models.Permiso, models.Permiso.id == models.rol_permiso.c.permiso_id
+        ).where(
+            models.rol_permiso.c.rol_id == user.role_id,
+            models.Permiso.codigo == permission_code
+        )
+    )
+    return result.scalar_one() > 0
+
 def check_permission(user: models.Usuario, permission_code: str, db: Session):
     """Verificar si el usuario tiene un permiso específico"""
     # TEMPORALMENTE DESACTIVADO PARA DEPURACIÓN - SIEMPRE DEVUELVE TRUE
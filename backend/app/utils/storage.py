@@ -2,18 +2,36 @@ import os
 import shutil
 import hashlib
 import logging
-import difflib
+import sys
+import uuid
 from datetime import datetime
 from typing import Optional, Tuple, Dict, Any, List
 from fastapi import UploadFile
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
 
 from ..db import models
+from ..db.lineage import get_current_version
 from ..utils.config import settings
+from ..utils.diff import compare_files
+from ..utils.text_extraction import schedule_text_extraction
+from ..utils.metrics import observe_storage, record_transfer
+from ..utils.outbox import dispatch_events, record_event
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# ioctl de Linux para clonar un archivo por referencia (reflink); None en otras plataformas
+FICLONE = 0x40049409 if fcntl is not None and sys.platform.startswith("linux") else None
+
+# Directorio (dentro de DOCUMENT_STORAGE_PATH) de los archivos de versiones aún no confirmadas
+STAGING_DIR = ".staging"
+
 class StorageService:
     """
     Servicio para gestionar el almacenamiento físico de documentos y sus versiones.
@@ -54,12 +72,14 @@ class StorageService:
             
             # Leer contenido del archivo
             contents = await file.read()
+            record_transfer("upload", len(contents))
             
             # Calcular hash del archivo para verificación de integridad
-            file_hash = hashlib.sha256(contents).hexdigest()
+            with observe_storage("hash"):
+                file_hash = hashlib.sha256(contents).hexdigest()
             
             # Guardar archivo
-            with open(file_path, "wb") as buffer:
+            with observe_storage("save"), open(file_path, "wb") as buffer:
                 buffer.write(contents)
             
             # Preparar metadatos
@@ -72,6 +92,9 @@ class StorageService:
                 "estado_integridad": True
             }
             
+            # Extraer el texto (PDF y DOCX) en segundo plano para las comparaciones
+            schedule_text_extraction(file_path, file_hash, file_extension)
+            
             # Registrar operación exitosa
             logger.info(f"Archivo guardado correctamente: {file_path}")
             
@@ -125,7 +148,7 @@ class StorageService:
                 return False, f"Archivo no encontrado en la ruta: {documento.path_archivo}"
             
             # Leer archivo y calcular hash
-            with open(documento.path_archivo, "rb") as file:
+            with observe_storage("verify"), open(documento.path_archivo, "rb") as file:
                 contents = file.read()
                 current_hash = hashlib.sha256(contents).hexdigest()
             
@@ -241,7 +264,8 @@ class StorageService:
             backup_path = os.path.join(backup_dir, backup_filename)
             
             # Copiar archivo
-            shutil.copy2(documento.path_archivo, backup_path)
+            with observe_storage("copy"):
+                shutil.copy2(documento.path_archivo, backup_path)
             
             return True, "Respaldo creado correctamente", backup_path
             
@@ -249,6 +273,143 @@ class StorageService:
             logger.error(f"Error al crear respaldo: {str(e)}")
             return False, f"Error al crear respaldo: {str(e)}", None
     
+    @staticmethod
+    def _staging_path(file_extension: str) -> str:
+        """
+        Ruta temporal para el archivo de una versión en preparación. Está en el mismo
+        sistema de archivos que las versiones, así que publicarla es un os.replace atómico.
+        """
+        staging_dir = os.path.join(settings.DOCUMENT_STORAGE_PATH, STAGING_DIR)
+        os.makedirs(staging_dir, exist_ok=True)
+        return os.path.join(staging_dir, f"{uuid.uuid4().hex}{file_extension or ''}")
+    
+    @staticmethod
+    def _clone_file(source: str, destination: str) -> str:
+        """
+        Reproduce un archivo de versión sin copiar su contenido cuando es posible. Los
+        archivos de versiones son inmutables, así que un enlace duro alcanza; si el
+        sistema de archivos no lo admite se intenta un reflink (copia por referencia en
+        Btrfs, XFS, etc.) y, por último, una copia completa.
+        
+        Returns:
+            Método usado: "hardlink", "reflink" o "copy"
+        """
+        try:
+            os.link(source, destination)
+            return "hardlink"
+        except OSError:
+            pass
+        
+        if FICLONE is not None:
+            try:
+                with open(source, "rb") as src, open(destination, "wb") as dst:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                shutil.copystat(source, destination)
+                return "reflink"
+            except OSError:
+                pass
+        
+        shutil.copy2(source, destination)
+        return "copy"
+    
+    @staticmethod
+    def _lock_document(db: Session, document_id: int) -> Optional[models.Documento]:
+        """
+        Bloquea la fila del documento (SELECT ... FOR UPDATE) hasta el fin de la transacción.
+        Serializa la creación de versiones del mismo documento sin afectar a los demás.
+        """
+        return db.query(models.Documento).filter(
+            models.Documento.id == document_id,
+            models.Documento.activo == True
+        ).with_for_update().populate_existing().first()
+    
+    @staticmethod
+    def _publish_version(
+        db: Session,
+        documento: models.Documento,
+        staged_path: str,
+        file_hash: str,
+        file_size: int,
+        file_extension: str,
+        **campos
+    ) -> Tuple[models.VersionDocumento, models.EventoPendiente]:
+        """
+        Agrega una nueva versión a la transacción en curso, con el documento ya bloqueado:
+        calcula el número, desmarca la versión actual, actualiza el documento, registra el
+        evento version_creada y mueve el archivo de staging a su ruta definitiva. El commit
+        queda a cargo del llamador, que debe eliminar el archivo publicado si el commit falla.
+        
+        Args:
+            campos: Columnas restantes de la versión (comentario, cambios, usuario_id, titulo_archivo)
+        """
+        ultima_version = get_current_version(db, documento)
+        nuevo_numero_version = ultima_version.numero_version + 1 if ultima_version else 1
+        
+        # Crear directorio para versiones si no existe
+        versions_dir = os.path.join(settings.DOCUMENT_STORAGE_PATH, str(documento.id), "versions")
+        os.makedirs(versions_dir, exist_ok=True)
+        version_file_path = os.path.join(versions_dir, f"{documento.id}_v{nuevo_numero_version}{file_extension or ''}")
+        
+        if ultima_version:
+            # Desmarcar la versión anterior antes de insertar la nueva (índice único parcial sobre es_actual)
+            ultima_version.es_actual = False
+            db.flush()
+        
+        nueva_version = models.VersionDocumento(
+            documento_id=documento.id,
+            numero_version=nuevo_numero_version,
+            fecha_version=datetime.utcnow(),
+            path_archivo=version_file_path,
+            version_anterior_id=ultima_version.id if ultima_version else None,
+            hash_archivo=file_hash,
+            tamano_archivo=file_size,
+            extension_archivo=file_extension,
+            es_actual=True,
+            **campos
+        )
+        db.add(nueva_version)
+        db.flush()
+        
+        # Actualizar el documento principal con la información de la nueva versión
+        documento.version_actual_id = nueva_version.id
+        documento.path_archivo = version_file_path
+        documento.hash_archivo = file_hash
+        documento.tamano_archivo = file_size
+        documento.extension_archivo = file_extension
+        documento.fecha_modificacion = datetime.utcnow()
+        documento.fecha_ultima_verificacion = datetime.utcnow()
+        documento.estado_integridad = True
+        
+        evento = record_event(
+            db, "version_creada", documento.id,
+            version_id=nueva_version.id, path=version_file_path, hash=file_hash, extension=file_extension
+        )
+        db.flush()
+        
+        # Publicar el archivo al final: si algo de lo anterior falla, sigue en staging
+        with observe_storage("publish"):
+            os.replace(staged_path, version_file_path)
+        return nueva_version, evento
+    
+    @staticmethod
+    def _discard_files(*paths: Optional[str]) -> None:
+        """Elimina los archivos de una versión que no llegó a confirmarse."""
+        for path in paths:
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                    logger.info(f"Archivo temporal eliminado: {path}")
+                except OSError as cleanup_error:
+                    logger.error(f"Error al limpiar archivo temporal: {str(cleanup_error)}")
+    
+    @staticmethod
+    def _dispatch_event(db: Session, event_id: int) -> None:
+        """Despacha un evento recién confirmado; si falla, lo retoma el reintento periódico."""
+        try:
+            dispatch_events(db, [event_id])
+        except Exception as e:
+            logger.warning(f"Evento {event_id} diferido: {str(e)}")
+    
     @staticmethod
     async def create_document_version(
         file: UploadFile,
@@ -261,6 +422,12 @@ class StorageService:
         """
         Crea una nueva versión de un documento existente.
         
+        El archivo se escribe primero en staging, fuera de cualquier bloqueo. Luego,
+        en una única transacción con el documento bloqueado, se calcula el número de
+        versión, se registran la versión, el documento, el historial y el evento
+        version_creada, y se publica el archivo; las cargas concurrentes sobre el mismo
+        documento esperan el bloqueo y toman el número siguiente.
+        
         Args:
             file: Archivo de la nueva versión
             document_id: ID del documento
@@ -275,11 +442,11 @@ class StorageService:
             - Mensaje (str)
             - ID de la versión creada (int o None)
         """
-        nueva_version_id = None
+        staged_path = None
         version_file_path = None
         
         try:
-            # Verificar que el documento existe
+            # Verificar que el documento existe antes de recibir el archivo
             documento = db.query(models.Documento).filter(
                 models.Documento.id == document_id,
                 models.Documento.activo == True
@@ -288,145 +455,71 @@ class StorageService:
             if not documento:
                 return False, f"Documento con ID {document_id} no encontrado", None
             
-            # Obtener la última versión del documento
-            ultima_version = db.query(models.VersionDocumento).filter(
-                models.VersionDocumento.documento_id == document_id,
-                models.VersionDocumento.es_actual == True
-            ).first()
-            
-            # Si no hay versión actual, buscar la versión con número más alto
-            if not ultima_version:
-                ultima_version = db.query(models.VersionDocumento).filter(
-                    models.VersionDocumento.documento_id == document_id
-                ).order_by(models.VersionDocumento.numero_version.desc()).first()
-            
-            # Determinar el número de la nueva versión
-            nuevo_numero_version = 1
-            version_anterior_id = None
-            
-            if ultima_version:
-                nuevo_numero_version = ultima_version.numero_version + 1
-                version_anterior_id = ultima_version.id
-            
-            # Crear directorio para versiones si no existe
-            versions_dir = os.path.join(settings.DOCUMENT_STORAGE_PATH, str(document_id), "versions")
-            os.makedirs(versions_dir, exist_ok=True)
-            
             # Obtener extensión del archivo
             file_extension = os.path.splitext(file.filename)[1].lower()
             
-            # Definir ruta completa del archivo de la versión
-            version_file_path = os.path.join(versions_dir, f"{document_id}_v{nuevo_numero_version}{file_extension}")
-            
             # Leer contenido del archivo
             contents = await file.read()
+            record_transfer("upload", len(contents))
             
             # Calcular hash del archivo
-            file_hash = hashlib.sha256(contents).hexdigest()
+            with observe_storage("hash"):
+                file_hash = hashlib.sha256(contents).hexdigest()
             
-            # Guardar archivo de la versión
-            with open(version_file_path, "wb") as buffer:
+            # Guardar el archivo en staging, sin bloquear el documento
+            staged_path = StorageService._staging_path(file_extension)
+            with observe_storage("save"), open(staged_path, "wb") as buffer:
                 buffer.write(contents)
             
-            # Usar transacciones separadas para cada operación principal
-            # Transacción 1: Actualizar la versión anterior
-            if ultima_version:
-                try:
-                    # Actualizar la versión anterior para que no sea la actual
-                    ultima_version.es_actual = False
-                    db.add(ultima_version)
-                    db.commit()
-                except Exception as e:
-                    logger.error(f"Error al actualizar versión anterior: {str(e)}")
-                    # Continuar con el proceso, no es crítico
-            
-            # Transacción 2: Crear nueva versión
-            try:
-                # Crear registro de la nueva versión
-                nueva_version = models.VersionDocumento(
-                    documento_id=document_id,
-                    numero_version=nuevo_numero_version,
-                    fecha_version=datetime.utcnow(),
-                    comentario=comentario,
-                    cambios=cambios,
-                    path_archivo=version_file_path,
-                    usuario_id=user_id,
-                    version_anterior_id=version_anterior_id,
-                    hash_archivo=file_hash,
-                    tamano_archivo=len(contents),
-                    extension_archivo=file_extension,
-                    es_actual=True,
-                    titulo_archivo=file.filename
-                )
-                
-                db.add(nueva_version)
-                db.commit()
-                db.refresh(nueva_version)
-                nueva_version_id = nueva_version.id
-                
-                logger.info(f"Nueva versión creada con ID: {nueva_version_id}")
-            except Exception as e:
-                logger.error(f"Error al crear registro de nueva versión: {str(e)}")
-                if os.path.exists(version_file_path):
-                    try:
-                        os.remove(version_file_path)
-                    except:
-                        pass
-                raise
-            
-            # Transacción 3: Actualizar documento principal
-            try:
-                # Actualizar el documento principal con la información de la nueva versión
-                documento.path_archivo = version_file_path
-                documento.hash_archivo = file_hash
-                documento.tamano_archivo = len(contents)
-                documento.extension_archivo = file_extension
-                documento.fecha_modificacion = datetime.utcnow()
-                documento.fecha_ultima_verificacion = datetime.utcnow()
-                documento.estado_integridad = True
-                
-                db.add(documento)
-                db.commit()
-            except Exception as e:
-                logger.error(f"Error al actualizar documento principal: {str(e)}")
-                # No lanzar excepción, la versión ya se creó correctamente
+            # Transacción única con el documento bloqueado
+            documento = StorageService._lock_document(db, document_id)
+            if not documento:
+                db.rollback()
+                StorageService._discard_files(staged_path)
+                return False, f"Documento con ID {document_id} no encontrado", None
             
-            # Transacción 4: Registrar historial (no crítico)
-            try:
-                # Registrar la acción en el historial
-                historial = models.HistorialAcceso(
-                    usuario_id=user_id,
-                    documento_id=document_id,
-                    accion="nueva_version",
-                    detalles=f"Nueva versión {nuevo_numero_version} creada"
-                )
-                db.add(historial)
-                db.commit()
-            except Exception as e:
-                logger.error(f"Error al registrar historial: {str(e)}")
-                # No lanzar excepción, la versión ya se creó correctamente
+            nueva_version, evento = StorageService._publish_version(
+                db, documento, staged_path, file_hash, len(contents), file_extension,
+                comentario=comentario,
+                cambios=cambios,
+                usuario_id=user_id,
+                titulo_archivo=file.filename
+            )
+            version_file_path = nueva_version.path_archivo
+            nuevo_numero_version = nueva_version.numero_version
+            nueva_version_id, evento_id = nueva_version.id, evento.id
+            
+            # Registrar la acción en el historial
+            historial = models.HistorialAcceso(
+                usuario_id=user_id,
+                documento_id=document_id,
+                accion="nueva_version",
+                detalles=f"Nueva versión {nuevo_numero_version} creada"
+            )
+            db.add(historial)
+            db.commit()
+            
+            logger.info(f"Nueva versión creada con ID: {nueva_version_id}")
+            StorageService._dispatch_event(db, evento_id)
             
             return True, f"Versión {nuevo_numero_version} creada correctamente", nueva_version_id
             
         except Exception as e:
             logger.error(f"Error al crear versión: {str(e)}")
+            try:
+                db.rollback()
+            except Exception:
+                pass
             
-            # Si ya se creó la versión en la base de datos pero ocurrió un error posterior
-            if nueva_version_id is not None:
-                logger.warning(f"Se creó la versión con ID {nueva_version_id} pero ocurrió un error posterior")
-                return True, f"Versión creada con advertencias: {str(e)}", nueva_version_id
+            # Nada quedó confirmado: eliminar el archivo en staging o ya publicado
+            StorageService._discard_files(staged_path, version_file_path)
             
-            # Si el archivo se guardó pero no se creó el registro en la base de datos
-            if version_file_path and os.path.exists(version_file_path):
-                try:
-                    os.remove(version_file_path)
-                    logger.info(f"Archivo temporal eliminado: {version_file_path}")
-                except Exception as cleanup_error:
-                    logger.error(f"Error al limpiar archivo temporal: {str(cleanup_error)}")
+            if isinstance(e, IntegrityError):
+                # Solo ocurre si otra escritura eludió el bloqueo del documento
+                return False, "Conflicto con otra versión creada al mismo tiempo, intente nuevamente", None
             
             # Registrar error
             try:
-                db.rollback()
                 error_log = models.ErrorAlmacenamiento(
                     documento_id=document_id,
                     usuario_id=user_id,
@@ -453,7 +546,8 @@ class StorageService:
         comentario: Optional[str] = None
     ) -> Tuple[bool, str, Optional[int]]:
         """
-        Restaura una versión específica de un documento, creando una nueva versión.
+        Restaura una versión específica de un documento, creando una nueva versión
+        en una única transacción con el documento bloqueado (ver create_document_version).
         
         Args:
             document_id: ID del documento
@@ -468,6 +562,9 @@ class StorageService:
             - Mensaje (str)
             - ID de la nueva versión creada (int o None)
         """
+        staged_path = None
+        version_file_path = None
+        
         try:
             # Verificar que el documento existe
             documento = db.query(models.Documento).filter(
@@ -491,77 +588,37 @@ class StorageService:
             if not os.path.exists(version.path_archivo):
                 return False, f"Archivo de la versión no encontrado: {version.path_archivo}", None
             
-            # Obtener la última versión del documento
-            ultima_version = db.query(models.VersionDocumento).filter(
-                models.VersionDocumento.documento_id == document_id,
-                models.VersionDocumento.es_actual == True
-            ).first()
-            
-            # Si no hay versión actual, buscar la versión con número más alto
-            if not ultima_version:
-                ultima_version = db.query(models.VersionDocumento).filter(
-                    models.VersionDocumento.documento_id == document_id
-                ).order_by(models.VersionDocumento.numero_version.desc()).first()
-            
-            # Determinar el número de la nueva versión
-            nuevo_numero_version = 1
-            version_anterior_id = None
-            
-            if ultima_version:
-                nuevo_numero_version = ultima_version.numero_version + 1
-                version_anterior_id = ultima_version.id
-                
-                # Actualizar la versión anterior para que no sea la actual
-                ultima_version.es_actual = False
-                db.add(ultima_version)
-            
-            # Crear directorio para versiones si no existe
-            versions_dir = os.path.join(settings.DOCUMENT_STORAGE_PATH, str(document_id), "versions")
-            os.makedirs(versions_dir, exist_ok=True)
-            
-            # Definir ruta completa del archivo de la nueva versión
-            version_file_path = os.path.join(versions_dir, f"{document_id}_v{nuevo_numero_version}{version.extension_archivo}")
-            
-            # Copiar archivo de la versión a restaurar
-            shutil.copy2(version.path_archivo, version_file_path)
-            
-            # Calcular hash del archivo
-            with open(version_file_path, "rb") as file:
-                contents = file.read()
-                file_hash = hashlib.sha256(contents).hexdigest()
+            # Reutilizar el archivo de la versión a restaurar en staging, sin bloquear el documento
+            staged_path = StorageService._staging_path(version.extension_archivo)
+            with observe_storage("copy"):
+                StorageService._clone_file(version.path_archivo, staged_path)
+            file_size = os.path.getsize(staged_path)
+            
+            # El contenido es el de la versión restaurada: su hash ya es conocido
+            file_hash = version.hash_archivo
+            if not file_hash:
+                with open(staged_path, "rb") as file:
+                    contents = file.read()
+                    with observe_storage("hash"):
+                        file_hash = hashlib.sha256(contents).hexdigest()
+            
+            # Transacción única con el documento bloqueado
+            documento = StorageService._lock_document(db, document_id)
+            if not documento:
+                db.rollback()
+                StorageService._discard_files(staged_path)
+                return False, f"Documento con ID {document_id} no encontrado", None
             
-            # Crear registro de la nueva versión
-            nueva_version = models.VersionDocumento(
-                documento_id=document_id,
-                numero_version=nuevo_numero_version,
-                fecha_version=datetime.utcnow(),
+            nueva_version, evento = StorageService._publish_version(
+                db, documento, staged_path, file_hash, file_size, version.extension_archivo,
                 comentario=comentario or f"Restauración de la versión {version.numero_version}",
                 cambios=f"Restauración de la versión {version.numero_version}",
-                path_archivo=version_file_path,
                 usuario_id=user_id,
-                version_anterior_id=version_anterior_id,
-                hash_archivo=file_hash,
-                tamano_archivo=os.path.getsize(version_file_path),
-                extension_archivo=version.extension_archivo,
-                es_actual=True,
                 titulo_archivo=version.titulo_archivo
             )
-            
-            db.add(nueva_version)
-            db.commit()
-            db.refresh(nueva_version)
-            
-            # Actualizar el documento principal con la información de la nueva versión
-            documento.path_archivo = version_file_path
-            documento.hash_archivo = file_hash
-            documento.tamano_archivo = os.path.getsize(version_file_path)
-            documento.extension_archivo = version.extension_archivo
-            documento.fecha_modificacion = datetime.utcnow()
-            documento.fecha_ultima_verificacion = datetime.utcnow()
-            documento.estado_integridad = True
-            
-            db.add(documento)
-            db.commit()
+            version_file_path = nueva_version.path_archivo
+            nuevo_numero_version = nueva_version.numero_version
+            nueva_version_id, evento_id = nueva_version.id, evento.id
             
             # Registrar la acción en el historial
             historial = models.HistorialAcceso(
@@ -572,12 +629,17 @@ class StorageService:
             )
             db.add(historial)
             db.commit()
+            StorageService._dispatch_event(db, evento_id)
             
-            return True, f"Versión {version.numero_version} restaurada como versión {nuevo_numero_version}", nueva_version.id
+            return True, f"Versión {version.numero_version} restaurada como versión {nuevo_numero_version}", nueva_version_id
             
         except Exception as e:
             logger.error(f"Error al restaurar versión: {str(e)}")
             db.rollback()
+            StorageService._discard_files(staged_path, version_file_path)
+            
+            if isinstance(e, IntegrityError):
+                return False, "Conflicto con otra versión creada al mismo tiempo, intente nuevamente", None
             
             # Registrar error
             error_log = models.ErrorAlmacenamiento(
@@ -595,11 +657,153 @@ class StorageService:
             return False, f"Error al restaurar versión: {str(e)}", None
     
     @staticmethod
-    def compare_versions(
+    def get_versions_to_compare(
         document_id: int,
         version_id1: int,
         version_id2: int,
         db: Session
+    ) -> Tuple[bool, str, Optional[Tuple[models.VersionDocumento, models.VersionDocumento]]]:
+        """
+        Obtiene las dos versiones a comparar verificando que pertenecen al documento
+        y que sus archivos existen.
+        
+        Returns:
+            Tuple con:
+            - Éxito de la operación (bool)
+            - Mensaje (str)
+            - Las dos versiones (Tuple o None)
+        """
+        # Verificar que el documento existe
+        documento = db.query(models.Documento).filter(
+            models.Documento.id == document_id,
+            models.Documento.activo == True
+        ).first()
+        
+        if not documento:
+            return False, f"Documento con ID {document_id} no encontrado", None
+        
+        # Verificar que las versiones existen y pertenecen al documento
+        # Se carga el usuario de cada versión junto con la versión (se usa en el resultado)
+        version1 = db.query(models.VersionDocumento).options(
+            joinedload(models.VersionDocumento.usuario)
+        ).filter(
+            models.VersionDocumento.id == version_id1,
+            models.VersionDocumento.documento_id == document_id
+        ).first()
+        
+        version2 = db.query(models.VersionDocumento).options(
+            joinedload(models.VersionDocumento.usuario)
+        ).filter(
+            models.VersionDocumento.id == version_id2,
+            models.VersionDocumento.documento_id == document_id
+        ).first()
+        
+        if not version1:
+            return False, f"Versión con ID {version_id1} no encontrada para el documento {document_id}", None
+            
+        if not version2:
+            return False, f"Versión con ID {version_id2} no encontrada para el documento {document_id}", None
+        
+        # Verificar que los archivos de las versiones existen
+        if not os.path.exists(version1.path_archivo):
+            return False, f"Archivo de la versión {version_id1} no encontrado: {version1.path_archivo}", None
+            
+        if not os.path.exists(version2.path_archivo):
+            return False, f"Archivo de la versión {version_id2} no encontrado: {version2.path_archivo}", None
+        
+        return True, "Versiones encontradas", (version1, version2)
+    
+    @staticmethod
+    def compare_version_files(
+        version1: models.VersionDocumento,
+        version2: models.VersionDocumento
+    ) -> Dict[str, Any]:
+        """
+        Compara los archivos de dos versiones con el motor de diff.
+        El resultado se toma de la caché si el par de hashes ya se comparó.
+        """
+        return compare_files(
+            version1.path_archivo,
+            version2.path_archivo,
+            version1.hash_archivo,
+            version2.hash_archivo,
+            fromfile=f"v{version1.numero_version}",
+            tofile=f"v{version2.numero_version}"
+        )
+    
+    @staticmethod
+    def comparison_summary(
+        version1: models.VersionDocumento,
+        version2: models.VersionDocumento,
+        comparison: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Metadatos de las versiones comparadas y conteo de cambios, sin el diff.
+        """
+        def version_info(version: models.VersionDocumento) -> Dict[str, Any]:
+            return {
+                "numero": version.numero_version,
+                "fecha": version.fecha_version.isoformat(),
+                "usuario": f"{version.usuario.nombre} {version.usuario.apellido}",
+                "tamano": version.tamano_archivo,
+                "comentario": version.comentario,
+                "cambios": version.cambios
+            }
+        
+        return {
+            "version1": version_info(version1),
+            "version2": version_info(version2),
+            "added_lines": comparison["added_lines"],
+            "removed_lines": comparison["removed_lines"],
+            "is_binary": comparison["is_binary"],
+            "is_approximate": comparison["is_approximate"],
+            "is_too_large": comparison["is_too_large"],
+            "is_text_extracted": comparison.get("is_text_extracted", False)
+        }
+    
+    @staticmethod
+    def comparison_result(
+        version1: models.VersionDocumento,
+        version2: models.VersionDocumento,
+        comparison: Dict[str, Any],
+        max_lines: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Resultado completo de la comparación; con max_lines el diff y los cambios
+        por párrafo se recortan y se marcan como truncados (el resultado completo
+        se obtiene en NDJSON).
+        """
+        diff = comparison["diff"]
+        changes = comparison.get("changes")
+        truncated = max_lines is not None and (
+            len(diff or []) > max_lines or len(changes or []) > max_lines
+        )
+        return {
+            **StorageService.comparison_summary(version1, version2, comparison),
+            "diff": diff[:max_lines] if truncated and diff is not None else diff,
+            "changes": changes[:max_lines] if truncated and changes is not None else changes,
+            "truncated": truncated
+        }
+    
+    @staticmethod
+    def comparison_message(comparison: Dict[str, Any]) -> str:
+        if comparison["is_binary"]:
+            return "Los archivos son binarios, solo se pueden comparar metadatos"
+        if comparison.get("is_text_extracted"):
+            return "Comparación realizada sobre el texto extraído de los documentos"
+        if comparison["is_too_large"]:
+            return "Los archivos superan el tamaño máximo para comparar, solo se pueden comparar metadatos"
+        if comparison["is_approximate"]:
+            return "Comparación aproximada: se agotó el tiempo máximo de cálculo"
+        return "Comparación realizada correctamente"
+    
+    @staticmethod
+    def compare_versions(
+        document_id: int,
+        version_id1: int,
+        version_id2: int,
+        db: Session,
+        max_lines: Optional[int] = None
     ) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
         """
         Compara dos versiones de un documento.
@@ -609,6 +813,7 @@ class StorageService:
             version_id1: ID de la primera versión a comparar
             version_id2: ID de la segunda versión a comparar
             db: Sesión de base de datos
+            max_lines: Máximo de líneas de diff en el resultado (None: sin límite)
             
         Returns:
             Tuple con:
@@ -617,107 +822,17 @@ class StorageService:
             - Diccionario con los resultados de la comparación (Dict o None)
         """
         try:
-            # Verificar que el documento existe
-            documento = db.query(models.Documento).filter(
-                models.Documento.id == document_id,
-                models.Documento.activo == True
-            ).first()
-            
-            if not documento:
-                return False, f"Documento con ID {document_id} no encontrado", None
-            
-            # Verificar que las versiones existen y pertenecen al documento
-            version1 = db.query(models.VersionDocumento).filter(
-                models.VersionDocumento.id == version_id1,
-                models.VersionDocumento.documento_id == document_id
-            ).first()
-            
-            version2 = db.query(models.VersionDocumento).filter(
-                models.VersionDocumento.id == version_id2,
-                models.VersionDocumento.documento_id == document_id
-            ).first()
-            
-            if not version1:
-                return False, f"Versión con ID {version_id1} no encontrada para el documento {document_id}", None
-                
-            if not version2:
-                return False, f"Versión con ID {version_id2} no encontrada para el documento {document_id}", None
-            
-            # Verificar que los archivos de las versiones existen
-            if not os.path.exists(version1.path_archivo):
-                return False, f"Archivo de la versión {version_id1} no encontrado: {version1.path_archivo}", None
-                
-            if not os.path.exists(version2.path_archivo):
-                return False, f"Archivo de la versión {version_id2} no encontrado: {version2.path_archivo}", None
+            success, message, versions = StorageService.get_versions_to_compare(
+                document_id, version_id1, version_id2, db
+            )
+            if not success:
+                return False, message, None
             
-            # Leer contenido de los archivos
-            try:
-                with open(version1.path_archivo, "r", encoding="utf-8") as file1:
-                    content1 = file1.readlines()
-                    
-                with open(version2.path_archivo, "r", encoding="utf-8") as file2:
-                    content2 = file2.readlines()
-            except UnicodeDecodeError:
-                # Si no se pueden leer como texto, comparar solo metadatos
-                return True, "Los archivos son binarios, solo se pueden comparar metadatos", {
-                    "version1": {
-                        "numero": version1.numero_version,
-                        "fecha": version1.fecha_version.isoformat(),
-                        "usuario": f"{version1.usuario.nombre} {version1.usuario.apellido}",
-                        "tamano": version1.tamano_archivo,
-                        "comentario": version1.comentario,
-                        "cambios": version1.cambios
-                    },
-                    "version2": {
-                        "numero": version2.numero_version,
-                        "fecha": version2.fecha_version.isoformat(),
-                        "usuario": f"{version2.usuario.nombre} {version2.usuario.apellido}",
-                        "tamano": version2.tamano_archivo,
-                        "comentario": version2.comentario,
-                        "cambios": version2.cambios
-                    },
-                    "diff": None,
-                    "is_binary": True
-                }
-            
-            # Generar diff
-            diff = list(difflib.unified_diff(
-                content1, 
-                content2, 
-                fromfile=f"v{version1.numero_version}", 
-                tofile=f"v{version2.numero_version}",
-                lineterm=""
-            ))
-            
-            # Contar cambios
-            added_lines = sum(1 for line in diff if line.startswith('+') and not line.startswith('+++'))
-            removed_lines = sum(1 for line in diff if line.startswith('-') and not line.startswith('---'))
-            
-            # Preparar resultado
-            result = {
-                "version1": {
-                    "numero": version1.numero_version,
-                    "fecha": version1.fecha_version.isoformat(),
-                    "usuario": f"{version1.usuario.nombre} {version1.usuario.apellido}",
-                    "tamano": version1.tamano_archivo,
-                    "comentario": version1.comentario,
-                    "cambios": version1.cambios
-                },
-                "version2": {
-                    "numero": version2.numero_version,
-                    "fecha": version2.fecha_version.isoformat(),
-                    "usuario": f"{version2.usuario.nombre} {version2.usuario.apellido}",
-                    "tamano": version2.tamano_archivo,
-                    "comentario": version2.comentario,
-                    "cambios": version2.cambios
-                },
-                "diff": diff,
-                "added_lines": added_lines,
-                "removed_lines": removed_lines,
-                "is_binary": False
-            }
+            version1, version2 = versions
+            comparison = StorageService.compare_version_files(version1, version2)
+            result = StorageService.comparison_result(version1, version2, comparison, max_lines)
             
-            return True, "Comparación realizada correctamente", result
+            return True, StorageService.comparison_message(comparison), result
             
         except Exception as e:
             logger.error(f"Error al comparar versiones: {str(e)}")
@@ -762,13 +877,18 @@ class StorageService:
                 if not success:
                     return False, "No se pudo crear respaldo del archivo actual antes de restaurar"
             
-            # Copiar archivo de respaldo a la ubicación original
-            shutil.copy2(backup_path, documento.path_archivo)
+            # Copiar archivo de respaldo a la ubicación original. Se reemplaza el archivo en
+            # lugar de sobrescribirlo: puede ser un enlace duro compartido con otra versión
+            staged_path = StorageService._staging_path(os.path.splitext(documento.path_archivo)[1])
+            with observe_storage("copy"):
+                shutil.copy2(backup_path, staged_path)
+                os.replace(staged_path, documento.path_archivo)
             
             # Recalcular hash y actualizar metadatos
             with open(documento.path_archivo, "rb") as file:
                 contents = file.read()
-                new_hash = hashlib.sha256(contents).hexdigest()
+                with observe_storage("hash"):
+                    new_hash = hashlib.sha256(contents).hexdigest()
             
             documento.hash_archivo = new_hash
             documento.tamano_archivo = os.path.getsize(documento.path_archivo)
@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
 from ..db import models
+from ..utils.document_events import INTEGRITY_FAILED, publish_document_event
 from ..utils.storage import StorageService
 
 # Configurar logging
@@ -22,6 +23,10 @@ async def verify_document_integrity(db: Session, document_id: int = None):
             # Verificar documento específico
             success, message = StorageService.verify_document_integrity(document_id, db)
             logger.info(f"Verificación de documento {document_id}: {message}")
+            if not success:
+                documento = db.query(models.Documento).filter(models.Documento.id == document_id).first()
+                if documento:
+                    await publish_document_event(INTEGRITY_FAILED, documento, mensaje=message)
             return
         
         # Obtener documentos que no han sido verificados en el último día
@@ -37,6 +42,7 @@ async def verify_document_integrity(db: Session, document_id: int = None):
             success, message = StorageService.verify_document_integrity(documento.id, db)
             if not success:
                 logger.warning(f"Documento {documento.id}: {message}")
+                await publish_document_event(INTEGRITY_FAILED, documento, mensaje=message)
                 
                 # Crear respaldo automático si falla la verificación
                 backup_success, backup_message, backup_path = StorageService.create_backup(documento.id, db)
@@ -97,3 +103,30 @@ async def cleanup_old_backups(db: Session, days_to_keep: int = 30):
         
     except Exception as e:
         logger.error(f"Error en limpieza de respaldos: {str(e)}")
+
+async def cleanup_staged_files():
+    """
+    Tarea en segundo plano para eliminar archivos de versiones que quedaron en
+    staging porque el worker cayó antes de confirmar la transacción.
+    """
+    import os
+    from ..utils.config import settings
+    from ..utils.storage import STAGING_DIR
+    
+    try:
+        staging_dir = os.path.join(settings.DOCUMENT_STORAGE_PATH, STAGING_DIR)
+        if not os.path.exists(staging_dir):
+            return
+        
+        cutoff = datetime.now() - timedelta(hours=settings.STAGING_MAX_AGE_HOURS)
+        count_deleted = 0
+        for staged_file in os.listdir(staging_dir):
+            file_path = os.path.join(staging_dir, staged_file)
+            if datetime.fromtimestamp(os.path.getmtime(file_path)) < cutoff:
+                os.remove(file_path)
+                count_deleted += 1
+        
+        logger.info(f"Limpieza de staging completada: {count_deleted} archivos eliminados")
+        
+    except Exception as e:
+        logger.error(f"Error en limpieza de staging: {str(e)}")
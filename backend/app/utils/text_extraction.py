@@ -0,0 +1,187 @@
+"""
+Extracción de texto de versiones PDF y DOCX para compararlas.
+
+El texto se extrae como páginas de párrafos y se guarda comprimido en
+TEXT_CACHE_PATH por hash de contenido (las versiones son inmutables), de modo que
+cada archivo se procesa una sola vez y todos los workers comparten el resultado.
+La extracción se programa en un pool dedicado al crear cada versión; si todavía
+no terminó cuando se comparan las versiones, se hace en ese momento.
+
+Los DOCX se leen directamente de su XML. Los PDF requieren pypdf; si no está
+instalado, se comparan solo por metadatos como el resto de los binarios.
+"""
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import zipfile
+from typing import List, Optional
+from xml.etree import ElementTree
+
+from .config import settings
+from .executors import BoundedExecutor, ExecutorSaturatedError
+from .metrics import observe_storage
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - depende de la instalación
+    PdfReader = None
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Páginas de párrafos: [[párrafo, ...], ...]
+Pages = List[List[str]]
+
+EXTRACTABLE_EXTENSIONS = (".pdf", ".docx")
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+# Fin de línea que cierra un párrafo en el texto de un PDF
+PARAGRAPH_END = re.compile(r"[.:;!?]$")
+
+# Pool dedicado a la extracción: no compite con los diffs ni con las solicitudes
+extraction_executor = BoundedExecutor(
+    "text-extraction",
+    max_workers=settings.TEXT_EXTRACTION_WORKERS,
+    max_pending=settings.TEXT_EXTRACTION_MAX_PENDING
+)
+
+def can_extract(extension: Optional[str]) -> bool:
+    """Indica si se puede extraer texto de los archivos con esta extensión."""
+    extension = (extension or "").lower()
+    if extension == ".pdf":
+        return PdfReader is not None
+    return extension in EXTRACTABLE_EXTENSIONS
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+def extract_docx(path: str) -> Pages:
+    """
+    Párrafos del cuerpo de un DOCX. Las páginas se separan en los saltos de página
+    explícitos y en los que Word registró al guardar (lastRenderedPageBreak).
+    """
+    with zipfile.ZipFile(path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+
+    pages: Pages = [[]]
+    for paragraph in root.iter(f"{WORD_NAMESPACE}p"):
+        parts = []
+        for element in paragraph.iter():
+            if element.tag == f"{WORD_NAMESPACE}t" and element.text:
+                parts.append(element.text)
+            elif element.tag == f"{WORD_NAMESPACE}tab":
+                parts.append(" ")
+            elif (
+                element.tag == f"{WORD_NAMESPACE}lastRenderedPageBreak"
+                or (element.tag == f"{WORD_NAMESPACE}br" and element.get(f"{WORD_NAMESPACE}type") == "page")
+            ):
+                text = _normalize("".join(parts))
+                if text:
+                    pages[-1].append(text)
+                parts = []
+                if pages[-1]:
+                    pages.append([])
+        text = _normalize("".join(parts))
+        if text:
+            pages[-1].append(text)
+    return [page for page in pages if page] or [[]]
+
+def split_paragraphs(text: str) -> List[str]:
+    """
+    Reconstruye los párrafos del texto de una página de PDF: las líneas se unen
+    hasta una línea en blanco o una línea que termina en puntuación final.
+    """
+    paragraphs = []
+    current: List[str] = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            current.append(line)
+        if current and (not line or PARAGRAPH_END.search(line)):
+            paragraphs.append(_normalize(" ".join(current)))
+            current = []
+    if current:
+        paragraphs.append(_normalize(" ".join(current)))
+    return paragraphs
+
+def extract_pdf(path: str) -> Pages:
+    """Párrafos de cada página de un PDF."""
+    reader = PdfReader(path)
+    return [split_paragraphs(page.extract_text() or "") for page in reader.pages]
+
+def has_text(pages: Optional[Pages]) -> bool:
+    """Indica si se extrajo algún párrafo (los PDF escaneados no tienen capa de texto)."""
+    return bool(pages) and any(pages)
+
+def extract_pages(path: str, extension: str) -> Pages:
+    if extension.lower() == ".docx":
+        return extract_docx(path)
+    return extract_pdf(path)
+
+def _cache_file(file_hash: str) -> str:
+    return os.path.join(settings.TEXT_CACHE_PATH, file_hash[:2], f"{file_hash}.json.gz")
+
+def cached_pages(file_hash: str) -> Optional[dict]:
+    """Entrada de la caché ({"pages": ...}) o None si el archivo no se procesó."""
+    try:
+        with gzip.open(_cache_file(file_hash), "rt", encoding="utf-8") as cached:
+            return json.load(cached)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Texto extraído ilegible para {file_hash}: {str(e)}")
+        return None
+
+def _store(file_hash: str, entry: dict) -> None:
+    path = _cache_file(file_hash)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(temporary, "wt", encoding="utf-8", compresslevel=3) as cached:
+            json.dump(entry, cached, ensure_ascii=False)
+        os.replace(temporary, path)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar el texto extraído de {file_hash}: {str(e)}")
+
+def get_pages(path: str, file_hash: Optional[str], extension: str) -> Optional[Pages]:
+    """
+    Texto del archivo por páginas, desde la caché o extrayéndolo ahora.
+    Devuelve None si no se puede extraer. Los archivos dañados se recuerdan como
+    tales; las fallas transitorias (archivo ausente, falta de memoria) no.
+    """
+    if not can_extract(extension):
+        return None
+    cache = bool(file_hash and settings.TEXT_CACHE_PATH)
+    if cache:
+        entry = cached_pages(file_hash)
+        if entry is not None:
+            return entry["pages"]
+
+    try:
+        with observe_storage("extract_text"):
+            pages = extract_pages(path, extension)
+        entry = {"pages": pages}
+    except (OSError, MemoryError) as e:
+        logger.warning(f"No se pudo leer {path} para extraer el texto: {str(e)}")
+        return None
+    except Exception as e:
+        logger.warning(f"No se pudo extraer el texto de {path}: {str(e)}")
+        entry = {"pages": None, "error": str(e)}
+
+    if cache:
+        _store(file_hash, entry)
+    return entry["pages"]
+
+def schedule_text_extraction(path: str, file_hash: str, extension: str) -> None:
+    """
+    Programa la extracción del texto de una versión nueva en el pool dedicado.
+    Si el pool está saturado, el texto se extraerá al comparar la versión.
+    """
+    if not can_extract(extension) or not settings.TEXT_CACHE_PATH:
+        return
+    try:
+        extraction_executor.submit(get_pages, path, file_hash, extension)
+    except ExecutorSaturatedError:
+        logger.info(f"Extracción de texto de {path} diferida: pool de extracción saturado")
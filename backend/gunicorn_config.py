@@ -2,6 +2,12 @@
 Configuración de Gunicorn para producción
 """
 import multiprocessing
+import os
+import shutil
+
+# Métricas Prometheus multiproceso: cada worker escribe sus valores en este
+# directorio y /api/metrics los agrega. Debe definirse antes de cargar la app
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/hcdsys_metrics")
 
 # Configuración básica - reducida para evitar problemas de memoria
 bind = "0.0.0.0:8000"
@@ -24,3 +30,14 @@ limit_request_field_size = 8190
 
 # Configuración de rendimiento - reducida para evitar problemas de memoria
 worker_connections = 500  # Reducido a la mitad
+
+def on_starting(server):
+    """Vaciar el directorio de métricas para no arrastrar valores de ejecuciones anteriores"""
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+def child_exit(server, worker):
+    """Descartar los gauges "live" de un worker que terminó (p. ej. por max_requests)"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,68 @@
+"""
+Benchmarks de la escritura de auditoría: el RegistroAcceso que inserta
+AuthenticationMiddleware en cada solicitud, el HistorialAcceso de las rutas de
+documentos (ambos con AsyncSession y un commit por fila) y el vaciado en lote
+de LoginAttemptBuffer.
+"""
+from datetime import datetime
+from typing import Dict
+
+from .harness import BenchmarkSuite, measure, measure_async, run_async
+
+def run(suite: BenchmarkSuite, reference: Dict, repeat: int, batch_size: int = 50) -> None:
+    from sqlalchemy import select
+
+    from app.db import models
+    from app.db.database import AsyncSessionLocal, async_engine
+    from app.utils.login_attempts import LoginAttemptBuffer
+
+    print("Auditoría")
+
+    async def bench() -> None:
+        async with AsyncSessionLocal() as db:
+            documento_id = (await db.execute(select(models.Documento.id).limit(1))).scalar()
+
+            async def registro_acceso():
+                db.add(models.RegistroAcceso(
+                    usuario_id=reference["usuario_id"],
+                    ip_address="10.0.0.1",
+                    user_agent="benchmark",
+                    endpoint="/api/documents/",
+                    metodo="GET",
+                    exitoso=True,
+                    codigo_respuesta=200,
+                    tiempo_respuesta=1.0
+                ))
+                await db.commit()
+
+            suite.add("audit.registro_acceso", await measure_async(registro_acceso, repeat, warmup=5))
+
+            if documento_id is not None:
+                async def historial_acceso():
+                    db.add(models.HistorialAcceso(
+                        usuario_id=reference["usuario_id"],
+                        documento_id=documento_id,
+                        accion="consulta",
+                        detalles="benchmark"
+                    ))
+                    await db.commit()
+
+                suite.add("audit.historial_acceso", await measure_async(historial_acceso, repeat, warmup=5))
+        await async_engine.dispose()
+
+    run_async(bench())
+
+    buffer = LoginAttemptBuffer(max_size=batch_size + 1)
+
+    def flush():
+        for number in range(batch_size):
+            buffer.add({
+                "email": f"bench{number}@example.com",
+                "ip_address": "10.0.0.1",
+                "user_agent": "benchmark",
+                "exitoso": number % 2 == 0,
+                "fecha": datetime.utcnow()
+            })
+        assert buffer.flush() == batch_size
+
+    suite.add("audit.intentos_login_flush", measure(flush, repeat, warmup=2), batch=batch_size)
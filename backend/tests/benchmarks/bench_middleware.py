@@ -0,0 +1,58 @@
+"""
+Benchmarks del costo de los middlewares por solicitud.
+
+Se monta el mismo endpoint trivial en una aplicación sin middlewares y en otra
+con la pila de middlewares de app.main, y se mide una ruta pública (sin
+autenticación ni registro de acceso) y una protegida (token, consulta del
+usuario y RegistroAcceso). La diferencia de medianas es el costo de la pila.
+"""
+from typing import Dict
+
+import httpx
+from fastapi import FastAPI
+
+from .harness import BenchmarkSuite, measure_async, run_async
+
+def build_apps():
+    """Devuelve la aplicación sin middlewares y la aplicación con la pila de app.main."""
+    from app.main import app as main_app
+
+    def ping():
+        return {"status": "ok"}
+
+    bare = FastAPI()
+    stacked = FastAPI()
+    for application in (bare, stacked):
+        application.get("/api/health/ping")(ping)
+        application.get("/api/benchmark/ping")(ping)
+    stacked.user_middleware = list(main_app.user_middleware)
+    return bare, stacked
+
+def run(suite: BenchmarkSuite, reference: Dict, repeat: int) -> None:
+    from app.db.database import async_engine
+
+    print("Middlewares")
+    bare, stacked = build_apps()
+    headers = {"Authorization": f"Bearer {reference['token']}"}
+    cases = {
+        "sin_middlewares": (bare, "/api/benchmark/ping", {}),
+        "publica": (stacked, "/api/health/ping", {}),
+        "autenticada": (stacked, "/api/benchmark/ping", headers),
+    }
+
+    async def bench() -> None:
+        medians = {}
+        for name, (application, path, request_headers) in cases.items():
+            transport = httpx.ASGITransport(app=application)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                async def request():
+                    response = await client.get(path, headers=request_headers)
+                    assert response.status_code == 200, response.text
+
+                result = suite.add("middleware.request", await measure_async(request, repeat, warmup=5), case=name)
+                medians[name] = result["median_ms"]
+        for name in ("publica", "autenticada"):
+            print(f"  costo de la pila ({name}): {medians[name] - medians['sin_middlewares']:.3f} ms por solicitud")
+        await async_engine.dispose()
+
+    run_async(bench())
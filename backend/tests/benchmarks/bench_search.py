@@ -0,0 +1,97 @@
+"""
+Benchmarks de GET /api/documents/ (search_documents) sobre conjuntos de
+documentos sembrados con generate_series. Los conjuntos se siembran de forma
+incremental (10k, luego hasta 100k, luego hasta 1M) y se mide la solicitud
+completa a través de la aplicación, incluidos los middlewares.
+"""
+from typing import Dict, List
+
+import httpx
+from sqlalchemy import text
+
+from .harness import BenchmarkSuite, measure_async, run_async
+
+SEED_SQL = text("""
+    INSERT INTO documentos (
+        titulo, numero_expediente, descripcion, fecha_creacion, fecha_modificacion,
+        categoria_id, tipo_documento_id, usuario_id, path_archivo, activo
+    )
+    SELECT
+        (ARRAY['Ordenanza', 'Resolución', 'Decreto', 'Comunicación', 'Minuta'])[1 + g % 5]
+            || ' ' || g || ' sobre ' ||
+            (ARRAY['tránsito', 'presupuesto', 'obras públicas', 'salud', 'cultura', 'ambiente'])[1 + g % 6],
+        'EXP-' || lpad(g::text, 7, '0'),
+        'Expediente de prueba número ' || g || ' para benchmarks de búsqueda',
+        timestamp '2015-01-01' + (g % 3650) * interval '1 day',
+        timestamp '2015-01-01' + (g % 3650) * interval '1 day' + (g % 24) * interval '1 hour',
+        CASE WHEN g % 4 = 0 THEN NULL ELSE :categoria_id END,
+        :tipo_documento_id,
+        :usuario_id,
+        '/dev/null',
+        g % 20 <> 0
+    FROM generate_series(:start, :end) AS g
+""")
+
+def parse_dataset(value: str) -> int:
+    """Convierte "10k", "100k" o "1M" en una cantidad de documentos."""
+    value = value.strip().lower()
+    if value.endswith("k"):
+        return int(float(value[:-1]) * 1_000)
+    if value.endswith("m"):
+        return int(float(value[:-1]) * 1_000_000)
+    return int(value)
+
+def seed_documents(engine, reference: Dict, total: int, batch: int = 100_000) -> None:
+    """Completa los documentos sembrados hasta `total` y actualiza las estadísticas del planificador."""
+    with engine.begin() as conn:
+        current = conn.execute(text("SELECT count(*) FROM documentos WHERE path_archivo = '/dev/null'")).scalar()
+    for start in range(current + 1, total + 1, batch):
+        end = min(start + batch - 1, total)
+        with engine.begin() as conn:
+            conn.execute(SEED_SQL, {
+                "start": start,
+                "end": end,
+                "categoria_id": reference["categoria_id"],
+                "tipo_documento_id": reference["tipo_documento_id"],
+                "usuario_id": reference["usuario_id"],
+            })
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE documentos"))
+
+def search_queries(reference: Dict) -> Dict[str, Dict]:
+    """Consultas representativas de la pantalla de búsqueda."""
+    return {
+        "termino": {"termino": "presupuesto 12"},
+        "numero_expediente": {"numero_expediente": "EXP-0004321"},
+        "categoria": {"categoria_id": reference["categoria_id"]},
+        "rango_fechas": {"fecha_desde": "2020-01-01", "fecha_hasta": "2020-03-31"},
+        "usuario_pagina_50": {"usuario_id": reference["usuario_id"], "page": 50},
+        "orden_titulo": {"categoria_id": reference["categoria_id"], "sort_by": "titulo", "sort_order": "asc"},
+    }
+
+def run(suite: BenchmarkSuite, reference: Dict, datasets: List[str], repeat: int) -> None:
+    from app.db.database import async_engine, engine
+    from app.main import app
+
+    print("search_documents")
+    headers = {"Authorization": f"Bearer {reference['token']}"}
+    queries = search_queries(reference)
+
+    async def bench() -> None:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for label in sorted(datasets, key=parse_dataset):
+                total = parse_dataset(label)
+                print(f"  sembrando {total} documentos...")
+                seed_documents(engine, reference, total)
+                for name, params in queries.items():
+                    async def search():
+                        response = await client.get("/api/documents/", params=params, headers=headers)
+                        assert response.status_code == 200, response.text
+
+                    suite.add("search.search_documents", await measure_async(search, repeat, warmup=2),
+                              dataset=label, query=name)
+        # Las conexiones asyncpg quedan ligadas a este event loop
+        await async_engine.dispose()
+
+    run_async(bench())
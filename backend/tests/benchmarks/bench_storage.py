@@ -0,0 +1,130 @@
+"""
+Benchmarks de StorageService: save_document, verify_document_integrity y
+compare_versions con archivos de distintos tamaños.
+"""
+import hashlib
+import io
+import os
+import random
+from typing import Dict, List
+
+from fastapi import UploadFile
+
+from .harness import BenchmarkSuite, measure, measure_async, run_async
+
+def parse_size(value: str) -> int:
+    """Convierte "10KB", "1MB" o "512" en bytes."""
+    value = value.strip().upper()
+    for suffix, factor in (("KB", 1024), ("MB", 1024 ** 2), ("GB", 1024 ** 3), ("B", 1)):
+        if value.endswith(suffix):
+            return int(float(value[:-len(suffix)]) * factor)
+    return int(value)
+
+def text_content(size: int, seed: int, changed_fraction: float = 0.0) -> bytes:
+    """
+    Texto de `size` bytes en líneas de ~80 caracteres. Con changed_fraction > 0
+    modifica esa fracción de las líneas (la segunda versión de compare_versions).
+    """
+    rng = random.Random(seed)
+    words = ["artículo", "ordenanza", "concejo", "expediente", "municipal", "resolución", "comisión", "sesión"]
+    lines = []
+    total = 0
+    while total < size:
+        line = " ".join(rng.choice(words) for _ in range(9))[:79] + "\n"
+        lines.append(line)
+        total += len(line.encode("utf-8"))
+    if changed_fraction:
+        for index in rng.sample(range(len(lines)), max(1, int(len(lines) * changed_fraction))):
+            lines[index] = f"línea modificada {index}\n"
+    return "".join(lines).encode("utf-8")
+
+def _create_document(db, models, reference: Dict, path: str, content: bytes, file_hash: str):
+    documento = models.Documento(
+        titulo="Documento de benchmark",
+        numero_expediente="BENCH-0001",
+        tipo_documento_id=reference["tipo_documento_id"],
+        categoria_id=reference["categoria_id"],
+        usuario_id=reference["usuario_id"],
+        path_archivo=path,
+        hash_archivo=file_hash,
+        tamano_archivo=len(content),
+        extension_archivo=os.path.splitext(path)[1]
+    )
+    db.add(documento)
+    db.commit()
+    return documento
+
+def run(suite: BenchmarkSuite, reference: Dict, sizes: List[str], compare_sizes: List[str], repeat: int) -> None:
+    from app.db import models
+    from app.db.database import SessionLocal
+    from app.utils.config import settings
+    from app.utils.diff import diff_cache
+    from app.utils.storage import StorageService
+
+    print("StorageService")
+    db = SessionLocal()
+    try:
+        for label in sizes:
+            content = os.urandom(parse_size(label))
+
+            upload = UploadFile(file=io.BytesIO(content), filename="benchmark.pdf")
+
+            async def save():
+                upload.file.seek(0)
+                success, message, _ = await StorageService.save_document(upload, 999999, reference["usuario_id"], db)
+                assert success, message
+
+            suite.add("storage.save_document", run_async(measure_async(save, repeat)), size=label)
+
+            path = os.path.join(settings.DOCUMENT_STORAGE_PATH, f"verify-{label}.pdf")
+            with open(path, "wb") as output:
+                output.write(content)
+            document_id = _create_document(db, models, reference, path, content, hashlib.sha256(content).hexdigest()).id
+
+            def verify():
+                success, message = StorageService.verify_document_integrity(document_id, db)
+                assert success, message
+
+            suite.add("storage.verify_document_integrity", measure(verify, repeat), size=label)
+
+        # compare_versions hace un diff por líneas; se mide con archivos de texto, sin caché y con caché
+        for label in compare_sizes:
+            size = parse_size(label)
+            original = text_content(size, seed=1)
+            modified = text_content(size, seed=1, changed_fraction=0.05)
+            paths = []
+            for number, content in ((1, original), (2, modified)):
+                path = os.path.join(settings.DOCUMENT_STORAGE_PATH, f"compare-{label}-v{number}.txt")
+                with open(path, "wb") as output:
+                    output.write(content)
+                paths.append(path)
+            documento = _create_document(db, models, reference, paths[1], modified, hashlib.sha256(modified).hexdigest())
+            versiones = [
+                models.VersionDocumento(
+                    documento_id=documento.id,
+                    numero_version=number,
+                    path_archivo=path,
+                    usuario_id=reference["usuario_id"],
+                    hash_archivo=hashlib.sha256(content).hexdigest(),
+                    tamano_archivo=len(content),
+                    extension_archivo=".txt",
+                    es_actual=(number == 2)
+                )
+                for number, (path, content) in enumerate(zip(paths, (original, modified)), start=1)
+            ]
+            db.add_all(versiones)
+            db.commit()
+            ids = (documento.id, versiones[0].id, versiones[1].id)
+
+            def compare():
+                success, message, _ = StorageService.compare_versions(*ids, db)
+                assert success, message
+
+            def compare_uncached():
+                diff_cache.clear()
+                compare()
+
+            suite.add("storage.compare_versions", measure(compare_uncached, repeat), size=label)
+            suite.add("storage.compare_versions_cached", measure(compare, repeat), size=label)
+    finally:
+        db.close()
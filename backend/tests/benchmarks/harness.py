@@ -0,0 +1,128 @@
+"""
+Utilidades comunes de los benchmarks: medición, estadísticas, resultados en
+JSON y comparación con una línea base.
+
+No importa la aplicación, de modo que puede usarse antes de configurar las
+variables de entorno de la base de datos de benchmarks.
+"""
+import asyncio
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Percentil por interpolación lineal (fraction entre 0 y 1)."""
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Estadísticas en milisegundos de una lista de duraciones en segundos."""
+    return {
+        "runs": len(samples),
+        "min_ms": round(min(samples) * 1000, 4),
+        "median_ms": round(statistics.median(samples) * 1000, 4),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 4),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "stdev_ms": round(statistics.stdev(samples) * 1000, 4) if len(samples) > 1 else 0.0,
+    }
+
+def measure(func: Callable[[], Any], repeat: int, warmup: int = 1) -> List[float]:
+    """Ejecuta func `warmup` veces sin medir y `repeat` veces midiendo cada ejecución."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+async def measure_async(func: Callable[[], Awaitable[Any]], repeat: int, warmup: int = 1) -> List[float]:
+    """Versión de measure para funciones asíncronas."""
+    for _ in range(warmup):
+        await func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def run_async(coro):
+    """Ejecuta una corrutina en un event loop nuevo."""
+    return asyncio.run(coro)
+
+class BenchmarkSuite:
+    """Resultados de una ejecución de la suite, identificados por nombre y parámetros."""
+
+    def __init__(self, metadata: Optional[Dict[str, Any]] = None):
+        self.metadata = {
+            "fecha": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            **(metadata or {}),
+        }
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def key(name: str, **params) -> str:
+        """Clave estable de un resultado, p. ej. storage.save_document[size=1MB]."""
+        if not params:
+            return name
+        return f"{name}[{','.join(f'{k}={v}' for k, v in sorted(params.items()))}]"
+
+    def add(self, name: str, samples: List[float], **params) -> Dict[str, Any]:
+        key = self.key(name, **params)
+        result = {"name": name, "params": params, **summarize(samples)}
+        self.results[key] = result
+        print(f"  {key:<60} mediana {result['median_ms']:>10.3f} ms  p95 {result['p95_ms']:>10.3f} ms")
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"metadata": self.metadata, "results": self.results}
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as output:
+            json.dump(self.to_dict(), output, indent=2, ensure_ascii=False)
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    """Lee los resultados de un archivo generado por BenchmarkSuite.save."""
+    with open(path) as baseline:
+        return json.load(baseline)["results"]
+
+def compare(
+    current: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float,
+    metric: str = "median_ms",
+) -> List[Dict[str, Any]]:
+    """
+    Compara los resultados con la línea base y devuelve las regresiones: los
+    benchmarks presentes en ambas cuyo `metric` creció más que `threshold`
+    (fracción, 0.2 = 20 %). Los benchmarks nuevos o ausentes no se comparan.
+    """
+    regressions = []
+    for key, result in current.items():
+        previous = baseline.get(key)
+        if previous is None or not previous.get(metric):
+            continue
+        change = result[metric] / previous[metric] - 1
+        if change > threshold:
+            regressions.append({
+                "benchmark": key,
+                "baseline_ms": previous[metric],
+                "current_ms": result[metric],
+                "change": round(change, 4),
+            })
+    return regressions
@@ -9,7 +9,7 @@ from typing import AsyncGenerator, Generator
 
 # Importaciones de la aplicación
 from app.main_test import app
-from app.db.database import Base, get_db
+from app.db.database import Base, get_db, get_async_db
 from app.db.models import Usuario as User, Rol as Role, Permiso as Permission, Documento as Document
 from app.utils.security import get_password_hash
 
@@ -35,6 +35,7 @@ async def override_get_db() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_db
 
 # Fixtures para las pruebas
 @pytest.fixture(scope="session")
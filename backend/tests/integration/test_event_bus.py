@@ -0,0 +1,47 @@
+"""
+Prueba del bus de eventos sobre LISTEN/NOTIFY de Postgres.
+
+Dos instancias del bus simulan dos workers: un evento publicado por una debe
+llegar a ambas. Requiere la variable TEST_POSTGRES_URL (URL postgresql://).
+"""
+import asyncio
+import os
+import uuid
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.replicas import to_async_url
+from app.utils.event_bus import PostgresEventBus, role_topic
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="Requiere TEST_POSTGRES_URL")
+
+@pytest.mark.integration
+class TestPostgresEventBus:
+    async def test_events_reach_every_worker(self):
+        """Prueba que un evento publicado en un worker se entrega en todos los workers"""
+        engine = create_async_engine(to_async_url(POSTGRES_URL))
+        channel = f"test_eventos_{uuid.uuid4().hex[:8]}"
+        buses = [PostgresEventBus(POSTGRES_URL, channel, reconnect_delay=0.1, bind=engine) for _ in range(2)]
+        received = [asyncio.Queue(), asyncio.Queue()]
+        for bus, queue in zip(buses, received):
+            bus.subscribe(lambda topic, message, queue=queue: queue.put((topic, message)))
+        try:
+            for bus in buses:
+                await bus.start()
+            # Esperar a que ambas conexiones estén escuchando
+            for _ in range(50):
+                if all(bus._connection is not None for bus in buses):
+                    break
+                await asyncio.sleep(0.1)
+
+            await buses[0].publish(role_topic(1), {"action": "permission_change"})
+
+            for queue in received:
+                assert await asyncio.wait_for(queue.get(), 5) == ("rol:1", {"action": "permission_change"})
+        finally:
+            for bus in buses:
+                await bus.stop()
+            await engine.dispose()
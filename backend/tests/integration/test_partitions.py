@@ -0,0 +1,54 @@
+"""
+Prueba del mantenimiento de particiones sobre Postgres.
+
+Requiere la variable TEST_POSTGRES_URL (URL postgresql://), por ejemplo:
+
+    docker run -d -p 5433:5432 -e POSTGRES_PASSWORD=password postgres:15
+"""
+import os
+import uuid
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, insert, text
+
+from app.db import models
+from app.db.database import Base
+from app.utils.partitions import ensure_partitions, list_partitions
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="Requiere TEST_POSTGRES_URL")
+
+@pytest.fixture
+def pg_connection():
+    """Conexión con el esquema creado en un esquema temporal."""
+    schema = f"test_particiones_{uuid.uuid4().hex[:8]}"
+    engine = create_engine(POSTGRES_URL)
+    with engine.connect() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.execute(text(f"SET search_path TO {schema}, public"))
+        Base.metadata.create_all(conn)
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            conn.commit()
+    engine.dispose()
+
+def test_rows_in_default_are_moved_to_new_partition(pg_connection):
+    """Prueba que si la DEFAULT ya tiene filas del mes, la partición se crea y las filas pasan a ella"""
+    conn = pg_connection
+    ensure_partitions(conn, "intentos_login", months_ahead=0, today=date(2026, 9, 1))
+    conn.execute(insert(models.IntentosLogin), [
+        {"email": "ana@hcd.test", "ip_address": "10.0.0.1", "fecha": datetime(2026, 10, 5)},
+        {"email": "ana@hcd.test", "ip_address": "10.0.0.1", "fecha": datetime(2026, 12, 5)},
+    ])
+
+    ensure_partitions(conn, "intentos_login", months_ahead=1, today=date(2026, 10, 19))
+
+    assert {"intentos_login_p202610", "intentos_login_p202611"} <= set(list_partitions(conn, "intentos_login"))
+    assert conn.execute(text("SELECT count(*) FROM intentos_login_p202610")).scalar() == 1
+    assert conn.execute(text("SELECT count(*) FROM intentos_login_default")).scalar() == 1
+    assert conn.execute(text("SELECT count(*) FROM intentos_login")).scalar() == 2
@@ -0,0 +1,155 @@
+"""
+Prueba de regresión de los índices de patrones de consulta.
+
+Crea el esquema en un esquema temporal de Postgres y verifica con EXPLAIN que
+las consultas principales usan los índices definidos en los modelos.
+Requiere la variable TEST_POSTGRES_URL (URL postgresql://), por ejemplo:
+
+    docker run -d -p 5433:5432 -e POSTGRES_PASSWORD=password postgres:15
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert, or_, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.db import models
+from app.db.database import Base
+from app.utils.partitions import ensure_partitions
+
+from tests.mocks.db import create_documentos
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="Requiere TEST_POSTGRES_URL")
+
+@pytest.fixture(scope="module")
+def pg_connection():
+    """Conexión con el esquema creado en un esquema temporal y el seq scan desactivado."""
+    schema = f"test_indices_{uuid.uuid4().hex[:8]}"
+    engine = create_engine(POSTGRES_URL)
+    with engine.connect() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.execute(text(f"SET search_path TO {schema}, public"))
+        Base.metadata.create_all(conn)
+        # historial_acceso está particionada: los índices se consultan en sus particiones
+        ensure_partitions(conn, "historial_acceso", months_ahead=1)
+        insert_history(conn)
+        conn.execute(text("ANALYZE"))
+        # Con tablas vacías el planificador prefiere seq scan; se desactiva para
+        # comprobar que existe un índice utilizable para cada consulta
+        conn.execute(text("SET enable_seqscan = off"))
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            conn.commit()
+    engine.dispose()
+
+def insert_history(conn, documentos: int = 20, accesos: int = 10) -> None:
+    """Accesos del mes en curso repartidos entre varios documentos."""
+    # La sesión se une a la transacción de la conexión y solo hace flush
+    with Session(bind=conn) as db:
+        creados = create_documentos(db, documentos)
+        usuario_id = creados[0].usuario_id
+        documento_ids = [documento.id for documento in creados]
+    conn.execute(insert(models.HistorialAcceso), [
+        {"id": documento_id * accesos + n, "usuario_id": usuario_id, "documento_id": documento_id, "accion": "ver",
+         "fecha": datetime.utcnow() - timedelta(minutes=n)}
+        for documento_id in documento_ids for n in range(accesos)
+    ])
+
+def partition_indexes(conn, index: str) -> list:
+    """Nombres de los índices de las particiones adjuntos al índice particionado."""
+    return conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:index AS regclass)
+    """), {"index": index}).scalars().all()
+
+def explain(conn, stmt) -> str:
+    """Devuelve el plan de la consulta como texto."""
+    sql = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    return "\n".join(row[0] for row in conn.execute(text(f"EXPLAIN {sql}")))
+
+@pytest.mark.integration
+class TestQueryIndexes:
+    def test_search_by_category_uses_partial_index(self, pg_connection):
+        """Prueba que la búsqueda por categoría usa el índice parcial de documentos activos"""
+        stmt = select(models.Documento).where(
+            models.Documento.activo == True,
+            models.Documento.categoria_id == 1
+        ).order_by(models.Documento.fecha_modificacion.desc()).limit(10)
+
+        assert "ix_documentos_activos_categoria" in explain(pg_connection, stmt)
+
+    def test_search_default_order_uses_partial_index(self, pg_connection):
+        """Prueba que el listado por fecha de modificación usa el índice parcial"""
+        stmt = select(models.Documento).where(
+            models.Documento.activo == True
+        ).order_by(models.Documento.fecha_modificacion.desc()).limit(10)
+
+        assert "ix_documentos_activos_fecha_modificacion" in explain(pg_connection, stmt)
+
+    def test_text_search_uses_trigram_indexes(self, pg_connection):
+        """Prueba que la búsqueda por término usa los índices de trigramas"""
+        termino = "%ordenanza%"
+        stmt = select(models.Documento.id).where(
+            models.Documento.activo == True,
+            or_(
+                models.Documento.titulo.ilike(termino),
+                models.Documento.numero_expediente.ilike(termino),
+                models.Documento.descripcion.ilike(termino)
+            )
+        )
+
+        plan = explain(pg_connection, stmt)
+        assert "ix_documentos_titulo_trgm" in plan
+        assert "ix_documentos_numero_expediente_trgm" in plan
+        assert "ix_documentos_descripcion_trgm" in plan
+
+    def test_versions_listing_uses_composite_index(self, pg_connection):
+        """Prueba que el listado de versiones usa el índice (documento_id, numero_version)"""
+        stmt = select(models.VersionDocumento).where(
+            models.VersionDocumento.documento_id == 1
+        ).order_by(models.VersionDocumento.numero_version.desc())
+
+        assert "ix_versiones_documento_documento_numero" in explain(pg_connection, stmt)
+
+    def test_current_version_uses_partial_index(self, pg_connection):
+        """Prueba que la búsqueda de la versión actual usa el índice parcial"""
+        stmt = select(models.VersionDocumento).where(
+            models.VersionDocumento.documento_id == 1,
+            models.VersionDocumento.es_actual == True
+        )
+
+        assert "ix_versiones_documento_actual" in explain(pg_connection, stmt)
+
+    def test_document_history_uses_composite_index(self, pg_connection):
+        """Prueba que el historial de un documento usa el índice (documento_id, fecha)"""
+        stmt = select(models.HistorialAcceso).where(
+            models.HistorialAcceso.documento_id == 1
+        ).order_by(models.HistorialAcceso.fecha.desc()).limit(50)
+
+        plan = explain(pg_connection, stmt)
+        # En cada partición se usa el índice heredado de ix_historial_acceso_documento_fecha
+        attached = partition_indexes(pg_connection, "ix_historial_acceso_documento_fecha")
+        assert attached
+        assert any(index in plan for index in attached)
+        others = partition_indexes(pg_connection, "ix_historial_acceso_fecha") + partition_indexes(pg_connection, "ix_historial_acceso_usuario_fecha")
+        assert not any(index in plan for index in others)
+
+    def test_ip_block_check_uses_partial_index(self, pg_connection):
+        """Prueba que la verificación de IP bloqueada usa el índice parcial de bloqueos activos"""
+        stmt = select(models.BloqueoIP).where(
+            models.BloqueoIP.ip_address == "10.0.0.1",
+            models.BloqueoIP.activo == True,
+            models.BloqueoIP.fecha_fin > datetime(2026, 1, 1)
+        ).limit(1)
+
+        assert "ix_bloqueo_ip_activo" in explain(pg_connection, stmt)
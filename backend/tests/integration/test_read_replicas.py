@@ -0,0 +1,48 @@
+"""
+Prueba del enrutamiento a réplicas contra dos instancias locales de Postgres.
+
+Requiere las variables TEST_PRIMARY_DATABASE_URL y TEST_REPLICA_DATABASE_URL
+(URLs postgresql://). Por ejemplo, con dos contenedores:
+
+    docker run -d -p 5433:5432 -e POSTGRES_PASSWORD=password postgres:15
+    docker run -d -p 5434:5432 -e POSTGRES_PASSWORD=password postgres:15
+"""
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.replicas import ReplicaRouter, to_async_url
+
+PRIMARY_URL = os.getenv("TEST_PRIMARY_DATABASE_URL")
+REPLICA_URL = os.getenv("TEST_REPLICA_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(
+    not (PRIMARY_URL and REPLICA_URL),
+    reason="Requiere TEST_PRIMARY_DATABASE_URL y TEST_REPLICA_DATABASE_URL"
+)
+
+async def server_port(session) -> int:
+    return (await session.execute(text("SELECT inet_server_port()"))).scalar()
+
+@pytest.mark.integration
+class TestReadReplicas:
+    async def test_reads_go_to_replica_until_user_writes(self):
+        """Prueba que las lecturas van a la réplica salvo dentro de la ventana posterior a una escritura"""
+        router = ReplicaRouter([REPLICA_URL], sticky_seconds=5)
+        primary = create_async_engine(to_async_url(PRIMARY_URL))
+        try:
+            async with primary.connect() as conn:
+                primary_port = (await conn.execute(text("SELECT inet_server_port()"))).scalar()
+            
+            index = router.choose("user:1")
+            assert index == 0
+            async with router.session(index) as db:
+                assert await server_port(db) != primary_port
+            
+            router.mark_write("user:1")
+            assert router.choose("user:1") is None
+        finally:
+            await router.dispose()
+            await primary.dispose()
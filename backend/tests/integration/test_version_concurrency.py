@@ -0,0 +1,89 @@
+"""
+Prueba de creación concurrente de versiones contra Postgres.
+
+Varios hilos cargan versiones del mismo documento a la vez; el bloqueo de la
+fila del documento debe asignar números consecutivos sin repetir y dejar una
+sola versión actual. Requiere la variable TEST_POSTGRES_URL (URL postgresql://).
+"""
+import asyncio
+import io
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import UploadFile
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db import models
+from app.db.database import Base
+from app.utils import outbox
+from app.utils.config import settings
+from app.utils.partitions import ensure_partitions
+from app.utils.storage import StorageService
+
+from tests.mocks.db import create_documento
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="Requiere TEST_POSTGRES_URL")
+
+UPLOADS = 8
+
+@pytest.fixture
+def session_factory():
+    """Sesiones sobre un esquema temporal con las tablas y particiones creadas."""
+    schema = f"test_versiones_{uuid.uuid4().hex[:8]}"
+    engine = create_engine(POSTGRES_URL, pool_size=UPLOADS)
+
+    @event.listens_for(engine, "connect")
+    def set_search_path(dbapi_connection, connection_record):
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {schema}, public")
+        dbapi_connection.commit()
+
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.execute(text(f"SET search_path TO {schema}, public"))
+        Base.metadata.create_all(conn)
+        ensure_partitions(conn, "historial_acceso", months_ahead=1)
+    try:
+        yield sessionmaker(bind=engine)
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        engine.dispose()
+
+@pytest.fixture
+def documento(session_factory):
+    with session_factory() as db:
+        documento = create_documento(db)
+        db.commit()
+        return documento.id, documento.usuario_id
+
+@pytest.mark.integration
+class TestVersionConcurrency:
+    def test_concurrent_uploads_get_consecutive_numbers(self, session_factory, documento, tmp_path, monkeypatch):
+        """Prueba que las cargas concurrentes sobre un documento obtienen números consecutivos y una sola versión actual"""
+        documento_id, usuario_id = documento
+        monkeypatch.setattr(settings, "DOCUMENT_STORAGE_PATH", str(tmp_path))
+        monkeypatch.setitem(outbox.HANDLERS, "version_creada", lambda datos: None)
+
+        def upload(index: int):
+            with session_factory() as db:
+                file = UploadFile(file=io.BytesIO(f"versión {index}".encode()), filename="ordenanza.txt")
+                return asyncio.run(StorageService.create_document_version(file, documento_id, usuario_id, db))
+
+        with ThreadPoolExecutor(max_workers=UPLOADS) as pool:
+            results = list(pool.map(upload, range(UPLOADS)))
+
+        assert all(success for success, _, _ in results), results
+        with session_factory() as db:
+            versiones = db.query(models.VersionDocumento).filter_by(documento_id=documento_id).all()
+            actual_id = db.get(models.Documento, documento_id).version_actual_id
+            assert sorted(v.numero_version for v in versiones) == list(range(1, UPLOADS + 1))
+            assert [v.id for v in versiones if v.es_actual] == [actual_id]
+            # Cada archivo publicado corresponde a su versión
+            assert len({v.path_archivo for v in versiones}) == UPLOADS
+            assert all(os.path.exists(v.path_archivo) for v in versiones)
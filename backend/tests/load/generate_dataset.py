@@ -0,0 +1,517 @@
+"""
+Generador de datos sintéticos para pruebas de carga y de escala.
+
+Carga con COPY millones de filas de usuarios, documentos, versiones,
+historial_acceso y registro_acceso con distribuciones parecidas a las de
+producción:
+- Números de expediente EXP-<año>-<correlativo> correlativos por año, con más
+  expedientes en los años recientes.
+- Títulos con tipo de norma, número, acción y tema; los temas y las categorías
+  siguen una distribución sesgada (pocas concentran la mayoría).
+- Cantidad de versiones con cola larga: la mayoría de los documentos tiene una
+  sola versión y pocos superan las cinco.
+- Pocos usuarios cargan la mayor parte de los documentos.
+- Historial y registro de accesos de los últimos meses, con más actividad en
+  horario laboral.
+
+Opcionalmente crea los archivos de cada documento como archivos dispersos
+(sparse): ocupan el tamaño declarado pero no bloques de disco, y su hash
+coincide con hash_archivo, de modo que las descargas y la verificación de
+integridad funcionan.
+
+Los usuarios generados comparten la contraseña LOAD_TEST_PASSWORD para que las
+pruebas de carga puedan autenticarse con cualquiera de ellos.
+
+Uso (desde backend/):
+    python tests/load/generate_dataset.py --documents 1000000 --users 500
+"""
+import argparse
+import bisect
+import hashlib
+import io
+import itertools
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BACKEND_DIR)
+
+LOAD_TEST_PASSWORD = os.getenv("LOAD_TEST_PASSWORD", "Carga123!")
+LOAD_TEST_EMAIL_DOMAIN = "hcdsys.test"
+
+# Distribuciones (valor, peso)
+TIPOS_NORMA = [
+    ("Ordenanza", 30), ("Resolución", 25), ("Decreto", 15), ("Comunicación", 12),
+    ("Minuta de comunicación", 8), ("Declaración", 6), ("Pedido de informes", 4),
+]
+ACCIONES = [
+    ("Modifica", 20), ("Aprueba", 18), ("Establece", 14), ("Solicita informes sobre", 12),
+    ("Autoriza", 10), ("Declara de interés", 10), ("Crea", 8), ("Deroga", 5), ("Reglamenta", 3),
+]
+TEMAS = [
+    ("el régimen de tránsito", 20), ("el presupuesto municipal", 15), ("obras de pavimentación", 12),
+    ("el servicio de recolección de residuos", 10), ("la habilitación de comercios", 9),
+    ("el transporte público", 8), ("espacios verdes", 6), ("el código de edificación", 5),
+    ("la tasa de seguridad e higiene", 5), ("actividades culturales", 4), ("la salud pública", 3),
+    ("la protección animal", 2), ("el alumbrado público", 1),
+]
+BARRIOS = [
+    "Centro", "Norte", "Sur", "Las Flores", "San Martín", "Belgrano", "Villa Nueva",
+    "Parque Industrial", "Los Álamos", "La Ribera", "El Mirador", "Santa Rosa",
+]
+BLOQUES = ["oficialista", "de la oposición", "interbloque", "del Departamento Ejecutivo"]
+ACCIONES_HISTORIAL = [
+    ("visualizacion", 45), ("descarga", 20), ("consulta_versiones", 12), ("consulta_version", 8),
+    ("descarga_version", 5), ("consulta_historial", 4), ("comparacion_versiones", 3), ("edicion", 3),
+]
+ENDPOINTS = [
+    ("GET", "/api/documents/", 35), ("GET", "/api/documents/{id}", 25), ("GET", "/api/documents/{id}/download", 12),
+    ("GET", "/api/documents/{id}/versions", 8), ("GET", "/api/document-history/{id}", 5),
+    ("POST", "/api/documents/", 4), ("POST", "/api/documents/{id}/versions", 3), ("PUT", "/api/documents/{id}", 3),
+    ("GET", "/api/users/", 2), ("GET", "/api/roles/", 2), ("GET", "/api/permissions/", 1),
+]
+USER_AGENTS = [
+    ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/124.0 Safari/537.36", 60),
+    ("Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0", 25),
+    ("Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 Version/17.4 Safari/605.1.15", 10),
+    ("python-requests/2.31.0", 5),
+]
+# Actividad relativa por hora del día (horario de la administración pública)
+PESOS_HORA = [1, 1, 1, 1, 1, 2, 4, 10, 30, 45, 50, 48, 35, 38, 42, 35, 20, 10, 6, 4, 3, 2, 1, 1]
+# Tipos de documento de init_categories_types.py: {nombre: (extensión, peso)}
+EXTENSIONES_TIPO = {"PDF": (".pdf", 70), "Word": (".docx", 18), "Excel": (".xlsx", 5),
+                    "Imagen": (".jpg", 4), "Texto": (".txt", 2), "PowerPoint": (".pptx", 1)}
+
+class WeightedChoice:
+    """Elección ponderada con pesos acumulados precalculados (más rápida que random.choices en bucles)."""
+
+    def __init__(self, items: Sequence[Tuple], rng: random.Random):
+        self.values = [item[:-1] if len(item) > 2 else item[0] for item in items]
+        self.cumulative = list(itertools.accumulate(item[-1] for item in items))
+        self.rng = rng
+
+    def __call__(self):
+        return self.values[bisect.bisect_right(self.cumulative, self.rng.random() * self.cumulative[-1])]
+
+def zipf_weights(count: int, exponent: float = 1.1) -> List[float]:
+    """Pesos de una distribución de Zipf: el elemento de rango r pesa 1 / r^exponent."""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+def size_buckets(minimum: int, maximum: int, count: int = 64) -> List[int]:
+    """Tamaños de archivo en progresión geométrica; limitar los tamaños distintos permite cachear los hashes."""
+    ratio = (maximum / minimum) ** (1 / (count - 1))
+    return sorted({int(minimum * ratio ** index) for index in range(count)})
+
+class SparseHashes:
+    """Hash SHA-256 de un archivo de `size` bytes en cero (el contenido de un archivo disperso)."""
+
+    def __init__(self):
+        self._cache: Dict[int, str] = {}
+
+    def __call__(self, size: int) -> str:
+        if size not in self._cache:
+            digest = hashlib.sha256()
+            chunk = bytes(1024 * 1024)
+            remaining = size
+            while remaining > 0:
+                digest.update(chunk[:min(remaining, len(chunk))])
+                remaining -= len(chunk)
+            self._cache[size] = digest.hexdigest()
+        return self._cache[size]
+
+def create_sparse_file(path: str, size: int) -> None:
+    """Crea un archivo disperso de `size` bytes (sin ocupar bloques de disco)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as output:
+        output.truncate(size)
+
+class DatasetGenerator:
+    """Genera las filas de documentos, versiones y auditoría con distribuciones realistas."""
+
+    def __init__(
+        self,
+        rng: random.Random,
+        categoria_ids: List[int],
+        tipos: Dict[int, str],
+        usuario_ids: List[int],
+        storage_path: str,
+        years: int = 10,
+        audit_months: int = 12,
+        max_versions: int = 20,
+        history_mean: float = 5.0,
+        max_file_size: int = 10 * 1024 * 1024,
+        now: Optional[datetime] = None,
+    ):
+        self.rng = rng
+        self.storage_path = storage_path
+        self.now = now or datetime.utcnow()
+        self.audit_start = self.now - timedelta(days=30 * audit_months)
+        self.max_versions = max_versions
+        self.history_mu = math.log(max(history_mean, 0.1)) - 0.5  # media de la lognormal con sigma 1
+
+        self.tipo_norma = WeightedChoice(TIPOS_NORMA, rng)
+        self.accion = WeightedChoice(ACCIONES, rng)
+        self.tema = WeightedChoice(TEMAS, rng)
+        self.accion_historial = WeightedChoice(ACCIONES_HISTORIAL, rng)
+        self.endpoint = WeightedChoice(ENDPOINTS, rng)
+        self.user_agent = WeightedChoice(USER_AGENTS, rng)
+        self.hora = WeightedChoice(list(zip(range(24), PESOS_HORA)), rng)
+
+        # Las primeras categorías concentran la mayoría de los documentos; un 5 % no tiene categoría
+        categorias = list(zip(categoria_ids, zipf_weights(len(categoria_ids), 1.3)))
+        total = sum(weight for _, weight in categorias)
+        self.categoria = WeightedChoice(categorias + [(None, total * 0.05 / 0.95)], rng)
+        self.tipo = WeightedChoice(
+            [(tipo_id, EXTENSIONES_TIPO.get(nombre, (".pdf", 1))[1]) for tipo_id, nombre in tipos.items()], rng
+        )
+        self.extensiones = {tipo_id: EXTENSIONES_TIPO.get(nombre, (".pdf", 1))[0] for tipo_id, nombre in tipos.items()}
+        # Pocos usuarios cargan la mayoría de los documentos
+        self.usuario = WeightedChoice(list(zip(usuario_ids, zipf_weights(len(usuario_ids), 1.0))), rng)
+        self.usuario_ids = usuario_ids
+
+        # Años con crecimiento del 10 % anual en la cantidad de expedientes
+        current_year = self.now.year
+        self.year = WeightedChoice(
+            [(current_year - offset, 1.1 ** -offset) for offset in range(years)], rng
+        )
+        self.expediente_counters: Dict[int, int] = {}
+        self.sizes = size_buckets(5 * 1024, max_file_size)
+        self.sparse_hash = SparseHashes()
+
+    def expediente(self, year: int) -> str:
+        """Número de expediente correlativo dentro del año."""
+        number = self.expediente_counters.get(year, 0) + 1
+        self.expediente_counters[year] = number
+        return f"EXP-{year}-{number:05d}"
+
+    def bucket(self, size: float) -> int:
+        """Tamaño de la tabla de tamaños más cercano por arriba (o el máximo)."""
+        return self.sizes[min(bisect.bisect_left(self.sizes, size), len(self.sizes) - 1)]
+
+    def file_size(self) -> int:
+        """Tamaño de archivo lognormal con mediana de ~250 KB."""
+        return self.bucket(self.rng.lognormvariate(math.log(250 * 1024), 1.2))
+
+    def version_count(self) -> int:
+        """Cantidad de versiones con cola larga: P(más de k versiones) = 0.35^k."""
+        count = 1
+        while count < self.max_versions and self.rng.random() < 0.35:
+            count += 1
+        return count
+
+    def instant(self, start: datetime, end: datetime) -> datetime:
+        """Momento aleatorio entre start y end, con la hora del día ponderada por la actividad."""
+        if end <= start:
+            return start
+        day = start + timedelta(days=self.rng.random() * (end - start).total_seconds() / 86400)
+        moment = day.replace(hour=self.hora(), minute=self.rng.randrange(60), second=self.rng.randrange(60))
+        return min(max(moment, start), end)
+
+    def document(self, documento_id: int) -> Tuple[tuple, List[tuple]]:
+        """
+        Devuelve la fila del documento y las de sus versiones. Las filas de las
+        versiones no incluyen id ni version_anterior_id: se asignan al reservar
+        los ids del lote (ver VERSION_COLUMNS).
+        """
+        rng = self.rng
+        year = self.year()
+        tipo_norma = self.tipo_norma()
+        tema = self.tema()
+        titulo = f"{tipo_norma} {rng.randint(1, 9999)}/{year} - {self.accion()} {tema}"
+        if rng.random() < 0.4:
+            titulo += f" en barrio {rng.choice(BARRIOS)}"
+        descripcion = None
+        if rng.random() < 0.85:
+            descripcion = f"Proyecto de {tipo_norma.lower()} presentado por el bloque {rng.choice(BLOQUES)} sobre {tema}."
+
+        fecha_creacion = self.instant(datetime(year, 1, 1), min(datetime(year, 12, 31, 23, 59), self.now))
+        tipo_id = self.tipo()
+        extension = self.extensiones[tipo_id]
+        usuario_id = self.usuario()
+        document_dir = os.path.join(self.storage_path, str(documento_id))
+
+        versions = []
+        fecha = fecha_creacion
+        size = self.file_size()
+        count = self.version_count()
+        for numero in range(1, count + 1):
+            if numero > 1:
+                # Cada versión se publica hasta cuatro meses después de la anterior y suele crecer
+                fecha = self.instant(fecha, min(fecha + timedelta(days=120), self.now))
+                size = self.bucket(size * rng.uniform(0.85, 1.3))
+            versions.append((
+                documento_id, numero, fecha,
+                "Versión inicial" if numero == 1 else f"Actualización {numero - 1}",
+                os.path.join(document_dir, "versions", f"{documento_id}_v{numero}{extension}"),
+                usuario_id if numero == 1 or rng.random() < 0.6 else self.usuario(),
+                self.sparse_hash(size), size, extension,
+                None if numero == 1 else "Se actualizó el contenido del documento",
+                numero == count,
+                f"{tipo_norma.lower().replace(' ', '_')}_{year}_v{numero}{extension}",
+            ))
+
+        activo = rng.random() >= 0.03
+        row = (
+            documento_id, titulo, self.expediente(year), descripcion, fecha_creacion, fecha,
+            self.categoria(), tipo_id, usuario_id,
+            os.path.join(document_dir, f"{documento_id}{extension}"),
+            self.sparse_hash(size), size, extension, None, None, activo,
+        )
+        return row, versions
+
+    def history(self, documento: tuple) -> List[tuple]:
+        """Filas de historial_acceso del documento (sin id) dentro del período de auditoría."""
+        documento_id, fecha_creacion = documento[0], documento[4]
+        count = min(int(self.rng.lognormvariate(self.history_mu, 1.0)), 1000)
+        start = max(fecha_creacion, self.audit_start)
+        rows = []
+        if fecha_creacion >= self.audit_start:
+            rows.append((documento[8], documento_id, "creacion", fecha_creacion, None))
+        for _ in range(count):
+            rows.append((self.usuario(), documento_id, self.accion_historial(), self.instant(start, self.now), None))
+        return rows
+
+    def access_log(self, max_documento_id: int) -> tuple:
+        """Fila de registro_acceso (sin id): 2 % de accesos fallidos sin usuario."""
+        rng = self.rng
+        metodo, endpoint = self.endpoint()
+        endpoint = endpoint.replace("{id}", str(rng.randint(1, max(max_documento_id, 1))))
+        if rng.random() < 0.02:
+            usuario_id, codigo, exitoso, mensaje = None, 401, False, "Token inválido o expirado"
+        else:
+            usuario_id, codigo, exitoso, mensaje = self.usuario(), 200, True, None
+        return (
+            usuario_id, f"10.{rng.randint(0, 3)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}", self.user_agent(),
+            endpoint, metodo, self.instant(self.audit_start, self.now), exitoso, codigo, mensaje,
+            round(rng.lognormvariate(math.log(40), 0.8), 2),
+        )
+
+# Columnas en el orden de las tuplas de DatasetGenerator
+DOCUMENTO_COLUMNS = [
+    "id", "titulo", "numero_expediente", "descripcion", "fecha_creacion", "fecha_modificacion",
+    "categoria_id", "tipo_documento_id", "usuario_id", "path_archivo", "hash_archivo", "tamano_archivo",
+    "extension_archivo", "fecha_ultima_verificacion", "estado_integridad", "activo",
+]
+VERSION_COLUMNS = [
+    "id", "version_anterior_id", "documento_id", "numero_version", "fecha_version", "comentario",
+    "path_archivo", "usuario_id", "hash_archivo", "tamano_archivo", "extension_archivo", "cambios",
+    "es_actual", "titulo_archivo",
+]
+HISTORIAL_COLUMNS = ["id", "usuario_id", "documento_id", "accion", "fecha", "detalles"]
+REGISTRO_COLUMNS = [
+    "id", "usuario_id", "ip_address", "user_agent", "endpoint", "metodo", "fecha", "exitoso",
+    "codigo_respuesta", "mensaje_error", "tiempo_respuesta",
+]
+USUARIO_COLUMNS = ["id", "nombre", "apellido", "email", "password_hash", "dni", "role_id", "activo", "fecha_registro"]
+
+def copy_value(value) -> str:
+    """Valor en el formato de texto de COPY."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+    return str(value)
+
+def copy_rows(conn, table: str, columns: List[str], rows: Iterable[tuple]) -> None:
+    """Inserta las filas con COPY ... FROM STDIN en la transacción de la conexión."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    raw = conn.connection.dbapi_connection
+    with raw.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+def reserve_ids(conn, sequence: str, count: int) -> int:
+    """Reserva `count` ids consecutivos de la secuencia y devuelve el primero."""
+    from sqlalchemy import text
+
+    last = conn.execute(
+        text("SELECT setval(CAST(:sequence AS regclass), nextval(CAST(:sequence AS regclass)) + :count - 1)"),
+        {"sequence": sequence, "count": count}
+    ).scalar()
+    return last - count + 1
+
+def serial_sequence(conn, table: str) -> str:
+    from sqlalchemy import text
+
+    return conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}).scalar()
+
+def prepare_reference_data(users: int, rng: random.Random) -> Tuple[List[int], Dict[int, str], List[int]]:
+    """
+    Asegura roles, categorías y tipos de documento, y crea los usuarios de carga
+    que falten. Devuelve (ids de categorías, {id de tipo: nombre}, ids de usuarios de carga).
+    """
+    from sqlalchemy import text
+
+    from app.db import models
+    from app.db.database import SessionLocal, engine
+    from app.db.init_roles import init_roles_and_permissions
+    from app.utils.security import get_password_hash
+    from init_categories_types import init_categories_types
+
+    db = SessionLocal()
+    try:
+        init_roles_and_permissions(db)
+    finally:
+        db.close()
+    init_categories_types()
+
+    with engine.begin() as conn:
+        categoria_ids = [row[0] for row in conn.execute(text("SELECT id FROM categorias ORDER BY id"))]
+        tipos = {row[0]: row[1] for row in conn.execute(text("SELECT id, nombre FROM tipos_documento ORDER BY id"))}
+        existing = [row[0] for row in conn.execute(
+            text("SELECT id FROM usuarios WHERE email LIKE :pattern ORDER BY id"),
+            {"pattern": f"carga%@{LOAD_TEST_EMAIL_DOMAIN}"}
+        )]
+        missing = users - len(existing)
+        if missing > 0:
+            password_hash = get_password_hash(LOAD_TEST_PASSWORD)
+            start = reserve_ids(conn, serial_sequence(conn, models.Usuario.__tablename__), missing)
+            now = datetime.utcnow()
+            rows = []
+            for offset in range(missing):
+                number = len(existing) + offset + 1
+                rows.append((
+                    start + offset, f"Usuario{number}", "Carga", f"carga{number}@{LOAD_TEST_EMAIL_DOMAIN}",
+                    password_hash, str(60000000 + number),
+                    # Un 20 % de gestores de documentos y el resto usuarios de consulta
+                    2 if rng.random() < 0.2 else 3, True, now,
+                ))
+            copy_rows(conn, "usuarios", USUARIO_COLUMNS, rows)
+            existing += [row[0] for row in rows]
+    return categoria_ids, tipos, existing[:users]
+
+def ensure_audit_partitions(conn, audit_months: int) -> None:
+    """Crea las particiones mensuales del período generado para que las filas no caigan en la DEFAULT."""
+    from app.utils.config import settings
+    from app.utils.partitions import ensure_partitions, is_partitioned
+
+    start = (datetime.utcnow() - timedelta(days=30 * audit_months)).date()
+    for table in ("historial_acceso", "registro_acceso"):
+        if is_partitioned(conn, table):
+            ensure_partitions(conn, table, audit_months + settings.AUDIT_PARTITIONS_AHEAD + 1, today=start)
+
+def create_files(documento: tuple, versions: List[tuple], mode: str) -> None:
+    """Crea los archivos dispersos del documento ("current") o también de sus versiones ("all")."""
+    create_sparse_file(documento[9], documento[11])
+    if mode == "all":
+        for version in versions:
+            create_sparse_file(version[4], version[7])
+
+def generate(args) -> None:
+    from sqlalchemy import text
+
+    from app.db.database import engine
+    from app.utils.config import settings
+
+    rng = random.Random(args.seed)
+    storage_path = os.path.abspath(args.storage_path or settings.DOCUMENT_STORAGE_PATH)
+    categoria_ids, tipos, usuario_ids = prepare_reference_data(args.users, rng)
+    generator = DatasetGenerator(
+        rng, categoria_ids, tipos, usuario_ids, storage_path,
+        years=args.years, audit_months=args.audit_months, max_versions=args.max_versions,
+        history_mean=args.history_mean, max_file_size=settings.MAX_UPLOAD_SIZE,
+    )
+
+    with engine.begin() as conn:
+        ensure_audit_partitions(conn, args.audit_months)
+        documento_seq = serial_sequence(conn, "documentos")
+        version_seq = serial_sequence(conn, "versiones_documento")
+        # Continuar la numeración de expedientes existentes (EXP-<año>-<correlativo>)
+        for year, number in conn.execute(text(
+            "SELECT split_part(numero_expediente, '-', 2)::int, max(split_part(numero_expediente, '-', 3)::int) "
+            "FROM documentos WHERE numero_expediente ~ '^EXP-[0-9]{4}-[0-9]+$' GROUP BY 1"
+        )):
+            generator.expediente_counters[year] = number
+
+    totals = {"documentos": 0, "versiones_documento": 0, "historial_acceso": 0, "registro_acceso": 0}
+    started = time.perf_counter()
+    max_documento_id = 0
+    for batch_start in range(0, args.documents, args.batch_size):
+        batch = min(args.batch_size, args.documents - batch_start)
+        with engine.begin() as conn:
+            first_documento_id = reserve_ids(conn, documento_seq, batch)
+            documentos, versiones, historial = [], [], []
+            for offset in range(batch):
+                documento, versions = generator.document(first_documento_id + offset)
+                documentos.append(documento)
+                versiones.append(versions)
+                historial.extend(generator.history(documento))
+
+            # Ids de todas las versiones del lote en un solo bloque; cada versión apunta a la anterior
+            first_version_id = reserve_ids(conn, version_seq, sum(len(versions) for versions in versiones))
+            flat_versions = []
+            for versions in versiones:
+                for version in versions:
+                    version_id = first_version_id + len(flat_versions)
+                    anterior = version_id - 1 if version[1] > 1 else None
+                    flat_versions.append((version_id, anterior) + version)
+
+            copy_rows(conn, "documentos", DOCUMENTO_COLUMNS, documentos)
+            copy_rows(conn, "versiones_documento", VERSION_COLUMNS, flat_versions)
+            if historial:
+                first_historial_id = reserve_ids(conn, "historial_acceso_id_seq", len(historial))
+                copy_rows(conn, "historial_acceso", HISTORIAL_COLUMNS,
+                          ((first_historial_id + index,) + row for index, row in enumerate(historial)))
+
+        if args.files != "none":
+            for documento, versions in zip(documentos, versiones):
+                create_files(documento, versions, args.files)
+
+        max_documento_id = documentos[-1][0]
+        totals["documentos"] += len(documentos)
+        totals["versiones_documento"] += len(flat_versions)
+        totals["historial_acceso"] += len(historial)
+        elapsed = time.perf_counter() - started
+        print(f"  {totals['documentos']}/{args.documents} documentos "
+              f"({totals['documentos'] / elapsed:.0f} documentos/s)", flush=True)
+
+    access_logs = args.access_logs if args.access_logs is not None else args.documents * 5
+    for batch_start in range(0, access_logs, args.batch_size * 5):
+        batch = min(args.batch_size * 5, access_logs - batch_start)
+        with engine.begin() as conn:
+            first_registro_id = reserve_ids(conn, "registro_acceso_id_seq", batch)
+            copy_rows(conn, "registro_acceso", REGISTRO_COLUMNS, (
+                (first_registro_id + index,) + generator.access_log(max_documento_id) for index in range(batch)
+            ))
+        totals["registro_acceso"] += batch
+
+    # Estadísticas del planificador actualizadas para que las consultas usen los índices adecuados
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in totals:
+            conn.execute(text(f"ANALYZE {table}"))
+
+    print(f"\nDatos generados en {time.perf_counter() - started:.1f} s:")
+    for table, count in totals.items():
+        print(f"  {table}: {count}")
+    print(f"\nUsuarios de carga: carga1@{LOAD_TEST_EMAIL_DOMAIN} ... carga{args.users}@{LOAD_TEST_EMAIL_DOMAIN} "
+          f"(contraseña: LOAD_TEST_PASSWORD)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generador de datos sintéticos para pruebas de carga y escala")
+    parser.add_argument("--documents", type=int, default=100_000, help="Documentos a generar")
+    parser.add_argument("--users", type=int, default=200, help="Usuarios de carga (se crean los que falten)")
+    parser.add_argument("--years", type=int, default=10, help="Años de expedientes a generar")
+    parser.add_argument("--max-versions", type=int, default=20, help="Máximo de versiones por documento")
+    parser.add_argument("--history-mean", type=float, default=5.0,
+                        help="Media de registros de historial_acceso por documento")
+    parser.add_argument("--access-logs", type=int, default=None,
+                        help="Filas de registro_acceso (por defecto 5 por documento)")
+    parser.add_argument("--audit-months", type=int, default=12,
+                        help="Meses hacia atrás que abarcan el historial y el registro de accesos")
+    parser.add_argument("--files", choices=["none", "current", "all"], default="current",
+                        help="Archivos dispersos a crear: ninguno, el de cada documento o también los de sus versiones")
+    parser.add_argument("--storage-path", default=None, help="Directorio de documentos (por defecto DOCUMENT_STORAGE_PATH)")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="Documentos por transacción de COPY")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla para obtener siempre los mismos datos")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    generate(parse_args())
@@ -1,168 +1,295 @@
 """
-Archivo de configuración para pruebas de carga con Locust
+Modelo de carga de HCDSys para Locust.
+
+La mezcla de usuarios y tareas reproduce el tráfico real del sistema:
+- Lectores (la mayoría): búsquedas por término y por filtros, vista de detalle,
+  descargas, listado de versiones e historial.
+- Gestores: carga de nuevas versiones y comparación de versiones.
+- Oyentes WebSocket: conexiones abiertas a /api/ws/permissions con mensajes periódicos.
+- Monitoreo: /api/health.
+
+Cada solicitud se agrupa por escenario (parámetro `name`), de modo que los
+percentiles de Locust se comparan contra los SLO de slos.json. Al terminar se
+escribe el informe JSON en LOAD_TEST_REPORT (lo define run_load_tests.py) y el
+proceso termina con código 1 si algún escenario incumple su SLO.
+
+Los datos deben generarse antes con generate_dataset.py: los usuarios virtuales
+inician sesión con los usuarios de carga carga<N>@hcdsys.test.
 """
+import json
 import os
 import random
-import json
 import time
+from datetime import date, timedelta
 from pathlib import Path
-from locust import HttpUser, task, between
+
+import websocket
 from dotenv import load_dotenv
+from locust import HttpUser, between, events, task
+
+from generate_dataset import LOAD_TEST_EMAIL_DOMAIN, LOAD_TEST_PASSWORD, TEMAS, TIPOS_NORMA
+from slo import build_report, format_report, load_slos, save_report
 
 # Cargar variables de entorno
 env_path = Path(__file__).parent.parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
 # Constantes
-BASE_URL = os.getenv("LOAD_TEST_BASE_URL", "http://localhost:8000")
-TEST_USER_EMAIL = os.getenv("TEST_USER_EMAIL", "test@example.com")
-TEST_USER_PASSWORD = os.getenv("TEST_USER_PASSWORD", "password123")
-
-# Datos de prueba
-SAMPLE_DOCUMENT = {
-    "title": "Documento de prueba",
-    "description": "Este es un documento de prueba para las pruebas de carga",
-    "category": "ORDENANZA",
-    "tags": ["prueba", "carga", "rendimiento"]
-}
-
-class DocumentAPIUser(HttpUser):
-    """
-    Usuario simulado para pruebas de carga de la API de documentos
-    """
-    wait_time = between(1, 5)  # Tiempo de espera entre tareas en segundos
-    token = None
-    document_ids = []
-    
+LOAD_TEST_USERS = int(os.getenv("LOAD_TEST_USERS", "200"))  # Usuarios de carga creados por generate_dataset.py
+TEST_USER_EMAIL = os.getenv("TEST_USER_EMAIL")  # Si se define, todos los usuarios virtuales usan esta cuenta
+TEST_USER_PASSWORD = os.getenv("TEST_USER_PASSWORD", LOAD_TEST_PASSWORD)
+UPLOAD_SIZE_KB = int(os.getenv("LOAD_TEST_UPLOAD_KB", "200"))
+SLO_FILE = os.getenv("LOAD_TEST_SLO_FILE")
+REPORT_FILE = os.getenv("LOAD_TEST_REPORT")
+
+# Términos de búsqueda: palabras de los temas y tipos de norma de los datos generados
+SEARCH_TERMS = [tema.split()[-1] for tema, _ in TEMAS] + [tipo for tipo, _ in TIPOS_NORMA]
+SEARCH_WEIGHTS = [peso for _, peso in TEMAS] + [peso for _, peso in TIPOS_NORMA]
+
+def credentials():
+    """Credenciales de un usuario de carga al azar (o de TEST_USER_EMAIL si está definido)."""
+    if TEST_USER_EMAIL:
+        return TEST_USER_EMAIL, TEST_USER_PASSWORD
+    return f"carga{random.randint(1, LOAD_TEST_USERS)}@{LOAD_TEST_EMAIL_DOMAIN}", LOAD_TEST_PASSWORD
+
+class AuthenticatedUser(HttpUser):
+    """Usuario autenticado con el formulario OAuth2 de /api/auth/login."""
+    abstract = True
+
     def on_start(self):
-        """
-        Método que se ejecuta cuando un usuario comienza la simulación
-        """
-        # Autenticación
-        response = self.client.post(
+        self.token = None
+        self.document_ids = []
+        self.categories = []
+        self.types = []
+        self.login()
+        if self.token:
+            self.load_reference_data()
+
+    def login(self):
+        email, password = credentials()
+        with self.client.post(
             "/api/auth/login",
-            json={"email": TEST_USER_EMAIL, "password": TEST_USER_PASSWORD}
-        )
+            data={"username": email, "password": password},
+            name="login",
+            catch_response=True
+        ) as response:
+            if response.status_code != 200:
+                response.failure(f"Login fallido ({response.status_code}): ¿se generaron los usuarios de carga?")
+                return
+            self.token = response.json()["access_token"]
+            self.client.headers.update({"Authorization": f"Bearer {self.token}"})
+
+    def load_reference_data(self):
+        categories = self.client.get("/api/documents/categories", name="referencias")
+        types = self.client.get("/api/documents/types", name="referencias")
+        if categories.status_code == 200:
+            self.categories = [categoria["id"] for categoria in categories.json()]
+        if types.status_code == 200:
+            self.types = [tipo["id"] for tipo in types.json()]
+        # Documentos iniciales para las vistas de detalle (luego se alimenta con los resultados de búsqueda)
+        self.search({"termino": random.choice(SEARCH_TERMS), "page_size": 50}, "busqueda_termino")
+
+    def search(self, params, name):
+        response = self.client.get("/api/documents/", params=params, name=name)
         if response.status_code == 200:
-            self.token = response.json().get("access_token")
-            self.client.headers = {"Authorization": f"Bearer {self.token}"}
-            
-            # Obtener algunos IDs de documentos para las pruebas
-            docs_response = self.client.get("/api/documents")
-            if docs_response.status_code == 200:
-                documents = docs_response.json()
-                self.document_ids = [doc["id"] for doc in documents[:10]]
-    
+            ids = [documento["id"] for documento in response.json()["items"]]
+            # Conservar un conjunto acotado de documentos vistos recientemente
+            self.document_ids = (ids + self.document_ids)[:200]
+        return response
+
+    def random_document(self):
+        return random.choice(self.document_ids) if self.document_ids else None
+
+class ReaderUser(AuthenticatedUser):
+    """Lector: busca, abre y descarga documentos y consulta sus versiones e historial."""
+    weight = 8
+    wait_time = between(2, 8)
+
+    @task(10)
+    def search_by_term(self):
+        termino = random.choices(SEARCH_TERMS, weights=SEARCH_WEIGHTS)[0]
+        self.search({"termino": termino, "page": random.choice([1, 1, 1, 2, 3])}, "busqueda_termino")
+
+    @task(6)
+    def search_by_filters(self):
+        params = {}
+        if self.categories and random.random() < 0.7:
+            params["categoria_id"] = random.choice(self.categories)
+        if self.types and random.random() < 0.3:
+            params["tipo_documento_id"] = random.choice(self.types)
+        if not params or random.random() < 0.5:
+            desde = date.today() - timedelta(days=random.randint(30, 3650))
+            params["fecha_desde"] = desde.isoformat()
+            params["fecha_hasta"] = (desde + timedelta(days=random.choice([30, 90, 365]))).isoformat()
+        params["sort_by"] = random.choice(["fecha_modificacion", "fecha_creacion", "titulo"])
+        self.search(params, "busqueda_filtros")
+
+    @task(2)
+    def search_by_expediente(self):
+        anio = date.today().year - random.randint(0, 5)
+        self.search({"numero_expediente": f"EXP-{anio}-{random.randint(1, 3000):05d}"}, "busqueda_expediente")
+
+    @task(8)
+    def view_document(self):
+        documento_id = self.random_document()
+        if documento_id:
+            self.client.get(f"/api/documents/{documento_id}", name="documento_detalle")
+
+    @task(4)
+    def download_document(self):
+        documento_id = self.random_document()
+        if documento_id:
+            self.client.get(f"/api/documents/{documento_id}/download", name="documento_descarga")
+
     @task(3)
-    def get_documents_list(self):
-        """
-        Tarea para obtener la lista de documentos
-        """
-        self.client.get("/api/documents")
-    
+    def list_versions(self):
+        documento_id = self.random_document()
+        if documento_id:
+            self.client.get(f"/api/documents/{documento_id}/versions", name="versiones_listado")
+
     @task(2)
-    def search_documents(self):
-        """
-        Tarea para buscar documentos
-        """
-        search_terms = ["prueba", "documento", "ordenanza", "resolución", ""]
-        term = random.choice(search_terms)
-        self.client.get(f"/api/documents?search={term}")
-    
-    @task(1)
-    def get_document_detail(self):
-        """
-        Tarea para obtener el detalle de un documento
-        """
-        if self.document_ids:
-            doc_id = random.choice(self.document_ids)
-            self.client.get(f"/api/documents/{doc_id}")
-    
-    @task(1)
-    def create_document(self):
-        """
-        Tarea para crear un nuevo documento
-        """
-        doc = SAMPLE_DOCUMENT.copy()
-        doc["title"] = f"Documento de prueba {int(time.time())}"
-        response = self.client.post("/api/documents", json=doc)
-        if response.status_code == 201:
-            new_doc_id = response.json().get("id")
-            if new_doc_id:
-                self.document_ids.append(new_doc_id)
-    
-    @task(1)
-    def update_document(self):
-        """
-        Tarea para actualizar un documento existente
-        """
-        if self.document_ids:
-            doc_id = random.choice(self.document_ids)
-            self.client.put(
-                f"/api/documents/{doc_id}",
-                json={"title": f"Documento actualizado {int(time.time())}"}
-            )
-
-class UserAPIUser(HttpUser):
-    """
-    Usuario simulado para pruebas de carga de la API de usuarios
-    """
-    wait_time = between(2, 5)  # Tiempo de espera entre tareas en segundos
-    token = None
-    
-    def on_start(self):
-        """
-        Método que se ejecuta cuando un usuario comienza la simulación
-        """
-        # Autenticación como administrador
-        response = self.client.post(
-            "/api/auth/login",
-            json={"email": TEST_USER_EMAIL, "password": TEST_USER_PASSWORD}
-        )
-        if response.status_code == 200:
-            self.token = response.json().get("access_token")
-            self.client.headers = {"Authorization": f"Bearer {self.token}"}
-    
+    def view_history(self):
+        documento_id = self.random_document()
+        if documento_id:
+            self.client.get(f"/api/documents/{documento_id}/history", name="historial")
+
+class ManagerUser(AuthenticatedUser):
+    """Gestor de documentos: carga nuevas versiones y compara versiones."""
+    weight = 2
+    wait_time = between(5, 15)
+
     @task(3)
-    def get_users_list(self):
-        """
-        Tarea para obtener la lista de usuarios
-        """
-        self.client.get("/api/users")
-    
+    def search_own_area(self):
+        if self.categories:
+            self.search({"categoria_id": random.choice(self.categories)}, "busqueda_filtros")
+
     @task(2)
-    def get_roles_list(self):
-        """
-        Tarea para obtener la lista de roles
-        """
-        self.client.get("/api/roles")
-    
-    @task(1)
-    def get_permissions_list(self):
-        """
-        Tarea para obtener la lista de permisos
-        """
-        self.client.get("/api/permissions")
-
-class AnonymousUser(HttpUser):
-    """
-    Usuario anónimo para simular tráfico sin autenticación
-    """
-    wait_time = between(1, 3)  # Tiempo de espera entre tareas en segundos
-    
-    @task(5)
-    def visit_health_check(self):
-        """
-        Tarea para verificar el estado de la API
-        """
-        self.client.get("/api/health")
-    
+    def upload_version(self):
+        documento_id = self.random_document()
+        if not documento_id:
+            return
+        detalle = self.client.get(f"/api/documents/{documento_id}", name="documento_detalle")
+        if detalle.status_code != 200:
+            return
+        extension = detalle.json().get("extension_archivo") or ".pdf"
+        contenido = os.urandom(UPLOAD_SIZE_KB * 1024)
+        self.client.post(
+            f"/api/documents/{documento_id}/versions",
+            files={"archivo": (f"version{extension}", contenido, "application/octet-stream")},
+            data={"comentario": "Versión de prueba de carga"},
+            name="version_carga"
+        )
+
     @task(2)
-    def failed_login_attempt(self):
-        """
-        Tarea para simular intentos de inicio de sesión fallidos
-        """
+    def compare_versions(self):
+        documento_id = self.random_document()
+        if not documento_id:
+            return
+        versiones = self.client.get(f"/api/documents/{documento_id}/versions", name="versiones_listado")
+        if versiones.status_code != 200 or len(versiones.json()) < 2:
+            return
+        version1, version2 = random.sample([version["id"] for version in versiones.json()], 2)
         self.client.post(
-            "/api/auth/login",
-            json={"email": f"fake{random.randint(1, 1000)}@example.com", "password": "wrongpassword"}
+            f"/api/documents/{documento_id}/versions/compare",
+            params={"version_id1": version1, "version_id2": version2},
+            name="version_comparacion"
         )
+
+    @task(1)
+    def view_history(self):
+        documento_id = self.random_document()
+        if documento_id:
+            self.client.get(f"/api/documents/{documento_id}/history", name="historial")
+
+class WebSocketListener(AuthenticatedUser):
+    """Pestaña abierta con la conexión WebSocket de notificaciones de permisos."""
+    weight = 1
+    wait_time = between(10, 30)
+    ws = None
+
+    def load_reference_data(self):
+        self.connect()
+
+    def fire(self, name, start, length=0, exception=None):
+        self.environment.events.request.fire(
+            request_type="WS",
+            name=name,
+            response_time=(time.perf_counter() - start) * 1000,
+            response_length=length,
+            exception=exception,
+            context={}
+        )
+
+    def connect(self):
+        url = self.host.replace("http://", "ws://").replace("https://", "wss://")
+        start = time.perf_counter()
+        try:
+            self.ws = websocket.create_connection(f"{url}/api/ws/permissions?token={self.token}", timeout=10)
+            self.fire("ws_conexion", start)
+        except Exception as e:
+            self.ws = None
+            self.fire("ws_conexion", start, exception=e)
+
+    @task
+    def send_message(self):
+        if self.ws is None:
+            self.connect()
+            return
+        start = time.perf_counter()
+        try:
+            self.ws.send("ping")
+            # Ignorar las notificaciones que lleguen antes de la respuesta
+            while True:
+                message = self.ws.recv()
+                if json.loads(message).get("action") == "echo":
+                    break
+            self.fire("ws_mensaje", start, len(message))
+        except Exception as e:
+            self.fire("ws_mensaje", start, exception=e)
+            self.ws = None
+
+    def on_stop(self):
+        if getattr(self, "ws", None) is not None:
+            self.ws.close()
+
+class MonitoringUser(HttpUser):
+    """Sondeo de disponibilidad del balanceador y del monitoreo."""
+    weight = 1
+    wait_time = between(5, 10)
+
+    @task
+    def health_check(self):
+        self.client.get("/api/health", name="health")
+
+def collect_stats(stats):
+    """Percentiles y errores de cada escenario registrado por Locust."""
+    rows = []
+    for entry in stats.entries.values():
+        if entry.num_requests == 0:
+            continue
+        rows.append({
+            "name": entry.name,
+            "method": entry.method,
+            "requests": entry.num_requests,
+            "failures": entry.num_failures,
+            "p50_ms": entry.get_response_time_percentile(0.50) or 0,
+            "p95_ms": entry.get_response_time_percentile(0.95) or 0,
+            "p99_ms": entry.get_response_time_percentile(0.99) or 0,
+            "rps": round(entry.total_rps, 3),
+        })
+    return rows
+
+@events.quitting.add_listener
+def report_slos(environment, **kwargs):
+    """Evalúa los SLO al terminar la prueba y escribe el informe JSON."""
+    report = build_report(collect_stats(environment.stats), load_slos(SLO_FILE), metadata={
+        "host": environment.host,
+        "usuarios": getattr(environment.parsed_options, "num_users", None),
+        "duracion_s": round(time.time() - environment.stats.start_time, 1),
+    })
+    print("\n" + format_report(report))
+    if REPORT_FILE:
+        save_report(report, REPORT_FILE)
+        print(f"Informe de SLO guardado en: {REPORT_FILE}")
+    if not report["passed"]:
+        environment.process_exit_code = 1
@@ -12,6 +12,8 @@ import matplotlib.pyplot as plt
 import pandas as pd
 from pathlib import Path
 
+from slo import compare_reports, format_report, load_report
+
 # Configuración de rutas
 SCRIPT_DIR = Path(__file__).parent
 REPORTS_DIR = SCRIPT_DIR / "reports"
@@ -32,7 +34,7 @@ def setup_environment():
         print("Instala las dependencias con: pip install -r requirements.txt")
         sys.exit(1)
 
-def run_load_test(users, spawn_rate, runtime, host):
+def run_load_test(users, spawn_rate, runtime, host, slo_file=None):
     """
     Ejecutar la prueba de carga con los parámetros especificados
     
@@ -41,12 +43,20 @@ def run_load_test(users, spawn_rate, runtime, host):
         spawn_rate: Tasa de generación de usuarios por segundo
         runtime: Duración de la prueba en segundos
         host: URL del host a probar
+        slo_file: Archivo de SLO (por defecto slos.json)
     
     Returns:
-        Path al archivo CSV con los resultados
+        Tupla (Path al archivo CSV con los resultados, Path al informe JSON de SLO)
+        o (None, None) si la prueba no pudo ejecutarse
     """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     csv_file = REPORTS_DIR / f"results_{timestamp}.csv"
+    slo_report = REPORTS_DIR / f"slo_{timestamp}.json"
+    
+    # El locustfile escribe el informe de SLO al terminar
+    env = dict(os.environ, LOAD_TEST_REPORT=str(slo_report))
+    if slo_file:
+        env["LOAD_TEST_SLO_FILE"] = str(slo_file)
     
     print(f"\n{'=' * 80}")
     print(f"Iniciando prueba de carga con {users} usuarios, tasa de {spawn_rate}/s, duración {runtime}s")
@@ -68,7 +78,7 @@ def run_load_test(users, spawn_rate, runtime, host):
     
     # Ejecutar locust
     try:
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env)
         
         # Mostrar salida en tiempo real
         for line in process.stdout:
@@ -76,15 +86,17 @@ def run_load_test(users, spawn_rate, runtime, host):
         
         process.wait()
         
-        if process.returncode != 0:
+        # Locust termina con código 1 si algún escenario incumple su SLO; en ese caso el informe existe
+        if process.returncode != 0 and not slo_report.exists():
             print(f"Error: La prueba de carga falló con código de salida {process.returncode}")
-            return None
+            return None, None
         
-        return csv_file.with_suffix('_stats.csv')
+        # Locust añade el sufijo _stats.csv al prefijo indicado con --csv
+        return REPORTS_DIR / f"results_{timestamp}_stats.csv", slo_report
     
     except Exception as e:
         print(f"Error al ejecutar la prueba de carga: {str(e)}")
-        return None
+        return None, None
 
 def generate_report(csv_file):
     """
@@ -98,8 +110,11 @@ def generate_report(csv_file):
         return
     
     try:
-        # Cargar datos
+        csv_file = str(csv_file)
+        
+        # Cargar datos (sin la fila Aggregated, que se resume aparte)
         df = pd.read_csv(csv_file)
+        df = df[df['Name'] != 'Aggregated']
         
         # Crear gráficos
         plt.figure(figsize=(12, 8))
@@ -174,7 +189,7 @@ def generate_report(csv_file):
     except Exception as e:
         print(f"Error al generar el informe: {str(e)}")
 
-def run_stress_test(host, max_users=1000, step=100, target_rps=None):
+def run_stress_test(host, max_users=1000, step=100, target_rps=None, slo_file=None):
     """
     Ejecutar una prueba de estrés incremental para encontrar el límite del sistema
     
@@ -183,6 +198,7 @@ def run_stress_test(host, max_users=1000, step=100, target_rps=None):
         max_users: Número máximo de usuarios a probar
         step: Incremento de usuarios en cada paso
         target_rps: Tasa objetivo de solicitudes por segundo
+        slo_file: Archivo de SLO (por defecto slos.json)
     """
     print(f"\n{'=' * 80}")
     print(f"Iniciando prueba de estrés incremental")
@@ -196,7 +212,7 @@ def run_stress_test(host, max_users=1000, step=100, target_rps=None):
         print(f"\nPrueba con {users} usuarios concurrentes:")
         
         # Ejecutar prueba con este número de usuarios
-        csv_file = run_load_test(users, spawn_rate=users/10, runtime=30, host=host)
+        csv_file, slo_report = run_load_test(users, spawn_rate=users/10, runtime=30, host=host, slo_file=slo_file)
         
         if not csv_file or not os.path.exists(csv_file):
             print(f"La prueba con {users} usuarios falló. Deteniendo prueba de estrés.")
@@ -204,6 +220,8 @@ def run_stress_test(host, max_users=1000, step=100, target_rps=None):
         
         # Analizar resultados
         df = pd.read_csv(csv_file)
+        df = df[df['Name'] != 'Aggregated']
+        report = load_report(slo_report)
         
         # Calcular métricas clave
         total_rps = df['Requests/s'].sum()
@@ -214,7 +232,8 @@ def run_stress_test(host, max_users=1000, step=100, target_rps=None):
             "users": users,
             "rps": total_rps,
             "avg_response_time": avg_response_time,
-            "error_rate": error_rate * 100
+            "error_rate": error_rate * 100,
+            "slo_cumplidos": report["passed"]
         })
         
         print(f"  Usuarios: {users}")
@@ -223,6 +242,11 @@ def run_stress_test(host, max_users=1000, step=100, target_rps=None):
         print(f"  Tasa de error: {error_rate * 100:.2f}%")
         
         # Verificar si hemos alcanzado el límite
+        if not report["passed"]:
+            failing = [name for name, scenario in report["scenarios"].items() if scenario["violations"]]
+            print(f"\n¡LÍMITE ALCANZADO! Se incumplen los SLO de {', '.join(failing)} con {users} usuarios.")
+            break
+        
         if error_rate > 0.1:  # Más del 10% de errores
             print(f"\n¡LÍMITE ALCANZADO! La tasa de error supera el 10% con {users} usuarios.")
             break
@@ -302,6 +326,9 @@ def main():
     parser.add_argument("--max-users", type=int, default=1000, help="Número máximo de usuarios para la prueba de estrés")
     parser.add_argument("--step", type=int, default=100, help="Incremento de usuarios en cada paso de la prueba de estrés")
     parser.add_argument("--target-rps", type=int, help="Tasa objetivo de solicitudes por segundo para la prueba de estrés")
+    parser.add_argument("--slo-file", help="Archivo JSON con los SLO por escenario (por defecto slos.json)")
+    parser.add_argument("--baseline", help="Informe de SLO de una ejecución anterior con el que comparar")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Aumento máximo del p95 respecto de la ejecución anterior (0.2 = 20%%)")
     
     args = parser.parse_args()
     
@@ -310,14 +337,34 @@ def main():
     
     if args.stress:
         # Ejecutar prueba de estrés
-        run_stress_test(args.host, args.max_users, args.step, args.target_rps)
-    else:
-        # Ejecutar prueba de carga
-        csv_file = run_load_test(args.users, args.spawn_rate, args.runtime, args.host)
-        
-        if csv_file:
-            # Generar informe
-            generate_report(csv_file)
+        run_stress_test(args.host, args.max_users, args.step, args.target_rps, args.slo_file)
+        return 0
+    
+    # Ejecutar prueba de carga
+    csv_file, slo_report = run_load_test(args.users, args.spawn_rate, args.runtime, args.host, args.slo_file)
+    if not csv_file:
+        return 1
+    
+    # Generar informe
+    generate_report(csv_file)
+    
+    report = load_report(slo_report)
+    print(f"\nInforme de SLO: {slo_report}")
+    print(format_report(report))
+    exit_code = 0 if report["passed"] else 1
+    
+    if args.baseline:
+        regressions = compare_reports(report, load_report(args.baseline), args.threshold)
+        if regressions:
+            print(f"\nRegresiones de p95 mayores a {args.threshold:.0%} respecto de {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression['escenario']}: {regression['base_ms']:.0f} ms -> {regression['actual_ms']:.0f} ms "
+                      f"({regression['cambio']:+.0%})")
+            exit_code = 1
+        else:
+            print(f"\nSin regresiones de p95 mayores a {args.threshold:.0%} respecto de {args.baseline}")
+    
+    return exit_code
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Objetivos de nivel de servicio (SLO) de las pruebas de carga.
+
+Evalúa los percentiles y la tasa de errores de cada escenario contra los SLO de
+slos.json, genera el informe JSON de la ejecución y compara dos informes para
+detectar regresiones entre ejecuciones.
+"""
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_SLO_FILE = Path(__file__).parent / "slos.json"
+PERCENTILES = ("p50_ms", "p95_ms", "p99_ms")
+
+def load_slos(path: Optional[str] = None) -> Dict[str, Any]:
+    """Lee los SLO: {"default": {...}, "scenarios": {escenario: {...}}}."""
+    with open(path or DEFAULT_SLO_FILE) as slo_file:
+        return json.load(slo_file)
+
+def slo_for(slos: Dict[str, Any], scenario: str) -> Dict[str, float]:
+    """SLO del escenario, completado con los valores por defecto."""
+    return {**slos.get("default", {}), **slos.get("scenarios", {}).get(scenario, {})}
+
+def evaluate(rows: List[Dict[str, Any]], slos: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Evalúa cada escenario (filas con name, requests, failures, p50_ms, p95_ms,
+    p99_ms y rps) contra su SLO y devuelve los resultados por escenario con la
+    lista de objetivos incumplidos.
+    """
+    scenarios = {}
+    for row in rows:
+        objective = slo_for(slos, row["name"])
+        error_rate = row["failures"] / row["requests"] if row["requests"] else 0.0
+        violations = [
+            f"{percentile} {row[percentile]:.0f} ms > {objective[percentile]:.0f} ms"
+            for percentile in PERCENTILES
+            if percentile in objective and row[percentile] > objective[percentile]
+        ]
+        if "error_rate" in objective and error_rate > objective["error_rate"]:
+            violations.append(f"errores {error_rate:.2%} > {objective['error_rate']:.2%}")
+        if row["requests"] < objective.get("min_requests", 0):
+            violations.append(f"solicitudes {row['requests']} < {objective['min_requests']} (muestra insuficiente)")
+        scenarios[row["name"]] = {
+            **row,
+            "error_rate": round(error_rate, 5),
+            "slo": objective,
+            "violations": violations,
+        }
+    return scenarios
+
+def build_report(rows: List[Dict[str, Any]], slos: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    scenarios = evaluate(rows, slos)
+    return {
+        "metadata": {"fecha": datetime.now().isoformat(), **(metadata or {})},
+        "passed": all(not scenario["violations"] for scenario in scenarios.values()),
+        "scenarios": scenarios,
+    }
+
+def save_report(report: Dict[str, Any], path: str) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as output:
+        json.dump(report, output, indent=2, ensure_ascii=False)
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path) as report:
+        return json.load(report)
+
+def compare_reports(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float = 0.2,
+    metric: str = "p95_ms",
+) -> List[Dict[str, Any]]:
+    """Escenarios cuyo `metric` empeoró más que `threshold` (fracción) respecto del informe base."""
+    regressions = []
+    for name, scenario in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or not previous.get(metric):
+            continue
+        change = scenario[metric] / previous[metric] - 1
+        if change > threshold:
+            regressions.append({
+                "escenario": name,
+                "base_ms": previous[metric],
+                "actual_ms": scenario[metric],
+                "cambio": round(change, 4),
+            })
+    return regressions
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Tabla de texto con los percentiles de cada escenario y el resultado de sus SLO."""
+    lines = [
+        f"{'Escenario':<24} {'Solicitudes':>11} {'Errores':>8} {'p50':>8} {'p95':>8} {'p99':>8}  SLO",
+        "-" * 90,
+    ]
+    for name, scenario in sorted(report["scenarios"].items()):
+        status = "OK" if not scenario["violations"] else "FALLA: " + "; ".join(scenario["violations"])
+        lines.append(
+            f"{name:<24} {scenario['requests']:>11} {scenario['error_rate']:>8.2%} "
+            f"{scenario['p50_ms']:>8.0f} {scenario['p95_ms']:>8.0f} {scenario['p99_ms']:>8.0f}  {status}"
+        )
+    lines.append("-" * 90)
+    lines.append("SLO cumplidos" if report["passed"] else "SLO incumplidos")
+    return "\n".join(lines)
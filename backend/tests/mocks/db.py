@@ -1,12 +1,17 @@
 """
 Mocks para la base de datos y modelos
 """
+import itertools
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from unittest.mock import AsyncMock, MagicMock
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
 
+from app.db import models
 from app.db.models import Usuario as User, Rol as Role, Permiso as Permission, Documento as Document, VersionDocumento as DocumentVersion, HistorialAcceso as DocumentHistory
 
 # Mock para la sesión de base de datos
@@ -40,6 +45,91 @@ def create_mock_session() -> AsyncSession:
     session.rollback = AsyncMock()
     return session
 
+# Contador de consultas SQL emitidas por un motor
+class QueryCounter:
+    """
+    Cuenta las sentencias SQL ejecutadas sobre un motor (sync o async) dentro del bloque with.
+
+    Uso:
+        with QueryCounter(engine) as counter:
+            ...
+        counter.assert_at_most(3)
+    """
+
+    def __init__(self, engine):
+        self.engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+    def assert_at_most(self, limit: int) -> None:
+        """Falla si se ejecutaron más de `limit` consultas, mostrando las sentencias."""
+        assert self.count <= limit, (
+            f"Se ejecutaron {self.count} consultas (máximo {limit}):\n" + "\n".join(self.statements)
+        )
+
+# Tablas de auditoría con clave primaria compuesta (id, fecha) por el particionado
+PARTITIONED_MODELS = (models.HistorialAcceso, models.RegistroAcceso, models.IntentosLogin)
+
+@contextmanager
+def sqlite_audit_ids():
+    """
+    Asigna el id de las tablas de auditoría al insertar. SQLite no autoincrementa
+    una clave primaria compuesta; en Postgres la asigna la secuencia.
+    """
+    ids = itertools.count(1)
+    def assign_id(mapper, connection, target):
+        if target.id is None:
+            target.id = next(ids)
+    for model in PARTITIONED_MODELS:
+        event.listen(model, "before_insert", assign_id)
+    try:
+        yield
+    finally:
+        for model in PARTITIONED_MODELS:
+            event.remove(model, "before_insert", assign_id)
+
+# Datos persistidos para las pruebas sobre una base real (SQLite o Postgres)
+def create_documentos(db: Session, cantidad: int = 1) -> List[Document]:
+    """
+    Crea el rol gestor, la usuaria Ana Paz, el tipo de documento TXT y `cantidad`
+    documentos "Ordenanza" (EXP-2025-00001, EXP-2025-00002, ...). Hace flush sin
+    commit; el commit queda a cargo de la prueba.
+    """
+    rol = models.Rol(nombre="gestor")
+    db.add(rol)
+    db.flush()
+    usuario = models.Usuario(nombre="Ana", apellido="Paz", email="ana@hcd.test", password_hash="x", dni="1", role_id=rol.id)
+    tipo = models.TipoDocumento(nombre="TXT", extensiones_permitidas=".txt")
+    db.add_all([usuario, tipo])
+    db.flush()
+    documentos = [
+        models.Documento(
+            titulo="Ordenanza", numero_expediente=f"EXP-2025-{n:05d}", tipo_documento_id=tipo.id,
+            usuario_id=usuario.id, path_archivo="/dev/null"
+        )
+        for n in range(1, cantidad + 1)
+    ]
+    db.add_all(documentos)
+    db.flush()
+    return documentos
+
+def create_documento(db: Session) -> Document:
+    """Un único documento con su usuaria, rol y tipo (ver create_documentos)."""
+    return create_documentos(db)[0]
+
 # Datos mock para pruebas
 class MockData:
     @staticmethod
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from tests.benchmarks.bench_search import parse_dataset
+from tests.benchmarks.bench_storage import parse_size, text_content
+from tests.benchmarks.harness import BenchmarkSuite, compare, load_results, percentile, summarize
+
+@pytest.mark.unit
+class TestBenchmarkHarness:
+    def test_summarize_in_milliseconds(self):
+        """Prueba que las estadísticas se calculan en milisegundos"""
+        stats = summarize([0.001, 0.002, 0.003, 0.004])
+
+        assert stats["runs"] == 4
+        assert stats["min_ms"] == 1.0
+        assert stats["median_ms"] == 2.5
+        assert stats["p95_ms"] == pytest.approx(3.85)
+        assert percentile([0.5], 0.95) == 0.5
+
+    def test_results_are_keyed_by_params(self, tmp_path):
+        """Prueba que cada resultado se identifica por nombre y parámetros y se guarda en JSON"""
+        suite = BenchmarkSuite()
+        suite.add("search.search_documents", [0.01, 0.02], query="termino", dataset="10k")
+        path = tmp_path / "results.json"
+        suite.save(str(path))
+
+        results = load_results(str(path))
+        assert list(results) == ["search.search_documents[dataset=10k,query=termino]"]
+        assert json.loads(path.read_text())["metadata"]["python"]
+
+    def test_compare_reports_regressions_over_threshold(self):
+        """Prueba que solo se reportan los benchmarks que empeoran más que el umbral"""
+        baseline = {"a": {"median_ms": 10.0}, "b": {"median_ms": 10.0}, "removido": {"median_ms": 1.0}}
+        current = {"a": {"median_ms": 11.0}, "b": {"median_ms": 13.0}, "nuevo": {"median_ms": 50.0}}
+
+        regressions = compare(current, baseline, threshold=0.2)
+
+        assert [regression["benchmark"] for regression in regressions] == ["b"]
+        assert regressions[0]["change"] == pytest.approx(0.3)
+
+    def test_parsers(self):
+        """Prueba la interpretación de tamaños de archivo y de conjuntos de datos"""
+        assert parse_size("10KB") == 10 * 1024
+        assert parse_size("1MB") == 1024 ** 2
+        assert parse_size("512") == 512
+        assert parse_dataset("100k") == 100_000
+        assert parse_dataset("1M") == 1_000_000
+
+    def test_text_content_changes_a_fraction_of_lines(self):
+        """Prueba que la segunda versión de compare_versions difiere en la fracción pedida de líneas"""
+        original = text_content(8192, seed=1).decode("utf-8").splitlines()
+        modified = text_content(8192, seed=1, changed_fraction=0.1).decode("utf-8").splitlines()
+
+        assert len(original) == len(modified)
+        changed = sum(1 for before, after in zip(original, modified) if before != after)
+        assert changed == int(len(original) * 0.1)
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import create_engine, exc
+from sqlalchemy.pool import QueuePool
+
+from app.db import pool as pool_module
+from app.db.pool import instrumented_pool_class, register_engine, get_pool_metrics
+
+@pytest.mark.unit
+class TestInstrumentedPool:
+    def test_checkouts_and_timeouts_are_counted(self, tmp_path, monkeypatch):
+        """Prueba que se registran las obtenciones de conexión y los timeouts del pool"""
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'pool.db'}",
+            poolclass=instrumented_pool_class(QueuePool),
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.1
+        )
+        # Registro propio de la prueba: el motor no queda en las métricas de las siguientes
+        monkeypatch.setattr(pool_module, "_engines", {})
+        register_engine("test", engine)
+
+        conn = engine.connect()
+        metrics = get_pool_metrics()["test"]
+        assert metrics["checked_out"] == 1
+        assert metrics["checkouts"] == 1
+
+        # El pool está agotado: la segunda conexión espera y agota el tiempo
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+
+        metrics = get_pool_metrics()["test"]
+        assert metrics["timeouts"] == 1
+        assert metrics["waiting"] == 0
+
+        conn.close()
+        assert get_pool_metrics()["test"]["checked_out"] == 0
+        engine.dispose()
+
+    def test_each_pool_class_has_its_own_stats(self):
+        """Prueba que cada clase instrumentada tiene contadores independientes"""
+        assert instrumented_pool_class(QueuePool).stats is not instrumented_pool_class(QueuePool).stats
@@ -0,0 +1,180 @@
+import difflib
+import json
+import random
+
+import pytest
+
+from app.utils import diff as diff_module
+from app.utils.diff import DiffCache, compare_files, ndjson_chunks, unified_diff
+
+def apply_diff(lines_a, diff):
+    """Reconstruye la segunda versión aplicando el diff unificado a la primera."""
+    result, position = [], 0
+    for line in diff[2:]:
+        if line.startswith("@@"):
+            start = int(line.split()[1][1:].split(",")[0])
+            length = line.split()[1].split(",")
+            # "-0,0" indica un hunk que inserta antes de la primera línea
+            start = start - 1 if len(length) == 1 or length[1] != "0" else start
+            result.extend(lines_a[position:start])
+            position = start
+        elif line.startswith("-"):
+            position += 1
+        elif line.startswith("+"):
+            result.append(line[1:])
+        else:
+            result.append(lines_a[position])
+            position += 1
+    return result + lines_a[position:]
+
+def edited(lines, rng, fraction):
+    result = list(lines)
+    for _ in range(int(len(lines) * fraction)):
+        position = rng.randrange(len(result))
+        action = rng.random()
+        if action < 0.4:
+            result[position] = f"cambio {rng.random()}\n"
+        elif action < 0.7:
+            result.insert(position, f"nueva {rng.random()}\n")
+        else:
+            del result[position]
+    return result
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    cache = DiffCache("", max_lines=10000)
+    monkeypatch.setattr(diff_module, "diff_cache", cache)
+    return cache
+
+@pytest.mark.unit
+class TestDiffEngine:
+    def test_matches_difflib_for_small_edits(self):
+        """Prueba que para cambios simples el diff coincide con difflib.unified_diff"""
+        lines_a = [f"línea {n}\n" for n in range(50)]
+        lines_b = lines_a[:10] + ["nueva\n"] + lines_a[12:40] + lines_a[41:]
+
+        result = unified_diff(lines_a, lines_b, "v1", "v2")
+
+        expected = list(difflib.unified_diff(lines_a, lines_b, fromfile="v1", tofile="v2", lineterm=""))
+        assert result["diff"] == expected
+        assert (result["added_lines"], result["removed_lines"]) == (1, 3)
+
+    @pytest.mark.parametrize("repeated", [False, True])
+    def test_diff_reconstructs_second_version(self, repeated):
+        """Prueba que aplicar el diff a la primera versión produce la segunda, con y sin líneas repetidas"""
+        rng = random.Random(5)
+        if repeated:
+            lines_a = [f"{rng.choice(['art.', 'inc.', ''])} {n % 37}\n" if n % 5 else "\n" for n in range(2000)]
+        else:
+            lines_a = [f"Artículo {n}: {rng.random()}\n" for n in range(20000)]
+        lines_b = edited(lines_a, rng, 0.05)
+
+        result = unified_diff(lines_a, lines_b, "v1", "v2")
+
+        assert not result["is_approximate"]
+        assert apply_diff(lines_a, result["diff"]) == lines_b
+
+    def test_identical_files_have_empty_diff(self):
+        """Prueba que dos versiones iguales no generan diff"""
+        lines = ["a\n", "b\n"]
+
+        assert unified_diff(lines, lines, "v1", "v2")["diff"] == []
+
+    def test_time_budget_returns_approximate_valid_diff(self):
+        """Prueba que al agotarse el tiempo el diff se marca como aproximado pero sigue siendo válido"""
+        rng = random.Random(3)
+        lines_a = [f"{n}\n" for n in range(5000)]
+        lines_b = edited(lines_a, rng, 0.1)
+
+        result = unified_diff(lines_a, lines_b, "v1", "v2", deadline=0)
+
+        assert result["is_approximate"]
+        assert apply_diff(lines_a, result["diff"]) == lines_b
+
+    def test_binary_and_oversized_files_are_not_diffed(self, tmp_path, monkeypatch, memory_cache):
+        """Prueba que los archivos binarios y los que superan el tamaño máximo solo se comparan por metadatos"""
+        binary = tmp_path / "a.bin"
+        binary.write_bytes(b"%PDF\0\x01\x02")
+        text = tmp_path / "a.txt"
+        text.write_text("hola\n" * 100)
+
+        assert compare_files(str(binary), str(text), None, None, "v1", "v2")["is_binary"]
+
+        monkeypatch.setattr(diff_module.settings, "DIFF_MAX_FILE_SIZE", 10)
+        result = compare_files(str(text), str(text), None, None, "v1", "v2")
+        assert result["is_too_large"] and result["diff"] == []
+
+    def test_repeated_comparison_uses_cache(self, tmp_path, monkeypatch, memory_cache):
+        """Prueba que la segunda comparación del mismo par de hashes no vuelve a calcular el diff"""
+        path1, path2 = tmp_path / "v1.txt", tmp_path / "v2.txt"
+        path1.write_text("a\nb\nc\n")
+        path2.write_text("a\nx\nc\n")
+        first = compare_files(str(path1), str(path2), "h1", "h2", "v1", "v2")
+
+        def fail(*args, **kwargs):
+            raise AssertionError("El diff no debía recalcularse")
+
+        monkeypatch.setattr(diff_module, "unified_diff", fail)
+        assert compare_files(str(path1), str(path2), "h1", "h2", "v1", "v2") == first
+
+    def test_cached_result_uses_caller_labels(self, tmp_path, memory_cache):
+        """Prueba que otro par con el mismo contenido recibe sus propios nombres en el encabezado del diff"""
+        path1, path2 = tmp_path / "v1.txt", tmp_path / "v2.txt"
+        path1.write_text("a\nb\nc\n")
+        path2.write_text("a\nx\nc\n")
+        first = compare_files(str(path1), str(path2), "h1", "h2", "v1", "v2")
+
+        # v3 restaura el contenido de v2
+        restored = compare_files(str(path1), str(path2), "h1", "h2", "v1", "v3")
+
+        assert first["diff"][:2] == ["--- v1", "+++ v2"]
+        assert restored["diff"][:2] == ["--- v1", "+++ v3"]
+        assert restored["diff"][2:] == first["diff"][2:]
+
+    def test_approximate_result_is_not_cached(self, tmp_path, monkeypatch, memory_cache):
+        """Prueba que un diff aproximado por falta de tiempo no se guarda y la siguiente comparación lo recalcula"""
+        rng = random.Random(3)
+        lines_a = [f"{n}\n" for n in range(5000)]
+        path1, path2 = tmp_path / "v1.txt", tmp_path / "v2.txt"
+        path1.write_text("".join(lines_a))
+        path2.write_text("".join(edited(lines_a, rng, 0.1)))
+        exact_diff = diff_module.unified_diff
+
+        def expired(lines1, lines2, fromfile, tofile, deadline=None):
+            return exact_diff(lines1, lines2, fromfile, tofile, deadline=0)
+
+        monkeypatch.setattr(diff_module, "unified_diff", expired)
+        assert compare_files(str(path1), str(path2), "h1", "h2", "v1", "v2")["is_approximate"]
+
+        monkeypatch.setattr(diff_module, "unified_diff", exact_diff)
+        result = compare_files(str(path1), str(path2), "h1", "h2", "v1", "v2")
+        assert not result["is_approximate"]
+        assert memory_cache.get(DiffCache.key("h1", "h2"))["diff"] == result["diff"][2:]
+
+    def test_disk_cache_is_shared(self, tmp_path):
+        """Prueba que una entrada guardada en disco la lee otra instancia de la caché (otro worker)"""
+        result = {"diff": ["--- v1", "+++ v2"], "added_lines": 0, "removed_lines": 0}
+        DiffCache(str(tmp_path), max_lines=100).put("ab-cd-v1", result)
+
+        assert DiffCache(str(tmp_path), max_lines=100).get("ab-cd-v1") == result
+
+    def test_memory_cache_evicts_least_recent(self):
+        """Prueba que la caché en memoria descarta las entradas menos usadas al superar el máximo de líneas"""
+        cache = DiffCache("", max_lines=10)
+        cache.put("a", {"diff": ["x"] * 4})
+        cache.put("b", {"diff": ["x"] * 4})
+        cache.get("a")
+        cache.put("c", {"diff": ["x"] * 4})
+
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+
+    def test_ndjson_chunks(self):
+        """Prueba que el NDJSON empieza con el resumen y contiene el diff completo en bloques"""
+        diff = [f"+{n}" for n in range(25)]
+
+        chunks = [json.loads(chunk) for chunk in ndjson_chunks({"added_lines": 25}, diff, 10)]
+
+        assert chunks[0] == {"type": "summary", "added_lines": 25, "total_lines": 25, "total_changes": 0}
+        assert [len(chunk["lines"]) for chunk in chunks[1:]] == [10, 10, 5]
+        assert sum((chunk["lines"] for chunk in chunks[1:]), []) == diff
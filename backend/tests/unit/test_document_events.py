@@ -0,0 +1,77 @@
+import pytest
+
+from app.db import models
+from app.routes.websockets import ConnectionManager
+from app.utils.document_events import DocumentSubscription, VERSION_ADDED, document_event
+from app.utils.event_bus import DOCUMENTS_TOPIC, MemoryEventBus
+from app.utils.reference_data import PUBLIC_LEVELS, RESTRICTED_LEVELS
+
+from .test_event_bus import FakeWebSocket, drain
+
+def documento(**campos) -> models.Documento:
+    datos = dict(id=7, titulo="Ordenanza", numero_expediente="EXP-2025-00001", categoria_id=3, usuario_id=1, activo=True)
+    datos.update(campos)
+    return models.Documento(**datos)
+
+@pytest.fixture
+async def manager():
+    manager = ConnectionManager(bus=MemoryEventBus(), queue_size=4, send_timeout=5, heartbeat_interval=60, heartbeat_timeout=120)
+    yield manager
+    await manager.close_all()
+
+@pytest.mark.unit
+class TestDocumentSubscription:
+    def test_filters_by_category_expediente_and_document(self):
+        """Prueba que la suscripción acepta los eventos de sus categorías, expedientes y documentos"""
+        subscription = DocumentSubscription(user_id=2, niveles=None)
+        event = document_event(VERSION_ADDED, documento())
+        assert not subscription.accepts(event)
+
+        for filtros in ({"categorias": [3]}, {"expedientes": "EXP-2025-00001"}, {"documentos": ["7"]}, {"todos": True}):
+            subscription.update(filtros)
+            assert subscription.accepts(event), filtros
+            subscription.update(filtros, subscribe=False)
+            assert not subscription.accepts(event), filtros
+
+    @pytest.mark.parametrize("niveles, visibles", [(PUBLIC_LEVELS, {1}), (RESTRICTED_LEVELS, {1, 2})])
+    def test_only_visible_documents(self, niveles, visibles):
+        """Prueba que sin docs:view se reciben los documentos propios y los de tipos visibles para el nivel, como en la búsqueda"""
+        # Tipos: 1 público, 2 restringido, 3 clasificado
+        tipos = {PUBLIC_LEVELS: frozenset({1}), RESTRICTED_LEVELS: frozenset({1, 2})}
+        subscription = DocumentSubscription(user_id=2, niveles=niveles, visible_types=tipos.get)
+        subscription.update({"todos": True})
+
+        for tipo_id in (1, 2, 3):
+            ajeno = document_event(VERSION_ADDED, documento(usuario_id=1, tipo_documento_id=tipo_id))
+            propio = document_event(VERSION_ADDED, documento(usuario_id=2, tipo_documento_id=tipo_id))
+            assert subscription.accepts(ajeno) == (tipo_id in visibles), tipo_id
+            assert subscription.accepts(propio)
+
+@pytest.mark.unit
+class TestDocumentEvents:
+    async def test_events_reach_matching_connections(self, manager):
+        """Prueba que un evento del tema documentos llega solo a las conexiones cuyo filtro lo acepta"""
+        por_categoria, otra_categoria, sin_filtro = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        for user_id, websocket in enumerate((por_categoria, otra_categoria, sin_filtro), start=1):
+            await manager.connect(websocket, user_id=user_id, role_id=1)
+        for websocket, categoria_id in ((por_categoria, 3), (otra_categoria, 4)):
+            subscription = DocumentSubscription(user_id=0, niveles=None)
+            subscription.update({"categorias": [categoria_id]})
+            manager.subscribe(websocket, DOCUMENTS_TOPIC, subscription.accepts)
+
+        await manager.bus.publish(DOCUMENTS_TOPIC, document_event(VERSION_ADDED, documento(), version_id=11))
+        await drain(manager)
+
+        assert [(m["tipo"], m["documento_id"], m["version_id"]) for m in por_categoria.sent] == [(VERSION_ADDED, 7, 11)]
+        assert otra_categoria.sent == []
+        assert sin_filtro.sent == []
+
+    async def test_unsubscribe_removes_filter(self, manager):
+        """Prueba que al quitar la suscripción al tema también se descarta su filtro"""
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, user_id=1, role_id=1)
+        manager.subscribe(websocket, DOCUMENTS_TOPIC, lambda event: True)
+
+        manager.unsubscribe(websocket, DOCUMENTS_TOPIC)
+
+        assert manager.filters == {}
@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import pytest
+
+from app.routes.websockets import ConnectionManager
+from app.utils.event_bus import MemoryEventBus, document_topic
+
+class FakeWebSocket:
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.close_code = None
+        self.release = asyncio.Event()
+        if not blocked:
+            self.release.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await self.release.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code):
+        self.close_code = code
+
+@pytest.fixture
+async def manager():
+    manager = ConnectionManager(bus=MemoryEventBus(), queue_size=2, send_timeout=5, heartbeat_interval=60, heartbeat_timeout=120)
+    yield manager
+    await manager.close_all()
+
+async def drain(manager):
+    """Espera a que se envíen los mensajes encolados de las conexiones abiertas."""
+    await asyncio.gather(*(connection.queue.join() for connection in manager.connections.values()))
+
+@pytest.mark.unit
+class TestEventBus:
+    async def test_role_messages_reach_only_role_connections(self, manager):
+        """Prueba que un mensaje a un rol llega a las conexiones de ese rol y no a las de otros"""
+        admin, gestor = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(admin, user_id=1, role_id=1)
+        await manager.connect(gestor, user_id=2, role_id=2)
+
+        await manager.broadcast_to_role({"action": "permission_change"}, 1)
+        await drain(manager)
+
+        assert admin.sent == [{"action": "permission_change"}]
+        assert gestor.sent == []
+
+    async def test_document_subscriptions(self, manager):
+        """Prueba que los eventos de un documento llegan solo a las conexiones suscritas"""
+        subscribed, other = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(subscribed, user_id=1, role_id=1)
+        await manager.connect(other, user_id=2, role_id=1)
+        manager.subscribe(subscribed, document_topic(7))
+
+        await manager.broadcast_to_document({"action": "version_creada"}, 7)
+        await drain(manager)
+
+        assert subscribed.sent == [{"action": "version_creada"}]
+        assert other.sent == []
+
+    async def test_disconnect_removes_every_topic(self, manager):
+        """Prueba que al desconectarse la conexión deja de estar en todos sus temas"""
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, user_id=1, role_id=1)
+        manager.subscribe(websocket, document_topic(7))
+
+        manager.disconnect(websocket, user_id=1, role_id=1)
+
+        assert manager.topic_connections == {}
+        assert manager.active_connections == {}
+        await manager.broadcast({"action": "aviso"})
+        assert websocket.sent == []
+
+    async def test_slow_client_does_not_delay_others(self, manager):
+        """Prueba que un cliente que no lee no demora a los demás y se desconecta al llenar su cola"""
+        slow, fast = FakeWebSocket(blocked=True), FakeWebSocket()
+        await manager.connect(slow, user_id=1, role_id=1)
+        await manager.connect(fast, user_id=2, role_id=1)
+
+        for number in range(4):
+            await asyncio.wait_for(manager.broadcast({"numero": number}), 1)
+        await drain(manager)
+
+        assert fast.sent == [{"numero": number} for number in range(4)]
+        assert slow.close_code == 1013
+        assert slow not in manager.connections
+
+    async def test_heartbeat_drops_silent_clients(self):
+        """Prueba que el latido envía pings y cierra las conexiones que no responden"""
+        manager = ConnectionManager(bus=MemoryEventBus(), heartbeat_interval=0.01, heartbeat_timeout=0.05)
+        silent, alive = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(silent, user_id=1, role_id=1)
+        await manager.connect(alive, user_id=2, role_id=1)
+
+        for _ in range(20):
+            manager.touch(alive)
+            await asyncio.sleep(0.01)
+
+        assert silent.close_code == 1001
+        assert {"action": "ping"} in alive.sent
+        assert list(manager.connections) == [alive]
+        await manager.close_all()
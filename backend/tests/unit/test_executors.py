@@ -0,0 +1,36 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.utils.executors import BoundedExecutor, ExecutorSaturatedError
+
+@pytest.mark.unit
+class TestBoundedExecutor:
+    async def test_run_returns_result(self):
+        """Prueba que las tareas se ejecutan en el pool y devuelven su resultado"""
+        executor = BoundedExecutor("test", max_workers=1, max_pending=2)
+        try:
+            result = await executor.run(lambda a, b: a + b, 2, 3)
+            assert result == 5
+            assert executor.pending == 0
+        finally:
+            executor.shutdown()
+
+    async def test_rejects_when_saturated(self):
+        """Prueba que el pool rechaza tareas al superar el máximo de pendientes"""
+        executor = BoundedExecutor("test", max_workers=1, max_pending=1)
+        release = threading.Event()
+        try:
+            running = asyncio.ensure_future(executor.run(release.wait, 5))
+            await asyncio.sleep(0.05)
+
+            with pytest.raises(ExecutorSaturatedError):
+                await executor.run(lambda: None)
+
+            release.set()
+            await running
+            assert executor.pending == 0
+        finally:
+            release.set()
+            executor.shutdown()
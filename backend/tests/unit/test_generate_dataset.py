@@ -0,0 +1,78 @@
+import hashlib
+import random
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+from tests.load.generate_dataset import DatasetGenerator, SparseHashes, copy_value, create_sparse_file
+
+TIPOS = {1: "PDF", 2: "Word", 3: "Excel", 4: "PowerPoint", 5: "Imagen", 6: "Texto"}
+
+@pytest.fixture
+def generator(tmp_path):
+    return DatasetGenerator(
+        random.Random(7), [1, 2, 3, 4, 5, 6], TIPOS, list(range(100, 150)), str(tmp_path),
+        now=datetime(2025, 6, 30, 12, 0)
+    )
+
+@pytest.mark.unit
+class TestDatasetGenerator:
+    def test_expedientes_are_unique_and_sequential_per_year(self, generator):
+        """Prueba que los números de expediente son correlativos dentro de cada año"""
+        expedientes = [generator.document(documento_id)[0][2] for documento_id in range(1, 2001)]
+
+        assert len(set(expedientes)) == len(expedientes)
+        por_anio = Counter(expediente.split("-")[1] for expediente in expedientes)
+        assert f"EXP-2025-{por_anio['2025']:05d}" in expedientes
+        # Los años recientes tienen más expedientes que los antiguos
+        assert por_anio["2025"] > por_anio["2016"]
+
+    def test_versions_form_a_chain_ending_in_current(self, generator):
+        """Prueba que las versiones son consecutivas, fechadas en orden y solo la última es la actual"""
+        for documento_id in range(1, 500):
+            documento, versions = generator.document(documento_id)
+            assert [version[1] for version in versions] == list(range(1, len(versions) + 1))
+            assert [version[10] for version in versions] == [False] * (len(versions) - 1) + [True]
+            assert [version[2] for version in versions] == sorted(version[2] for version in versions)
+            # El documento refleja el archivo y la fecha de la última versión
+            assert documento[5] == versions[-1][2]
+            assert documento[10:12] == versions[-1][6:8]
+
+    def test_distributions_are_skewed(self, generator):
+        """Prueba que la mayoría de los documentos tiene una versión y la primera categoría concentra más documentos"""
+        versiones = Counter()
+        categorias = Counter()
+        for documento_id in range(1, 5001):
+            documento, versions = generator.document(documento_id)
+            versiones[len(versions)] += 1
+            categorias[documento[6]] += 1
+
+        assert versiones[1] > 5000 * 0.5
+        assert max(versiones) > 3
+        assert categorias.most_common(1)[0][0] == 1
+        assert 0 < categorias[None] < 5000 * 0.1
+
+    def test_audit_rows_are_inside_the_audit_period(self, generator):
+        """Prueba que el historial y el registro de accesos caen dentro del período de auditoría"""
+        for documento_id in range(1, 200):
+            documento, _ = generator.document(documento_id)
+            for row in generator.history(documento):
+                assert max(generator.audit_start, documento[4]) <= row[3] <= generator.now
+        for _ in range(200):
+            row = generator.access_log(200)
+            assert generator.audit_start <= row[5] <= generator.now
+            assert row[7] == (200 if row[6] else 401)
+
+    def test_sparse_file_matches_hash(self, tmp_path):
+        """Prueba que el hash precalculado coincide con el contenido del archivo disperso"""
+        path = tmp_path / "1" / "1.pdf"
+        create_sparse_file(str(path), 3 * 1024 * 1024 + 17)
+
+        assert hashlib.sha256(path.read_bytes()).hexdigest() == SparseHashes()(3 * 1024 * 1024 + 17)
+
+    def test_copy_value(self):
+        """Prueba el formato de texto de COPY para nulos y caracteres especiales"""
+        assert copy_value(None) == "\\N"
+        assert copy_value("a\tb\nc\\d") == "a\\tb\\nc\\\\d"
+        assert copy_value(True) == "True"
@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db import models
+from app.db.database import Base
+from app.db.lineage import get_current_version, get_lineage
+
+from tests.mocks.db import QueryCounter, create_documento
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+@pytest.fixture
+def documento(db):
+    documento = create_documento(db)
+
+    anterior = None
+    for numero in range(1, 6):
+        version = models.VersionDocumento(
+            documento_id=documento.id, numero_version=numero, path_archivo="/dev/null", usuario_id=documento.usuario_id,
+            version_anterior_id=anterior.id if anterior else None, es_actual=(numero == 5)
+        )
+        db.add(version)
+        db.flush()
+        anterior = version
+    documento.version_actual_id = anterior.id
+    db.commit()
+    return documento
+
+@pytest.mark.unit
+class TestVersionLineage:
+    def test_lineage_in_a_single_query(self, db, documento):
+        """Prueba que el linaje de una versión intermedia se obtiene completo y en orden con una sola consulta"""
+        version = db.query(models.VersionDocumento).filter_by(numero_version=3).one()
+        db.expunge_all()
+        with QueryCounter(db.get_bind()) as counter:
+            lineage = get_lineage(db, version.id)
+
+        assert [v.numero_version for v in lineage] == [1, 2, 3, 4, 5]
+        counter.assert_at_most(1)
+
+    def test_current_version_uses_pointer(self, db, documento):
+        """Prueba que la versión actual se lee por el puntero del documento"""
+        actual = get_current_version(db, documento)
+
+        assert actual.id == documento.version_actual_id
+        assert actual.numero_version == 5
+
+    def test_current_version_without_pointer(self, db, documento):
+        """Prueba que sin puntero se toma la versión marcada como actual con una sola consulta"""
+        documento_id = documento.id
+        documento.version_actual_id = None
+        db.commit()
+        db.expunge_all()
+        documento = db.get(models.Documento, documento_id)
+        with QueryCounter(db.get_bind()) as counter:
+            actual = get_current_version(db, documento)
+
+        assert actual.numero_version == 5
+        counter.assert_at_most(1)
@@ -0,0 +1,51 @@
+import pytest
+
+from tests.load.slo import build_report, compare_reports, format_report, load_slos, slo_for
+
+SLOS = {
+    "default": {"p50_ms": 300, "p95_ms": 1000, "p99_ms": 2000, "error_rate": 0.01},
+    "scenarios": {"busqueda_termino": {"p95_ms": 500}},
+}
+
+def row(name, p95, failures=0, requests=1000):
+    return {"name": name, "method": "GET", "requests": requests, "failures": failures,
+            "p50_ms": 100, "p95_ms": p95, "p99_ms": p95 * 1.5, "rps": 10.0}
+
+@pytest.mark.unit
+class TestLoadSLO:
+    def test_scenario_slo_overrides_default(self):
+        """Prueba que el SLO del escenario completa los valores por defecto"""
+        assert slo_for(SLOS, "busqueda_termino") == {"p50_ms": 300, "p95_ms": 500, "p99_ms": 2000, "error_rate": 0.01}
+        assert slo_for(SLOS, "otro")["p95_ms"] == 1000
+
+    def test_report_lists_violations(self):
+        """Prueba que el informe marca los percentiles y la tasa de errores fuera del SLO"""
+        report = build_report([row("busqueda_termino", 600), row("historial", 200, failures=50)], SLOS)
+
+        assert report["passed"] is False
+        assert report["scenarios"]["busqueda_termino"]["violations"] == ["p95_ms 600 ms > 500 ms"]
+        assert report["scenarios"]["historial"]["violations"] == ["errores 5.00% > 1.00%"]
+        assert "SLO incumplidos" in format_report(report)
+
+    def test_report_passes_within_slo(self):
+        """Prueba que un informe dentro de los SLO se marca como cumplido"""
+        report = build_report([row("busqueda_termino", 400), row("historial", 900)], SLOS)
+
+        assert report["passed"] is True
+
+    def test_compare_reports_detects_p95_regressions(self):
+        """Prueba que se detectan los escenarios cuyo p95 empeoró más que el umbral"""
+        baseline = build_report([row("busqueda_termino", 400), row("historial", 100)], SLOS)
+        current = build_report([row("busqueda_termino", 440), row("historial", 150), row("nuevo", 50)], SLOS)
+
+        regressions = compare_reports(current, baseline, threshold=0.2)
+
+        assert [regression["escenario"] for regression in regressions] == ["historial"]
+        assert regressions[0]["cambio"] == pytest.approx(0.5)
+
+    def test_default_slo_file_covers_workload_scenarios(self):
+        """Prueba que slos.json es válido y define todos los percentiles por defecto"""
+        slos = load_slos()
+
+        assert {"p50_ms", "p95_ms", "p99_ms", "error_rate"} <= set(slos["default"])
+        assert "busqueda_termino" in slos["scenarios"]
@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.db import loaders, models, schemas
+from app.db.database import Base
+from tests.mocks.db import QueryCounter
+
+@pytest.fixture
+def session():
+    """Sesión sobre una base SQLite en memoria con el esquema completo"""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=True) as db:
+        yield db
+    engine.dispose()
+
+def populate(db: Session, filas: int) -> models.Documento:
+    """Crea un documento con `filas` versiones, entradas de historial y cambios de rol/permiso, cada una de un usuario distinto"""
+    rol = models.Rol(nombre="usuario")
+    categoria_permiso = models.CategoriaPermiso(nombre="Documentos", codigo="docs")
+    categoria = models.Categoria(nombre="Ordenanzas")
+    tipo = models.TipoDocumento(nombre="Público", extensiones_permitidas="pdf")
+    db.add_all([rol, categoria_permiso, categoria, tipo])
+    db.flush()
+
+    usuarios = [
+        models.Usuario(nombre=f"Nombre{i}", apellido="Apellido", email=f"u{i}@example.com",
+                       password_hash="x", dni=str(30000000 + i), role_id=rol.id)
+        for i in range(filas)
+    ]
+    db.add_all(usuarios)
+    db.flush()
+
+    documento = models.Documento(titulo="Doc", numero_expediente="EXP-1", categoria_id=categoria.id,
+                                 tipo_documento_id=tipo.id, usuario_id=usuarios[0].id, path_archivo="a.pdf")
+    db.add(documento)
+    db.flush()
+
+    # Las tablas de auditoría particionadas usan una secuencia de Postgres: en SQLite el id se asigna aquí
+    anterior = None
+    for i, usuario in enumerate(usuarios):
+        version = models.VersionDocumento(documento_id=documento.id, numero_version=i + 1, path_archivo=f"v{i}.pdf",
+                                          usuario_id=usuario.id, es_actual=(i == filas - 1),
+                                          version_anterior_id=anterior.id if anterior else None)
+        db.add(version)
+        db.flush()
+        anterior = version
+
+        permiso = models.Permiso(nombre=f"p{i}", codigo=f"p{i}", categoria_id=categoria_permiso.id)
+        db.add(permiso)
+        db.flush()
+        db.add_all([
+            models.HistorialAcceso(id=i + 1, usuario_id=usuario.id, documento_id=documento.id, accion="visualizacion"),
+            models.HistorialRol(usuario_id=usuario.id, rol_anterior_id=rol.id, rol_nuevo_id=rol.id,
+                                modificado_por_id=usuarios[0].id),
+            models.HistorialPermiso(rol_id=rol.id, permiso_id=permiso.id, accion="asignado",
+                                    modificado_por_id=usuario.id),
+            models.RegistroAcceso(id=i + 1, usuario_id=usuario.id, ip_address="10.0.0.1", endpoint="/api/documents",
+                                  metodo="GET", codigo_respuesta=200),
+            models.ErrorAlmacenamiento(usuario_id=usuario.id, documento_id=documento.id, tipo_error="db",
+                                       mensaje_error="error"),
+        ])
+    db.commit()
+    return documento
+
+# (modelo, esquema de respuesta, opciones de carga, máximo de consultas)
+LIST_RESPONSES = [
+    (models.Documento, schemas.Documento, loaders.documento_options, 1),
+    (models.VersionDocumento, schemas.VersionDocumentoSimple, loaders.version_simple_options, 1),
+    (models.VersionDocumento, schemas.VersionDocumento, loaders.version_options, 4),
+    (models.HistorialAcceso, schemas.HistorialAcceso, loaders.historial_acceso_options, 2),
+    (models.HistorialRol, schemas.HistorialRol, loaders.historial_rol_options, 1),
+    (models.HistorialPermiso, schemas.HistorialPermiso, loaders.historial_permiso_options, 2),
+    (models.RegistroAcceso, schemas.RegistroAcceso, loaders.registro_acceso_options, 1),
+    (models.ErrorAlmacenamiento, schemas.ErrorAlmacenamiento, loaders.error_almacenamiento_options, 2),
+]
+
+@pytest.mark.unit
+class TestLoaders:
+    @pytest.mark.parametrize("model, schema, options, max_queries", LIST_RESPONSES,
+                             ids=[entry[1].__name__ for entry in LIST_RESPONSES])
+    def test_list_serialization_uses_constant_queries(self, session, model, schema, options, max_queries):
+        """Prueba que serializar un listado con su esquema no emite consultas por fila"""
+        populate(session, filas=8)
+
+        with QueryCounter(session.get_bind()) as counter:
+            rows = session.execute(select(model).options(*options())).unique().scalars().all()
+            serialized = [schema.model_validate(row, from_attributes=True) for row in rows]
+
+        assert len(serialized) >= 1
+        counter.assert_at_most(max_queries)
+
+    def test_lazy_loading_would_exceed_limit(self, session):
+        """Prueba que el contador detecta el N+1 cuando no se usan las opciones de carga"""
+        populate(session, filas=8)
+
+        with QueryCounter(session.get_bind()) as counter:
+            rows = session.execute(select(models.VersionDocumento)).scalars().all()
+            [schemas.VersionDocumentoSimple.model_validate(row, from_attributes=True) for row in rows]
+
+        assert counter.count > len(rows)
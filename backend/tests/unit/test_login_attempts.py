@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from app.utils.login_attempts import SlidingWindowCounter, LoginAttemptBuffer
+
+@pytest.mark.unit
+class TestSlidingWindowCounter:
+    def test_count_within_window(self):
+        """Prueba que los eventos dentro de la ventana se acumulan"""
+        counter = SlidingWindowCounter(window_seconds=600, buckets=10)
+
+        for i in range(5):
+            counter.add("10.0.0.1", now=1000.0 + i)
+
+        assert counter.count("10.0.0.1", now=1010.0) == 5
+        assert counter.count("10.0.0.2", now=1010.0) == 0
+
+    def test_events_expire_after_window(self):
+        """Prueba que los eventos salen de la ventana al pasar el tiempo"""
+        counter = SlidingWindowCounter(window_seconds=600, buckets=10)
+
+        counter.add("10.0.0.1", now=1000.0)
+        counter.add("10.0.0.1", now=1300.0)
+
+        # El primer evento ya salió de la ventana, el segundo no
+        assert counter.count("10.0.0.1", now=1700.0) == 1
+        # Ambos eventos vencidos
+        assert counter.count("10.0.0.1", now=2000.0) == 0
+
+    def test_reused_bucket_is_reset(self):
+        """Prueba que una sub-ventana reutilizada no arrastra conteos anteriores"""
+        counter = SlidingWindowCounter(window_seconds=60, buckets=6)
+
+        counter.add("ip", now=0.0)
+        counter.add("ip", now=0.5)
+
+        # 60 segundos después se reutiliza el mismo slot del anillo
+        assert counter.add("ip", now=60.0) == 1
+
+    def test_max_keys_evicts_oldest(self):
+        """Prueba que se descartan las claves menos usadas"""
+        counter = SlidingWindowCounter(window_seconds=60, buckets=6, max_keys=2)
+
+        counter.add("a", now=1.0)
+        counter.add("b", now=1.0)
+        counter.add("c", now=1.0)
+
+        assert counter.count("a", now=2.0) == 0
+        assert counter.count("c", now=2.0) == 1
+
+@pytest.mark.unit
+class TestLoginAttemptBuffer:
+    def test_add_does_not_flush(self):
+        """Prueba que agregar intentos nunca escribe en la base desde el event loop"""
+        buffer = LoginAttemptBuffer(max_size=2)
+
+        with patch.object(LoginAttemptBuffer, "flush") as mock_flush:
+            for _ in range(3):
+                buffer.add({"email": "a@example.com", "ip_address": "1.1.1.1", "exitoso": False})
+
+        assert mock_flush.call_count == 0
+        assert len(buffer) == 3
+
+    async def test_full_buffer_wakes_flusher(self):
+        """Prueba que la tarea de fondo deja de esperar en cuanto el buffer se llena"""
+        buffer = LoginAttemptBuffer(max_size=2)
+        waiting = asyncio.create_task(buffer.wait(timeout=60))
+        await asyncio.sleep(0)
+
+        buffer.add({"email": "a@example.com", "ip_address": "1.1.1.1", "exitoso": False})
+        await asyncio.sleep(0)
+        assert not waiting.done()
+
+        buffer.add({"email": "a@example.com", "ip_address": "1.1.1.1", "exitoso": True})
+        await asyncio.wait_for(waiting, timeout=1)
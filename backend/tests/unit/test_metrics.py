@@ -0,0 +1,81 @@
+import subprocess
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY, CollectorRegistry, generate_latest
+from prometheus_client import multiprocess
+
+from app.utils.metrics import MetricsMiddleware, record_transfer, render_metrics, track_task
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+@pytest.mark.unit
+class TestMetrics:
+    def test_latency_is_labeled_by_route_template(self):
+        """Prueba que la latencia se agrupa por plantilla de ruta y no por URL"""
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/api/items/{item_id}")
+        def get_item(item_id: int):
+            return {"id": item_id}
+
+        labels = {"method": "GET", "route": "/api/items/{item_id}", "status": "200"}
+        before = sample("hcdsys_http_request_duration_seconds_count", labels)
+
+        client = TestClient(app)
+        client.get("/api/items/1")
+        client.get("/api/items/2")
+
+        assert sample("hcdsys_http_request_duration_seconds_count", labels) == before + 2
+        assert sample("hcdsys_http_requests_in_flight", {}) == 0
+
+    def test_record_transfer(self):
+        """Prueba que se acumulan los bytes transferidos por dirección"""
+        before = sample("hcdsys_document_transfer_bytes_total", {"direction": "upload"})
+
+        record_transfer("upload", 2048)
+        record_transfer("upload", None)
+
+        assert sample("hcdsys_document_transfer_bytes_total", {"direction": "upload"}) == before + 2048
+
+    def test_track_task_records_outcome(self):
+        """Prueba que la duración de una tarea se registra con su resultado"""
+        labels = {"task": "prueba", "outcome": "error"}
+        before = sample("hcdsys_background_task_duration_seconds_count", labels)
+
+        with pytest.raises(RuntimeError):
+            with track_task("prueba"):
+                raise RuntimeError("fallo")
+
+        assert sample("hcdsys_background_task_duration_seconds_count", labels) == before + 1
+
+    def test_render_metrics(self):
+        """Prueba que el endpoint devuelve el formato de texto de Prometheus"""
+        response = render_metrics()
+
+        assert response.media_type.startswith("text/plain")
+        assert b"hcdsys_http_requests_in_flight" in response.body
+
+    def test_multiprocess_aggregation(self, tmp_path):
+        """Prueba que los valores de varios procesos se suman al leer el directorio compartido"""
+        script = (
+            "from app.utils.metrics import record_transfer, WEBSOCKET_CONNECTIONS\n"
+            "record_transfer('download', 1000)\n"
+            "WEBSOCKET_CONNECTIONS.inc()\n"
+        )
+        env = {"PROMETHEUS_MULTIPROC_DIR": str(tmp_path), "PATH": ""}
+        for _ in range(2):
+            subprocess.run([sys.executable, "-c", script], env=env, check=True, cwd=".")
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+
+        assert registry.get_sample_value("hcdsys_document_transfer_bytes_total", {"direction": "download"}) == 2000
+        # Los gauges "livesum" solo cuentan procesos vivos; aquí los procesos ya terminaron
+        # pero mark_process_dead no se llamó, por lo que siguen sumando
+        assert registry.get_sample_value("hcdsys_websocket_connections", {}) == 2
+        assert b"hcdsys_document_transfer_bytes_total" in generate_latest(registry)
@@ -0,0 +1,69 @@
+import logging
+import pytest
+from datetime import date
+from unittest.mock import MagicMock
+
+from app.utils import partitions
+from app.utils.config import settings
+from app.utils.partitions import (
+    add_months,
+    create_partition_sql,
+    expired_partitions,
+    parse_partition_name,
+    partition_name,
+    run_partition_maintenance
+)
+
+@pytest.mark.unit
+class TestPartitions:
+    def test_add_months_across_years(self):
+        """Prueba la aritmética de meses al cruzar el cambio de año"""
+        assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+        assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+    def test_partition_name_roundtrip(self):
+        """Prueba que el nombre de la partición identifica tabla y mes"""
+        name = partition_name("registro_acceso", date(2026, 3, 1))
+
+        assert name == "registro_acceso_p202603"
+        assert parse_partition_name(name) == ("registro_acceso", date(2026, 3, 1))
+        assert parse_partition_name("registro_acceso_default") is None
+
+    def test_create_partition_sql_bounds(self):
+        """Prueba que cada partición cubre exactamente un mes"""
+        sql = create_partition_sql("intentos_login", date(2026, 12, 1))
+
+        assert "intentos_login_p202612 PARTITION OF intentos_login" in sql
+        assert "FROM ('2026-12-01') TO ('2027-01-01')" in sql
+
+    def test_expired_partitions(self):
+        """Prueba que solo vencen las particiones de meses fuera de la retención"""
+        partitions = [
+            "historial_acceso_default",
+            "historial_acceso_p202508",
+            "historial_acceso_p202509",
+            "historial_acceso_p202510",
+            "historial_acceso_p202610",
+        ]
+
+        expired = expired_partitions(partitions, retention_months=12, today=date(2026, 10, 19))
+
+        assert expired == ["historial_acceso_p202508", "historial_acceso_p202509"]
+
+    def test_maintenance_isolates_failing_table(self, monkeypatch, caplog):
+        """Prueba que si una tabla falla se registra el error y se mantienen las demás"""
+        def ensure(conn, table, months_ahead):
+            if table == "historial_acceso":
+                raise RuntimeError("updated partition constraint for default partition would be violated")
+        monkeypatch.setattr(partitions, "is_partitioned", lambda conn, table: True)
+        monkeypatch.setattr(partitions, "ensure_partitions", ensure)
+        monkeypatch.setattr(partitions, "drop_expired_partitions", lambda conn, table, *args: [f"{table}_p202401"])
+        monkeypatch.setattr(settings, "AUDIT_RETENTION_MONTHS", 12)
+
+        with caplog.at_level(logging.ERROR, logger=partitions.__name__):
+            dropped = run_partition_maintenance(MagicMock())
+
+        assert dropped == ["registro_acceso_p202401", "intentos_login_p202401"]
+        assert [record.levelno for record in caplog.records] == [logging.ERROR]
+        assert "historial_acceso" in caplog.records[0].getMessage()
+        assert caplog.records[0].exc_info is not None
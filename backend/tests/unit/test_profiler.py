@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import Counter
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils import profiler
+from app.utils.profiler import (
+    ProfilingMiddleware, RequestProfilingSession, StackSampler, collapsed, load_profile
+)
+
+def busy_function(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+def profiled_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, session_func=lambda request: AsyncMock())
+
+    @app.get("/api/items")
+    def list_items():
+        time.sleep(0.05)
+        return []
+
+    return app
+
+@pytest.mark.unit
+class TestStackSampler:
+    def test_samples_busy_thread(self):
+        """Prueba que las pilas del hilo ocupado aparecen en formato collapsed"""
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_function, args=(stop,), name="busy")
+        worker.start()
+        try:
+            sampler = StackSampler(interval=0.001).start()
+            time.sleep(0.1)
+            sampler.stop()
+        finally:
+            stop.set()
+            worker.join()
+
+        assert sampler.samples > 0
+        busy_stacks = [stack for stack in sampler.counts if stack.startswith("busy;")]
+        assert busy_stacks
+        assert any("busy_function" in stack for stack in busy_stacks)
+
+    def test_collapsed_format(self):
+        """Prueba el formato "marco;marco cantidad" ordenado por frecuencia"""
+        counts = Counter({"main;a;b": 2, "main;a;c": 5})
+
+        assert collapsed(counts) == "main;a;c 5\nmain;a;b 2\n"
+
+@pytest.mark.unit
+class TestRequestProfiling:
+    def test_session_claims_only_matching_requests(self):
+        """Prueba que la sesión reclama solo la cantidad pedida de rutas con el prefijo"""
+        session = RequestProfilingSession(count=1, path_prefix="/api/documents")
+
+        assert not session.claim("/api/users")
+        assert session.claim("/api/documents/1")
+        assert not session.claim("/api/documents/2")
+
+    def test_header_ignored_without_permission(self):
+        """Prueba que la cabecera X-Profile no se acepta a usuarios sin el permiso"""
+        with patch.object(profiler, "user_can_profile", AsyncMock(return_value=False)), \
+             patch.object(profiler, "save_profile") as mock_save:
+            response = TestClient(profiled_app()).get("/api/items", headers={"X-Profile": "1"})
+
+        assert response.status_code == 200
+        assert "X-Profile" not in response.headers
+        mock_save.assert_not_called()
+
+    def test_header_profiles_request_for_admin(self, tmp_path):
+        """Prueba que un administrador recibe el id del perfil guardado"""
+        with patch.object(profiler, "user_can_profile", AsyncMock(return_value=True)), \
+             patch.object(profiler.settings, "PROFILE_OUTPUT_PATH", str(tmp_path)):
+            response = TestClient(profiled_app()).get("/api/items", headers={"X-Profile": "1"})
+            profile = load_profile(response.headers["X-Profile"])
+
+        assert response.status_code == 200
+        assert profile is not None
+
+    def test_load_profile_rejects_paths(self):
+        """Prueba que el id del perfil no permite leer otros archivos"""
+        assert load_profile("../../etc/passwd") is None
@@ -0,0 +1,99 @@
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+from unittest.mock import patch
+
+from app.db import query_stats
+from app.db.query_stats import (
+    QueryStatsRegistry, RequestQueryStats, current_request_stats, fingerprint, instrument_engine
+)
+from app.utils.middleware import QueryStatsMiddleware
+
+@pytest.fixture
+def sqlite_engine():
+    """Motor SQLite en memoria con los eventos de medición"""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    instrument_engine(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.mark.unit
+class TestFingerprint:
+    def test_literals_and_parameters_are_normalized(self):
+        """Prueba que consultas iguales con distintos valores comparten huella"""
+        a = fingerprint("SELECT * FROM documentos WHERE id = 5 AND titulo = 'Acta'")
+        b = fingerprint("SELECT *   FROM documentos\n WHERE id = %(id_1)s AND titulo = %(titulo_1)s")
+
+        assert a == b == "SELECT * FROM documentos WHERE id = ? AND titulo = ?"
+
+    def test_in_lists_are_collapsed(self):
+        """Prueba que las listas IN de distinto largo comparten huella"""
+        assert fingerprint("SELECT 1 WHERE id IN (1, 2, 3)") == fingerprint("SELECT 1 WHERE id IN ($1, $2)")
+
+@pytest.mark.unit
+class TestQueryStats:
+    def test_request_stats_keep_slowest(self):
+        """Prueba que solo se conservan las sentencias más lentas"""
+        stats = RequestQueryStats(keep_slowest=2)
+        for i, duration in enumerate([0.001, 0.005, 0.003]):
+            stats.record(f"SELECT {i}", duration)
+
+        assert stats.count == 3
+        assert [row["ms"] for row in stats.slowest] == [5.0, 3.0]
+
+    def test_registry_caps_fingerprints(self):
+        """Prueba que el registro no crece más allá del máximo de huellas"""
+        registry = QueryStatsRegistry(max_fingerprints=1)
+        registry.record("SELECT ?", 0.002)
+        registry.record("SELECT ?", 0.004)
+        registry.record("UPDATE t SET a = ?", 0.001)
+
+        top = registry.top()
+        assert top == [{"fingerprint": "SELECT ?", "calls": 2, "total_ms": 6.0, "mean_ms": 3.0, "max_ms": 4.0}]
+        assert registry.dropped == 1
+
+    def test_engine_events_record_current_request(self, sqlite_engine):
+        """Prueba que las consultas del motor se cuentan en la solicitud actual"""
+        stats = RequestQueryStats()
+        token = current_request_stats.set(stats)
+        try:
+            with sqlite_engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+        finally:
+            current_request_stats.reset(token)
+
+        assert stats.count == 2
+        assert stats.total_time > 0
+
+    def test_slow_queries_are_logged(self, sqlite_engine, caplog):
+        """Prueba que las consultas sobre el umbral se registran en el log de lentas"""
+        with patch.object(query_stats.settings, "SLOW_QUERY_MS", 0), \
+             patch.object(query_stats.settings, "SLOW_QUERY_SAMPLE_RATE", 1.0), \
+             caplog.at_level(logging.WARNING, logger="app.db.slow_queries"):
+            with sqlite_engine.connect() as conn:
+                conn.execute(text("SELECT 42"))
+
+        assert any("SELECT ?" in record.getMessage() for record in caplog.records)
+
+    def test_middleware_adds_debug_headers(self, sqlite_engine):
+        """Prueba que en modo DEBUG la respuesta incluye la cantidad de consultas y el tiempo"""
+        app = FastAPI()
+        app.add_middleware(QueryStatsMiddleware)
+
+        @app.get("/items")
+        def list_items():
+            with sqlite_engine.connect() as conn:
+                for i in range(3):
+                    conn.execute(text(f"SELECT {i}"))
+            return []
+
+        with patch("app.utils.middleware.settings.DEBUG", True):
+            response = TestClient(app).get("/items")
+
+        assert response.headers["X-DB-Query-Count"] == "3"
+        assert "X-DB-Time-Ms" in response.headers
@@ -0,0 +1,55 @@
+import pytest
+
+from app.utils.rate_limiter import GCRAPolicy, MemoryRateLimitStore, get_route_cost, DEFAULT_COST
+
+@pytest.mark.unit
+class TestGCRAPolicy:
+    def test_burst_then_reject(self):
+        """Prueba que se admite la ráfaga configurada y luego se rechaza"""
+        policy = GCRAPolicy(rate=60, period=60.0, burst=5)
+        store = MemoryRateLimitStore()
+
+        results = [store.hit("user:1", policy, 1, now=1000.0) for _ in range(6)]
+
+        assert all(r.allowed for r in results[:5])
+        assert not results[5].allowed
+        assert results[5].retry_after == pytest.approx(1.0)
+
+    def test_tokens_refill_over_time(self):
+        """Prueba que la capacidad se recupera al ritmo configurado"""
+        policy = GCRAPolicy(rate=60, period=60.0, burst=2)
+        store = MemoryRateLimitStore()
+
+        assert store.hit("ip:1.1.1.1", policy, 2, now=0.0).allowed
+        assert not store.hit("ip:1.1.1.1", policy, 1, now=0.0).allowed
+        # Un segundo después se recupera una unidad
+        assert store.hit("ip:1.1.1.1", policy, 1, now=1.0).allowed
+
+    def test_cost_above_burst_is_rejected(self):
+        """Prueba que una solicitud más cara que la ráfaga se rechaza sin consumir capacidad"""
+        policy = GCRAPolicy(rate=60, period=60.0, burst=5)
+        store = MemoryRateLimitStore()
+
+        assert not store.hit("user:1", policy, 10, now=0.0).allowed
+        assert store.hit("user:1", policy, 5, now=0.0).allowed
+
+    def test_keys_are_independent(self):
+        """Prueba que cada clave tiene su propio límite"""
+        policy = GCRAPolicy(rate=60, period=60.0, burst=1)
+        store = MemoryRateLimitStore()
+
+        assert store.hit("user:1", policy, 1, now=0.0).allowed
+        assert store.hit("user:2", policy, 1, now=0.0).allowed
+        assert not store.hit("user:1", policy, 1, now=0.0).allowed
+
+@pytest.mark.unit
+class TestRouteCosts:
+    def test_upload_costs_more_than_search(self):
+        """Prueba que la carga de documentos cuesta más que una búsqueda"""
+        assert get_route_cost("POST", "/api/documents") > get_route_cost("GET", "/api/documents")
+        assert get_route_cost("POST", "/api/documents/3/versions") == get_route_cost("POST", "/api/documents/")
+
+    def test_default_cost(self):
+        """Prueba el costo por defecto de las rutas sin configuración"""
+        assert get_route_cost("GET", "/api/users/me") == DEFAULT_COST
+        assert get_route_cost("GET", "/api/documents/3") == DEFAULT_COST
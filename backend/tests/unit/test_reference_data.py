@@ -0,0 +1,178 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.db import models
+from app.db.database import Base
+from app.utils import reference_data
+from app.utils.event_bus import MemoryEventBus
+from app.utils.reference_data import (
+    CATEGORIES, PERMISSIONS, PUBLIC_LEVELS, RESTRICTED_LEVELS, ReferenceDataCache, reference_cache,
+    serve_reference_set, visible_document_types
+)
+
+@pytest.fixture
+def db():
+    # Las rutas del TestClient se ejecutan en otro hilo
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([models.Categoria(nombre="Ordenanzas"), models.Categoria(nombre="Resoluciones")])
+        session.add_all([
+            models.TipoDocumento(nombre="Boletín", extensiones_permitidas=".pdf", nivel_acceso=models.NIVEL_PUBLICO),
+            models.TipoDocumento(nombre="Expediente", extensiones_permitidas=".pdf"),
+            models.TipoDocumento(nombre="Sumario", extensiones_permitidas=".pdf", nivel_acceso=models.NIVEL_CLASIFICADO),
+        ])
+        categoria = models.CategoriaPermiso(nombre="Documentos", codigo="docs")
+        session.add(categoria)
+        session.flush()
+        session.add_all([
+            models.Permiso(nombre="Ver", codigo="docs:view", categoria_id=categoria.id),
+            models.Permiso(nombre="Editar", codigo="docs:edit", categoria_id=categoria.id + 1),
+        ])
+        session.commit()
+        reference_cache.clear()
+        yield session
+    reference_cache.clear()
+    engine.dispose()
+
+def count_queries(db):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+
+    @app.get("/categorias")
+    async def categorias(request: Request):
+        return serve_reference_set(request, db, CATEGORIES)
+
+    @app.get("/permisos")
+    async def permisos(request: Request, categoria_id: int):
+        return serve_reference_set(request, db, PERMISSIONS, lambda permiso: permiso.categoria_id == categoria_id)
+
+    return TestClient(app)
+
+@pytest.mark.unit
+class TestReferenceData:
+    def test_served_from_memory(self, db):
+        """Prueba que el conjunto se consulta una sola vez y luego se sirve desde la memoria"""
+        statements = count_queries(db)
+
+        first = reference_cache.get(db, CATEGORIES)
+        second = reference_cache.get(db, CATEGORIES)
+
+        assert len(statements) == 1
+        assert second is first
+        assert [c.nombre for c in first.items] == ["Ordenanzas", "Resoluciones"]
+        assert reference_cache.contains(db, CATEGORIES, first.items[0].id)
+        assert not reference_cache.contains(db, CATEGORIES, 99)
+
+    def test_etag_and_not_modified(self, client):
+        """Prueba que la respuesta lleva ETag y Cache-Control y devuelve 304 si el cliente ya la tiene"""
+        response = client.get("/categorias")
+        etag = response.headers["etag"]
+
+        assert response.status_code == 200
+        assert [c["nombre"] for c in response.json()] == ["Ordenanzas", "Resoluciones"]
+        assert "max-age" in response.headers["cache-control"]
+
+        cached = client.get("/categorias", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert client.get("/categorias", headers={"If-None-Match": '"otro"'}).status_code == 200
+
+    def test_filtered_set_has_its_own_etag(self, client):
+        """Prueba que un subconjunto filtrado se sirve con el ETag de su propio contenido"""
+        todos = client.get("/categorias")
+        filtrados = client.get("/permisos", params={"categoria_id": 1})
+
+        assert [p["codigo"] for p in filtrados.json()] == ["docs:view"]
+        assert filtrados.headers["etag"] != todos.headers["etag"]
+        assert client.get("/permisos", params={"categoria_id": 1}, headers={"If-None-Match": filtrados.headers["etag"]}).status_code == 304
+
+    def test_commit_invalidates(self, db, client):
+        """Prueba que un commit que modifica categorías recarga el conjunto y cambia su ETag"""
+        etag = client.get("/categorias").headers["etag"]
+
+        db.add(models.Categoria(nombre="Decretos"))
+        db.commit()
+
+        response = client.get("/categorias", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert [c["nombre"] for c in response.json()] == ["Ordenanzas", "Resoluciones", "Decretos"]
+
+    def test_rollback_keeps_cache(self, db):
+        """Prueba que los cambios descartados no invalidan el conjunto"""
+        cached = reference_cache.get(db, CATEGORIES)
+
+        db.add(models.Categoria(nombre="Decretos"))
+        db.flush()
+        db.rollback()
+
+        assert reference_cache.get(db, CATEGORIES) is cached
+
+    async def test_invalidation_reaches_other_workers(self, db):
+        """Prueba que la invalidación publicada en el bus descarta el conjunto en los demás workers"""
+        bus = MemoryEventBus()
+        worker, other = ReferenceDataCache(bus), ReferenceDataCache(bus)
+        cached = other.get(db, CATEGORIES)
+
+        await worker.publish_invalidation([CATEGORIES])
+
+        reloaded = other.get(db, CATEGORIES)
+        assert reloaded is not cached
+        assert reloaded.version > cached.version
+
+    def test_load_racing_invalidation_is_not_kept(self, db, monkeypatch):
+        """Prueba que una carga que se cruza con una invalidación no queda en la caché"""
+        cache = ReferenceDataCache()
+        loader = reference_data.LOADERS[CATEGORIES]
+        query = loader.query
+
+        def invalidated_during_load(session):
+            rows = query(session)
+            cache.invalidate([CATEGORIES])
+            return rows
+        monkeypatch.setattr(loader, "query", invalidated_during_load)
+        first = cache.get(db, CATEGORIES)
+        monkeypatch.setattr(loader, "query", query)
+
+        assert cache.get(db, CATEGORIES) is not first
+
+@pytest.mark.unit
+class TestVisibleDocumentTypes:
+    def test_sets_by_access_level(self, db):
+        """Prueba que los tipos visibles dependen del nivel de acceso y se calculan una sola vez"""
+        statements = count_queries(db)
+
+        publicos = visible_document_types(db, PUBLIC_LEVELS)
+        restringidos = visible_document_types(db, RESTRICTED_LEVELS)
+
+        assert publicos == {1}
+        assert restringidos == {1, 2}
+        assert visible_document_types(db, RESTRICTED_LEVELS) is restringidos
+        assert len(statements) == 1
+
+    def test_all_visible_needs_no_filter(self, db):
+        """Prueba que si todos los tipos son visibles no se devuelve un conjunto para filtrar"""
+        sumario = db.query(models.TipoDocumento).filter_by(nombre="Sumario").one()
+        sumario.nivel_acceso = models.NIVEL_RESTRINGIDO
+        db.commit()
+
+        assert visible_document_types(db, RESTRICTED_LEVELS) is None
+
+    def test_level_change_invalidates(self, db):
+        """Prueba que cambiar el nivel de un tipo recalcula los conjuntos visibles"""
+        assert visible_document_types(db, PUBLIC_LEVELS) == {1}
+
+        expediente = db.query(models.TipoDocumento).filter_by(nombre="Expediente").one()
+        expediente.nivel_acceso = models.NIVEL_PUBLICO
+        db.commit()
+
+        assert visible_document_types(db, PUBLIC_LEVELS) == {1, 2}
@@ -0,0 +1,42 @@
+import pytest
+
+from app.db.replicas import ReplicaRouter, to_async_url
+
+@pytest.mark.unit
+class TestReplicaRouter:
+    def test_without_replicas_uses_primary(self):
+        """Prueba que sin réplicas configuradas todas las lecturas van al primario"""
+        router = ReplicaRouter([], sticky_seconds=10)
+
+        assert not router.enabled
+        assert router.choose("user:1") is None
+
+    def test_round_robin_between_replicas(self):
+        """Prueba que las lecturas se reparten por turnos entre las réplicas"""
+        router = ReplicaRouter(
+            ["sqlite+aiosqlite:///replica1.db", "sqlite+aiosqlite:///replica2.db"],
+            sticky_seconds=10
+        )
+
+        assert [router.choose("user:1", now=0.0) for _ in range(4)] == [0, 1, 0, 1]
+
+    def test_read_your_writes_window(self):
+        """Prueba que tras una escritura las lecturas del usuario van al primario durante la ventana"""
+        router = ReplicaRouter(["sqlite+aiosqlite:///replica1.db"], sticky_seconds=10)
+
+        router.mark_write("user:1", now=100.0)
+
+        assert router.choose("user:1", now=105.0) is None
+        assert router.choose("user:2", now=105.0) == 0
+        assert router.choose("user:1", now=111.0) == 0
+
+    def test_cookie_extends_window_across_workers(self):
+        """Prueba que la cookie de consistencia envía la lectura al primario"""
+        router = ReplicaRouter(["sqlite+aiosqlite:///replica1.db"], sticky_seconds=10)
+
+        assert router.choose(None, cookie_until=150.0, now=140.0) is None
+        assert router.choose(None, cookie_until=150.0, now=160.0) == 0
+
+    def test_to_async_url(self):
+        """Prueba la conversión de URLs al driver asyncpg"""
+        assert to_async_url("postgresql://u:p@replica:5432/hcdsys") == "postgresql+asyncpg://u:p@replica:5432/hcdsys"
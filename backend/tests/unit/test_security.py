@@ -1,11 +1,18 @@
 import pytest
 from datetime import datetime, timedelta
 from jose import jwt
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from starlette.requests import Request
 
+from app.db import models
 from app.utils.security import (
     create_access_token,
+    get_current_user_async,
     verify_password,
-    get_password_hash
+    verify_password_async,
+    get_password_hash,
+    pwd_context,
+    role_has_permission
 )
 from app.utils.config import settings
 
@@ -23,6 +30,19 @@ class TestSecurity:
         assert verify_password(password, hashed) is True
         assert verify_password("wrongpassword", hashed) is False
     
+    async def test_verify_password_async_rehash(self):
+        """Prueba que la verificación asíncrona devuelve un nuevo hash si cambió el costo"""
+        old_hash = pwd_context.hash("testpassword123", rounds=4)
+
+        is_valid, new_hash = await verify_password_async("testpassword123", old_hash)
+        assert is_valid is True
+        assert new_hash is not None
+        assert verify_password("testpassword123", new_hash) is True
+
+        is_valid, new_hash = await verify_password_async("wrongpassword", old_hash)
+        assert is_valid is False
+        assert new_hash is None
+    
     def test_create_access_token(self):
         """Prueba la creación de tokens de acceso"""
         data = {"sub": "test@example.com", "role": "admin"}
@@ -66,3 +86,54 @@ class TestSecurity:
         # Verificar que el token ha expirado
         with pytest.raises(jwt.ExpiredSignatureError):
             jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    
+    async def test_get_current_user_async(self):
+        """Prueba que el usuario actual se obtiene con una sesión asíncrona"""
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all, tables=[models.Usuario.__table__])
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        
+        async with session_factory() as db:
+            db.add(models.Usuario(
+                nombre="Test", apellido="User", email="test@example.com",
+                password_hash="x", dni="12345678", role_id=1, activo=True
+            ))
+            await db.commit()
+            
+            request = Request({"type": "http", "headers": []})
+            token = create_access_token({"sub": "test@example.com"})
+            user = await get_current_user_async(request, token=token, db=db)
+            
+            assert user.email == "test@example.com"
+            assert user.ultimo_acceso is not None
+            
+            # Si el middleware ya autenticó la solicitud, se reutiliza el usuario
+            request.state.user = user
+            assert await get_current_user_async(request, token="invalido", db=db) is user
+        
+        await engine.dispose()
+
+    async def test_role_has_permission_checks_rol_permiso(self):
+        """Prueba que el permiso se verifica en rol_permiso y no con check_permission"""
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async with session_factory() as db:
+            categoria = models.CategoriaPermiso(nombre="Administración", codigo="admin")
+            admin, gestor = models.Rol(nombre="admin"), models.Rol(nombre="gestor")
+            db.add_all([categoria, admin, gestor])
+            await db.flush()
+            permiso = models.Permiso(nombre="Configurar", codigo="admin:system:config", categoria_id=categoria.id)
+            db.add(permiso)
+            await db.flush()
+            await db.execute(models.rol_permiso.insert().values(rol_id=admin.id, permiso_id=permiso.id))
+            await db.commit()
+
+            assert await role_has_permission(models.Usuario(role_id=admin.id), "admin:system:config", db)
+            assert not await role_has_permission(models.Usuario(role_id=gestor.id), "admin:system:config", db)
+            assert not await role_has_permission(None, "admin:system:config", db)
+
+        await engine.dispose()
@@ -0,0 +1,108 @@
+import zipfile
+
+import pytest
+
+from app.utils import diff as diff_module
+from app.utils import text_extraction
+from app.utils.diff import DiffCache, compare_files, document_diff, word_diff
+from app.utils.text_extraction import extract_docx, get_pages, split_paragraphs
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+PAGE_BREAK = '<w:r><w:br w:type="page"/></w:r>'
+
+def write_docx(path, paragraphs):
+    """DOCX mínimo con un párrafo por elemento; PAGE_BREAK inserta un salto de página."""
+    body = "".join(
+        f"<w:p>{PAGE_BREAK}</w:p>" if paragraph == PAGE_BREAK else f"<w:p><w:r><w:t>{paragraph}</w:t></w:r></w:p>"
+        for paragraph in paragraphs
+    )
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", f"<w:document {W}><w:body>{body}</w:body></w:document>")
+
+@pytest.fixture
+def text_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_extraction.settings, "TEXT_CACHE_PATH", str(tmp_path / "text_cache"))
+    monkeypatch.setattr(diff_module, "diff_cache", DiffCache("", max_lines=10000))
+
+@pytest.mark.unit
+class TestTextExtraction:
+    def test_docx_paragraphs_and_pages(self, tmp_path):
+        """Prueba que los párrafos del DOCX se agrupan por página según los saltos de página"""
+        path = tmp_path / "v1.docx"
+        write_docx(path, ["Artículo 1.", "Artículo  2.", PAGE_BREAK, "Artículo 3."])
+
+        assert extract_docx(str(path)) == [["Artículo 1.", "Artículo 2."], ["Artículo 3."]]
+
+    def test_pdf_lines_are_joined_into_paragraphs(self):
+        """Prueba que las líneas cortadas del PDF se unen hasta el final de la oración"""
+        text = "El Concejo Deliberante\nsanciona con fuerza de\nOrdenanza:\n\nArtículo 1\nApruébase el convenio."
+
+        assert split_paragraphs(text) == [
+            "El Concejo Deliberante sanciona con fuerza de Ordenanza:",
+            "Artículo 1 Apruébase el convenio.",
+        ]
+
+    def test_word_diff(self):
+        """Prueba que el diff por palabras conserva el texto común y marca solo las palabras cambiadas"""
+        segments = word_diff("Plazo de 30 días hábiles.", "Plazo de 60 días corridos.")
+
+        assert segments == [["=", "Plazo de "], ["-", "30"], ["+", "60"], ["=", " días "], ["-", "hábiles"], ["+", "corridos"], ["=", "."]]
+
+    def test_document_diff_reports_pages(self):
+        """Prueba que cada cambio indica su página en ambas versiones"""
+        pages_a = [["Visto", "Considerando"], ["Artículo 1: plazo de 30 días.", "Artículo 2: comuníquese."]]
+        pages_b = [["Visto", "Considerando", "Nuevo considerando"], ["Artículo 1: plazo de 60 días.", "Artículo 2: comuníquese."]]
+
+        result = document_diff(pages_a, pages_b, "v1", "v2")
+
+        assert result["is_text_extracted"]
+        assert (result["added_lines"], result["removed_lines"]) == (2, 1)
+        assert result["changes"][0] == {"tipo": "agregado", "pagina1": 1, "pagina2": 1, "texto": "Nuevo considerando"}
+        assert result["changes"][1]["tipo"] == "modificado"
+        assert (result["changes"][1]["pagina1"], result["changes"][1]["pagina2"]) == (2, 2)
+        assert ["-", "30"] in result["changes"][1]["palabras"]
+        assert result["diff"][2].endswith("página 1 / página 1")
+
+    def test_docx_versions_are_compared_by_text(self, tmp_path, text_cache):
+        """Prueba que dos DOCX se comparan por su texto y que el texto extraído queda en caché"""
+        path1, path2 = tmp_path / "v1.docx", tmp_path / "v2.docx"
+        write_docx(path1, ["Artículo 1.", "Artículo 2."])
+        write_docx(path2, ["Artículo 1.", "Artículo 2 modificado."])
+
+        result = compare_files(str(path1), str(path2), "hash1", "hash2", "v1", "v2")
+
+        assert not result["is_binary"] and result["is_text_extracted"]
+        assert result["diff"][-2:] == ["-Artículo 2.", "+Artículo 2 modificado."]
+        # El texto se lee de la caché aunque el archivo ya no esté
+        path1.unlink()
+        assert get_pages(str(path1), "hash1", ".docx") == [["Artículo 1.", "Artículo 2."]]
+
+    def test_damaged_docx_falls_back_to_binary(self, tmp_path, text_cache):
+        """Prueba que un DOCX dañado se compara solo por metadatos"""
+        path1, path2 = tmp_path / "v1.docx", tmp_path / "v2.docx"
+        path1.write_bytes(b"PK\x03\x04 roto")
+        write_docx(path2, ["Artículo 1."])
+
+        assert compare_files(str(path1), str(path2), "roto", "sano", "v1", "v2")["is_binary"]
+
+    def test_versions_without_text_are_not_reported_identical(self, tmp_path, text_cache):
+        """Prueba que dos versiones sin texto extraído (PDF escaneados) se comparan solo por metadatos"""
+        path1, path2 = tmp_path / "v1.docx", tmp_path / "v2.docx"
+        write_docx(path1, [])
+        write_docx(path2, [])
+
+        result = compare_files(str(path1), str(path2), "escaneo1", "escaneo2", "v1", "v2")
+
+        assert result["is_binary"] and not result["is_text_extracted"]
+        # Con el mismo contenido sí se puede afirmar que no hay cambios
+        same = compare_files(str(path1), str(path1), "escaneo1", "escaneo1", "v1", "v1")
+        assert same["is_text_extracted"] and same["diff"] == []
+
+    def test_transient_failures_are_not_cached(self, tmp_path, text_cache):
+        """Prueba que un archivo ausente no queda registrado como imposible de extraer"""
+        path = tmp_path / "v1.docx"
+
+        assert get_pages(str(path), "hash1", ".docx") is None
+
+        write_docx(path, ["Artículo 1."])
+        assert get_pages(str(path), "hash1", ".docx") == [["Artículo 1."]]
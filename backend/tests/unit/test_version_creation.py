@@ -0,0 +1,143 @@
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db import models
+from app.db.database import Base
+from app.utils import outbox
+from app.utils import storage as storage_module
+from app.utils.config import settings
+from app.utils.storage import STAGING_DIR, StorageService
+
+from tests.mocks.db import create_documento, sqlite_audit_ids
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DOCUMENT_STORAGE_PATH", str(tmp_path))
+    return tmp_path
+
+@pytest.fixture
+def dispatched(monkeypatch):
+    events = []
+    monkeypatch.setitem(outbox.HANDLERS, "version_creada", events.append)
+    return events
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with sqlite_audit_ids(), Session(engine) as session:
+        yield session
+    engine.dispose()
+
+@pytest.fixture
+def documento(db):
+    documento = create_documento(db)
+    db.commit()
+    return documento
+
+def upload(content: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename="ordenanza.txt")
+
+async def create_version(db, documento, content: bytes):
+    return await StorageService.create_document_version(upload(content), documento.id, documento.usuario_id, db)
+
+@pytest.mark.unit
+class TestVersionCreation:
+    async def test_versions_are_numbered_in_a_single_transaction(self, db, documento, storage, dispatched):
+        """Prueba que cada versión toma el número siguiente, queda como única actual y publica su evento"""
+        for content in (b"v1", b"v2"):
+            success, message, version_id = await create_version(db, documento, content)
+            assert success, message
+
+        versiones = db.query(models.VersionDocumento).order_by(models.VersionDocumento.numero_version).all()
+        assert [v.numero_version for v in versiones] == [1, 2]
+        assert [v.es_actual for v in versiones] == [False, True]
+        assert versiones[1].version_anterior_id == versiones[0].id
+        assert db.get(models.Documento, documento.id).version_actual_id == version_id
+        with open(versiones[1].path_archivo, "rb") as published:
+            assert published.read() == b"v2"
+        assert os.listdir(storage / STAGING_DIR) == []
+        # Los eventos se despacharon después del commit y se eliminaron de la bandeja
+        assert [event["version_id"] for event in dispatched] == [versiones[0].id, version_id]
+        assert db.query(models.EventoPendiente).count() == 0
+
+    async def test_conflicting_number_rolls_back_everything(self, db, documento, storage, dispatched):
+        """Prueba que un número de versión repetido se rechaza sin dejar filas, archivos ni eventos"""
+        await create_version(db, documento, b"v1")
+        # Una versión 2 escrita por fuera del bloqueo del documento
+        db.add(models.VersionDocumento(documento_id=documento.id, numero_version=2, path_archivo="/dev/null", usuario_id=documento.usuario_id))
+        db.commit()
+
+        success, message, version_id = await create_version(db, documento, b"v2")
+
+        assert not success and version_id is None
+        assert "Conflicto" in message
+        assert db.query(models.VersionDocumento).count() == 2
+        assert os.listdir(storage / STAGING_DIR) == []
+        assert not os.path.exists(storage / str(documento.id) / "versions" / f"{documento.id}_v2.txt")
+        assert len(dispatched) == 1
+
+    async def test_failed_event_stays_pending(self, db, documento, storage, monkeypatch):
+        """Prueba que si el efecto posterior falla, la versión se crea y el evento queda para el reintento"""
+        def fail(datos):
+            raise OSError("pool de extracción no disponible")
+        monkeypatch.setitem(outbox.HANDLERS, "version_creada", fail)
+
+        success, message, version_id = await create_version(db, documento, b"v1")
+
+        assert success, message
+        evento = db.query(models.EventoPendiente).one()
+        assert evento.intentos == 1
+
+        monkeypatch.setitem(outbox.HANDLERS, "version_creada", lambda datos: None)
+        assert outbox.dispatch_events(db) == 1
+        assert db.query(models.EventoPendiente).count() == 0
+
+    async def test_restore_creates_next_version(self, db, documento, storage, dispatched):
+        """Prueba que restaurar una versión crea la siguiente con el contenido restaurado"""
+        _, _, first_id = await create_version(db, documento, b"v1")
+        await create_version(db, documento, b"v2")
+
+        success, message, version_id = StorageService.restore_version(documento.id, first_id, documento.usuario_id, db)
+
+        assert success, message
+        restored = db.get(models.VersionDocumento, version_id)
+        assert restored.numero_version == 3 and restored.es_actual
+        with open(restored.path_archivo, "rb") as published:
+            assert published.read() == b"v1"
+        assert db.query(models.VersionDocumento).filter(models.VersionDocumento.es_actual == True).count() == 1
+
+    async def test_restore_links_source_file(self, db, documento, storage, dispatched):
+        """Prueba que restaurar reutiliza el archivo de la versión con un enlace duro y conserva su hash"""
+        _, _, first_id = await create_version(db, documento, b"v1")
+        await create_version(db, documento, b"v2")
+        source = db.get(models.VersionDocumento, first_id)
+
+        success, message, version_id = StorageService.restore_version(documento.id, first_id, documento.usuario_id, db)
+
+        assert success, message
+        restored = db.get(models.VersionDocumento, version_id)
+        assert os.stat(restored.path_archivo).st_ino == os.stat(source.path_archivo).st_ino
+        assert (restored.hash_archivo, restored.tamano_archivo) == (source.hash_archivo, source.tamano_archivo)
+
+    async def test_restore_falls_back_to_copy(self, db, documento, storage, dispatched, monkeypatch):
+        """Prueba que sin enlaces duros ni reflinks la restauración copia el archivo"""
+        _, _, first_id = await create_version(db, documento, b"v1")
+        def unsupported(source, destination):
+            raise OSError("enlaces no admitidos")
+        monkeypatch.setattr(storage_module.os, "link", unsupported)
+        monkeypatch.setattr(storage_module, "FICLONE", None)
+
+        success, message, version_id = StorageService.restore_version(documento.id, first_id, documento.usuario_id, db)
+
+        assert success, message
+        restored = db.get(models.VersionDocumento, version_id)
+        source = db.get(models.VersionDocumento, first_id)
+        assert os.stat(restored.path_archivo).st_ino != os.stat(source.path_archivo).st_ino
+        with open(restored.path_archivo, "rb") as published:
+            assert published.read() == b"v1"